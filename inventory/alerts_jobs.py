@@ -9,9 +9,9 @@ from django.core.mail import send_mail
 from django.urls import reverse
 from django.utils import timezone
 
+from inventory import anomaly_shards, job_runs
 from inventory.ml.anomaly import (
     anomaly_keep_set,
-    detect_sales_anomalies,
     prune_stale_anomalies_not_in_results,
     save_anomalies,
 )
@@ -107,6 +107,9 @@ def run_anomaly_scan_and_notify(
     """
     Run anomaly detection and create in-app notifications for new MEDIUM/HIGH anomalies.
 
+    Detection runs sharded on a local pool (see ``inventory.anomaly_shards``);
+    the Celery task fans the same shards out to workers instead.
+
     Returns dict:
       {
         "detected": int,
@@ -118,8 +121,8 @@ def run_anomaly_scan_and_notify(
     """
     if days_back is None:
         days_back = getattr(django_settings, "ANOMALY_SCAN_DAYS_BACK", 60)
-    results = detect_sales_anomalies(
-        days_back=days_back,
+    results = anomaly_shards.scan(
+        days_back,
         min_points=min_points,
         last_n_days_only=last_n_days_only,
         z_thresh_low=z_thresh_low,
@@ -127,11 +130,39 @@ def run_anomaly_scan_and_notify(
         z_thresh_high=z_thresh_high,
         **detect_kwargs,
     )
+    return apply_anomaly_results(results)
+
+
+def apply_anomaly_results(results):
+    """
+    The single aggregation step of a scan: upsert ``results`` into
+    DemandAnomaly, prune rows and notifications the scan no longer reports,
+    and notify managers of new MEDIUM/HIGH anomalies. Returns the summary dict
+    described in ``run_anomaly_scan_and_notify``.
+    """
     keep = anomaly_keep_set(results)
-    created, created_objs = save_anomalies(results)
-    pruned = prune_stale_anomalies_not_in_results(keep)
-    notifications_pruned = delete_obsolete_anomaly_notifications(keep)
+    with job_runs.stage("save"):
+        created, created_objs = save_anomalies(results)
+    with job_runs.stage("prune"):
+        pruned = prune_stale_anomalies_not_in_results(keep)
+        notifications_pruned = delete_obsolete_anomaly_notifications(keep)
+
+    with job_runs.stage("notify"):
+        emails_sent = _notify_new_anomalies(created_objs)
 
+    summary = {
+        "detected": len(results),
+        "created": created,
+        "pruned": pruned,
+        "notifications_pruned": notifications_pruned,
+        "critical_emails_sent": emails_sent,
+    }
+    job_runs.add_summary(summary)
+    return summary
+
+
+def _notify_new_anomalies(created_objs):
+    """Bell notifications (and grouped emails for HIGH) for new MEDIUM/HIGH anomalies; returns emails sent."""
     Notification = apps.get_model("inventory", "Notification")
     User = get_user_model()
     emails_sent = 0
@@ -198,13 +229,7 @@ def run_anomaly_scan_and_notify(
             if ok:
                 emails_sent += 1
 
-    return {
-        "detected": len(results),
-        "created": created,
-        "pruned": pruned,
-        "notifications_pruned": notifications_pruned,
-        "critical_emails_sent": emails_sent,
-    }
+    return emails_sent
 
 
 def sync_recommendation_notifications(*, limit=50):
@@ -2,9 +2,10 @@
 
 from __future__ import annotations
 
+from django.contrib.auth import get_user_model
 from django.urls import reverse
 
-from inventory.models import Notification
+from inventory.models import Activity, Notification
 
 # Stored in Notification.message; excluded from bell dropdown / badge count.
 ANOMALY_SCAN_RESULT_PREFIX = "[ANOMALY_SCAN_RESULT] "
@@ -26,3 +27,28 @@ def record_anomaly_scan_completion_for_user(user, summary: dict) -> None:
         message=f"{ANOMALY_SCAN_RESULT_PREFIX}{body}",
         url=reverse("dashboard") + "?open_anomalies=1",
     )
+
+
+def record_anomaly_scan(result, user_id=None) -> None:
+    """Banner + activity entry for a finished scan; ``user_id`` None means the scheduled scan."""
+    if user_id:
+        user = get_user_model().objects.filter(pk=user_id).first()
+        if user:
+            record_anomaly_scan_completion_for_user(user, result)
+            Activity.objects.create(
+                user=user,
+                kind=Activity.KIND_ANOMALY_SCAN,
+                message=(
+                    f"Anomaly scan completed: {result['detected']} match rules "
+                    f"({result['created']} new, {result['pruned']} obsolete rows removed)"
+                ),
+            )
+    else:
+        Activity.objects.create(
+            user=None,
+            kind=Activity.KIND_ANOMALY_SCAN,
+            message=(
+                f"Scheduled anomaly scan completed: {result['detected']} match rules "
+                f"({result['created']} new)."
+            ),
+        )
@@ -0,0 +1,212 @@
+"""
+Sharded, parallel demand anomaly scan.
+
+The scan splits the items that sold in the recent window into contiguous
+item-id ranges. Each shard loads only its own slice of the daily demand
+matrix and scores it with ``inventory.ml.anomaly.score_sales_df``. All
+shards use one shared window (``ScanWindow``), so together they flag exactly
+what a single-process scan would. Writing the results happens once, in
+``alerts_jobs.apply_anomaly_results``: the DemandAnomaly upsert, pruning
+stale rows and notifications. Shards never race each other on the table.
+
+Where the shards run:
+
+- ``run_anomaly_scan_task`` sends them to Celery as a chord: one
+  ``scan_anomaly_shard_task`` per shard, then ``finish_anomaly_scan_task``.
+  The scan gets faster as worker concurrency grows.
+- ``scan`` (a manual scan without a broker, ``run_anomaly_scan``, and
+  ``run_anomaly_scan --celery`` when no broker is reachable) runs them on a
+  local pool. It uses forked processes by default, or threads with
+  ``ANOMALY_SCAN_LOCAL_POOL=thread``. Inside an open transaction
+  (``TestCase``, ``ATOMIC_REQUESTS``) they run one after another on the
+  caller's connection, because other connections cannot see its
+  uncommitted rows.
+
+``ANOMALY_SCAN_SHARDS`` caps the shard count. ``ANOMALY_SCAN_SHARD_MIN_ITEMS``
+keeps small catalogues in a single shard.
+
+Each shard times its ``load`` and ``detect`` phases into a
+``job_runs.Stages``. Local pools and the chord hand those back to the parent,
+which adds them to the active job run.
+"""
+from __future__ import annotations
+
+import dataclasses
+import datetime
+import logging
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Max
+
+from . import job_runs
+from .ml.anomaly import AnomalyResult, build_daily_sales_df, latest_sale_date, score_sales_df, sort_results
+from .models import Order, OrderLine
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LAST_N_DAYS = 14
+
+
+@dataclasses.dataclass(frozen=True)
+class ScanWindow:
+    """Date window shared by every shard: history ``start``..``end``; ``end_date`` = last day with sales."""
+
+    start: datetime.date
+    end: datetime.date
+    end_date: datetime.date
+
+    def as_json(self):
+        return {k: v.isoformat() for k, v in dataclasses.asdict(self).items()}
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(**{k: datetime.date.fromisoformat(v) for k, v in data.items()})
+
+
+def _sale_lines(start, end):
+    return OrderLine.objects.filter(order__order_type=Order.TYPE_SALE, order_date__range=(start, end))
+
+
+def scan_window(days_back):
+    """The window a full scan would use, or None when there are no sales in it."""
+    end = latest_sale_date()
+    if not end:
+        return None
+    start = end - datetime.timedelta(days=days_back)
+    end_date = _sale_lines(start, end).aggregate(last=Max("order_date"))["last"]
+    return ScanWindow(start, end, end_date) if end_date else None
+
+
+def plan_shards(window, *, last_n_days_only=DEFAULT_LAST_N_DAYS, shards=None, min_items=None):
+    """
+    Inclusive item-id ranges with about the same number of candidate items each.
+
+    Candidates are the items with sales in the recent window; scoring skips
+    every other item anyway, so they are what the work scales with.
+    """
+    if window is None:
+        return []
+    shards = shards or settings.ANOMALY_SCAN_SHARDS
+    min_items = min_items or settings.ANOMALY_SCAN_SHARD_MIN_ITEMS
+    recent_from = window.end_date - datetime.timedelta(days=last_n_days_only)
+    item_ids = list(
+        _sale_lines(recent_from, window.end_date)
+        .filter(quantity__gt=0)
+        .order_by("item_id")
+        .values_list("item_id", flat=True)
+        .distinct()
+    )
+    if not item_ids:
+        return []
+    count = max(1, min(shards, len(item_ids) // min_items))
+    size = math.ceil(len(item_ids) / count)
+    return [(item_ids[i], item_ids[min(i + size, len(item_ids)) - 1]) for i in range(0, len(item_ids), size)]
+
+
+def scan_shard(window, item_range, days_back, rules, stages=None):
+    """
+    Load and score one item-id range; ``rules`` are the ``score_sales_df`` keyword arguments.
+
+    The load/detect seconds go to ``stages``, or to the active job run when
+    none is given.
+    """
+    timer = stages.time if stages is not None else job_runs.stage
+    with timer("load"):
+        df = build_daily_sales_df(days_back=days_back, end=window.end, item_range=tuple(item_range))
+    with timer("detect"):
+        return score_sales_df(df, end_date=window.end_date, days_back=days_back, **rules)
+
+
+def timed_scan_shard(window, item_range, days_back, rules):
+    """``scan_shard`` for another thread or process: returns ``(results, stages)``."""
+    stages = job_runs.Stages()
+    return scan_shard(window, item_range, days_back, rules, stages), stages
+
+
+# ---- local pools ----
+
+def _in_transaction():
+    return any(conn.in_atomic_block for conn in connections.all(initialized_only=True))
+
+
+def _scan_shard_and_close(*args):
+    try:
+        return timed_scan_shard(*args)
+    finally:
+        # Pool threads and processes are not request threads; nothing else
+        # closes their connections.
+        connections.close_all()
+
+
+def _local_executor(pool, workers):
+    if pool == "process" and "fork" in multiprocessing.get_all_start_methods():
+        # Children must not share the parent's sockets: close them so each
+        # forked process opens its own connection.
+        connections.close_all()
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="warewolf-anomaly")
+
+
+def run_shards_locally(window, ranges, days_back, rules, *, pool=None, workers=None):
+    """Score ``ranges`` on a local process/thread pool (or inline) and return the merged results."""
+    pool = pool or settings.ANOMALY_SCAN_LOCAL_POOL
+    workers = min(len(ranges), workers or settings.ANOMALY_SCAN_LOCAL_WORKERS or os.cpu_count() or 1)
+    job_runs.set_total(len(ranges))
+    parts = []
+    if pool == "inline" or workers < 2 or _in_transaction():
+        for item_range in ranges:
+            parts.append(scan_shard(window, item_range, days_back, rules))
+            job_runs.advance()
+    else:
+        job_runs.show_stage("detect")
+        with _local_executor(pool, workers) as executor:
+            futures = [executor.submit(_scan_shard_and_close, window, r, days_back, rules) for r in ranges]
+            for future in as_completed(futures):
+                results, stages = future.result()
+                job_runs.add_stages(stages)
+                job_runs.advance()
+                parts.append(results)
+    return sort_results([result for part in parts for result in part])
+
+
+def scan(days_back, *, last_n_days_only=DEFAULT_LAST_N_DAYS, pool=None, workers=None, **rules):
+    """Sharded equivalent of ``detect_sales_anomalies``, run in this process."""
+    with job_runs.stage("plan"):
+        window = scan_window(days_back)
+        ranges = plan_shards(window, last_n_days_only=last_n_days_only)
+    job_runs.add_rows(shards=len(ranges))
+    if not ranges:
+        return []
+    rules["last_n_days_only"] = last_n_days_only
+    return run_shards_locally(window, ranges, days_back, rules, pool=pool, workers=workers)
+
+
+# ---- Celery ----
+
+def shard_to_json(results, stages):
+    return {"results": [dataclasses.asdict(r) for r in results], "stages": stages}
+
+
+def results_from_json(parts):
+    """Merge the shard results returned by the chord header; their stage times go to the active job run."""
+    for part in parts:
+        job_runs.add_stages(part["stages"])
+    return sort_results([AnomalyResult(**row) for part in parts for row in part["results"]])
+
+
+def broker_available(timeout=1.0):
+    """True when the Celery broker accepts a connection within ``timeout`` seconds."""
+    from celery import current_app
+
+    try:
+        with current_app.connection_for_write() as conn:
+            conn.ensure_connection(max_retries=1, timeout=timeout)
+        return True
+    except Exception:
+        logger.info("Celery broker unreachable; running the anomaly scan locally", exc_info=True)
+        return False
@@ -0,0 +1,654 @@
+"""
+Versioned JSON API (``/api/v1/``) for integrations.
+
+Resources are items, orders (with lines), locations, suppliers, clients
+(customers) and ``stock`` (a slim, read-only quantity feed). Each one is a
+``Resource`` in ``RESOURCES``:
+
+- ``GET /api/v1/<resource>/`` lists records in primary-key order with cursor
+  pagination. Pass ``?cursor=`` with the previous page's ``next_cursor``.
+  Cursor pages never skip or repeat rows when others are inserted, and each
+  page is an index range scan rather than an ``OFFSET``. ``?limit=`` is at
+  most ``MAX_LIMIT``.
+- ``?fields=name,sku,quantity`` returns only those fields, and only those
+  columns are selected (``.only()``). ``?include=lines`` (orders) adds the
+  lines through one prefetch query. Simple equality filters are listed per
+  resource (``?status=PENDING``).
+- ``GET /api/v1/<resource>/<id>/`` returns one record.
+- ``POST /api/v1/<resource>/batch/`` with ``{"records": [...]}`` creates
+  (no ``id``) or updates (with ``id``; only the given fields change) up to
+  ``MAX_BATCH`` records. Every record is validated with the same form the
+  web pages use. Foreign keys are resolved for the whole batch with one
+  query per field. If any record is invalid, nothing is written and the
+  errors come back per record index. Otherwise everything is saved in one
+  transaction.
+
+GETs carry an ETag built from the resource's table versions
+(``inventory.change_versions``), so polling an unchanged collection costs one
+tiny query and returns ``304 Not Modified``.
+
+Requests authenticate with the session cookie (CSRF applies to writes) or HTTP
+Basic credentials of a WareWolf user. Access uses the normal model
+permissions: ``view_*`` to read and ``add_*`` / ``change_*`` to write.
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+import datetime
+import json
+from dataclasses import dataclass, field
+from decimal import Decimal
+from functools import wraps
+from typing import Callable
+
+from django import forms
+from django.contrib.auth import authenticate
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Prefetch
+from django.db.models.fields.files import FieldFile
+from django.http import JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.views.decorators.csrf import csrf_exempt
+
+from .change_versions import conditional_response
+from .daily_totals import item_contribution, note_item_change, sum_contributions
+from .forms import ClientForm, ItemForm, LocationForm, OrderForm, OrderLineFormSet, SupplierForm
+from .models import Activity, Client, Item, Location, Order, OrderLine, StockMovement, Supplier
+from .scan_codes import sync_codes_for_items
+from .tree_service import bump_tree_version
+
+API_VERSION = "v1"
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+MAX_BATCH = 1000
+_TRUE = {"1", "true", "yes"}
+_FALSE = {"0", "false", "no"}
+
+
+class ApiError(Exception):
+    def __init__(self, status, code, message="", **extra):
+        super().__init__(message or code)
+        self.status = status
+        self.code = code
+        self.message = message
+        self.extra = extra
+
+    def response(self):
+        body = {"error": self.code}
+        if self.message:
+            body["message"] = self.message
+        body.update(self.extra)
+        return JsonResponse(body, status=self.status)
+
+
+@dataclass(frozen=True)
+class Include:
+    prefetch: Callable  # () -> Prefetch
+    serialize: Callable  # (obj) -> JSON value
+
+
+@dataclass(frozen=True)
+class Resource:
+    name: str
+    model: type
+    fields: tuple  # readable model fields; "id" first
+    form: type | None = None  # write form (None: read-only)
+    filters: dict = field(default_factory=dict)  # query param -> model field
+    includes: dict = field(default_factory=dict)
+    save_batch: Callable | None = None  # (resource, [(record, form, instance)], user) -> None
+
+    def perm(self, action):
+        return f"{self.model._meta.app_label}.{action}_{self.model._meta.model_name}"
+
+
+# ---- serialization ----
+
+def _json_value(value):
+    if isinstance(value, FieldFile):
+        return value.url if value else None
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def _attname(model, name):
+    return model._meta.get_field(name).attname
+
+
+def serialize(resource, obj, fields, includes=()):
+    out = {name: _json_value(getattr(obj, _attname(resource.model, name))) for name in fields}
+    for name in includes:
+        out[name] = resource.includes[name].serialize(obj)
+    return out
+
+
+# ---- query parameters ----
+
+def _parse_fields(resource, raw):
+    if not raw:
+        return list(resource.fields)
+    wanted = [name.strip() for name in raw.split(",") if name.strip()]
+    unknown = [name for name in wanted if name not in resource.fields]
+    if unknown:
+        raise ApiError(400, "invalid_fields", f"Unknown fields: {', '.join(unknown)}", allowed=list(resource.fields))
+    return ["id"] + [name for name in dict.fromkeys(wanted) if name != "id"]
+
+
+def _parse_includes(resource, raw):
+    wanted = [name.strip() for name in (raw or "").split(",") if name.strip()]
+    unknown = [name for name in wanted if name not in resource.includes]
+    if unknown:
+        raise ApiError(400, "invalid_include", f"Cannot include: {', '.join(unknown)}", allowed=list(resource.includes))
+    return list(dict.fromkeys(wanted))
+
+
+def _parse_filters(resource, params):
+    lookups = {}
+    for param, model_field in resource.filters.items():
+        if param not in params:
+            continue
+        value = params[param]
+        field_obj = resource.model._meta.get_field(model_field)
+        if isinstance(field_obj, models.BooleanField):
+            if value.lower() not in _TRUE | _FALSE:
+                raise ApiError(400, "invalid_filter", f"{param} must be true or false")
+            value = value.lower() in _TRUE
+        else:
+            # A foreign key validates as its target's primary key.
+            try:
+                value = field_obj.to_python(value)
+            except (ValidationError, ValueError):
+                raise ApiError(400, "invalid_filter", f"{param} is not a valid {field_obj.verbose_name}")
+        lookups[_attname(resource.model, model_field)] = value
+    return lookups
+
+
+def encode_cursor(pk):
+    return base64.urlsafe_b64encode(json.dumps({"after": pk}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded.encode()))["after"])
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        raise ApiError(400, "invalid_cursor", "Malformed cursor")
+
+
+def _parse_limit(raw):
+    if raw in (None, ""):
+        return DEFAULT_LIMIT
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise ApiError(400, "invalid_limit", "limit must be a number")
+    return max(1, min(MAX_LIMIT, limit))
+
+
+def list_records(resource, params):
+    """One page of ``resource`` as ``{"results", "next_cursor"}`` (see the module docstring)."""
+    fields = _parse_fields(resource, params.get("fields"))
+    includes = _parse_includes(resource, params.get("include"))
+    limit = _parse_limit(params.get("limit"))
+    qs = resource.model.objects.filter(**_parse_filters(resource, params)).only(*fields).order_by("pk")
+    if params.get("cursor"):
+        qs = qs.filter(pk__gt=decode_cursor(params["cursor"]))
+    for name in includes:
+        qs = qs.prefetch_related(resource.includes[name].prefetch())
+    # One extra row tells whether there is a next page without a COUNT.
+    rows = list(qs[: limit + 1])
+    page = rows[:limit]
+    return {
+        "results": [serialize(resource, obj, fields, includes) for obj in page],
+        "next_cursor": encode_cursor(page[-1].pk) if len(rows) > limit else None,
+    }
+
+
+def get_record(resource, pk, params):
+    fields = _parse_fields(resource, params.get("fields"))
+    includes = _parse_includes(resource, params.get("include"))
+    qs = resource.model.objects.only(*fields)
+    for name in includes:
+        qs = qs.prefetch_related(resource.includes[name].prefetch())
+    obj = qs.filter(pk=pk).first()
+    if obj is None:
+        raise ApiError(404, "not_found", f"No {resource.name} record with id {pk}")
+    return serialize(resource, obj, fields, includes)
+
+
+# ---- batch writes ----
+
+def _form_errors(form):
+    return {name: [str(m) for m in messages] for name, messages in form.errors.items()}
+
+
+def _preload_choices(form_class, bound_forms):
+    """
+    Resolve every ModelChoiceField of ``bound_forms`` from one query per field.
+
+    A plain ModelChoiceField runs ``queryset.get()`` for each form. Here the
+    ids used across the batch are loaded once, and each form's field looks
+    them up in memory. It still raises the form's own "invalid choice"
+    error.
+    """
+    if not bound_forms:
+        return
+    base = form_class()
+    for name, base_field in base.fields.items():
+        if not isinstance(base_field, forms.ModelChoiceField) or isinstance(base_field, forms.ModelMultipleChoiceField):
+            continue
+        values = {str(form.data.get(name)) for form in bound_forms if form.data.get(name) not in (None, "")}
+        objects = {}
+        if values:
+            ids = [v for v in values if v.isdigit()]
+            objects = {str(obj.pk): obj for obj in base_field.queryset.filter(pk__in=ids)}
+        for form in bound_forms:
+            form.fields[name].to_python = _lookup(form.fields[name], objects)
+
+
+def _lookup(model_field, objects):
+    def to_python(value):
+        if value in model_field.empty_values:
+            return None
+        obj = objects.get(str(value.pk if hasattr(value, "pk") else value))
+        if obj is None:
+            raise ValidationError(model_field.error_messages["invalid_choice"], code="invalid_choice")
+        return obj
+
+    return to_python
+
+
+def _form_data(form_class, instance, record):
+    """
+    Form data for ``record``: unspecified fields keep the instance's values.
+
+    On creates, the fields start from the model defaults, as the web forms do.
+    """
+    if instance is None:
+        instance = form_class._meta.model()
+    data = forms.model_to_dict(instance, fields=list(form_class._meta.fields))
+    data.update({k: v for k, v in record.items() if k != "id"})
+    return data
+
+
+def validate_batch(resource, records):
+    """
+    ``[(record, bound form, instance or None)]`` when every record is valid.
+
+    Raises ``ApiError`` (400) listing ``{"index", "errors"}`` per bad record.
+    """
+    if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+        raise ApiError(400, "invalid_body", 'Send {"records": [{...}, ...]}')
+    if not records:
+        raise ApiError(400, "invalid_body", "No records given")
+    if len(records) > MAX_BATCH:
+        raise ApiError(400, "batch_too_large", f"At most {MAX_BATCH} records per call")
+
+    errors = []
+    ids = [r["id"] for r in records if r.get("id") is not None]
+    bad_ids = [i for i in ids if not isinstance(i, int)]
+    if bad_ids:
+        raise ApiError(400, "invalid_body", "Record ids must be integers")
+    instances = resource.model.objects.in_bulk(ids)
+    entries = []
+    for index, record in enumerate(records):
+        unknown = sorted(set(record) - set(_writable(resource.form)) - {"id"} - set(resource.includes))
+        instance = None
+        if record.get("id") is not None:
+            instance = instances.get(record["id"])
+            if instance is None:
+                errors.append({"index": index, "errors": {"id": [f"No {resource.name} record with this id."]}})
+                continue
+        if unknown:
+            errors.append({"index": index, "errors": {name: ["Unknown or read-only field."] for name in unknown}})
+            continue
+        form = resource.form(data=_form_data(resource.form, instance, record), instance=instance)
+        entries.append((index, record, form, instance))
+
+    _preload_choices(resource.form, [form for _, _, form, _ in entries])
+    seen_unique = {}
+    unique_fields = [f.name for f in resource.model._meta.fields if f.unique and f.name in resource.form._meta.fields]
+    valid = []
+    for index, record, form, instance in entries:
+        if not form.is_valid():
+            errors.append({"index": index, "errors": _form_errors(form)})
+            continue
+        clash = None
+        for name in unique_fields:
+            key = (name, form.cleaned_data.get(name))
+            if key in seen_unique:
+                clash = {name: [f"Same value as record {seen_unique[key]} in this batch."]}
+            seen_unique.setdefault(key, index)
+        if clash:
+            errors.append({"index": index, "errors": clash})
+            continue
+        valid.append((index, record, form, instance))
+
+    if errors:
+        raise ApiError(400, "validation_failed", "Nothing was saved", errors=sorted(errors, key=lambda e: e["index"]))
+    return valid
+
+
+def _save_forms(resource, entries, user):
+    """Default writer: each form's own ``save()`` (model ``save()`` logic and signals run)."""
+    for _, _, form, _ in entries:
+        form.save()
+
+
+def _save_items(resource, entries, user):
+    """
+    Bulk writer for items: one INSERT per batch, one UPDATE per set of fields.
+
+    Updates write only the fields each record names, so a concurrent change
+    to any other field (stock moved by an order, say) is kept. The rows are
+    locked first and the quantity, cost and active flag the ledger and daily
+    totals start from are read under that lock.
+
+    Because ``bulk_create``/``bulk_update`` skip signals, the ledger rows,
+    daily totals and scan codes are written here, as ``inventory.item_import``
+    does.
+    """
+    creates = [form.save(commit=False) for _, _, form, instance in entries if instance is None]
+    changes = [(record, form.save(commit=False)) for _, record, form, instance in entries if instance is not None]
+    current = {
+        pk: (is_active, qty, cost, location_id)
+        for pk, is_active, qty, cost, location_id in Item.objects.select_for_update()
+        .filter(pk__in=[item.pk for _, item in changes])
+        .values_list("pk", "is_active", "quantity", "unit_cost", "location_id")
+    }
+    before = {pk: values[:3] for pk, values in current.items()}
+    Item.objects.bulk_create(creates)
+    by_fields = {}
+    for record, item in changes:
+        # Fields the record leaves out take the locked row's values, never the validation snapshot's.
+        item.is_active, quantity, unit_cost, location_id = current[item.pk]
+        if "quantity" not in record:
+            item.quantity = quantity
+        if "unit_cost" not in record:
+            item.unit_cost = unit_cost
+        if "location" not in record:
+            item.location_id = location_id
+        fields = tuple(name for name in _writable(ItemForm) if name in record)
+        if fields:
+            by_fields.setdefault(fields, []).append(item)
+    for fields, items in by_fields.items():
+        Item.objects.bulk_update(items, fields, batch_size=500)
+    updates = [item for _, item in changes]
+
+    movements = []
+    for item in creates:
+        if item.quantity:
+            movements.append(
+                StockMovement(item_id=item.pk, location_id=item.location_id, delta=item.quantity,
+                              reason=StockMovement.REASON_INITIAL, user=user)
+            )
+    for item in updates:
+        delta = item.quantity - before[item.pk][1]
+        if delta:
+            movements.append(
+                StockMovement(item_id=item.pk, location_id=item.location_id, delta=delta,
+                              reason=StockMovement.REASON_EDIT, user=user)
+            )
+    StockMovement.objects.bulk_create(movements)
+    note_item_change(
+        sum_contributions(item_contribution(*values) for values in before.values()),
+        sum_contributions(item_contribution(i.is_active, i.quantity, i.unit_cost) for i in creates + updates),
+    )
+    sync_codes_for_items([i.pk for i in creates + updates])
+    bump_tree_version()
+
+
+def _save_orders(resource, entries, user):
+    """Orders with their lines; delivered orders apply stock exactly as the order form does."""
+    for index, record, form, instance in entries:
+        order = form.save()
+        if form.api_lines is not None:
+            if instance is not None:
+                order.lines.all().delete()
+            lines = [line.save(commit=False) for line in form.api_lines]
+            for line in lines:
+                line.order = order
+            OrderLine.objects.bulk_create(lines)
+        try:
+            order.apply_stock_if_needed(actor=user)
+        except ValueError as exc:
+            raise ApiError(409, "stock_error", str(exc), index=index)
+
+
+def _validate_order_lines(entries):
+    """Attach validated line forms to each order form (``form.api_lines``); returns per-record errors."""
+    line_class = OrderLineFormSet.form
+    errors = []
+    all_lines = []
+    for index, record, form, instance in entries:
+        raw = record.get("lines")
+        form.api_lines = None
+        if raw is None:
+            if instance is None:
+                errors.append({"index": index, "errors": {"lines": ["Orders need at least one line."]}})
+            continue
+        if not isinstance(raw, list) or not raw or not all(isinstance(line, dict) for line in raw):
+            errors.append({"index": index, "errors": {"lines": ["Give a non-empty list of {item, quantity, unit_price}."]}})
+            continue
+        if instance is not None and instance.stock_applied:
+            errors.append({"index": index, "errors": {"lines": ["Stock for this order was applied; its lines cannot change."]}})
+            continue
+        form.api_lines = [line_class(data=line) for line in raw]
+        all_lines.extend(form.api_lines)
+    _preload_choices(line_class, all_lines)
+    for index, record, form, instance in entries:
+        line_errors = [
+            {"line": n, "errors": _form_errors(line)}
+            for n, line in enumerate(form.api_lines or [])
+            if not line.is_valid()
+        ]
+        if line_errors:
+            errors.append({"index": index, "errors": {"lines": line_errors}})
+    return errors
+
+
+def save_batch(resource, records, user):
+    """Validate and save ``records`` in one transaction; returns ``[{"index", "id", "created"}]``."""
+    entries = validate_batch(resource, records)
+    if resource.model is Order:
+        errors = _validate_order_lines(entries)
+        if errors:
+            raise ApiError(400, "validation_failed", "Nothing was saved", errors=errors)
+    writer = resource.save_batch or _save_forms
+    with transaction.atomic():
+        writer(resource, entries, user)
+        created = sum(1 for *_, instance in entries if instance is None)
+        Activity.objects.create(
+            user=user,
+            kind=Activity.KIND_ITEM_IMPORT if resource.model is Item else (
+                Activity.KIND_ORDER_STOCK if resource.model is Order else Activity.KIND_OTHER
+            ),
+            message=f"API batch ({resource.name}): {created} created, {len(entries) - created} updated",
+        )
+    return [
+        {"index": index, "id": form.instance.pk, "created": instance is None}
+        for index, _, form, instance in entries
+    ]
+
+
+# ---- resources ----
+
+def _writable(form_class):
+    return tuple(name for name in form_class._meta.fields if name != "image")
+
+
+def _serialize_lines(order):
+    return [
+        {"id": line.pk, "item": line.item_id, "quantity": line.quantity, "unit_price": _json_value(line.unit_price)}
+        for line in order.lines.all()
+    ]
+
+
+RESOURCES = {
+    r.name: r
+    for r in [
+        Resource(
+            name="items",
+            model=Item,
+            form=ItemForm,
+            fields=("id",) + tuple(ItemForm._meta.fields) + ("is_active", "created_at"),
+            filters={"sku": "sku", "barcode": "barcode", "is_active": "is_active", "location": "location",
+                     "supplier": "supplier", "category": "category"},
+            save_batch=_save_items,
+        ),
+        Resource(
+            name="orders",
+            model=Order,
+            form=OrderForm,
+            fields=("id",) + tuple(OrderForm._meta.fields) + ("stock_applied", "created_at"),
+            filters={"status": "status", "order_type": "order_type", "client": "client", "supplier": "supplier",
+                     "reference": "reference"},
+            includes={
+                "lines": Include(
+                    prefetch=lambda: Prefetch(
+                        "lines", queryset=OrderLine.objects.only("id", "order_id", "item_id", "quantity", "unit_price").order_by("id")
+                    ),
+                    serialize=_serialize_lines,
+                ),
+            },
+            save_batch=_save_orders,
+        ),
+        Resource(
+            name="locations",
+            model=Location,
+            form=LocationForm,
+            fields=("id",) + tuple(LocationForm._meta.fields) + ("name_path", "depth"),
+            filters={"parent": "parent", "is_active": "is_active", "code": "code", "location_type": "location_type"},
+        ),
+        Resource(
+            name="suppliers",
+            model=Supplier,
+            form=SupplierForm,
+            fields=("id",) + tuple(SupplierForm._meta.fields),
+            filters={"is_active": "is_active"},
+        ),
+        Resource(
+            name="clients",
+            model=Client,
+            form=ClientForm,
+            fields=("id",) + tuple(ClientForm._meta.fields),
+            filters={"is_active": "is_active"},
+        ),
+        Resource(
+            name="stock",
+            model=Item,
+            fields=("id", "sku", "name", "quantity", "reorder_level", "location", "is_active"),
+            filters={"sku": "sku", "location": "location", "is_active": "is_active"},
+        ),
+    ]
+}
+
+
+# ---- views ----
+
+def _authenticate(request):
+    """Session user, or the user named by an ``Authorization: Basic`` header (then CSRF does not apply)."""
+    header = request.headers.get("Authorization", "")
+    if header.lower().startswith("basic "):
+        try:
+            username, _, password = base64.b64decode(header[6:].strip()).decode().partition(":")
+        except (binascii.Error, UnicodeDecodeError):
+            raise ApiError(401, "unauthorized", "Malformed Basic credentials")
+        user = authenticate(request, username=username, password=password)
+        if user is None or not user.is_active:
+            raise ApiError(401, "unauthorized", "Invalid credentials")
+        request.user = user
+        return
+    if not request.user.is_authenticated:
+        raise ApiError(401, "unauthorized", "Log in or send HTTP Basic credentials")
+    if request.method not in ("GET", "HEAD", "OPTIONS"):
+        rejected = CsrfViewMiddleware(lambda r: None).process_view(request, None, (), {})
+        if rejected is not None:
+            raise ApiError(403, "csrf_failed", "CSRF check failed; send the X-CSRFToken header")
+
+
+def api_view(methods):
+    def decorator(view):
+        @csrf_exempt  # checked in _authenticate for cookie sessions only
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            try:
+                if request.method not in methods:
+                    raise ApiError(405, "method_not_allowed", f"Use {' or '.join(methods)}")
+                _authenticate(request)
+                return view(request, *args, **kwargs)
+            except ApiError as exc:
+                return exc.response()
+
+        return wrapped
+
+    return decorator
+
+
+def _resource(name, user, action):
+    resource = RESOURCES.get(name)
+    if resource is None:
+        raise ApiError(404, "unknown_resource", f"No resource named {name!r}", resources=sorted(RESOURCES))
+    if not user.has_perm(resource.perm(action)):
+        raise ApiError(403, "forbidden", f"Requires {resource.perm(action)}")
+    return resource
+
+
+@api_view(["GET"])
+def api_index(request):
+    return JsonResponse({
+        "version": API_VERSION,
+        "resources": {
+            name: {
+                "fields": list(r.fields),
+                "filters": list(r.filters),
+                "includes": list(r.includes),
+                "writable": list(_writable(r.form)) if r.form else [],
+            }
+            for name, r in RESOURCES.items()
+            if request.user.has_perm(r.perm("view"))
+        },
+    })
+
+
+def _dependencies(resource):
+    return [resource.model] + ([OrderLine] if resource.includes else [])
+
+
+@api_view(["GET"])
+def api_list(request, resource):
+    resource = _resource(resource, request.user, "view")
+    return conditional_response(
+        request, _dependencies(resource), lambda: JsonResponse(list_records(resource, request.GET))
+    )
+
+
+@api_view(["GET"])
+def api_detail(request, resource, pk):
+    resource = _resource(resource, request.user, "view")
+    return conditional_response(
+        request, _dependencies(resource), lambda: JsonResponse(get_record(resource, pk, request.GET))
+    )
+
+
+@api_view(["POST"])
+def api_batch(request, resource):
+    resource = _resource(resource, request.user, "view")
+    if resource.form is None:
+        raise ApiError(405, "read_only", f"{resource.name} is read-only")
+    try:
+        body = json.loads(request.body or b"{}")
+    except (ValueError, UnicodeDecodeError):
+        raise ApiError(400, "invalid_json", "Body is not valid JSON")
+    records = body.get("records") if isinstance(body, dict) else None
+    if isinstance(records, list):
+        needed = {"add" if r.get("id") is None else "change" for r in records if isinstance(r, dict)}
+        missing = [resource.perm(a) for a in sorted(needed) if not request.user.has_perm(resource.perm(a))]
+        if missing:
+            raise ApiError(403, "forbidden", f"Requires {', '.join(missing)}")
+    results = save_batch(resource, records, request.user)
+    return JsonResponse({"saved": len(results), "results": results})
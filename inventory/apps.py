@@ -7,3 +7,6 @@ class InventoryConfig(AppConfig):
 
     def ready(self):
         import inventory.signals  # noqa: F401
+        from inventory import change_versions
+
+        change_versions.install()
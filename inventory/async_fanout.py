@@ -0,0 +1,105 @@
+"""
+Run independent queries concurrently from async views.
+
+Django's async ORM (``acount``, ``async for`` ...) hands every query to the
+request's single sync thread, so ``asyncio.gather`` over async ORM calls still
+runs them one after another. ``fan_out`` runs each branch, a zero-argument
+sync callable that returns evaluated results, on a small dedicated thread pool
+instead. Each pool thread keeps its own database connection, so the branches
+really do overlap. Total latency is roughly that of the slowest branch.
+
+Branches run one after another on the request thread when:
+
+- the caller is inside a transaction (``TestCase``, ``ATOMIC_REQUESTS``),
+  because other connections cannot see its uncommitted rows;
+- ``ASYNC_FANOUT_WORKERS`` is 0.
+
+``run_sync`` is the single-call form for the sync work an async view still
+has to do (rendering, sessions). Both count their SQL against the current
+request's ``RequestStats``.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone, translation
+
+from . import request_metrics
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    workers = int(getattr(settings, "ASYNC_FANOUT_WORKERS", 0) or 0)
+    if workers <= 0:
+        return None
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="warewolf-fanout")
+    return _executor
+
+
+def _in_transaction():
+    return any(conn.in_atomic_block for conn in connections.all(initialized_only=True))
+
+
+def _drop_broken_connections():
+    # Pool threads outlive requests, so the request_finished cleanup never runs
+    # for them; mirror the part of close_old_connections that matters here.
+    for conn in connections.all(initialized_only=True):
+        if conn.errors_occurred:
+            if conn.is_usable():
+                conn.errors_occurred = False
+            else:
+                conn.close()
+
+
+def _call_counted(func, *args):
+    """Call ``func`` with this thread's connections reporting to the current request."""
+    stats = request_metrics.current_stats()
+    with contextlib.ExitStack() as stack:
+        if stats is not None:
+            for alias in connections:
+                conn = connections[alias]
+                if stats.sql_wrapper not in conn.execute_wrappers:
+                    stack.enter_context(conn.execute_wrapper(stats.sql_wrapper))
+        return func(*args)
+
+
+def _run_branch(func, tz, language):
+    _drop_broken_connections()
+    # asgiref hides the caller's timezone/language from threads it did not
+    # start itself, so re-activate them for the branch.
+    with timezone.override(tz), translation.override(language, deactivate=True):
+        return _call_counted(func)
+
+
+async def run_sync(func, *args):
+    """``sync_to_async(func)(*args)`` with the queries counted for the request."""
+    return await sync_to_async(_call_counted)(func, *args)
+
+
+async def fan_out(*funcs):
+    """Run the sync callables concurrently and return their results in order."""
+    executor = _get_executor()
+    if executor is None or len(funcs) < 2 or await sync_to_async(_in_transaction)():
+        return [await run_sync(func) for func in funcs]
+    loop = asyncio.get_running_loop()
+    tz, language = timezone.get_current_timezone(), translation.get_language()
+    # One context copy per branch (the request stats travel with it); a
+    # Context cannot be entered by two threads at once.
+    return await asyncio.gather(
+        *(
+            loop.run_in_executor(executor, contextvars.copy_context().run, _run_branch, func, tz, language)
+            for func in funcs
+        )
+    )
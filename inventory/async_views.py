@@ -0,0 +1,52 @@
+"""
+Async versions of the fan-out endpoints, used when the app is served over ASGI.
+
+``warewolf.asgi`` turns on ``ASYNC_VIEWS``. ``inventory.urls`` then routes the
+dashboard shell, the dashboard widgets, the Alerts page and the navbar search
+here instead of to their sync twins in ``views.py`` (same URL names, same
+responses). Each view gathers its independent queries with
+``async_fanout.fan_out`` and hands the rest (rendering, headers) to the helpers
+the sync views use.
+"""
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse
+
+from . import change_versions, dashboard_widgets, search_service, views
+from .models import Client, Item, Order, Supplier
+from .async_fanout import fan_out, run_sync
+from .context_processors import aget_alerts_for_user
+
+
+@login_required
+@change_versions.conditional_view(Item, Supplier, Client, Order, extra=dashboard_widgets.shell_version)
+async def dashboard(request):
+    queries = dashboard_widgets.KPI_QUERIES
+    counts = dict(zip(queries, await fan_out(*queries.values())))
+    return await run_sync(views.dashboard_shell_response, request, dashboard_widgets.kpi_context(counts))
+
+
+@login_required
+async def dashboard_widget(request, name):
+    widget = dashboard_widgets.WIDGETS.get(name)
+    if widget is None:
+        raise Http404("Unknown dashboard widget")
+    payload = await run_sync(dashboard_widgets.get_payload, widget, request)
+    return await run_sync(views.dashboard_widget_response, request, widget, payload)
+
+
+@login_required
+@change_versions.conditional_view(*search_service.SOURCE_MODELS, page=False)
+async def global_search(request):
+    q = request.GET.get("q", "").strip()
+
+    if not q:
+        return JsonResponse({"results": []})
+
+    sections = await fan_out(*search_service.source_calls(q))
+    return JsonResponse({"results": [row for rows in sections for row in rows]})
+
+
+@login_required
+async def alerts_list(request):
+    alerts, _ = await aget_alerts_for_user(request, limit=None)
+    return await run_sync(views.alerts_list_response, request, alerts)
@@ -0,0 +1,252 @@
+"""
+Server-side barcode decoding (ZXing-C++) for uploaded photos.
+
+Phone photos are large: decoding a 12 MP JPEG at full size and scanning it
+costs hundreds of milliseconds. ``decode_image_bytes`` therefore:
+
+1. lets Pillow's JPEG draft mode decode straight to grayscale at roughly
+   ``BARCODE_DECODE_MAX_SIDE`` pixels on the long side;
+2. if nothing is found, reloads the full image and tries again at full
+   resolution (small or distant labels) and at half size (blurry,
+   frame-filling labels). Images smaller than the target are also tried
+   upscaled.
+
+Decodes run on a bounded thread pool (``BARCODE_DECODE_WORKERS`` threads).
+At most ``BARCODE_DECODE_QUEUE`` more jobs may wait for it. A job that cannot
+get a slot fails with ``busy`` instead of queueing forever, and callers stop
+waiting after ``BARCODE_DECODE_TIMEOUT_SECONDS`` (``timeout``). A timed-out
+decode keeps its slot until it actually finishes, so a slow pile-up pushes
+back on new uploads instead of growing unbounded.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from dataclasses import dataclass
+from io import BytesIO
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+# Refuse to inflate anything bigger than this (about a 48 MP photo).
+MAX_PIXELS = 50_000_000
+MIN_SIDE = 600
+
+# HTTP status for each failure code; ``not_found`` is a normal answer.
+ERROR_STATUS = {
+    "no_image": 400,
+    "too_large": 400,
+    "too_many": 400,
+    "invalid_type": 400,
+    "invalid_image": 400,
+    "not_found": 200,
+    "busy": 503,
+    "library_unavailable": 503,
+    "timeout": 504,
+    "decode_failed": 500,
+}
+
+
+@dataclass(frozen=True)
+class DecodeResult:
+    ok: bool
+    text: str = ""
+    format: str = ""
+    error: str = ""
+
+    @classmethod
+    def failed(cls, error):
+        return cls(ok=False, error=error)
+
+    @property
+    def status(self):
+        return 200 if self.ok else ERROR_STATUS.get(self.error, 500)
+
+    def as_json(self):
+        if self.ok:
+            return {"ok": True, "text": self.text, "format": self.format}
+        return {"ok": False, "error": self.error}
+
+
+def max_side():
+    return int(getattr(settings, "BARCODE_DECODE_MAX_SIDE", 1600))
+
+
+def decode_timeout():
+    return float(getattr(settings, "BARCODE_DECODE_TIMEOUT_SECONDS", 5.0))
+
+
+def check_upload(f):
+    """Failure code for an unusable upload, or ``None``."""
+    if f.size > MAX_UPLOAD_BYTES:
+        return "too_large"
+    ct = (getattr(f, "content_type", None) or "").lower()
+    if ct and not ct.startswith("image/"):
+        return "invalid_type"
+    return None
+
+
+# ---- decoding (runs on the pool) ----
+
+def _fit(img, side):
+    """Grayscale copy of ``img`` with its long side scaled to ``side``."""
+    from PIL import Image
+
+    gray = img if img.mode == "L" else img.convert("L")
+    longest = max(gray.size)
+    if longest == side:
+        return gray
+    scale = side / longest
+    size = (max(1, round(gray.width * scale)), max(1, round(gray.height * scale)))
+    return gray.resize(size, Image.Resampling.BILINEAR if scale < 1 else Image.Resampling.BICUBIC)
+
+
+def _read(zxingcpp, gray):
+    barcodes = zxingcpp.read_barcodes(gray)
+    if barcodes:
+        b = barcodes[0]
+        return DecodeResult(ok=True, text=b.text, format=str(b.format))
+    return None
+
+
+def decode_image_bytes(data):
+    """Decode the first barcode in an encoded image; always returns a ``DecodeResult``."""
+    try:
+        import zxingcpp
+        from PIL import Image
+    except ImportError:
+        return DecodeResult.failed("library_unavailable")
+
+    target = max_side()
+    try:
+        img = Image.open(BytesIO(data))
+        if img.width * img.height > MAX_PIXELS:
+            return DecodeResult.failed("too_large")
+        full_side = max(img.size)
+        # JPEG only: decode at 1/2, 1/4 or 1/8 scale, already grayscale.
+        img.draft("L", (target, target))
+        img.load()
+        first = _fit(img, min(target, max(img.size)))
+        found = _read(zxingcpp, first)
+        if found:
+            return found
+
+        retries = []
+        if full_side > target:
+            img = Image.open(BytesIO(data))
+            img.load()
+            retries.append(full_side)
+        elif full_side < MIN_SIDE:
+            retries.append(MIN_SIDE)
+        retries.append(max(first.size) // 2)
+        for side in retries:
+            found = _read(zxingcpp, _fit(img, side))
+            if found:
+                return found
+        return DecodeResult.failed("not_found")
+    except (OSError, Image.DecompressionBombError):
+        # Not an image (UnidentifiedImageError), truncated or corrupt data.
+        return DecodeResult.failed("invalid_image")
+
+
+# ---- bounded pool ----
+
+_pool = None
+_slots = None
+_pool_lock = threading.Lock()
+
+
+def _workers():
+    return max(1, int(getattr(settings, "BARCODE_DECODE_WORKERS", 2)))
+
+
+def _get_pool():
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is None:
+            workers = _workers()
+            queue = max(0, int(getattr(settings, "BARCODE_DECODE_QUEUE", 8)))
+            _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="warewolf-barcode")
+            _slots = threading.BoundedSemaphore(workers + queue)
+    return _pool, _slots
+
+
+def _submit(pool, slots, data):
+    """Submit ``data`` after a slot was acquired; the slot frees when the job ends."""
+    try:
+        future = pool.submit(decode_image_bytes, data)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    return future
+
+
+def _result(future, timeout=None):
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeout:
+        return DecodeResult.failed("timeout")
+    except Exception:
+        logger.exception("barcode decode failed")
+        return DecodeResult.failed("decode_failed")
+
+
+def decode(data, timeout=None):
+    """Decode one image on the pool; waits at most ``timeout`` seconds in total."""
+    timeout = decode_timeout() if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    pool, slots = _get_pool()
+    if not slots.acquire(timeout=timeout):
+        return DecodeResult.failed("busy")
+    future = _submit(pool, slots, data)
+    return _result(future, timeout=max(0.0, deadline - time.monotonic()))
+
+
+def decode_many(blobs, timeout=None):
+    """
+    Decode several images on the pool; yields ``(index, DecodeResult)`` as each finishes.
+
+    The batch may take ``timeout`` per round of ``BARCODE_DECODE_WORKERS``
+    images. Images that do not finish (or do not get a slot) in that time are
+    reported as ``timeout``.
+    """
+    blobs = list(blobs)
+    if not blobs:
+        return
+    timeout = decode_timeout() if timeout is None else timeout
+    deadline = time.monotonic() + timeout * math.ceil(len(blobs) / _workers())
+    pool, slots = _get_pool()
+    waiting = list(enumerate(blobs))
+    waiting.reverse()
+    running = {}
+
+    while waiting or running:
+        # Top up: grab free slots without blocking while our own jobs are running,
+        # otherwise wait (up to the deadline) for someone else's job to finish.
+        while waiting:
+            if running:
+                acquired = slots.acquire(blocking=False)
+            else:
+                acquired = slots.acquire(timeout=max(0.0, deadline - time.monotonic()))
+            if not acquired:
+                break
+            index, data = waiting.pop()
+            running[_submit(pool, slots, data)] = index
+
+        if not running:
+            break
+        done, _ = wait(running, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            yield running.pop(future), _result(future)
+
+    for index in sorted([*running.values(), *(index for index, _ in waiting)]):
+        yield index, DecodeResult.failed("timeout")
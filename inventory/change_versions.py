@@ -0,0 +1,287 @@
+"""
+Per-table change versions and the conditional GETs built on them.
+
+Every committed write to a tracked table bumps that table's ``ChangeVersion``
+row. Tracked tables are the ``inventory`` and ``auth`` tables, including
+many-to-many tables such as user groups. The hook is a database execute
+wrapper installed on every connection (``install``), not a set of model
+signals. So ``save()``/``delete()`` and the bulk paths (``bulk_create``,
+``bulk_update``, queryset ``update()``/``delete()``, raw ``execute``, imports,
+stock batches) all bump through the same code. The one thing it cannot see
+is a driver-level write that skips ``cursor.execute``, such as PostgreSQL
+``COPY`` (``retail_import``): such writers must call ``note_change`` for
+the tables they fill. The bump runs on commit: a reader never sees a new
+version alongside old rows, so an ETag can never pin stale content.
+Rolled-back writes do not bump.
+
+``conditional_view(*models)`` opts a GET view in. Before the view body runs,
+it reads the versions of the tables the response depends on (one query).
+From those it builds an ETag, together with the URL, the user and, for
+full pages, whatever else the navbar shows. When the client's
+``If-None-Match`` still matches, the response is ``304 Not Modified`` and
+the view body never runs. Otherwise the view runs as usual, and the
+response gets the ETag and ``Cache-Control: private, no-cache`` (always
+revalidate, never reuse without asking). ``conditional_response`` does the
+same for views that only know their tables at request time, such as the
+JSON API.
+"""
+from __future__ import annotations
+
+import functools
+import hashlib
+import logging
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.apps import apps
+from django.conf import settings
+from django.contrib import messages
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .models import ChangeVersion, Item, ManagerRequest, Notification, Order, OrderLine, UserPreference, UserProfile
+
+logger = logging.getLogger(__name__)
+
+TRACKED_APPS = ("inventory", "auth")
+# What the navbar and alert dropdown on every full page are built from.
+PAGE_MODELS = (Notification, ManagerRequest, Item, Order, OrderLine, UserPreference, UserProfile)
+
+_WRITE = re.compile(r'\s*(?:INSERT\s+(?:OR\s+\w+\s+)?INTO|UPDATE|DELETE\s+FROM)\s+[`"]?(\w+)', re.IGNORECASE)
+
+
+@functools.cache
+def tracked_tables():
+    tables = {
+        model._meta.db_table
+        for label in TRACKED_APPS
+        for model in apps.get_app_config(label).get_models(include_auto_created=True)
+    }
+    tables.discard(ChangeVersion._meta.db_table)
+    return frozenset(tables)
+
+
+@functools.cache
+def _auth_tables():
+    return tuple(
+        sorted(model._meta.db_table for model in apps.get_app_config("auth").get_models(include_auto_created=True))
+    )
+
+
+def tables_for(models):
+    return {model._meta.db_table for model in models}
+
+
+# ---- bumping ----
+
+def bump(*tables, using="default"):
+    """Advance the versions of ``tables`` now (normally called on commit by the write hook)."""
+    tables = sorted(set(tables))
+    if not tables:
+        return
+    rows = ChangeVersion.objects.using(using).filter(table__in=tables)
+    try:
+        updated = rows.update(version=F("version") + 1, changed_at=timezone.now())
+        if updated < len(tables):
+            ChangeVersion.objects.using(using).bulk_create(
+                [ChangeVersion(table=table) for table in tables], ignore_conflicts=True
+            )
+            rows.update(version=F("version") + 1, changed_at=timezone.now())
+    except DatabaseError:
+        # Writes made by migrations that run before the table exists.
+        logger.debug("Could not bump change versions for %s", tables, exc_info=True)
+
+
+class _PendingBump:
+    """``on_commit`` callback for one table; recognisable so repeated writes queue it only once."""
+
+    def __init__(self, alias, table):
+        self.alias = alias
+        self.table = table
+        self.ran = False  # ``captureOnCommitCallbacks(execute=True)`` runs it without dequeuing it
+
+    def __call__(self):
+        self.ran = True
+        bump(self.table, using=self.alias)
+
+
+def _pending(connection):
+    return [
+        (sids, callback)
+        for sids, callback, _robust in connection.run_on_commit
+        if isinstance(callback, _PendingBump) and not callback.ran
+    ]
+
+
+def _note_write(connection, table):
+    # Once per table per savepoint: a bump queued inside a savepoint that is
+    # later rolled back is discarded with it, so it cannot stand in for writes
+    # made outside that savepoint. (``atomic(savepoint=False)`` levels show up
+    # as None; their failure rolls back the enclosing level anyway.)
+    savepoints = set(connection.savepoint_ids) - {None}
+    for sids, callback in _pending(connection):
+        if callback.table == table and sids - {None} == savepoints:
+            return
+    # Outside a transaction this runs immediately, i.e. after the write (the
+    # statement has already executed) - never before it.
+    transaction.on_commit(_PendingBump(connection.alias, table), using=connection.alias)
+
+
+def note_change(*tables, using="default"):
+    """Bump ``tables`` on commit as if they had been written (for changes the write hook cannot see)."""
+    connection = connections[using]
+    for table in tables:
+        _note_write(connection, table)
+
+
+def has_uncommitted_writes(*tables, using="default"):
+    """Whether the current transaction has written any of ``tables`` (their bumps are still pending)."""
+    tables = set(tables)
+    return any(callback.table in tables for _sids, callback in _pending(connections[using]))
+
+
+def write_hook(execute, sql, params, many, context):
+    """``execute_wrapper`` that notes writes to tracked tables once they have executed."""
+    result = execute(sql, params, many, context)
+    match = _WRITE.match(sql)
+    if match and match.group(1) in tracked_tables():
+        _note_write(context["connection"], match.group(1))
+    return result
+
+
+def _install_on(connection, **kwargs):
+    if write_hook not in connection.execute_wrappers:
+        connection.execute_wrappers.append(write_hook)
+
+
+def install():
+    """Hook every current and future database connection (called from ``InventoryConfig.ready``)."""
+    from django.db.backends.signals import connection_created
+
+    connection_created.connect(_install_on, dispatch_uid="inventory-change-versions")
+    for connection in connections.all(initialized_only=True):
+        _install_on(connection)
+
+
+# ---- reading ----
+
+def current_versions(tables):
+    """``({table: version}, last change or None)`` for ``tables``, in one query."""
+    # The table holds one short row per tracked table, so reading all of it is
+    # as cheap as an IN list and keeps the statement identical on every view.
+    versions, last = {}, None
+    tables = set(tables)
+    for table, version, changed_at in ChangeVersion.objects.values_list("table", "version", "changed_at"):
+        if table not in tables:
+            continue
+        versions[table] = version
+        if changed_at and (last is None or changed_at > last):
+            last = changed_at
+    return versions, last
+
+
+def validators(request, tables, page=True, extra=None):
+    """
+    ``(etag, last_modified)`` for a GET of ``request``, or None when it must not be conditional.
+
+    Full pages also depend on the navbar (alerts, preferences, session
+    dismissals, today's date) and embed a CSRF token. So they skip
+    conditional handling when a flash message is waiting or when no CSRF
+    cookie is set yet, and they get no Last-Modified.
+    """
+    tables = set(tables) | set(_auth_tables())
+    parts = [request.get_full_path(), str(request.user.pk)]
+    if page:
+        if len(messages.get_messages(request)):
+            return None
+        csrf_cookie = request.COOKIES.get(settings.CSRF_COOKIE_NAME)
+        if not csrf_cookie:
+            return None
+        tables |= tables_for(PAGE_MODELS)
+        parts += [
+            csrf_cookie,
+            timezone.localdate().isoformat(),
+            ",".join(sorted(request.session.get("dismissed_alerts", []))),
+        ]
+    versions, last_modified = current_versions(tables)
+    parts += [f"{table}={versions.get(table, 0)}" for table in sorted(tables)]
+    if extra is not None:
+        parts.append(extra(request))
+    etag = '"%s"' % hashlib.md5("\n".join(parts).encode(), usedforsecurity=False).hexdigest()
+    return etag, (None if page else last_modified)
+
+
+def _stamp(response, etag, last_modified):
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    response["Cache-Control"] = "private, no-cache"
+    for header in ("Expires", "Pragma"):
+        if response.has_header(header):
+            del response[header]
+    patch_vary_headers(response, ["Cookie", "Authorization"])
+    return response
+
+
+def _not_modified(request, found):
+    if found is None:
+        return None
+    etag, last_modified = found
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp()) if last_modified else None
+    )
+    return _stamp(response, etag, last_modified) if response is not None else None
+
+
+def _finish(response, found):
+    if found is not None and response.status_code == 200:
+        _stamp(response, *found)
+    return response
+
+
+def _respond(request, tables, build, page, extra):
+    if request.method not in ("GET", "HEAD"):
+        return build()
+    found = validators(request, tables, page=page, extra=extra)
+    return _not_modified(request, found) or _finish(build(), found)
+
+
+def conditional_response(request, models, build, page=False, extra=None):
+    """``build()``'s response, or a 304 when nothing it depends on has changed since the client's copy."""
+    return _respond(request, tables_for(models), build, page, extra)
+
+
+def conditional_view(*models, page=True, extra=None):
+    """
+    Decorator: answer with 304 when the tables of ``models`` are unchanged.
+
+    ``page=False`` for JSON and CSV responses (no navbar). ``extra(request)``
+    adds anything else the response embeds, such as version tokens in URLs.
+    Put it below ``login_required``/``permission_required``. It works on sync
+    and async views.
+    """
+    tables = tables_for(models)
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            from .async_fanout import run_sync
+
+            @functools.wraps(view)
+            async def async_wrapped(request, *args, **kwargs):
+                if request.method not in ("GET", "HEAD"):
+                    return await view(request, *args, **kwargs)
+                found = await run_sync(functools.partial(validators, request, tables, page, extra))
+                return _not_modified(request, found) or _finish(await view(request, *args, **kwargs), found)
+
+            return markcoroutinefunction(async_wrapped)
+
+        @functools.wraps(view)
+        def wrapped(request, *args, **kwargs):
+            return _respond(request, tables, functools.partial(view, request, *args, **kwargs), page, extra)
+
+        return wrapped
+
+    return decorator
@@ -4,11 +4,15 @@ from django.db.models.functions import Coalesce, Greatest
 from django.utils import timezone
 from django.urls import reverse
 from django.core.cache import cache
+import functools
 import re
+import time
 
 from inventory.models import Item, Order
 from inventory.anomaly_scan_notifications import ANOMALY_SCAN_RESULT_PREFIX
 from .models import ManagerRequest, Notification, UserPreference, UserProfile
+from . import manual_scans, renditions
+from .request_metrics import current_stats, timed_section
 
 NOTIFICATIONS_DROPDOWN_LIMIT = 25
 # Navbar merge: newest N DB notifications (full count still shown on badge; Alerts page loads all).
@@ -123,138 +127,161 @@ def _append_notification_alert(alerts, n):
     )
 
 
-def _build_alerts(request, max_notifications=None):
-    """
-    Build merged alert rows for the current user.
+def _alert_inputs(request):
+    """(user, dismissed session keys, UserPreference, can_manage_requests) for the alert sections."""
+    user = request.user
+    if not user.is_authenticated:
+        return user, set(), None, False
+    can_manage_requests = user.groups.filter(name__in=["Manager", "Admin"]).exists()
+    dismissed = set(request.session.get("dismissed_alerts", []))
 
-    max_notifications:
-      None — include every unread DB notification (Alerts page; may be large).
-      int — merge only the newest N DB notifications (fast path for navbar badge/dropdown).
-    """
-    alerts = []
+    pref_cache_key = f"ctx_user_pref:v6:{user.pk}"
+    pref = cache.get(pref_cache_key)
+    if pref is None:
+        pref, _ = UserPreference.objects.get_or_create(user=user)
+        cache.set(pref_cache_key, pref, 120)
+    return user, dismissed, pref, can_manage_requests
 
-    can_manage_requests = False
-    dismissed = set()
-
-    pref = None
-    db_note_count = 0
-
-    if request.user.is_authenticated:
-        can_manage_requests = request.user.groups.filter(name__in=["Manager", "Admin"]).exists()
-        dismissed = set(request.session.get("dismissed_alerts", []))
-
-        pref_cache_key = f"ctx_user_pref:v6:{request.user.pk}"
-        pref = cache.get(pref_cache_key)
-        if pref is None:
-            pref, _ = UserPreference.objects.get_or_create(user=request.user)
-            cache.set(pref_cache_key, pref, 120)
-
-        if pref.notify_anomalies:
-            note_filter = Notification.objects.filter(
-                user=request.user, is_read=False, dismissed=False
-            ).exclude(message__startswith=ANOMALY_SCAN_RESULT_PREFIX)
-            db_note_count = note_filter.count()
-            qs = note_filter.order_by("-created_at").only("id", "message", "created_at", "url")
-            if max_notifications is not None:
-                qs = qs[: max_notifications]
-                note_iter = qs
-            else:
-                note_iter = qs.iterator(chunk_size=200)
-            for n in note_iter:
-                _append_notification_alert(alerts, n)
-
-    # B) Manager access requests (dismiss via session-based dismiss_alert)
-    if can_manage_requests:
-        pending = (
-            ManagerRequest.objects
-            .filter(status="PENDING")
-            .select_related("user")
-            .order_by("-created_at")[:10]
-        )
 
-        for r in pending:
-            key = f"manager_request:{r.id}"
-            if key in dismissed:
-                continue
+def _notification_alerts(user, pref, max_notifications):
+    """A) Unread DB notifications; returns (alerts, full unread count)."""
+    alerts = []
+    if pref is None or not pref.notify_anomalies:
+        return alerts, 0
+    note_filter = Notification.objects.filter(
+        user=user, is_read=False, dismissed=False
+    ).exclude(message__startswith=ANOMALY_SCAN_RESULT_PREFIX)
+    db_note_count = note_filter.count()
+    qs = note_filter.order_by("-created_at").only("id", "message", "created_at", "url")
+    if max_notifications is not None:
+        qs = qs[: max_notifications]
+        note_iter = qs
+    else:
+        note_iter = qs.iterator(chunk_size=200)
+    for n in note_iter:
+        _append_notification_alert(alerts, n)
+    return alerts, db_note_count
+
+
+def _manager_request_alerts(dismissed):
+    """B) Manager access requests (dismiss via session-based dismiss_alert)."""
+    alerts = []
+    pending = (
+        ManagerRequest.objects
+        .filter(status="PENDING")
+        .select_related("user")
+        .order_by("-created_at")[:10]
+    )
 
-            alerts.append({
-                "type": "manager_request",
-                "type_label": _humanize_type("manager_request"),
-                "is_db_notification": False,
-                "source": "access",
-                "severity": "warning",
-                "id": r.id,
-                "message": f"{r.user.username} has requested manager access.",
-                "time": r.created_at.strftime("%Y-%m-%d %H:%M"),
-                "approve_url": reverse("approve_manager_request", args=[r.id]),
-                "decline_url": reverse("decline_manager_request", args=[r.id]),
-                "dismiss_post_url": reverse("dismiss_alert"),
-                "key": key,
-                "url": reverse("dashboard"),
-                "item_name": r.user.username,
-                "quantity": "",
-                "score": "",
-                "status": "Pending",
-            })
-
-    # C) Low stock (SQL-filtered; session-dismissed keys skipped)
-    if request.user.is_authenticated and pref is not None:
-        if pref.notify_low_stock:
-            for item in _low_stock_candidates_queryset(pref).only(
-                "id", "name", "quantity", "reorder_level"
-            ):
-                user_buffer = max(int(pref.low_stock_threshold or 0), 0)
-                item_threshold = max(int(item.reorder_level or 0), 0)
-                effective_threshold = item_threshold + user_buffer
-                key = f"low_stock:{item.id}"
-                if key in dismissed:
-                    continue
-
-                alerts.append(
-                    {
-                        "type": "low_stock",
-                        "type_label": _humanize_type("low_stock"),
-                        "is_db_notification": False,
-                        "source": "stock",
-                        "severity": "critical" if item.quantity <= 0 else "warning",
-                        "id": item.id,
-                        "message": f"Low stock: {item.name} ({item.quantity}/{effective_threshold})",
-                        "dismiss_post_url": reverse("dismiss_alert"),
-                        "key": key,
-                        "url": reverse("item_detail", args=[item.id]),
-                        "item_name": item.name,
-                        "quantity": item.quantity,
-                        "score": "",
-                        "status": "Out of stock" if item.quantity <= 0 else "Low stock",
-                    }
-                )
-
-    # D) Delivered orders recently (dismiss via session-based dismiss_alert)
-    if request.user.is_authenticated:
-        recent_orders = Order.objects.filter(status="DELIVERED").order_by("-order_date")[:5]
-        today = timezone.now().date()
-        for order in recent_orders:
-            key = f"order_delivered:{order.id}"
-            if key in dismissed:
-                continue
-
-            alerts.append({
-                "type": "order_delivered",
-                "type_label": _humanize_type("order_delivered"),
+    for r in pending:
+        key = f"manager_request:{r.id}"
+        if key in dismissed:
+            continue
+
+        alerts.append({
+            "type": "manager_request",
+            "type_label": _humanize_type("manager_request"),
+            "is_db_notification": False,
+            "source": "access",
+            "severity": "warning",
+            "id": r.id,
+            "message": f"{r.user.username} has requested manager access.",
+            "time": r.created_at.strftime("%Y-%m-%d %H:%M"),
+            "approve_url": reverse("approve_manager_request", args=[r.id]),
+            "decline_url": reverse("decline_manager_request", args=[r.id]),
+            "dismiss_post_url": reverse("dismiss_alert"),
+            "key": key,
+            "url": reverse("dashboard"),
+            "item_name": r.user.username,
+            "quantity": "",
+            "score": "",
+            "status": "Pending",
+        })
+    return alerts
+
+
+def _low_stock_alerts(pref, dismissed):
+    """C) Low stock (SQL-filtered; session-dismissed keys skipped)."""
+    alerts = []
+    if pref is None or not pref.notify_low_stock:
+        return alerts
+    user_buffer = max(int(pref.low_stock_threshold or 0), 0)
+    for item in _low_stock_candidates_queryset(pref).only(
+        "id", "name", "quantity", "reorder_level"
+    ):
+        item_threshold = max(int(item.reorder_level or 0), 0)
+        effective_threshold = item_threshold + user_buffer
+        key = f"low_stock:{item.id}"
+        if key in dismissed:
+            continue
+
+        alerts.append(
+            {
+                "type": "low_stock",
+                "type_label": _humanize_type("low_stock"),
                 "is_db_notification": False,
-                "source": "orders",
-                "severity": "info",
-                "id": order.id,
-                "message": f"Order #{order.id} delivered",
-                "time": f"{(today - order.order_date).days} days ago",
+                "source": "stock",
+                "severity": "critical" if item.quantity <= 0 else "warning",
+                "id": item.id,
+                "message": f"Low stock: {item.name} ({item.quantity}/{effective_threshold})",
                 "dismiss_post_url": reverse("dismiss_alert"),
                 "key": key,
-                "url": reverse("order_detail", args=[order.id]),
-                "item_name": f"Order #{order.id}",
-                "quantity": order.total_quantity,
+                "url": reverse("item_detail", args=[item.id]),
+                "item_name": item.name,
+                "quantity": item.quantity,
                 "score": "",
-                "status": "Delivered",
-            })
+                "status": "Out of stock" if item.quantity <= 0 else "Low stock",
+            }
+        )
+    return alerts
+
+
+def _delivered_order_alerts(dismissed):
+    """D) Delivered orders recently (dismiss via session-based dismiss_alert)."""
+    alerts = []
+    recent_orders = Order.objects.filter(status="DELIVERED").order_by("-order_date")[:5]
+    today = timezone.now().date()
+    for order in recent_orders:
+        key = f"order_delivered:{order.id}"
+        if key in dismissed:
+            continue
+
+        alerts.append({
+            "type": "order_delivered",
+            "type_label": _humanize_type("order_delivered"),
+            "is_db_notification": False,
+            "source": "orders",
+            "severity": "info",
+            "id": order.id,
+            "message": f"Order #{order.id} delivered",
+            "time": f"{(today - order.order_date).days} days ago",
+            "dismiss_post_url": reverse("dismiss_alert"),
+            "key": key,
+            "url": reverse("order_detail", args=[order.id]),
+            "item_name": f"Order #{order.id}",
+            "quantity": order.total_quantity,
+            "score": "",
+            "status": "Delivered",
+        })
+    return alerts
+
+
+def _alert_sections(inputs, max_notifications):
+    """Independent zero-argument calls, one per alert source (see ``abuild_alerts``)."""
+    user, dismissed, pref, can_manage_requests = inputs
+    if not user.is_authenticated:
+        return []
+    sections = [functools.partial(_notification_alerts, user, pref, max_notifications)]
+    if can_manage_requests:
+        sections.append(functools.partial(_manager_request_alerts, dismissed))
+    sections.append(functools.partial(_low_stock_alerts, pref, dismissed))
+    sections.append(functools.partial(_delivered_order_alerts, dismissed))
+    return sections
+
+
+def _merge_alerts(section_results):
+    (notes, db_note_count), *others = section_results or [([], 0)]
+    alerts = notes + [a for section in others for a in section]
 
     # Pending manager access requests first, then severity, then time.
     alerts = sorted(
@@ -269,8 +296,36 @@ def _build_alerts(request, max_notifications=None):
     # Total for badge: all unread DB notifications + non-dismissed session alerts (not limited merge).
     non_db = [a for a in alerts if not a.get("is_db_notification")]
     total_alert_count = db_note_count + len(non_db)
+    return alerts, total_alert_count
 
-    return alerts, can_manage_requests, total_alert_count
+
+@timed_section("build_alerts")
+def _build_alerts(request, max_notifications=None):
+    """
+    Build merged alert rows for the current user.
+
+    max_notifications:
+      None — include every unread DB notification (Alerts page; may be large).
+      int — merge only the newest N DB notifications (fast path for navbar badge/dropdown).
+    """
+    inputs = _alert_inputs(request)
+    alerts, total_alert_count = _merge_alerts(
+        [section() for section in _alert_sections(inputs, max_notifications)]
+    )
+    return alerts, inputs[3], total_alert_count
+
+
+async def abuild_alerts(request, max_notifications=None):
+    """``_build_alerts`` for async views: the four alert sources are queried concurrently."""
+    from .async_fanout import fan_out, run_sync
+
+    stats = current_stats()
+    t0 = time.perf_counter()
+    inputs = await run_sync(_alert_inputs, request)
+    alerts, total_alert_count = _merge_alerts(await fan_out(*_alert_sections(inputs, max_notifications)))
+    if stats is not None:
+        stats.add_section("build_alerts", time.perf_counter() - t0)
+    return alerts, inputs[3], total_alert_count
 
 
 def get_alerts_for_user(request, limit=10):
@@ -282,6 +337,16 @@ def get_alerts_for_user(request, limit=10):
     return alerts, can_manage_requests
 
 
+async def aget_alerts_for_user(request, limit=10):
+    if not (await request.auser()).is_authenticated:
+        return [], False
+    alerts, can_manage_requests, _total = await abuild_alerts(request, max_notifications=None)
+    if limit is not None:
+        alerts = alerts[:limit]
+    return alerts, can_manage_requests
+
+
+@timed_section("ctx.notifications")
 def notifications(request):
     if not request.user.is_authenticated:
         return {
@@ -292,6 +357,7 @@ def notifications(request):
             "alerts_info": [],
             "can_manage_requests": False,
             "anomaly_scan_banner": None,
+            "anomaly_scan_progress": None,
         }
 
     # Do not cache navbar notifications: LocMem is per-process, so cache.delete() from
@@ -302,6 +368,11 @@ def notifications(request):
     )
     alerts = all_alerts[:NOTIFICATIONS_DROPDOWN_LIMIT]
 
+    # Before the banner lookup: a scan that just ended may leave a result banner.
+    anomaly_scan_progress = manual_scans.progress(manual_scans.watched_run(request))
+    if not anomaly_scan_progress["active"]:
+        anomaly_scan_progress = None
+
     anomaly_scan_banner = None
     banner_n = (
         Notification.objects.filter(
@@ -335,9 +406,11 @@ def notifications(request):
         "alerts_info": alerts_info,
         "can_manage_requests": can_manage_requests,
         "anomaly_scan_banner": anomaly_scan_banner,
+        "anomaly_scan_progress": anomaly_scan_progress,
     }
 
 
+@timed_section("ctx.user_preferences")
 def user_preferences(request):
     if not request.user.is_authenticated:
         return {"user_pref": None}
@@ -349,6 +422,7 @@ def user_preferences(request):
     return {"user_pref": pref}
 
 
+@timed_section("ctx.user_profile_avatar")
 def user_profile_avatar(request):
     if not request.user.is_authenticated:
         return {"profile_avatar_url": None}
@@ -360,6 +434,6 @@ def user_profile_avatar(request):
     if not row or not row.avatar:
         return {"profile_avatar_url": None}
     try:
-        return {"profile_avatar_url": row.avatar.url}
+        return {"profile_avatar_url": renditions.url(row.avatar, "xs")}
     except ValueError:
         return {"profile_avatar_url": None}
\ No newline at end of file
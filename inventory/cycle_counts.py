@@ -0,0 +1,282 @@
+"""
+Cycle counts (stock takes) recorded as sessions and applied in bulk.
+
+Counters scan or type codes into an open ``CycleCount``. ``record_counts``
+resolves a whole batch of codes through the scan index in one query and upserts
+the session's lines in bulk. A scan can add to a count or replace it.
+
+Variances are never stored while a session is open. ``lines_with_variance`` and
+``variance_summary`` compare the counted quantities with the items' current
+quantities in one query each, so the page stays correct if stock moves while
+counting is in progress.
+
+``approve`` applies the whole session in one transaction:
+
+1. The session is claimed with a conditional ``UPDATE``, so it is applied at
+   most once.
+2. Only the counted items are locked, in id order (as ``apply_stock_changes``
+   does), and a single ``UPDATE ... = (subquery)`` freezes their current
+   quantities on the lines as ``expected_quantity``.
+3. The non-zero variances go through ``apply_stock_changes`` in chunks of
+   ``APPLY_CHUNK`` items: bulk ``F()`` updates, bulk StockHistory upserts and
+   ledger rows with reason ``cycle_count``.
+4. One summary Activity (plus any auto-archive rows) is inserted in one batch.
+"""
+from __future__ import annotations
+
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Abs, Coalesce
+from django.utils import timezone
+
+from . import scan_codes
+from .models import Activity, CycleCount, CycleCountLine, Item, StockMovement
+from .stock_updates import apply_stock_changes
+
+MODE_ADD = "add"
+MODE_SET = "set"
+MODES = (MODE_ADD, MODE_SET)
+
+UPSERT_CHUNK = 1000
+APPLY_CHUNK = 1000
+MAX_QUANTITY = 1_000_000_000
+
+_COUNT_SPLIT = re.compile(r"[,;\t]")
+
+
+class CycleCountError(ValueError):
+    """The session cannot take this action (already approved, cancelled, ...)."""
+
+
+@dataclass
+class RecordResult:
+    recorded: int = 0  # distinct items whose line was written
+    unknown: list = field(default_factory=list)  # codes that matched no item
+
+
+@dataclass
+class ApprovalResult:
+    lines: int = 0
+    adjusted: int = 0
+    net_change: int = 0
+    archived_ids: set = field(default_factory=set)
+
+
+def parse_counts(text):
+    """
+    ``([(code, quantity)], [(line number, text)])`` from pasted or scanned text.
+
+    One entry per line: a code on its own counts 1 (a scanner gun typing codes),
+    ``code,quantity`` (comma, semicolon or tab) gives the quantity.
+    """
+    entries, invalid = [], []
+    for number, raw in enumerate((text or "").splitlines(), start=1):
+        line = raw.strip()
+        if not line:
+            continue
+        parts = [p.strip() for p in _COUNT_SPLIT.split(line)]
+        code = parts[0]
+        qty = parts[1] if len(parts) > 1 else "1"
+        if not code or len(parts) > 2 or not qty.isdigit() or int(qty) > MAX_QUANTITY:
+            invalid.append((number, line))
+            continue
+        entries.append((code, int(qty)))
+    return entries, invalid
+
+
+def _lock_open(session_id):
+    session = CycleCount.objects.select_for_update().get(pk=session_id)
+    if not session.is_open:
+        raise CycleCountError(f"{session.name} is {session.get_status_display().lower()}; counts can no longer change.")
+    return session
+
+
+def record_counts(session, entries, *, user=None, mode=MODE_ADD):
+    """
+    Record ``(code, quantity)`` pairs against an open session.
+
+    Codes are SKUs, barcodes or serial numbers. Several entries for the same
+    item are summed first. With ``MODE_ADD`` the total is added to the item's
+    existing count, and with ``MODE_SET`` it replaces it. Unknown codes are
+    returned, not raised, so one bad scan does not lose the rest of a batch.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown count mode {mode!r}")
+    result = RecordResult()
+    totals = defaultdict(int)
+    codes = [(scan_codes.normalize(code), qty) for code, qty in entries]
+    resolved = scan_codes.resolve_codes({code for code, _ in codes if code})
+    for code, qty in codes:
+        hit = resolved.get(code)
+        if hit is None:
+            result.unknown.append(code)
+        else:
+            totals[hit[0]] += qty
+    if not totals:
+        return result
+
+    counter = user if user is not None and getattr(user, "is_authenticated", False) else None
+    now = timezone.now()
+    item_ids = sorted(totals)
+    with transaction.atomic():
+        _lock_open(session.pk)
+        for i in range(0, len(item_ids), UPSERT_CHUNK):
+            chunk = item_ids[i : i + UPSERT_CHUNK]
+            existing = {}
+            if mode == MODE_ADD:
+                existing = dict(
+                    CycleCountLine.objects.filter(session_id=session.pk, item_id__in=chunk).values_list(
+                        "item_id", "counted_quantity"
+                    )
+                )
+            CycleCountLine.objects.bulk_create(
+                [
+                    CycleCountLine(
+                        session_id=session.pk,
+                        item_id=item_id,
+                        counted_quantity=min(MAX_QUANTITY, existing.get(item_id, 0) + totals[item_id]),
+                        counted_by=counter,
+                        counted_at=now,
+                    )
+                    for item_id in chunk
+                ],
+                update_conflicts=True,
+                unique_fields=["session", "item"],
+                update_fields=["counted_quantity", "counted_by", "counted_at"],
+            )
+    result.recorded = len(item_ids)
+    return result
+
+
+def _variance_expr():
+    # Frozen on approval; the live item quantity while the session is open.
+    return ExpressionWrapper(
+        F("counted_quantity") - Coalesce("expected_quantity", "item__quantity"),
+        output_field=IntegerField(),
+    )
+
+
+def lines_with_variance(session):
+    """The session's lines annotated with ``expected`` and ``diff`` (counted minus expected)."""
+    return (
+        session.lines.select_related("item", "item__location", "counted_by")
+        .annotate(
+            expected=Coalesce("expected_quantity", "item__quantity"),
+            diff=_variance_expr(),
+        )
+        .order_by("item__name", "item_id")
+    )
+
+
+def variance_summary(session):
+    """Line count, lines off, units over/under and the value of the net variance, in one query."""
+    diff = _variance_expr()
+    return session.lines.annotate(diff=diff).aggregate(
+        lines=Count("id"),
+        mismatched=Count("id", filter=~Q(diff=0)),
+        net_units=Coalesce(Sum("diff"), 0),
+        abs_units=Coalesce(Sum(Abs("diff")), 0),
+        net_value=Coalesce(
+            Sum(ExpressionWrapper(F("diff") * F("item__unit_cost"), output_field=DecimalField(max_digits=16, decimal_places=2))),
+            0,
+            output_field=DecimalField(max_digits=16, decimal_places=2),
+        ),
+    )
+
+
+def uncounted_items(session):
+    """Active items stored in the session's location (and below) that have no line yet."""
+    if not session.location_id:
+        return Item.objects.none()
+    return (
+        Item.objects.filter(is_active=True, location__tree_path__startswith=session.location.tree_path)
+        .exclude(pk__in=CycleCountLine.objects.filter(session_id=session.pk).values("item_id"))
+        .order_by("name")
+    )
+
+
+def approve(session, *, user=None):
+    """
+    Apply every variance of an open session and close it; returns an ``ApprovalResult``.
+
+    Raises ``CycleCountError`` if the session is no longer open. Nothing is
+    written in that case.
+    """
+    actor = user if user is not None and getattr(user, "is_authenticated", False) else None
+    result = ApprovalResult()
+    now = timezone.now()
+    with transaction.atomic():
+        claimed = CycleCount.objects.filter(pk=session.pk, status=CycleCount.STATUS_OPEN).update(
+            status=CycleCount.STATUS_APPROVED, approved_by=actor, approved_at=now
+        )
+        if not claimed:
+            raise CycleCountError(f"{session.name} has already been approved or cancelled.")
+
+        lines = CycleCountLine.objects.filter(session_id=session.pk)
+        item_ids = sorted(lines.values_list("item_id", flat=True))
+        # Lock before the snapshot so nothing moves between reading and applying.
+        for i in range(0, len(item_ids), APPLY_CHUNK):
+            list(Item.objects.select_for_update().filter(pk__in=item_ids[i : i + APPLY_CHUNK]).order_by("pk").values_list("pk"))
+        lines.update(expected_quantity=Subquery(Item.objects.filter(pk=OuterRef("item_id")).values("quantity")[:1]))
+
+        changes = list(
+            lines.annotate(diff=_variance_expr())
+            .exclude(diff=0)
+            .order_by("item_id")
+            .values_list("item_id", "diff")
+        )
+        for i in range(0, len(changes), APPLY_CHUNK):
+            applied = apply_stock_changes(
+                changes[i : i + APPLY_CHUNK],
+                actor=actor,
+                movement_reason=StockMovement.REASON_CYCLE_COUNT,
+            )
+            result.archived_ids |= applied.archived_ids
+
+        result.lines = len(item_ids)
+        result.adjusted = len(changes)
+        result.net_change = sum(delta for _, delta in changes)
+        CycleCount.objects.filter(pk=session.pk).update(adjusted_items=result.adjusted, net_change=result.net_change)
+
+        activities = [
+            Activity(
+                message=(
+                    f"Approved cycle count {session.name}: {result.lines} items counted, "
+                    f"{result.adjusted} adjusted (net {result.net_change:+d})"
+                )[:255],
+                user=actor,
+                kind=Activity.KIND_CYCLE_COUNT,
+            )
+        ]
+        if result.archived_ids:
+            names = dict(Item.objects.filter(pk__in=result.archived_ids).values_list("pk", "name"))
+            activities.extend(
+                Activity(
+                    message=f"Archived item (auto, stock depleted): {names[item_id]}"[:255],
+                    user=actor,
+                    kind=Activity.KIND_ITEM_AUTO_ARCHIVE,
+                )
+                for item_id in sorted(result.archived_ids)
+            )
+        Activity.objects.bulk_create(activities)
+
+    session.status = CycleCount.STATUS_APPROVED
+    session.approved_by = actor
+    session.approved_at = now
+    session.adjusted_items = result.adjusted
+    session.net_change = result.net_change
+    return result
+
+
+def cancel(session):
+    """Close an open session without touching stock."""
+    updated = CycleCount.objects.filter(pk=session.pk, status=CycleCount.STATUS_OPEN).update(
+        status=CycleCount.STATUS_CANCELLED
+    )
+    if not updated:
+        raise CycleCountError(f"{session.name} has already been approved or cancelled.")
+    session.status = CycleCount.STATUS_CANCELLED
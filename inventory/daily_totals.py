@@ -0,0 +1,233 @@
+"""
+Maintenance of ``InventoryDailyTotal`` (date, total_units, total_value, active_items).
+
+The dashboard trend chart reads a 180-row range from this table instead of
+replaying StockHistory on every request.
+
+- Today's row is adjusted in place (``F()`` update) by ``apply_today_delta``
+  whenever stock moves through the app. If the row does not exist yet, it is
+  created from a full aggregate, which already includes the change.
+- ``finalize_daily_totals`` (nightly beat task) writes yesterday's final row
+  as the current aggregate minus today's ledger movements. The result is exact
+  whatever time of day the job runs. It also re-syncs today's row from the
+  aggregate to remove drift from writes that bypass the app.
+- ``rebuild_daily_totals`` backfills history by walking the StockMovement
+  ledger backwards from current stock (``rebuild_inventory_daily_totals``).
+
+Totals cover items that are active now; archive history is not replayed.
+"""
+from __future__ import annotations
+
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import Coalesce, Greatest, TruncDate
+from django.utils import timezone
+
+from .models import InventoryDailyTotal, Item, StockMovement
+
+ZERO = Decimal("0")
+_VALUE = ExpressionWrapper(F("quantity") * F("unit_cost"), output_field=DecimalField(max_digits=16, decimal_places=2))
+
+
+def item_contribution(is_active, quantity, unit_cost):
+    """(units, value, active_items) an item adds to the daily totals."""
+    if not is_active:
+        return 0, ZERO, 0
+    qty = int(quantity or 0)
+    return qty, Decimal(qty) * Decimal(unit_cost or 0), 1
+
+
+def contribution_of(item):
+    return item_contribution(item.is_active, item.quantity, item.unit_cost)
+
+
+def sum_contributions(contributions):
+    units, value, active = 0, ZERO, 0
+    for u, v, a in contributions:
+        units += u
+        value += v
+        active += a
+    return units, value, active
+
+
+def current_totals():
+    agg = Item.objects.filter(is_active=True).aggregate(
+        units=Coalesce(Sum("quantity"), 0),
+        value=Coalesce(Sum(_VALUE), ZERO, output_field=DecimalField(max_digits=16, decimal_places=2)),
+        active=Count("id"),
+    )
+    return int(agg["units"]), Decimal(agg["value"]), int(agg["active"])
+
+
+def _start_of(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def refresh_day(day=None, finalized=False, totals=None):
+    """Overwrite ``day``'s row (default today) with ``totals`` or the current aggregate."""
+    day = day or timezone.localdate()
+    units, value, active = totals if totals is not None else current_totals()
+    row, _ = InventoryDailyTotal.objects.update_or_create(
+        date=day,
+        defaults={
+            "total_units": max(0, units),
+            "total_value": max(ZERO, value),
+            "active_items": max(0, active),
+            "finalized": finalized,
+        },
+    )
+    return row
+
+
+def apply_today_delta(units=0, value=ZERO, active=0):
+    """Shift today's totals; call after the item rows have been written."""
+    if not units and not value and not active:
+        return
+    today = timezone.localdate()
+    updated = InventoryDailyTotal.objects.filter(date=today).update(
+        # Clamped: items written outside the app (admin, imports) can leave the
+        # row behind the real totals until the nightly re-sync.
+        total_units=Greatest(F("total_units") + int(units), 0),
+        total_value=Greatest(F("total_value") + Decimal(value), ZERO),
+        active_items=Greatest(F("active_items") + int(active), 0),
+    )
+    if not updated:
+        refresh_day(today)
+
+
+def note_item_change(before, after):
+    """
+    Apply the difference between two ``item_contribution`` tuples to today.
+
+    Pass ``None`` for ``before`` when an item is created, or for ``after``
+    when it is deleted.
+    """
+    b = before or (0, ZERO, 0)
+    a = after or (0, ZERO, 0)
+    apply_today_delta(a[0] - b[0], a[1] - b[1], a[2] - b[2])
+
+
+def _ledger_totals_since(moment):
+    """Net (units, value) moved for currently active items since ``moment``."""
+    agg = StockMovement.objects.filter(timestamp__gte=moment, item__is_active=True).aggregate(
+        units=Coalesce(Sum("delta"), 0),
+        value=Coalesce(
+            Sum(ExpressionWrapper(F("delta") * F("item__unit_cost"), output_field=DecimalField(max_digits=16, decimal_places=2))),
+            ZERO,
+            output_field=DecimalField(max_digits=16, decimal_places=2),
+        ),
+    )
+    return int(agg["units"]), Decimal(agg["value"])
+
+
+def finalize_daily_totals():
+    """Write yesterday's final row and re-sync today's. Returns the two rows."""
+    today = timezone.localdate()
+    yesterday = today - datetime.timedelta(days=1)
+    with transaction.atomic():
+        units, value, active = current_totals()
+        today_units, today_value = _ledger_totals_since(_start_of(today))
+        created_today = Item.objects.filter(is_active=True, created_at__gte=_start_of(today)).count()
+        final = None
+        if not InventoryDailyTotal.objects.filter(date=yesterday, finalized=True).exists():
+            final = refresh_day(
+                yesterday,
+                finalized=True,
+                totals=(units - today_units, value - today_value, active - created_today),
+            )
+        current = refresh_day(today, totals=(units, value, active))
+    return final, current
+
+
+def rebuild_daily_totals(days=365, end=None):
+    """
+    Recompute rows for the last ``days`` days up to ``end`` (default today).
+
+    Starts from current stock and undoes one day of ledger movements at a time,
+    so the whole rebuild costs two reads plus bulk writes. Values use each
+    item's current unit cost.
+    """
+    end = end or timezone.localdate()
+    start = end - datetime.timedelta(days=max(int(days), 1) - 1)
+
+    items = {
+        row[0]: row
+        for row in Item.objects.filter(is_active=True).values_list("id", "quantity", "unit_cost", "created_at")
+    }
+    units = sum(int(q or 0) for _, q, _, _ in items.values())
+    value = sum((Decimal(q or 0) * Decimal(c or 0) for _, q, c, _ in items.values()), ZERO)
+    created_on = defaultdict(int)
+    for _, _, _, created_at in items.values():
+        created_on[timezone.localtime(created_at).date()] += 1
+    active = len(items)
+
+    moves = defaultdict(list)
+    qs = (
+        StockMovement.objects.filter(timestamp__gte=_start_of(start), item_id__in=list(items))
+        .annotate(day=TruncDate("timestamp"))
+        .values("day", "item_id")
+        .annotate(total=Sum("delta"))
+    )
+    for row in qs.iterator(chunk_size=5000):
+        moves[row["day"]].append((row["item_id"], int(row["total"] or 0)))
+
+    # Movements after ``end`` are undone first so ``end`` is reconstructed correctly.
+    for day in sorted(d for d in moves if d > end):
+        for item_id, delta in moves[day]:
+            units -= delta
+            value -= Decimal(delta) * Decimal(items[item_id][2] or 0)
+    for day in (d for d in created_on if d > end):
+        active -= created_on[day]
+
+    rows = []
+    today = timezone.localdate()
+    day = end
+    while day >= start:
+        rows.append(
+            InventoryDailyTotal(
+                date=day,
+                total_units=max(0, units),
+                total_value=max(ZERO, value),
+                active_items=max(0, active),
+                finalized=day < today,
+            )
+        )
+        for item_id, delta in moves.get(day, ()):
+            units -= delta
+            value -= Decimal(delta) * Decimal(items[item_id][2] or 0)
+        active -= created_on.get(day, 0)
+        day -= datetime.timedelta(days=1)
+
+    with transaction.atomic():
+        InventoryDailyTotal.objects.filter(date__range=(start, end)).delete()
+        InventoryDailyTotal.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def series_from_daily_totals(start_date, end_date):
+    """
+    ``[(date, total_units)]`` for every day in the window from one range select.
+
+    Returns ``None`` if the table does not cover ``start_date``. Days with no
+    row carry the previous day's value forward.
+    """
+    rows = list(
+        InventoryDailyTotal.objects.filter(date__range=(start_date, end_date))
+        .order_by("date")
+        .values_list("date", "total_units")
+    )
+    if not rows or rows[0][0] > start_date:
+        return None
+    by_day = dict(rows)
+    out = []
+    last = rows[0][1]
+    day = start_date
+    while day <= end_date:
+        last = by_day.get(day, last)
+        out.append((day, int(last)))
+        day += datetime.timedelta(days=1)
+    return out
@@ -0,0 +1,513 @@
+"""
+Dashboard widgets, each served on its own by ``dashboard_widget``.
+
+The dashboard view only renders the page shell (header, KPI counts and empty
+card bodies). The browser then fetches every widget in parallel. A widget is
+a compute function plus a fragment template. The fragment holds one
+``<template data-slot="...">`` per card body or modal it fills in the shell.
+The JSON payload is ``{"widget", "html", "data"}``, where ``data`` is what the
+charts and CSV exports need.
+
+Each widget has its own cache policy:
+
+- ``version`` gives a token that changes when the data does (the
+  ``ChangeVersion`` rows of the tables a stock-derived widget reads, which
+  every committed write from any process bumps; a time bucket for order
+  statistics). The shell
+  puts the token in the widget URL, so browsers may keep a response for
+  ``max_age`` seconds. The server keeps the rendered payload for
+  ``cache_seconds`` under the same token.
+- Widgets without a version (activity, anomalies) are computed on every
+  request and sent as ``no-cache``. Browsers revalidate them with the ETag,
+  so unchanged data comes back as an empty 304.
+
+The anomalies modal is ``lazy``: it is fetched only when the modal opens.
+"""
+from __future__ import annotations
+
+import datetime
+import hashlib
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Count, F, Sum
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+
+from . import change_versions
+from .models import (
+    Activity,
+    Category,
+    Client,
+    DemandAnomaly,
+    InventoryDailyTotal,
+    Item,
+    Location,
+    Order,
+    StockHistory,
+    StockMovement,
+    Supplier,
+)
+from .roles import is_manager_or_admin
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIR = "inventory/dashboard_widgets"
+
+
+@dataclass(frozen=True)
+class Widget:
+    name: str
+    compute: Callable  # (request) -> (template context, chart data)
+    params: tuple = ()  # query parameters that change the result
+    version: Callable | None = None  # (request) -> token embedded in the URL
+    cache_seconds: int = 0  # server-side payload cache (versioned widgets only)
+    max_age: int = 0  # browser cache lifetime for a versioned URL
+    lazy: bool = False  # fetched on demand instead of on page load
+
+    @property
+    def template(self):
+        return f"{TEMPLATE_DIR}/{self.name}.html"
+
+    @property
+    def cache_control(self):
+        if self.version is not None and self.max_age:
+            return f"private, max-age={self.max_age}"
+        return "private, no-cache"
+
+
+def dashboard_params(request):
+    """``(trend_days, forecast_days)`` from the query string, clamped like the page pills."""
+    try:
+        trend_days = int(request.GET.get("trend_days", 30))
+    except (TypeError, ValueError):
+        trend_days = 30
+    trend_days = max(7, min(30, trend_days))
+    try:
+        forecast_days = int(request.GET.get("forecast_days", 7))
+    except (TypeError, ValueError):
+        forecast_days = 7
+    if forecast_days not in (7, 14, 30):
+        forecast_days = 7
+    return trend_days, forecast_days
+
+
+KPI_QUERIES = {
+    "total_items": lambda: Item.objects.filter(is_active=True).count(),
+    "low_stock_items": lambda: Item.objects.filter(is_active=True, quantity__lte=F("reorder_level")).count(),
+    "active_supplier_count": lambda: Supplier.objects.filter(is_active=True).count(),
+    "active_customer_count": lambda: Client.objects.filter(is_active=True).count(),
+    "pending_purchase_orders_count": lambda: Order.objects.filter(
+        status=Order.STATUS_PENDING, order_type=Order.TYPE_PURCHASE
+    ).count(),
+    "pending_sales_orders_count": lambda: Order.objects.filter(
+        status=Order.STATUS_PENDING, order_type=Order.TYPE_SALE
+    ).count(),
+}
+
+
+def kpi_context(counts):
+    """Template context for the summary cards from the ``KPI_QUERIES`` results."""
+    total_items, low_stock_items = counts["total_items"], counts["low_stock_items"]
+    return {
+        **counts,
+        "low_stock_percent": round((low_stock_items / total_items) * 100, 1) if total_items else 0,
+    }
+
+
+def kpi_counts():
+    """Indexed counts for the summary cards; cheap enough to render in the shell."""
+    return kpi_context({name: query() for name, query in KPI_QUERIES.items()})
+
+
+# ---- versions ----
+
+def _request_versions(request):
+    # The shell embeds several versioned URLs; read the versions once per request.
+    versions = getattr(request, "_dashboard_change_versions", None)
+    if versions is None:
+        versions, _ = change_versions.current_versions(change_versions.tracked_tables())
+        request._dashboard_change_versions = versions
+    return versions
+
+
+def _stock_version(*models):
+    tables = sorted(change_versions.tables_for(models))
+
+    def version(request):
+        versions = _request_versions(request)
+        return "-".join([*(str(versions.get(table, 0)) for table in tables), timezone.localdate().isoformat()])
+
+    return version
+
+
+def _time_bucket(seconds):
+    return lambda request: str(int(time.time() // seconds))
+
+
+# ---- compute functions ----
+
+def _trend(request):
+    from .inventory_forecasting import evaluate_model, generate_forecast, get_daily_inventory_series
+
+    trend_days, forecast_days = dashboard_params(request)
+    full_series_df = get_daily_inventory_series(days_back=180)
+    trend_df = full_series_df.tail(trend_days).copy()
+
+    stock_dates = [d.strftime("%d %b") for d in trend_df["date"]]
+    stock_values = [int(v) for v in trend_df["total_units"]]
+    current_stock_value = int(stock_values[-1]) if stock_values else 0
+
+    inventory_change_pct = None
+    if len(stock_values) >= 2 and stock_values[0] > 0:
+        inventory_change_pct = round(((stock_values[-1] - stock_values[0]) / stock_values[0]) * 100, 1)
+
+    chart_history_days = 60 if forecast_days == 30 else 45
+    forecast_result = generate_forecast(
+        series_df=full_series_df,
+        horizon_days=forecast_days,
+        chart_history_days=chart_history_days,
+    )
+    model_eval = evaluate_model(series_df=full_series_df, horizon_days=forecast_days)
+
+    forecast_metric_value = (
+        forecast_result["next_day_forecast"] if forecast_result["next_day_forecast"] else forecast_result["latest_forecast"]
+    )
+    forecast_badge = forecast_result["trend_badge"]
+    forecast_change_pct = float(forecast_result.get("forecast_change_pct", 0.0))
+
+    if forecast_badge == "rising":
+        forecast_insight = (
+            f"Projected inventory increases by {abs(forecast_change_pct):.1f}% over the next {forecast_days} days, "
+            "indicating a net stock build-up."
+        )
+    elif forecast_badge == "falling":
+        forecast_insight = (
+            f"Projected inventory decreases by {abs(forecast_change_pct):.1f}% over the next {forecast_days} days, "
+            "indicating a net stock drawdown."
+        )
+    else:
+        forecast_insight = f"No significant change in stock levels expected over the next {forecast_days} days."
+
+    if request.GET.get("debug_trend") == "1":
+        logger.info(
+            "Forecast debug | points=%s trend_points=%s series_last=%s model=%s fallback=%s",
+            len(full_series_df),
+            len(stock_values),
+            current_stock_value,
+            forecast_result.get("model_used"),
+            forecast_result.get("used_fallback"),
+        )
+        if model_eval.get("can_evaluate"):
+            logger.info(
+                "Forecast backtest | baseline=%s advanced=%s train=%s valid=%s",
+                model_eval.get("baseline"),
+                model_eval.get("advanced"),
+                model_eval.get("train_points"),
+                model_eval.get("validation_points"),
+            )
+
+    context = {
+        "trend_days": trend_days,
+        "forecast_days": forecast_days,
+        "stock_dates": stock_dates,
+        "current_stock_value": current_stock_value,
+        "inventory_change_pct": inventory_change_pct,
+        "forecast_chart_labels": forecast_result["chart_labels"],
+        "forecast_values": forecast_result["chart_forecast_values"],
+        "forecast_metric_value": forecast_metric_value,
+        "forecast_badge": forecast_badge,
+        "forecast_model_name": forecast_result.get("model_used", "baseline"),
+        "forecast_eval": model_eval,
+        "forecast_change_pct": round(forecast_change_pct, 2),
+        "forecast_has_significant_change": bool(forecast_result.get("has_significant_change", False)),
+        "forecast_expected_range_lower": forecast_result.get("expected_range_lower", 0),
+        "forecast_expected_range_upper": forecast_result.get("expected_range_upper", 0),
+        "forecast_history_days_used": forecast_result.get("history_days_used", 0),
+        "forecast_confidence_label": forecast_result.get("confidence_label", "Medium"),
+        "forecast_insight_text": forecast_insight,
+    }
+    data = {
+        "trend_days": trend_days,
+        "forecast_days": forecast_days,
+        "stock_dates": stock_dates,
+        "stock_values": stock_values,
+        "trend_today_index": (len(stock_dates) - 1) if stock_dates else 0,
+        "forecast": {
+            "labels": forecast_result["chart_labels"],
+            "hist_values": forecast_result["chart_hist_values"],
+            "values": forecast_result["chart_forecast_values"],
+            "lower_values": forecast_result["chart_lower_values"],
+            "upper_values": forecast_result["chart_upper_values"],
+            "points": forecast_result.get("forecast_points", []),
+            "today_index": forecast_result.get("chart_today_index", 0),
+        },
+    }
+    return context, data
+
+
+def _monday_of_week(d):
+    return d - datetime.timedelta(days=d.weekday())
+
+
+def _orders(request):
+    """Order counts for 6 calendar weeks (Mon–Sun), always including the current week."""
+    current_week_start = _monday_of_week(timezone.localdate())
+    week_starts = [current_week_start - datetime.timedelta(weeks=k) for k in range(5, -1, -1)]
+    week_end_max = week_starts[-1] + datetime.timedelta(days=6)
+    idx_for_week_start = {ws: i for i, ws in enumerate(week_starts)}
+    purchase_by_week = [0] * 6
+    sale_by_week = [0] * 6
+    for order_date, otype in (
+        Order.objects.filter(order_date__gte=week_starts[0], order_date__lte=week_end_max)
+        .values_list("order_date", "order_type")
+        .iterator(chunk_size=4000)
+    ):
+        i = idx_for_week_start.get(_monday_of_week(order_date))
+        if i is None:
+            continue
+        if otype == Order.TYPE_PURCHASE:
+            purchase_by_week[i] += 1
+        elif otype == Order.TYPE_SALE:
+            sale_by_week[i] += 1
+
+    labels = [ws.strftime("%d %b") for ws in week_starts]
+    counts = [p + s for p, s in zip(purchase_by_week, sale_by_week)]
+    context = {
+        "weekly_order_labels": labels,
+        "this_week_orders": counts[-1],
+        "last_week_orders": counts[-2],
+    }
+    data = {"labels": labels, "purchase_counts": purchase_by_week, "sale_counts": sale_by_week}
+    return context, data
+
+
+def _top_items(request):
+    top_items = list(
+        Item.objects.annotate(total_orders=Count("order_lines"))
+        .filter(total_orders__gt=0)
+        .order_by("-total_orders")
+        .only("id", "name")[:5]
+    )
+    labels = [item.name[:25] + ("…" if len(item.name) > 25 else "") for item in top_items]
+    context = {
+        "top_item": top_items[0] if top_items else None,
+        "top_items_labels": labels,
+    }
+    data = {"labels": labels, "counts": [item.total_orders for item in top_items]}
+    return context, data
+
+
+def _activity(request):
+    # Compact card shows a short list (newest -> oldest). Expanded modal shows more history.
+    detail = list(Activity.objects.select_related("user").order_by("-timestamp")[:50])
+    context = {
+        "recent_activity": detail[:5],
+        "recent_activity_detail_list": detail,
+    }
+    data = {
+        "export_rows": [
+            {
+                "message": a.message,
+                "user": (a.user.username if a.user else "System"),
+                "timestamp": a.timestamp.isoformat(),
+            }
+            for a in detail
+        ]
+    }
+    return context, data
+
+
+def _recent_anomalies(request):
+    context = {
+        "recent_anomalies": DemandAnomaly.objects.filter(dismissed=False)
+        .select_related("item")
+        .order_by("-date", "-score")[:8],
+        "is_manager_or_admin": is_manager_or_admin(request.user),
+        "user_pref": _user_pref(request),
+    }
+    return context, {}
+
+
+def _export_score(val):
+    try:
+        v = float(val)
+        return 0.0 if v != v else v  # NaN -> 0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _anomalies(request):
+    """
+    The anomalies modal: filters mimic the anomaly_list page, paginated, plus a 200-row CSV export.
+
+    The bulk-action form is rendered without a CSRF token (a fresh masked token
+    would change the ETag on every request); the page adds the shell's token
+    before submitting.
+    """
+    from .views import PER_PAGE_CHOICES, get_per_page
+
+    anom_severity = request.GET.get("anom_severity", "")
+    anom_show = request.GET.get("anom_show", "active")  # active | dismissed | all
+    anom_q = request.GET.get("q", "").strip()
+
+    anomalies_qs = DemandAnomaly.objects.select_related("item").order_by("-date", "-score")
+    if anom_severity:
+        anomalies_qs = anomalies_qs.filter(severity=anom_severity)
+    if anom_show == "active":
+        anomalies_qs = anomalies_qs.filter(dismissed=False)
+    elif anom_show == "dismissed":
+        anomalies_qs = anomalies_qs.filter(dismissed=True)
+    if anom_q:
+        anomalies_qs = anomalies_qs.filter(item__name__icontains=anom_q)
+
+    per_page = get_per_page(request)
+    page_obj = Paginator(anomalies_qs, per_page).get_page(request.GET.get("page"))
+
+    filters = {"anom_severity": anom_severity, "anom_show": anom_show, "q": anom_q}
+    next_url = reverse("dashboard") + "?" + urlencode(
+        {"open_anomalies": 1, "page": page_obj.number, "per_page": per_page, **{k: v for k, v in filters.items() if v}}
+    )
+    context = {
+        "request": request,
+        "user_pref": _user_pref(request),
+        "anomalies_page_obj": page_obj,
+        "anomalies_total_count": page_obj.paginator.count,
+        "anomalies_per_page": per_page,
+        "per_page_choices": PER_PAGE_CHOICES,
+        "anomalies_next_url": next_url,
+        "anom_severity": anom_severity,
+        "anom_show": anom_show,
+        "anom_q": anom_q,
+        "is_manager_or_admin": is_manager_or_admin(request.user),
+    }
+    data = {
+        "anom_show": anom_show or "active",
+        "export_rows": [
+            {
+                "item": a.item.name,
+                "date": a.date.isoformat(),
+                "quantity": int(a.quantity) if a.quantity is not None else 0,
+                "score": _export_score(a.score),
+                "severity": a.severity,
+            }
+            for a in anomalies_qs[:200]
+        ],
+    }
+    return context, data
+
+
+def _categories(request):
+    rows = Item.objects.values("category__name").annotate(total_qty=Sum("quantity")).order_by("category__name")
+    labels = [row["category__name"] or "Uncategorised" for row in rows]
+    values = [int(row["total_qty"] or 0) for row in rows]
+    total = int(sum(values))
+    context = {
+        "pie_labels": labels,
+        "pie_total_units": total,
+        "pie_table_rows": [
+            {"label": lbl, "qty": qty, "pct": round(100.0 * qty / total, 2) if total else 0.0}
+            for lbl, qty in zip(labels, values)
+        ],
+    }
+    return context, {"labels": labels, "values": values}
+
+
+def _locations(request):
+    rows = Item.objects.values("location__name").annotate(total_qty=Sum("quantity")).order_by("-total_qty")[:8]
+    labels = [row["location__name"] or "No location" for row in rows]
+    values = [int(row["total_qty"] or 0) for row in rows]
+    context = {
+        "location_labels": labels,
+        "location_total_units": int(sum(values)),
+        "location_table_rows": [{"label": lbl, "qty": qty} for lbl, qty in zip(labels, values)],
+    }
+    return context, {"labels": labels, "values": values}
+
+
+def _user_pref(request):
+    from .context_processors import user_preferences
+
+    return user_preferences(request)["user_pref"]
+
+
+WIDGETS = {
+    w.name: w
+    for w in (
+        Widget(
+            "trend",
+            _trend,
+            params=("trend_days", "forecast_days"),
+            version=_stock_version(Item, StockHistory, StockMovement, InventoryDailyTotal),
+            cache_seconds=10 * 60,
+            max_age=5 * 60,
+        ),
+        Widget("orders", _orders, version=_time_bucket(60), cache_seconds=60, max_age=60),
+        Widget("top_items", _top_items, version=_time_bucket(5 * 60), cache_seconds=5 * 60, max_age=5 * 60),
+        Widget("activity", _activity),
+        Widget("recent_anomalies", _recent_anomalies),
+        Widget("anomalies", _anomalies, lazy=True),
+        Widget(
+            "categories",
+            _categories,
+            version=_stock_version(Item, Category),
+            cache_seconds=10 * 60,
+            max_age=5 * 60,
+        ),
+        Widget(
+            "locations",
+            _locations,
+            version=_stock_version(Item, Location),
+            cache_seconds=10 * 60,
+            max_age=5 * 60,
+        ),
+    )
+}
+
+
+def widget_url(widget, request):
+    """URL the shell fetches: current version token plus the widget's own parameters."""
+    query = {}
+    if widget.name == "trend":
+        query["trend_days"], query["forecast_days"] = dashboard_params(request)
+    if widget.version is not None:
+        query["v"] = widget.version(request)
+    url = reverse("dashboard_widget", args=[widget.name])
+    return f"{url}?{urlencode(query)}" if query else url
+
+
+def shell_version(request):
+    """Widget URLs the shell embeds; part of the shell's ETag, so a new widget version re-renders it."""
+    return " ".join(widget_url(widget, request) for widget in WIDGETS.values())
+
+
+def build_payload(widget, request):
+    context, data = widget.compute(request)
+    return {
+        "widget": widget.name,
+        "html": render_to_string(widget.template, context),
+        "data": data,
+    }
+
+
+def get_payload(widget, request):
+    """The widget payload, from the server cache when the widget is versioned."""
+    if widget.version is None or not widget.cache_seconds:
+        return build_payload(widget, request)
+    params = [(name, request.GET.get(name, "")) for name in widget.params]
+    key = f"dash-widget:{widget.name}:{widget.version(request)}:{urlencode(params)}"
+    payload = cache.get(key)
+    if payload is None:
+        payload = build_payload(widget, request)
+        cache.set(key, payload, widget.cache_seconds)
+    return payload
+
+
+def payload_etag(content):
+    return '"%s"' % hashlib.md5(content, usedforsecurity=False).hexdigest()
@@ -1,6 +1,6 @@
 from django import forms
 from django.conf import settings
-from .models import Item, Supplier, Client, Location, Order, OrderLine, Category
+from .models import Item, Supplier, Client, Location, Order, OrderLine, Category, CycleCount
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm, PasswordChangeForm
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
@@ -210,6 +210,13 @@ class LocationForm(forms.ModelForm):
         if self.instance and self.instance.pk:
             self.fields["parent"].queryset = Location.objects.exclude(id=self.instance.pk)
 
+    def clean_parent(self):
+        parent = self.cleaned_data.get("parent")
+        instance = self.instance
+        if parent and instance and instance.pk and instance.tree_path and parent.tree_path.startswith(instance.tree_path):
+            raise ValidationError("A location cannot be moved under one of its own sub-locations.")
+        return parent
+
     class Meta:
         model = Location
         fields = [
@@ -266,14 +273,28 @@ class CategoryForm(forms.ModelForm):
         instance = self.instance
         if parent and instance and instance.pk:
             # Prevent circular reference: parent cannot be self or a descendant of self
-            current = parent
-            while current:
-                if current.pk == instance.pk:
-                    raise ValidationError("A category cannot be its own parent or a descendant of itself.")
-                current = current.parent
+            if parent.pk == instance.pk or (instance.tree_path and parent.tree_path.startswith(instance.tree_path)):
+                raise ValidationError("A category cannot be its own parent or a descendant of itself.")
         return parent
 
 
+class CycleCountForm(forms.ModelForm):
+    class Meta:
+        model = CycleCount
+        fields = ["name", "location", "notes"]
+
+        widgets = {
+            "name": forms.TextInput(attrs={"class": "form-control", "placeholder": "e.g. Aisle 3 – March"}),
+            "location": forms.Select(attrs={"class": "form-select"}),
+            "notes": forms.Textarea(attrs={"class": "form-control", "rows": 2}),
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["location"].queryset = Location.objects.order_by("name_path")
+        self.fields["location"].label_from_instance = lambda loc: loc.name_path or loc.name
+
+
 OrderLineFormSet = inlineformset_factory(
     Order,
     OrderLine,
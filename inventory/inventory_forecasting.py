@@ -2,7 +2,6 @@ from __future__ import annotations
 
 import datetime
 import math
-import re
 from dataclasses import dataclass
 from typing import Any
 
@@ -11,7 +10,9 @@ import pandas as pd
 from django.db.models import Sum
 from django.utils import timezone
 
-from inventory.models import Activity, Item, Order, OrderLine, StockHistory
+from inventory.daily_totals import series_from_daily_totals
+from inventory.models import Item, StockHistory
+from inventory.stock_ledger import daily_movement_totals
 
 
 @dataclass
@@ -98,42 +99,10 @@ def _build_from_stock_snapshots(start_date: datetime.date, end_date: datetime.da
 
 
 def _reconstruct_from_movements(start_date: datetime.date, end_date: datetime.date) -> pd.DataFrame:
+    """Rebuild daily totals backwards from current stock using the StockMovement ledger."""
     current_total_units = int(Item.objects.filter(is_active=True).aggregate(total=Sum("quantity"))["total"] or 0)
 
-    order_rows = (
-        OrderLine.objects.filter(
-            order__status=Order.STATUS_DELIVERED,
-            order__stock_applied=True,
-            order__order_date__range=(start_date, end_date),
-        )
-        .values("order__order_date", "order__order_type")
-        .annotate(total_qty=Sum("quantity"))
-        .order_by("order__order_date")
-    )
-
-    daily_deltas: dict[datetime.date, int] = {}
-    for row in order_rows:
-        day = row["order__order_date"]
-        qty = int(row["total_qty"] or 0)
-        if row["order__order_type"] == Order.TYPE_PURCHASE:
-            delta = qty
-        else:
-            delta = -qty
-        daily_deltas[day] = int(daily_deltas.get(day, 0) + delta)
-
-    adjustment_re = re.compile(r"Adjusted quantity for .*: change of ([+-]?\d+)")
-    adjustment_rows = (
-        Activity.objects.filter(timestamp__date__range=(start_date, end_date))
-        .values("timestamp", "message")
-        .order_by("timestamp")
-    )
-    for row in adjustment_rows:
-        match = adjustment_re.search(row["message"] or "")
-        if not match:
-            continue
-        delta = int(match.group(1))
-        day = row["timestamp"].date()
-        daily_deltas[day] = int(daily_deltas.get(day, 0) + delta)
+    daily_deltas = daily_movement_totals(start_date, end_date)
 
     if not daily_deltas:
         return pd.DataFrame([{"date": end_date, "total_units": current_total_units}])
@@ -162,8 +131,12 @@ def get_daily_inventory_series(days_back: int = 180) -> pd.DataFrame:
     today = timezone.localdate()
     start_date = today - datetime.timedelta(days=max(int(days_back) - 1, 0))
 
-    has_snapshots = StockHistory.objects.exists()
-    if has_snapshots:
+    # Precomputed daily totals are one range read; fall back to replaying
+    # snapshots / the ledger until the table covers the whole window.
+    materialized = series_from_daily_totals(start_date, today)
+    if materialized is not None:
+        df = pd.DataFrame(materialized, columns=["date", "total_units"])
+    elif StockHistory.objects.exists():
         df = _build_from_stock_snapshots(start_date=start_date, end_date=today)
     else:
         df = _reconstruct_from_movements(start_date=start_date, end_date=today)
@@ -0,0 +1,385 @@
+"""
+Bulk item import: upsert stock items by SKU from a CSV or XLSX file.
+
+Used by the "Import items" page and the ``import_items`` command. The file is
+streamed and handled ``BATCH_ROWS`` rows at a time. Each batch costs a fixed
+number of queries, however many rows it has:
+
+- one read of the existing items for the batch's SKUs, to validate;
+- in the write transaction, the same rows again under ``select_for_update``,
+  so the merge, the ledger deltas and the daily totals start from the
+  committed values rather than the validation read;
+- one ``bulk_create(update_conflicts=True)`` upsert on ``sku`` for new
+  items, and one ``bulk_update`` per set of columns the rows supply;
+- one read back of the new items' ids, then bulk ledger rows, scan codes
+  and one daily-totals update.
+
+Category, supplier and location cells hold names (matched case-insensitively,
+like the export). They are resolved through maps loaded once per import.
+
+Headers are matched loosely ("Unit Cost", "unit_cost" and "unit-cost" are the
+same column), and unknown columns are ignored. Only the columns present in
+the file are written. A blank cell leaves an existing item's value unchanged
+and gives a new item the field's default. New items need a name, unit cost
+and supplier.
+
+Rows that fail validation are skipped and listed in the report; other rows
+are still imported. Each batch is written in its own transaction. One
+``Activity`` summarises the whole import.
+"""
+from __future__ import annotations
+
+import csv
+import io
+import re
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .daily_totals import item_contribution, note_item_change, sum_contributions
+from .models import Activity, Category, Item, Location, StockMovement, Supplier
+from .scan_codes import sync_codes_for_items
+from .tree_service import bump_tree_version
+
+BATCH_ROWS = 1000
+MAX_REPORTED_ERRORS = 10_000
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+
+# Same fields as ItemForm (minus the image upload).
+IMPORT_FIELDS = [
+    "name",
+    "sku",
+    "barcode",
+    "unit_of_measure",
+    "description",
+    "quantity",
+    "category",
+    "reorder_level",
+    "lead_time_days",
+    "safety_stock",
+    "unit_cost",
+    "currency",
+    "supplier",
+    "location",
+    "batch_code",
+    "stock_status",
+    "expiry_date",
+    "packaging",
+    "external_link",
+    "serial_numbers",
+    "delete_on_deplete",
+    "notes",
+]
+NAMED_FIELDS = {"category": Category, "supplier": Supplier, "location": Location}
+REQUIRED_FOR_NEW = ("name", "unit_cost", "supplier")
+CODE_FIELDS = {"sku", "barcode", "serial_numbers"}
+HEADER_ALIASES = {"cost": "unit_cost", "uom": "unit_of_measure", "unit": "unit_of_measure", "qty": "quantity"}
+_TRUE = {"1", "true", "t", "yes", "y"}
+_FALSE = {"0", "false", "f", "no", "n"}
+
+# Every model field an import reads or writes, by attname (supplier_id, ...).
+_ATTNAMES = ["id"] + [Item._meta.get_field(name).attname for name in IMPORT_FIELDS] + ["is_active"]
+
+
+class ItemImportError(Exception):
+    """The file as a whole cannot be imported (unreadable, no SKU column)."""
+
+
+@dataclass
+class ItemImportReport:
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    error_rows: int = 0
+    columns: list = field(default_factory=list)
+    ignored_columns: list = field(default_factory=list)
+    # (row number, sku, column, message); capped at MAX_REPORTED_ERRORS entries.
+    errors: list = field(default_factory=list)
+    dry_run: bool = False
+
+    def add_errors(self, row_number, sku, problems):
+        self.error_rows += 1
+        for column, message in problems:
+            if len(self.errors) < MAX_REPORTED_ERRORS:
+                self.errors.append((row_number, sku, column, message))
+
+    @property
+    def errors_truncated(self):
+        return len(self.errors) >= MAX_REPORTED_ERRORS
+
+    def summary(self):
+        verb = "would be " if self.dry_run else ""
+        return (
+            f"{self.rows} row(s): {self.created} {verb}created, {self.updated} {verb}updated, "
+            f"{self.unchanged} unchanged, {self.error_rows} with errors"
+        )
+
+    def errors_csv(self):
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(["Row", "SKU", "Column", "Error"])
+        writer.writerows(self.errors)
+        return out.getvalue()
+
+
+# ---- reading ----
+
+def _normalize_header(text):
+    key = re.sub(r"[^a-z0-9]+", "_", str(text or "").strip().lower()).strip("_")
+    return HEADER_ALIASES.get(key, key)
+
+
+def _table_rows(fileobj, filename, encoding):
+    if filename.lower().endswith((".xlsx", ".xlsm")):
+        try:
+            from openpyxl import load_workbook
+        except ImportError as exc:
+            raise ItemImportError("Reading .xlsx files needs openpyxl; upload a CSV instead.") from exc
+        try:
+            wb = load_workbook(fileobj, read_only=True, data_only=True)
+        except Exception as exc:  # zipfile/openpyxl raise a variety of types for bad files
+            raise ItemImportError(f"Could not open {filename} as an Excel workbook.") from exc
+        try:
+            yield from wb.worksheets[0].iter_rows(values_only=True)
+        finally:
+            wb.close()
+    else:
+        text = io.TextIOWrapper(fileobj, encoding=encoding, newline="")
+        try:
+            yield from csv.reader(text)
+        except UnicodeDecodeError as exc:
+            raise ItemImportError(f"{filename} is not {encoding} text; save it as UTF-8 CSV.") from exc
+        finally:
+            text.detach()
+
+
+# ---- validation ----
+
+def _cell(value):
+    """Stripped text for strings, the value itself for typed Excel cells; ``None`` when blank."""
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)  # Excel stores whole numbers (and numeric SKUs/barcodes) as floats
+    return value
+
+
+class _NameMaps:
+    """Case-insensitive name → id for categories, suppliers and locations (loaded once)."""
+
+    def __init__(self):
+        self.maps = {}
+        for column, model in NAMED_FIELDS.items():
+            by_name = {}
+            for pk, name in model.objects.order_by("-pk").values_list("pk", "name"):
+                by_name[name.strip().lower()] = pk  # duplicates: the oldest row wins
+            self.maps[column] = by_name
+
+    def resolve(self, column, value):
+        return self.maps[column].get(str(value).strip().lower())
+
+
+def _clean_cells(cells, maps):
+    """``({attname: value}, [(column, message)])`` for the non-blank cells of one row."""
+    values, problems = {}, []
+    for column, raw in cells.items():
+        if raw is None or column == "sku":
+            continue
+        model_field = Item._meta.get_field(column)
+        if column in NAMED_FIELDS:
+            pk = maps.resolve(column, raw)
+            if pk is None:
+                problems.append((column, f"No {column} named “{raw}”."))
+            else:
+                values[model_field.attname] = pk
+            continue
+        if column == "delete_on_deplete" and isinstance(raw, str):
+            if raw.lower() not in _TRUE | _FALSE:
+                problems.append((column, "Use yes/no, true/false or 1/0."))
+                continue
+            raw = raw.lower() in _TRUE
+        try:
+            value = model_field.clean(raw, None)
+        except ValidationError as exc:
+            problems.append((column, " ".join(exc.messages)))
+            continue
+        if column == "quantity" and value < 0:
+            problems.append((column, "Stock quantity cannot be below zero."))
+            continue
+        values[model_field.attname] = value
+    return values, problems
+
+
+def _defaults():
+    values = {}
+    for name in IMPORT_FIELDS:
+        model_field = Item._meta.get_field(name)
+        values[model_field.attname] = model_field.get_default() if model_field.has_default() else None
+    values["is_active"] = True
+    for name in ("barcode", "description", "batch_code", "packaging", "external_link", "serial_numbers", "notes"):
+        values[name] = values[name] or ""
+    return values
+
+
+# ---- import ----
+
+class _Importer:
+    def __init__(self, columns, report, user, dry_run):
+        self.columns = columns
+        self.report = report
+        self.user = user
+        self.dry_run = dry_run
+        self.maps = _NameMaps()
+        self.seen = {}  # sku -> first row number, to reject repeats within the file
+        self.update_fields = [name for name in columns if name != "sku"]
+        self.touches_codes = bool(CODE_FIELDS & set(columns))
+        self.defaults = _defaults()
+
+    def run_batch(self, batch):
+        skus = [sku for _, sku, _ in batch if sku]
+        existing = {
+            row["sku"]: row
+            for row in Item.objects.filter(sku__in=skus).values(*_ATTNAMES)
+        }
+        pending = []  # (values, previous values or None)
+        for number, sku, cells in batch:
+            problems = []
+            if not sku:
+                problems.append(("sku", "SKU is required."))
+            elif len(sku) > Item._meta.get_field("sku").max_length:
+                problems.append(("sku", "SKU is longer than 100 characters."))
+            elif sku in self.seen:
+                problems.append(("sku", f"SKU already imported from row {self.seen[sku]}."))
+            values, cell_problems = _clean_cells(cells, self.maps)
+            problems += cell_problems
+            previous = existing.get(sku)
+            if previous is None:
+                problems += [
+                    (name, f"{Item._meta.get_field(name).verbose_name.capitalize()} is required for new items.")
+                    for name in REQUIRED_FOR_NEW
+                    if Item._meta.get_field(name).attname not in values
+                    and not any(column == name for column, _ in cell_problems)
+                ]
+            if problems:
+                self.report.add_errors(number, sku, problems)
+                continue
+            self.seen[sku] = number
+            merged = {**(previous or self.defaults), **values, "sku": sku}
+            if previous is not None and all(merged[k] == previous[k] for k in values):
+                self.report.unchanged += 1
+                continue
+            pending.append((values, merged, previous))
+
+        self.report.created += sum(1 for *_, previous in pending if previous is None)
+        self.report.updated += sum(1 for *_, previous in pending if previous is not None)
+        if pending and not self.dry_run:
+            self._write(pending)
+
+    def _write(self, pending):
+        creates = [merged for _, merged, previous in pending if previous is None]
+        supplied = {merged["sku"]: values for values, merged, previous in pending if previous is not None}
+        with transaction.atomic():
+            # Re-read under lock: a sale or adjustment committed since the
+            # validation read must be neither overwritten nor missed by the ledger.
+            locked = {
+                row["sku"]: row
+                for row in Item.objects.select_for_update().filter(sku__in=list(supplied)).values(*_ATTNAMES)
+            }
+            if creates:
+                Item.objects.bulk_create(
+                    [Item(**{k: v for k, v in values.items() if k != "id"}) for values in creates],
+                    update_conflicts=True,
+                    unique_fields=["sku"],
+                    update_fields=self.update_fields or ["sku"],
+                )
+            ids = dict(Item.objects.filter(sku__in=[v["sku"] for v in creates]).values_list("sku", "id"))
+
+            written = [(values, None) for values in creates]  # (values after, locked values before)
+            by_fields = {}
+            for sku, values in supplied.items():
+                previous = locked.get(sku)
+                if previous is None:
+                    continue  # deleted since validation
+                if all(previous[k] == v for k, v in values.items()):
+                    continue
+                merged = {**previous, **values}
+                by_fields.setdefault(tuple(sorted(values)), []).append(Item(**merged))
+                ids[sku] = previous["id"]
+                written.append((merged, previous))
+            for fields, objs in by_fields.items():
+                Item.objects.bulk_update(objs, fields, batch_size=BATCH_ROWS)
+
+            movements, before, after = [], [], []
+            for values, previous in written:
+                old_qty = previous["quantity"] if previous else 0
+                delta = values["quantity"] - old_qty
+                if delta:
+                    movements.append(
+                        StockMovement(
+                            item_id=ids[values["sku"]],
+                            location_id=values["location_id"],
+                            delta=delta,
+                            reason=StockMovement.REASON_EDIT if previous else StockMovement.REASON_INITIAL,
+                            user=self.user,
+                        )
+                    )
+                if previous:
+                    before.append(item_contribution(previous["is_active"], previous["quantity"], previous["unit_cost"]))
+                after.append(item_contribution(values["is_active"], values["quantity"], values["unit_cost"]))
+            StockMovement.objects.bulk_create(movements)
+            note_item_change(sum_contributions(before), sum_contributions(after))
+            if self.touches_codes or creates:
+                sync_codes_for_items(ids.values())
+
+
+def import_items(fileobj, filename, user=None, dry_run=False, encoding="utf-8-sig", batch_rows=BATCH_ROWS):
+    """
+    Import items from an open binary file; returns an ``ItemImportReport``.
+
+    Raises ``ItemImportError`` when the file cannot be read at all.
+    """
+    rows = _table_rows(fileobj, filename, encoding)
+    header = next(rows, None)
+    if not header:
+        raise ItemImportError(f"{filename} is empty.")
+    names = [_normalize_header(h) for h in header]
+    if "sku" not in names:
+        raise ItemImportError("The file needs a SKU column.")
+
+    report = ItemImportReport(dry_run=dry_run)
+    index = {}
+    for i, name in enumerate(names):
+        if name in IMPORT_FIELDS and name not in index:
+            index[name] = i
+        elif name and header[i] is not None:
+            report.ignored_columns.append(str(header[i]))
+    report.columns = list(index)
+
+    user = user if user is not None and getattr(user, "is_authenticated", False) else None
+    importer = _Importer(report.columns, report, user, dry_run)
+    batch = []
+    for number, row in enumerate(rows, start=2):  # row 1 is the header, as in a spreadsheet
+        row = tuple(row)
+        cells = {name: _cell(row[i]) if i < len(row) else None for name, i in index.items()}
+        if all(value is None for value in cells.values()):
+            continue
+        report.rows += 1
+        sku = cells.get("sku")
+        batch.append((number, "" if sku is None else str(sku).strip(), cells))
+        if len(batch) >= batch_rows:
+            importer.run_batch(batch)
+            batch = []
+    if batch:
+        importer.run_batch(batch)
+
+    if not dry_run and (report.created or report.updated):
+        bump_tree_version()
+        Activity.objects.create(
+            user=user,
+            kind=Activity.KIND_ITEM_IMPORT,
+            message=f"Item import from {filename}: {report.summary()}"[:255],
+        )
+    return report
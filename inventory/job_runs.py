@@ -0,0 +1,325 @@
+"""
+Telemetry for background jobs: one ``JobRun`` row per execution.
+
+Entry points (Celery tasks, management commands, the manual scan thread)
+wrap the work in ``track(name)``. The row is created as ``running``
+before the job starts and completed when it ends with:
+
+- the wall-clock duration and final status (a raised exception marks the run
+  ``failed`` and keeps the error, then propagates unchanged);
+- seconds per stage. Library code marks its phases with ``stage("save")``
+  and friends, which does nothing when no run is active, so the same
+  functions stay cheap when called from a view or a test;
+- row counters added with ``add_rows`` / ``add_summary``;
+- the number and total time of SQL queries on this thread's connections
+  (``request_metrics.collect``);
+- the tracemalloc peak, when ``JOB_RUNS_TRACE_MEMORY`` is on and the job
+  has its process to itself: a Celery prefork child (``dedicated_process``
+  is called from ``worker_process_init``) or a management command
+  (``track(trace_memory=True)``). tracemalloc is process-wide, so it is
+  never started in a web worker (the manual scan thread) and a run never
+  stops tracing it did not start; overlapping runs get no peak rather than
+  a wrong one. Tracing slows allocation-heavy code such as the pandas scan
+  noticeably, so it can be switched off. An outer tracer
+  (``benchmark_jobs``) is left running and its peak is reported as is.
+
+``track`` is re-entrant: a nested call joins the outer run, so a task can
+open a run around a helper that opens its own. ``track(run_id=...)`` picks
+up a row created earlier (a queued manual scan, or a chord whose shards
+already ran) instead of creating one.
+
+The row doubles as a progress record. Entering a stage writes its name to
+``JobRun.stage``, and ``set_total`` / ``advance`` keep
+``progress_done``/``progress_total`` current. Other processes (the
+scan-status poll) see these as the job runs. The write is one short
+UPDATE per stage.
+
+Work done on other threads or processes (the anomaly shards) is not seen by
+the contextvar; those callers time the stages themselves in a ``Stages`` and
+hand them back with ``add_stages``. Their queries and memory are not
+counted. Stage seconds from parallel shards are summed, so they can exceed
+the run's duration.
+"""
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import logging
+import statistics
+import threading
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from . import request_metrics
+from .models import JobRun
+
+logger = logging.getLogger(__name__)
+
+_MB = 1024 * 1024
+
+_current = contextvars.ContextVar("warewolf_job_run", default=None)
+
+_trace_lock = threading.Lock()
+_trace_owner = None  # the JobRecorder that started tracemalloc, if a run did
+_dedicated = False
+
+
+class Stages(dict):
+    """``{stage: seconds}``; ``time(name)`` adds the duration of the enclosed block."""
+
+    @contextlib.contextmanager
+    def time(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self[name] = self.get(name, 0.0) + time.perf_counter() - t0
+
+    def merge(self, other):
+        for name, seconds in (other or {}).items():
+            self[name] = self.get(name, 0.0) + seconds
+
+
+class JobRecorder:
+    """What ``track`` yields: stage timings and row counters for the active run."""
+
+    def __init__(self, run):
+        self.run = run
+        self.stages = Stages(run.stages)
+        self.rows = dict(run.rows)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        mark(self.run.pk, stage=name)
+        with self.stages.time(name):
+            yield
+
+    def set_total(self, total):
+        mark(self.run.pk, progress_total=total, progress_done=0)
+
+    def advance(self, done=1):
+        mark(self.run.pk, progress_done=F("progress_done") + done)
+
+    def add_rows(self, **counts):
+        for name, count in counts.items():
+            self.rows[name] = self.rows.get(name, 0) + int(count)
+
+    def add_summary(self, summary):
+        """Add the integer entries of a job's summary dict as row counters."""
+        self.add_rows(**{
+            k: v for k, v in summary.items() if isinstance(v, int) and not isinstance(v, bool)
+        })
+
+
+def current():
+    return _current.get()
+
+
+def stage(name):
+    """Time the enclosed block as stage ``name`` of the active run (no-op outside a run)."""
+    recorder = _current.get()
+    return recorder.stage(name) if recorder else contextlib.nullcontext()
+
+
+def add_rows(**counts):
+    recorder = _current.get()
+    if recorder:
+        recorder.add_rows(**counts)
+
+
+def add_summary(summary):
+    recorder = _current.get()
+    if recorder:
+        recorder.add_summary(summary)
+
+
+def add_stages(stages):
+    recorder = _current.get()
+    if recorder:
+        recorder.stages.merge(stages)
+
+
+def show_stage(name):
+    """Display ``name`` as the active run's current stage without timing anything (work timed elsewhere)."""
+    recorder = _current.get()
+    if recorder:
+        mark(recorder.run.pk, stage=name)
+
+
+def set_total(total):
+    recorder = _current.get()
+    if recorder:
+        recorder.set_total(total)
+
+
+def advance(done=1):
+    recorder = _current.get()
+    if recorder:
+        recorder.advance(done)
+
+
+def mark(run_id, **fields):
+    """Update progress fields of run ``run_id`` (no-op for None) and bump ``updated_at``."""
+    if run_id:
+        JobRun.objects.filter(pk=run_id).update(updated_at=timezone.now(), **fields)
+
+
+def dedicated_process():
+    """Mark this process as running one job at a time, so runs may trace its memory by default."""
+    global _dedicated
+    _dedicated = True
+
+
+def _start_tracing(recorder, wanted):
+    """``"own"`` if this run started tracemalloc, ``"outer"`` under a non-run tracer, else None."""
+    global _trace_owner
+    with _trace_lock:
+        if tracemalloc.is_tracing():
+            return "outer" if _trace_owner is None else None
+        if not wanted:
+            return None
+        tracemalloc.start()
+        _trace_owner = recorder
+        return "own"
+
+
+def _stop_tracing(recorder, tracing):
+    """The peak to record for ``recorder`` (None when it was not measured)."""
+    global _trace_owner
+    with _trace_lock:
+        if tracing is None or not tracemalloc.is_tracing():
+            return None
+        peak = tracemalloc.get_traced_memory()[1]
+        if tracing == "own" and _trace_owner is recorder:
+            tracemalloc.stop()
+            _trace_owner = None
+        return peak
+
+
+def _start(name, user_id, run_id):
+    now = timezone.now()
+    run = JobRun.objects.filter(pk=run_id).first() if run_id else None
+    if run is None:
+        return JobRun.objects.create(name=name, user_id=user_id, started_at=now, updated_at=now)
+    if run.status == JobRun.STATUS_QUEUED:
+        run.started_at = now
+    run.status = JobRun.STATUS_RUNNING
+    run.updated_at = now
+    run.save(update_fields=["status", "started_at", "updated_at"])
+    return run
+
+
+def _finish(run, recorder, *, status, error, stats, peak):
+    run.status = status
+    run.error = error
+    run.finished_at = run.updated_at = timezone.now()
+    run.duration_seconds = round((run.finished_at - run.started_at).total_seconds(), 4)
+    run.stages = {name: round(seconds, 4) for name, seconds in recorder.stages.items()}
+    run.rows = recorder.rows
+    run.query_count = stats.sql_count if stats else 0
+    run.sql_seconds = round(stats.sql_seconds, 4) if stats else 0
+    run.peak_memory_mb = round(peak / _MB, 2) if peak is not None else None
+    run.stage = ""
+    run.lock = None
+    try:
+        # progress_done/total are left out: shard tasks may still be bumping them.
+        run.save(update_fields=[
+            "status", "error", "finished_at", "updated_at", "duration_seconds", "stages", "rows",
+            "query_count", "sql_seconds", "peak_memory_mb", "stage", "lock",
+        ])
+    except Exception:
+        # Never let bookkeeping replace the job's own result or exception.
+        logger.exception("Could not record job run %s (%s)", run.pk, run.name)
+
+
+@contextlib.contextmanager
+def track(name, *, user_id=None, run_id=None, trace_memory=None):
+    """
+    Record one run of job ``name`` (or continue run ``run_id``); yields a ``JobRecorder``.
+
+    ``trace_memory`` defaults to whether this is a ``dedicated_process``;
+    pass True from a process that runs only this job, False to never trace.
+    """
+    outer = _current.get()
+    if outer is not None:
+        yield outer
+        return
+    run = _start(name, user_id, run_id)
+    recorder = JobRecorder(run)
+    token = _current.set(recorder)
+    if trace_memory is None:
+        trace_memory = _dedicated
+    tracing = _start_tracing(recorder, settings.JOB_RUNS_TRACE_MEMORY and trace_memory)
+    stats = None
+    status, error = JobRun.STATUS_OK, ""
+    try:
+        with request_metrics.collect() as stats:
+            yield recorder
+    except BaseException as exc:
+        status, error = JobRun.STATUS_FAILED, f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        peak = _stop_tracing(recorder, tracing)
+        _current.reset(token)
+        _finish(run, recorder, status=status, error=error, stats=stats, peak=peak)
+
+
+# ---- reporting ----
+
+def run_as_json(run):
+    return {
+        "id": run.pk,
+        "name": run.name,
+        "status": run.status,
+        "started_at": run.started_at.isoformat(),
+        "finished_at": run.finished_at.isoformat() if run.finished_at else None,
+        "duration_seconds": run.duration_seconds,
+        "stages": run.stages,
+        "rows": run.rows,
+        "query_count": run.query_count,
+        "sql_seconds": run.sql_seconds,
+        "peak_memory_mb": run.peak_memory_mb,
+        "error": run.error,
+        "user": run.user.username if run.user_id else None,
+    }
+
+
+def stage_shares(run):
+    """``[(stage, seconds, percent of all stage time)]`` for the stage bar on the jobs page."""
+    total = sum(run.stages.values())
+    if not total:
+        return []
+    return [(name, seconds, round(100 * seconds / total, 1)) for name, seconds in run.stages.items()]
+
+
+def summarize(runs):
+    """
+    Per job name over ``runs`` (newest first): run and failure counts, the
+    latest and median duration, and each stage's median seconds. A stage whose
+    latest time is far above its median is what the page is for.
+    """
+    by_name = {}
+    for run in runs:
+        by_name.setdefault(run.name, []).append(run)
+    out = {}
+    for name, group in by_name.items():
+        finished = [r for r in group if r.duration_seconds is not None]
+        stage_names = list(dict.fromkeys(s for r in finished for s in r.stages))
+        out[name] = {
+            "runs": len(group),
+            "failed": sum(r.status == JobRun.STATUS_FAILED for r in group),
+            "last_status": group[0].status,
+            "last_duration_seconds": finished[0].duration_seconds if finished else None,
+            "median_duration_seconds": (
+                round(statistics.median(r.duration_seconds for r in finished), 4) if finished else None
+            ),
+            "median_stage_seconds": {
+                s: round(statistics.median(r.stages[s] for r in finished if s in r.stages), 4)
+                for s in stage_names
+            },
+        }
+    return out
@@ -0,0 +1,60 @@
+"""
+Archive and delete rows past their retention limit, and thin old stock history.
+
+Same policies as the nightly ``apply_retention_task`` (see
+inventory.retention). Rows are appended to RETENTION_ARCHIVE_DIR as
+.jsonl.gz before they are deleted, one batch per transaction.
+
+Usage:
+  python manage.py apply_retention --dry-run
+  python manage.py apply_retention
+  python manage.py apply_retention --only notification recommendation --max-rows 50000
+  python manage.py apply_retention --no-archive --json
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import job_runs
+from inventory.retention import BATCH_SIZE, DEFAULT_POLICIES, STOCK_HISTORY, apply_retention
+
+TABLES = sorted([policy.name for policy in DEFAULT_POLICIES] + [STOCK_HISTORY])
+
+
+class Command(BaseCommand):
+    help = "Apply the retention policies (archive + delete old rows, downsample StockHistory)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only count the rows each policy would remove")
+        parser.add_argument("--only", nargs="+", choices=TABLES, help="Limit the run to these tables")
+        parser.add_argument("--no-archive", action="store_true", help="Delete without writing archive files")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help=f"Rows per batch (default {BATCH_SIZE})")
+        parser.add_argument("--max-rows", type=int, default=None, help="Stop each table after this many rows")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    def handle(self, *args, **opts):
+        if opts["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        with job_runs.track("apply_retention", trace_memory=True):
+            report = apply_retention(
+                only=opts["only"],
+                dry_run=opts["dry_run"],
+                archive=not opts["no_archive"],
+                batch_size=opts["batch_size"],
+                max_rows=opts["max_rows"],
+            )
+        if opts["json"]:
+            self.stdout.write(json.dumps(report.as_json(), indent=2))
+            return
+        for result in report.results:
+            line = f"{result.name:<15} cutoff {result.cutoff[:10]}: "
+            if report.dry_run:
+                line += f"{result.eligible} rows eligible"
+            else:
+                line += f"{result.deleted} rows removed"
+            if result.name == STOCK_HISTORY:
+                line += f", {result.kept} weekly points kept"
+            if result.archive_path:
+                line += f" -> {result.archive_path} ({result.archive_bytes} bytes)"
+            self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS(report.summary()))
@@ -0,0 +1,249 @@
+"""
+Compare latency of the fan-out endpoints under concurrent load, WSGI vs ASGI.
+
+Each target is a running server. ``--spawn`` starts two local gunicorn
+servers for you: ``warewolf.wsgi`` with gthread workers and ``warewolf.asgi``
+with uvicorn workers, which serve the async views. For every endpoint the
+command sends ``--requests`` requests from ``--concurrency`` client threads,
+logged in as a manager through a shared database session. It then reports
+p50/p95/p99 latency, throughput and error count per target. The first target
+is the baseline for the printed p95 comparison.
+
+Usage:
+  python manage.py benchmark_concurrency --spawn --workers 2 --concurrency 32 --requests 400
+  python manage.py benchmark_concurrency --target wsgi=http://127.0.0.1:8000 --target asgi=http://127.0.0.1:8001
+  python manage.py benchmark_concurrency --spawn --compare previous.json --output after.json
+"""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client as HttpClient
+from django.urls import reverse
+from django.utils import timezone
+
+from .benchmark_scale import BENCH_USERNAME, _git_commit, _percentile
+
+# (label, url name, url args, query params)
+ENDPOINTS = [
+    ("dashboard", "dashboard", [], {}),
+    ("dashboard_widget", "dashboard_widget", ["top_items"], {}),
+    ("alerts_list", "alerts_list", [], {}),
+    ("global_search", "global_search", [], {"q": "SYN Item 12"}),
+]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port, process, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(f"Server exited with code {process.returncode}; is gunicorn/uvicorn installed?")
+        with contextlib.suppress(OSError), socket.create_connection(("127.0.0.1", port), timeout=0.5):
+            return
+        time.sleep(0.2)
+    raise CommandError(f"Server on port {port} did not start within {timeout}s")
+
+
+class Command(BaseCommand):
+    help = "Load-test the fan-out endpoints concurrently against WSGI and ASGI servers; writes a JSON report."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target",
+            action="append",
+            default=[],
+            metavar="LABEL=URL",
+            help="Running server to test (repeatable); the first one is the baseline",
+        )
+        parser.add_argument("--spawn", action="store_true", help="Start local WSGI and ASGI gunicorn servers")
+        parser.add_argument("--workers", type=int, default=2, help="Worker processes per spawned server")
+        parser.add_argument("--threads", type=int, default=8, help="Threads per WSGI worker when spawning")
+        parser.add_argument("--concurrency", type=int, default=32, help="Client threads sending requests")
+        parser.add_argument("--requests", type=int, default=200, help="Timed requests per endpoint and target")
+        parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+        parser.add_argument(
+            "--output",
+            default="benchmark_concurrency.json",
+            help="Report path (default benchmark_concurrency.json; '-' for stdout)",
+        )
+        parser.add_argument("--compare", help="Previous report to print per-endpoint p95 deltas against")
+
+    def handle(self, *args, **opts):
+        targets = []
+        for raw in opts["target"]:
+            label, sep, url = raw.partition("=")
+            if not sep or not label or not url:
+                raise CommandError(f"--target must look like LABEL=URL, got {raw!r}")
+            targets.append((label, url.rstrip("/")))
+
+        with contextlib.ExitStack() as stack:
+            if opts["spawn"]:
+                targets.extend(self._spawn_servers(stack, opts["workers"], opts["threads"]))
+            if not targets:
+                raise CommandError("Give at least one --target or use --spawn")
+
+            cookie = f"{settings.SESSION_COOKIE_NAME}={self._session_key()}"
+            report = {
+                "generated_at": timezone.now().isoformat(),
+                "git_commit": _git_commit(),
+                "database": connection.vendor,
+                "concurrency": opts["concurrency"],
+                "requests": opts["requests"],
+                "targets": {},
+            }
+            for label, base_url in targets:
+                self.stdout.write(f"\n{label} ({base_url})")
+                report["targets"][label] = self._load_target(base_url, cookie, opts)
+
+        self._print_comparison(report)
+        self._write(report, opts["output"])
+        if opts["compare"]:
+            self._compare(report, opts["compare"])
+
+    def _session_key(self):
+        from django.contrib.auth import get_user_model
+        from django.contrib.auth.models import Group
+
+        User = get_user_model()
+        user, _ = User.objects.get_or_create(username=BENCH_USERNAME)
+        user.groups.add(Group.objects.get_or_create(name="Manager")[0])
+        http = HttpClient()
+        http.force_login(user)
+        return http.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def _spawn_servers(self, stack, workers, threads):
+        servers = [
+            ("wsgi", ["warewolf.wsgi:application", "--worker-class", "gthread", "--threads", str(threads)]),
+            ("asgi", ["warewolf.asgi:application", "--worker-class", "uvicorn_worker.UvicornWorker"]),
+        ]
+        env = {
+            **os.environ,
+            "DJANGO_ALLOWED_HOSTS": "127.0.0.1,localhost",
+            "REQUEST_METRICS_ENABLED": os.environ.get("REQUEST_METRICS_ENABLED", "true"),
+        }
+        spawned = []
+        for label, args in servers:
+            port = _free_port()
+            process = subprocess.Popen(
+                [sys.executable, "-m", "gunicorn", *args, "--workers", str(workers), "--bind", f"127.0.0.1:{port}"],
+                cwd=settings.BASE_DIR,
+                env=env,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            stack.callback(self._stop, process)
+            _wait_for_port(port, process, timeout=60)
+            spawned.append((label, f"http://127.0.0.1:{port}"))
+        return spawned
+
+    @staticmethod
+    def _stop(process):
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    def _load_target(self, base_url, cookie, opts):
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(1, opts["concurrency"])) as pool:
+            for label, url_name, url_args, params in ENDPOINTS:
+                url = base_url + reverse(url_name, args=url_args)
+                if params:
+                    url += "?" + urllib.parse.urlencode(params)
+                self._fetch(url, cookie, opts["timeout"])  # warm-up (imports, caches, connections)
+
+                t0 = time.perf_counter()
+                samples = list(pool.map(lambda _: self._fetch(url, cookie, opts["timeout"]), range(opts["requests"])))
+                wall = time.perf_counter() - t0
+
+                timings = [ms for ms, ok in samples if ok]
+                errors = sum(1 for _, ok in samples if not ok)
+                results[label] = {
+                    "requests": len(samples),
+                    "errors": errors,
+                    "rps": round(len(samples) / wall, 1) if wall else 0.0,
+                    "p50_ms": round(_percentile(timings, 50), 2),
+                    "p95_ms": round(_percentile(timings, 95), 2),
+                    "p99_ms": round(_percentile(timings, 99), 2),
+                    "max_ms": round(max(timings), 2) if timings else 0.0,
+                }
+                self.stdout.write(
+                    f"  {label:17} p50 {results[label]['p50_ms']:8.1f} ms  p95 {results[label]['p95_ms']:8.1f} ms  "
+                    f"{results[label]['rps']:7.1f} req/s  {errors} errors"
+                )
+        return results
+
+    @staticmethod
+    def _fetch(url, cookie, timeout):
+        """(latency ms, ok) for one GET; redirects (e.g. to login) count as errors."""
+        request = urllib.request.Request(url, headers={"Cookie": cookie})
+        t0 = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                response.read()
+                ok = response.status == 200 and "/login" not in urllib.parse.urlsplit(response.url).path
+        except (urllib.error.URLError, OSError):
+            ok = False
+        return (time.perf_counter() - t0) * 1000, ok
+
+    def _print_comparison(self, report):
+        labels = list(report["targets"])
+        if len(labels) < 2:
+            return
+        baseline = labels[0]
+        self.stdout.write(f"\np95 vs {baseline}:")
+        for endpoint, base in report["targets"][baseline].items():
+            parts = []
+            for label in labels[1:]:
+                now = report["targets"][label].get(endpoint)
+                if now and base["p95_ms"]:
+                    delta = (now["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100
+                    parts.append(f"{label} {now['p95_ms']:.1f} ms ({delta:+.1f}%)")
+            self.stdout.write(f"{endpoint:17} {base['p95_ms']:9.1f} ms  " + "  ".join(parts))
+
+    def _write(self, report, output):
+        payload = json.dumps(report, indent=2, sort_keys=True)
+        if output == "-":
+            self.stdout.write(payload)
+            return
+        Path(output).write_text(payload + "\n", encoding="utf-8")
+        self.stdout.write(self.style.SUCCESS(f"Report written to {output}"))
+
+    def _compare(self, report, previous_path):
+        try:
+            previous = json.loads(Path(previous_path).read_text(encoding="utf-8"))
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Cannot read {previous_path}: {exc}")
+        self.stdout.write(f"\nvs {previous_path} ({previous.get('git_commit') or 'unknown commit'}):")
+        for label, endpoints in report["targets"].items():
+            before_endpoints = previous.get("targets", {}).get(label, {})
+            for endpoint, now in endpoints.items():
+                before = before_endpoints.get(endpoint)
+                if not before:
+                    continue
+                delta = (now["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0.0
+                self.stdout.write(
+                    f"{label:6} {endpoint:17} p95 {before['p95_ms']:9.1f} → {now['p95_ms']:9.1f} ms ({delta:+.1f}%)"
+                )
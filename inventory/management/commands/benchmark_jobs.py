@@ -0,0 +1,188 @@
+"""
+Microbenchmarks for the ML code and the background jobs run by Celery beat.
+
+For each catalogue size in ``--skus``, a synthetic dataset is generated inside
+a transaction that is rolled back at the end, so the database is left as it
+was. The command then runs anomaly detection, save and prune, the forecast and
+backtest, recommendation refresh and recommendation notifications. For each
+job it records wall time, peak Python memory (tracemalloc) and SQL query count.
+
+With ``--baseline`` the results are compared against a stored report. The
+command fails (non-zero exit) when any metric is more than ``--threshold``
+percent worse. Tiny absolute changes are ignored via ``--min-seconds`` /
+``--min-mb`` so timer noise does not fail the run.
+
+Usage:
+  python manage.py benchmark_jobs --skus 1000,10000,50000 --output jobs.json
+  python manage.py benchmark_jobs --skus 1000,10000 --baseline jobs.json --threshold 20
+"""
+
+from __future__ import annotations
+
+import json
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from inventory import request_metrics
+from inventory.alerts_jobs import sync_recommendation_notifications
+from inventory.inventory_forecasting import evaluate_model, generate_forecast, get_daily_inventory_series
+from inventory.ml.anomaly import (
+    anomaly_keep_set,
+    detect_sales_anomalies,
+    prune_stale_anomalies_not_in_results,
+    save_anomalies,
+)
+from inventory.recommendation_engine import recalculate_all_recommendations
+from inventory.synthetic_data import SyntheticSpec, generate_synthetic_data, synthetic_data_exists
+
+METRICS = ("seconds", "peak_mb", "queries")
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _measure(func, *args, **kwargs):
+    """Run ``func`` once; return (result, {"seconds", "peak_mb", "queries"})."""
+    tracemalloc.start()
+    try:
+        with request_metrics.collect() as stats:
+            t0 = time.perf_counter()
+            result = func(*args, **kwargs)
+            seconds = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, {
+        "seconds": round(seconds, 4),
+        "peak_mb": round(peak / (1024 * 1024), 2),
+        "queries": stats.sql_count,
+    }
+
+
+def run_job_suite(skus, lines_per_sku=20, seed=42, log=None):
+    """Benchmark every job against a rolled-back dataset of ``skus`` items."""
+    log = log or (lambda msg: None)
+    timings = {}
+    spec = SyntheticSpec(
+        items=skus,
+        order_lines=skus * lines_per_sku,
+        customers=max(10, skus // 20),
+        suppliers=max(5, skus // 200),
+        locations=max(10, skus // 50),
+        notifications=0,
+        users=3,
+        history_days=60,
+        days_back=120,
+        seed=seed,
+    )
+    try:
+        with transaction.atomic(), override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend"
+        ):
+            t0 = time.perf_counter()
+            result = generate_synthetic_data(spec)
+            Group.objects.get_or_create(name="Manager")[0].user_set.add(*result.user_ids)
+            log(f"  {skus} SKUs: dataset ready in {time.perf_counter() - t0:.1f}s")
+
+            anomalies, timings["detect_sales_anomalies"] = _measure(detect_sales_anomalies)
+            _, timings["save_anomalies"] = _measure(save_anomalies, anomalies)
+            _, timings["prune_stale_anomalies_not_in_results"] = _measure(
+                prune_stale_anomalies_not_in_results, anomaly_keep_set(anomalies)
+            )
+            series, timings["get_daily_inventory_series"] = _measure(get_daily_inventory_series, days_back=180)
+            _, timings["generate_forecast"] = _measure(generate_forecast, series, horizon_days=7)
+            _, timings["evaluate_model"] = _measure(evaluate_model, series, horizon_days=7)
+            _, timings["recalculate_all_recommendations"] = _measure(recalculate_all_recommendations)
+            _, timings["sync_recommendation_notifications"] = _measure(sync_recommendation_notifications)
+            raise _Rollback
+    except _Rollback:
+        pass
+    return timings
+
+
+def find_regressions(current, baseline, threshold_pct, min_seconds=0.05, min_mb=1.0):
+    """Return human-readable lines for every metric that regressed past the threshold."""
+    floors = {"seconds": min_seconds, "peak_mb": min_mb, "queries": 0}
+    problems = []
+    for scale, jobs in current.items():
+        for job, now in jobs.items():
+            before = baseline.get(scale, {}).get(job)
+            if not before:
+                continue
+            for metric in METRICS:
+                old, new = before.get(metric), now.get(metric)
+                if old is None or new is None or new - old <= floors[metric]:
+                    continue
+                pct = (new - old) / old * 100 if old else float("inf")
+                if pct > threshold_pct:
+                    problems.append(f"{scale} SKUs / {job}: {metric} {old} → {new} (+{pct:.0f}%)")
+    return problems
+
+
+class Command(BaseCommand):
+    help = "Profile ML / background jobs at several catalogue sizes; optionally fail on baseline regressions."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--skus", default="1000,10000,50000", help="Comma-separated SKU counts")
+        parser.add_argument("--lines-per-sku", type=int, default=20, help="Sale/purchase lines per SKU")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--output", default="", help="Write the JSON report here")
+        parser.add_argument("--baseline", default="", help="Previous report to compare against")
+        parser.add_argument("--threshold", type=float, default=25.0, help="Allowed regression in percent")
+        parser.add_argument("--min-seconds", type=float, default=0.05, help="Ignore time deltas below this")
+        parser.add_argument("--min-mb", type=float, default=1.0, help="Ignore memory deltas below this")
+
+    def handle(self, *args, **opts):
+        try:
+            scales = [int(s) for s in str(opts["skus"]).split(",") if s.strip()]
+        except ValueError:
+            raise CommandError("--skus must be a comma-separated list of integers")
+
+        if synthetic_data_exists():
+            raise CommandError("Synthetic data from benchmark_scale is present; run benchmark_scale --purge first.")
+
+        results = {}
+        for skus in scales:
+            self.stdout.write(f"Benchmarking {skus} SKUs…")
+            timings = run_job_suite(skus, opts["lines_per_sku"], opts["seed"], log=self.stdout.write)
+            results[str(skus)] = timings
+            for job, m in timings.items():
+                self.stdout.write(
+                    f"    {job:40} {m['seconds']:8.3f}s  {m['peak_mb']:8.1f} MB  {m['queries']:6d} queries"
+                )
+
+        report = {
+            "generated_at": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "lines_per_sku": opts["lines_per_sku"],
+            "results": results,
+        }
+        if opts["output"]:
+            Path(opts["output"]).write_text(json.dumps(report, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+            self.stdout.write(self.style.SUCCESS(f"Report written to {opts['output']}"))
+
+        if opts["baseline"]:
+            try:
+                baseline = json.loads(Path(opts["baseline"]).read_text(encoding="utf-8"))
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read baseline {opts['baseline']}: {exc}")
+            problems = find_regressions(
+                results,
+                baseline.get("results", {}),
+                opts["threshold"],
+                min_seconds=opts["min_seconds"],
+                min_mb=opts["min_mb"],
+            )
+            if problems:
+                raise CommandError(
+                    f"{len(problems)} regression(s) over {opts['threshold']:.0f}%:\n" + "\n".join(problems)
+                )
+            self.stdout.write(self.style.SUCCESS(f"No regressions over {opts['threshold']:.0f}% vs baseline."))
@@ -0,0 +1,216 @@
+"""
+Generate a production-sized synthetic dataset and time the key pages.
+
+Each view is requested through Django's test client as a manager user (one
+warm-up request, then ``--repeat`` timed requests). The JSON report records
+latency percentiles and SQL query counts per view plus the dataset size, so
+two reports (e.g. before/after a change) can be compared with ``--compare``.
+
+Usage:
+  python manage.py benchmark_scale --items 10000 --order-lines 2000000 --notifications 1000000
+  python manage.py benchmark_scale --skip-generate --output after.json --compare before.json
+  python manage.py benchmark_scale --purge
+"""
+
+from __future__ import annotations
+
+import json
+import statistics
+import subprocess
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client as HttpClient
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from inventory import request_metrics
+from inventory.models import Item, Notification, OrderLine
+from inventory.synthetic_data import (
+    SyntheticSpec,
+    generate_synthetic_data,
+    purge_synthetic_data,
+    synthetic_data_exists,
+)
+
+BENCH_USERNAME = "syn_bench_manager"
+
+# (label, url name, query params)
+VIEWS = [
+    ("dashboard", "dashboard", {}),
+    ("item_list", "item_list", {}),
+    ("order_list", "order_list", {}),
+    ("contacts_list", "contacts_list", {}),
+    ("alerts_list", "alerts_list", {}),
+    ("global_search", "global_search", {"q": "SYN Item 12"}),
+]
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = max(0, min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            timeout=5,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic data with bulk_create and time key views; writes a JSON report."
+
+    def add_arguments(self, parser):
+        defaults = SyntheticSpec()
+        parser.add_argument("--items", type=int, default=defaults.items)
+        parser.add_argument("--order-lines", type=int, default=defaults.order_lines)
+        parser.add_argument("--lines-per-order", type=int, default=defaults.lines_per_order)
+        parser.add_argument("--customers", type=int, default=defaults.customers)
+        parser.add_argument("--suppliers", type=int, default=defaults.suppliers)
+        parser.add_argument("--locations", type=int, default=defaults.locations)
+        parser.add_argument("--categories", type=int, default=defaults.categories)
+        parser.add_argument("--notifications", type=int, default=defaults.notifications)
+        parser.add_argument("--users", type=int, default=defaults.users)
+        parser.add_argument("--history-days", type=int, default=defaults.history_days)
+        parser.add_argument("--seed", type=int, default=defaults.seed)
+        parser.add_argument("--skip-generate", action="store_true", help="Time views against existing data")
+        parser.add_argument("--generate-only", action="store_true", help="Generate data, skip view timings")
+        parser.add_argument("--purge", action="store_true", help="Delete previously generated synthetic rows and exit")
+        parser.add_argument("--repeat", type=int, default=5, help="Timed requests per view (default 5)")
+        parser.add_argument(
+            "--output",
+            default="benchmark_report.json",
+            help="Report path (default benchmark_report.json; '-' for stdout)",
+        )
+        parser.add_argument("--compare", help="Previous report to print per-view deltas against")
+
+    def handle(self, *args, **opts):
+        log = lambda msg: self.stdout.write(msg)  # noqa: E731
+
+        if opts["purge"]:
+            purge_synthetic_data(log=log)
+            return
+
+        report = {
+            "generated_at": timezone.now().isoformat(),
+            "git_commit": _git_commit(),
+            "database": connection.vendor,
+            "generation": None,
+            "dataset": {},
+            "views": {},
+        }
+
+        if not opts["skip_generate"] and synthetic_data_exists():
+            raise CommandError(
+                "Synthetic data from an earlier run is still present. Run with --purge first, "
+                "or with --skip-generate to time the views against it."
+            )
+
+        if not opts["skip_generate"]:
+            spec = SyntheticSpec(
+                items=opts["items"],
+                order_lines=opts["order_lines"],
+                lines_per_order=opts["lines_per_order"],
+                customers=opts["customers"],
+                suppliers=opts["suppliers"],
+                locations=opts["locations"],
+                categories=opts["categories"],
+                notifications=opts["notifications"],
+                users=opts["users"],
+                history_days=opts["history_days"],
+                seed=opts["seed"],
+            )
+            t0 = time.perf_counter()
+            result = generate_synthetic_data(spec, log=log)
+            elapsed = time.perf_counter() - t0
+            report["generation"] = {"seconds": round(elapsed, 2), "created": result.counts}
+            self.stdout.write(self.style.SUCCESS(f"Generated in {elapsed:.1f}s: {result.counts}"))
+
+        report["dataset"] = {
+            "items": Item.objects.count(),
+            "order_lines": OrderLine.objects.count(),
+            "notifications": Notification.objects.count(),
+        }
+
+        if not opts["generate_only"]:
+            report["views"] = self._time_views(max(1, opts["repeat"]))
+
+        self._write(report, opts["output"])
+        if opts["compare"]:
+            self._compare(report, opts["compare"])
+
+    def _bench_user(self):
+        User = get_user_model()
+        user, _ = User.objects.get_or_create(username=BENCH_USERNAME)
+        user.groups.add(Group.objects.get_or_create(name="Manager")[0])
+        return user
+
+    def _time_views(self, repeat):
+        http = HttpClient()
+        http.force_login(self._bench_user())
+        results = {}
+        with override_settings(ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ["testserver"]):
+            for label, url_name, params in VIEWS:
+                url = reverse(url_name)
+                status = http.get(url, params).status_code  # warm-up (caches, imports)
+                timings, queries = [], []
+                for _ in range(repeat):
+                    with request_metrics.collect() as stats:
+                        t0 = time.perf_counter()
+                        status = http.get(url, params).status_code
+                        timings.append((time.perf_counter() - t0) * 1000)
+                    queries.append(stats.sql_count)
+                results[label] = {
+                    "status": status,
+                    "runs": repeat,
+                    "min_ms": round(min(timings), 2),
+                    "median_ms": round(statistics.median(timings), 2),
+                    "p95_ms": round(_percentile(timings, 95), 2),
+                    "max_ms": round(max(timings), 2),
+                    "queries": max(queries),
+                }
+                self.stdout.write(
+                    f"{label:15} {results[label]['median_ms']:9.1f} ms median  "
+                    f"{results[label]['queries']:5d} queries  (HTTP {status})"
+                )
+        return results
+
+    def _write(self, report, output):
+        payload = json.dumps(report, indent=2, sort_keys=True)
+        if output == "-":
+            self.stdout.write(payload)
+            return
+        Path(output).write_text(payload + "\n", encoding="utf-8")
+        self.stdout.write(self.style.SUCCESS(f"Report written to {output}"))
+
+    def _compare(self, report, previous_path):
+        try:
+            previous = json.loads(Path(previous_path).read_text(encoding="utf-8"))
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Cannot read {previous_path}: {exc}")
+        self.stdout.write(f"\nvs {previous_path} ({previous.get('git_commit') or 'unknown commit'}):")
+        for label, now in report["views"].items():
+            before = previous.get("views", {}).get(label)
+            if not before:
+                continue
+            delta = (now["median_ms"] - before["median_ms"]) / before["median_ms"] * 100 if before["median_ms"] else 0.0
+            self.stdout.write(
+                f"{label:15} {before['median_ms']:9.1f} → {now['median_ms']:9.1f} ms ({delta:+.1f}%)  "
+                f"queries {before['queries']} → {now['queries']}"
+            )
@@ -271,6 +271,7 @@ class Command(BaseCommand):
                 ord_.order_date = new_dt.date()
                 ord_.created_at = new_dt
             if orders_to_shift:
+                # Also moves each order's lines (their order_date copy), in this transaction.
                 Order.objects.bulk_update(orders_to_shift, ["order_date", "created_at"], batch_size=400)
 
             remap_start = datetime(2025, 1, 1).date()
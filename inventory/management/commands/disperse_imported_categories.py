@@ -19,6 +19,7 @@ from django.core.management.base import BaseCommand
 from django.db import transaction
 
 from inventory.models import Category, Item
+from inventory.tree_service import bump_tree_version
 
 
 # (display_name, lowercase keyword substrings) — first match wins; put specific before broad.
@@ -230,6 +231,7 @@ class Command(BaseCommand):
         with transaction.atomic():
             if to_update:
                 Item.objects.bulk_update(to_update, ["category"], batch_size=500)
+                bump_tree_version("category")
 
         self.stdout.write(
             self.style.SUCCESS(
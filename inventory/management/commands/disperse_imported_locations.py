@@ -19,6 +19,7 @@ from django.core.management.base import BaseCommand
 from django.db import transaction
 
 from inventory.models import Item, Location
+from inventory.tree_service import bump_tree_version
 
 
 # (location_name, lowercase keyword substrings) — first match wins; specific before broad.
@@ -210,6 +211,7 @@ class Command(BaseCommand):
         with transaction.atomic():
             if to_update:
                 Item.objects.bulk_update(to_update, ["location"], batch_size=500)
+                bump_tree_version("location")
 
         self.stdout.write(
             self.style.SUCCESS(
@@ -0,0 +1,50 @@
+"""
+Pre-create monthly partitions for orders, order lines and activity (PostgreSQL).
+
+Same routine as the daily ``ensure_partitions_task`` (see
+inventory.partitioning). It creates partitions for the current month and
+the next ``--months-ahead`` months, and splits out any month that has rows
+sitting in a DEFAULT partition. It does nothing on SQLite or while
+DB_PARTITIONING is off.
+
+Usage:
+  python manage.py ensure_partitions
+  python manage.py ensure_partitions --months-ahead 12
+  python manage.py ensure_partitions --convert   # after switching DB_PARTITIONING on
+  python manage.py ensure_partitions --json
+"""
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import job_runs
+from inventory.partitioning import ensure_partitions
+
+
+class Command(BaseCommand):
+    help = "Create upcoming monthly partitions (and optionally convert plain tables) on PostgreSQL."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=None,
+            help=f"Months to create past the current one (default DB_PARTITION_MONTHS_AHEAD={settings.DB_PARTITION_MONTHS_AHEAD})",
+        )
+        parser.add_argument("--convert", action="store_true", help="Convert tables that are not partitioned yet")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    def handle(self, *args, **opts):
+        if opts["months_ahead"] is not None and opts["months_ahead"] < 0:
+            raise CommandError("--months-ahead cannot be negative")
+        with job_runs.track("ensure_partitions", trace_memory=True) as run:
+            report = ensure_partitions(months_ahead=opts["months_ahead"], convert=opts["convert"])
+            run.add_rows(created=len(report.created), rows_moved=report.rows_moved)
+        if opts["json"]:
+            self.stdout.write(json.dumps(report.as_json(), indent=2))
+            return
+        for name in report.created:
+            self.stdout.write(f"created {name}")
+        style = self.style.SUCCESS if report.enabled else self.style.WARNING
+        self.stdout.write(style(report.summary()))
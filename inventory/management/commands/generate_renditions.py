@@ -0,0 +1,46 @@
+"""
+Generate the WebP thumbnails for every uploaded image (items, suppliers,
+clients, locations and profile avatars).
+
+New uploads get their renditions in the background; run this once for images
+uploaded before renditions existed, or after restoring MEDIA_ROOT. Files that
+already have all their renditions are skipped unless --force is given.
+
+Usage:
+  python manage.py generate_renditions
+  python manage.py generate_renditions --force
+"""
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from inventory.renditions import IMAGE_FIELDS, generate
+
+
+class Command(BaseCommand):
+    help = "Generate WebP thumbnail renditions for all uploaded images."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Re-render renditions that already exist")
+
+    def handle(self, *args, **opts):
+        names = set()
+        for label, field in IMAGE_FIELDS:
+            model = apps.get_model(label)
+            names.update(
+                model.objects.exclude(**{f"{field}__isnull": True}).exclude(**{field: ""})
+                .values_list(field, flat=True)
+            )
+
+        sources = written = failed = 0
+        for name in sorted(names):
+            try:
+                written += generate(name, force=opts["force"])
+            except Exception as exc:  # unreadable, missing or oversized file; keep going
+                failed += 1
+                self.stderr.write(f"  {name}: {exc}")
+                continue
+            sources += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Renditions: {written} file(s) written for {sources} image(s); {failed} failed.")
+        )
@@ -0,0 +1,65 @@
+"""
+Create or update stock items by SKU from a CSV or XLSX file.
+
+Same rules as the "Import items" page (see inventory.item_import): headers
+name Item fields, category/supplier/location are given by name, blank cells
+leave existing values alone. Invalid rows are skipped and listed; use
+--errors to write the full per-row report to a CSV file.
+
+Usage:
+  python manage.py import_items catalogue.csv
+  python manage.py import_items catalogue.xlsx --dry-run --errors errors.csv
+  python manage.py import_items catalogue.csv --user alice
+"""
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.item_import import BATCH_ROWS, ItemImportError, import_items
+
+
+class Command(BaseCommand):
+    help = "Upsert items by SKU from a CSV/XLSX file, with a per-row error report."
+
+    def add_arguments(self, parser):
+        parser.add_argument("file_path", help="CSV or .xlsx file with a header row")
+        parser.add_argument("--dry-run", action="store_true", help="Validate only; write nothing")
+        parser.add_argument("--errors", help="Write the per-row error report to this CSV file")
+        parser.add_argument("--user", help="Username recorded on the stock movements and activity")
+        parser.add_argument("--encoding", default="utf-8-sig", help="CSV encoding (default utf-8-sig)")
+        parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS, help=f"Rows per batch (default {BATCH_ROWS})")
+
+    def handle(self, *args, **opts):
+        user = None
+        if opts["user"]:
+            user = get_user_model().objects.filter(username=opts["user"]).first()
+            if user is None:
+                raise CommandError(f"No user named {opts['user']!r}")
+
+        path = Path(opts["file_path"])
+        try:
+            with path.open("rb") as f:
+                report = import_items(
+                    f,
+                    path.name,
+                    user=user,
+                    dry_run=opts["dry_run"],
+                    encoding=opts["encoding"],
+                    batch_rows=max(1, opts["batch_rows"]),
+                )
+        except (OSError, ItemImportError) as exc:
+            raise CommandError(str(exc))
+
+        if report.ignored_columns:
+            self.stdout.write(self.style.WARNING(f"Ignored columns: {', '.join(report.ignored_columns)}"))
+        for row, sku, column, message in report.errors[:20]:
+            self.stdout.write(f"  row {row} ({sku or 'no SKU'}) {column}: {message}")
+        if len(report.errors) > 20:
+            self.stdout.write(f"  … {len(report.errors) - 20} more")
+        if opts["errors"] and report.errors:
+            Path(opts["errors"]).write_text(report.errors_csv(), encoding="utf-8")
+            self.stdout.write(f"Error report written to {opts['errors']}")
+
+        style = self.style.SUCCESS if not report.error_rows else self.style.WARNING
+        self.stdout.write(style(("Dry run: " if report.dry_run else "Import complete: ") + report.summary()))
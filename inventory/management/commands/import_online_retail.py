@@ -1,103 +1,63 @@
-import pandas as pd
-from django.core.management.base import BaseCommand
-from django.utils import timezone
-from django.db import transaction
+"""
+Import the UCI Online Retail dataset (xlsx or CSV export) as items and sale orders.
+
+Only the best-selling --top-items SKUs over the last --months of the file are
+imported. Each invoice becomes one delivered sale order with a line per SKU.
+The file is streamed in chunks and written in bulk (COPY on PostgreSQL), see
+inventory.retail_import. Progress is checkpointed after every chunk, so
+rerunning an interrupted import resumes where it stopped.
+
+Usage:
+  python manage.py import_online_retail "Online Retail.xlsx"
+  python manage.py import_online_retail online_retail.csv --top-items 0 --months 24
+  python manage.py import_online_retail online_retail.csv --restart
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.retail_import import CHUNK_ROWS, RetailImportError, import_online_retail
 
-from inventory.models import Item, Order, Category, Supplier, Location
 
 class Command(BaseCommand):
     help = "Import UCI Online Retail dataset into WareWolf (SME-sized slice)."
 
     def add_arguments(self, parser):
-        parser.add_argument("file_path", type=str, help="Path to Online Retail.xlsx")
-        parser.add_argument("--top-items", type=int, default=100, help="How many SKUs to import (default 100)")
+        parser.add_argument("file_path", type=str, help="Path to Online Retail.xlsx (or a CSV export)")
+        parser.add_argument("--top-items", type=int, default=100, help="How many SKUs to import (default 100; 0 = all)")
         parser.add_argument("--months", type=int, default=12, help="How many months from end of dataset (default 12)")
-
-    @transaction.atomic
-    def handle(self, *args, **options):
-        file_path = options["file_path"]
-        top_n = options["top_items"]
-        months = options["months"]
-
-        self.stdout.write(self.style.WARNING(f"Loading dataset: {file_path}"))
-        df = pd.read_excel(file_path)
-
-        # Expected columns in UCI file:
-        # InvoiceNo, StockCode, Description, Quantity, InvoiceDate, UnitPrice, CustomerID, Country
-        df = df.dropna(subset=["StockCode", "Description", "InvoiceDate", "Quantity"])
-        df["InvoiceDate"] = pd.to_datetime(df["InvoiceDate"])
-        df["Quantity"] = pd.to_numeric(df["Quantity"], errors="coerce").fillna(0)
-
-        # Keep only positive quantities (sales). Returns/cancellations are negative/zero.
-        df = df[df["Quantity"] > 0]
-
-        # Limit timeframe to last N months to simulate SME history
-        end_date = df["InvoiceDate"].max()
-        start_date = end_date - pd.DateOffset(months=months)
-        df = df[df["InvoiceDate"].between(start_date, end_date)]
-
-        # Pick top N items by total quantity sold
-        top_items = (
-            df.groupby("StockCode")["Quantity"].sum()
-            .sort_values(ascending=False)
-            .head(top_n)
-            .index
+        parser.add_argument(
+            "--chunk-rows", type=int, default=CHUNK_ROWS, help=f"Source rows per write batch (default {CHUNK_ROWS})"
         )
-        df = df[df["StockCode"].isin(top_items)]
-
-        # Aggregate to daily demand per SKU (prevents huge Order counts)
-        df["order_date"] = df["InvoiceDate"].dt.date
-        daily = (
-            df.groupby(["StockCode", "Description", "order_date"])["Quantity"]
-            .sum()
-            .reset_index()
+        parser.add_argument("--encoding", default="utf-8-sig", help="CSV encoding (e.g. latin-1 for the UCI export)")
+        parser.add_argument(
+            "--checkpoint", help="Checkpoint file (default: <file_path>.checkpoint.json)"
         )
+        parser.add_argument("--restart", action="store_true", help="Ignore any checkpoint and import from the start")
+        parser.add_argument("--no-copy", action="store_true", help="Use INSERTs even on PostgreSQL")
 
-        # Create defaults (so Items have required FK fields)
-        category, _ = Category.objects.get_or_create(name="Imported Dataset")
-        supplier, _ = Supplier.objects.get_or_create(name="Dataset Supplier")
-        location, _ = Location.objects.get_or_create(name="Imported Location")
-
-        created_items = 0
-        created_orders = 0
-
-        for _, row in daily.iterrows():
-            sku = str(row["StockCode"]).strip()
-            name = str(row["Description"]).strip()
-            if not name or name.lower() == "nan":
-                name = f"Item {sku}"
-            name = name[:255]
-            qty = int(row["Quantity"])
-            order_date = row["order_date"]
+    def handle(self, *args, **options):
+        file_path = options["file_path"]
+        checkpoint = options["checkpoint"] or f"{file_path}.checkpoint.json"
+        if options["restart"]:
+            from pathlib import Path
 
-            item, created = Item.objects.get_or_create(
-                sku=sku,
-                defaults={
-                    "name": name,
-                    "category": category,
-                    "supplier": supplier,
-                    "location": location,
-                    "quantity": 0,
-                    "reorder_level": 10,
-                    "unit_cost": 1.00,
-                    "lead_time_days": 7,
-                    "safety_stock": 0,
-                }
-            )
-            if created:
-                created_items += 1
+            Path(checkpoint).unlink(missing_ok=True)
 
-            # Create a SALE order per day per SKU
-            Order.objects.create(
-                item=item,
-                order_type=Order.TYPE_SALE,
-                quantity=qty,
-                order_date=order_date,
-                unit_price=item.unit_cost,
-                status=Order.STATUS_DELIVERED,
+        self.stdout.write(self.style.WARNING(f"Loading dataset: {file_path}"))
+        try:
+            result = import_online_retail(
+                file_path,
+                months=options["months"],
+                top_items=options["top_items"],
+                chunk_rows=max(1, options["chunk_rows"]),
+                checkpoint_path=checkpoint,
+                encoding=options["encoding"],
+                use_copy=False if options["no_copy"] else None,
+                log=self.stdout.write,
             )
-            created_orders += 1
+        except (OSError, RetailImportError) as exc:
+            raise CommandError(str(exc))
 
         self.stdout.write(self.style.SUCCESS(
-            f"Import complete. Items created: {created_items}, Orders created: {created_orders}"
-        ))
\ No newline at end of file
+            f"Import complete in {result.seconds}s. Items created: {result.items_created}, "
+            f"Orders created: {result.orders_created}, Order lines created: {result.lines_created}"
+        ))
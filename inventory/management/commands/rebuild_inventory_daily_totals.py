@@ -0,0 +1,24 @@
+"""
+Backfill InventoryDailyTotal from current stock and the StockMovement ledger.
+
+Run once after deploying the table (or after bulk data fixes) so the dashboard
+trend chart can read its whole window from the table.
+
+Usage:
+  python manage.py rebuild_inventory_daily_totals
+  python manage.py rebuild_inventory_daily_totals --days 180
+"""
+from django.core.management.base import BaseCommand
+
+from inventory.daily_totals import rebuild_daily_totals
+
+
+class Command(BaseCommand):
+    help = "Recompute daily inventory totals (units, value, active items) for the last N days."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=365, help="Days to rebuild, ending today (default 365)")
+
+    def handle(self, *args, **opts):
+        written = rebuild_daily_totals(days=opts["days"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} daily total rows."))
@@ -0,0 +1,20 @@
+"""
+Refill the ScanCode lookup table from every item's SKU, barcode and serial numbers.
+
+Saving an item through the app keeps its codes in sync; run this after bulk
+imports (bulk_create skips signals), fixture loads or direct SQL edits.
+
+Usage:
+  python manage.py rebuild_scan_codes
+"""
+from django.core.management.base import BaseCommand
+
+from inventory.scan_codes import rebuild_scan_codes
+
+
+class Command(BaseCommand):
+    help = "Rebuild the scan-code lookup table (SKU, barcode and serial number → item)."
+
+    def handle(self, *args, **opts):
+        count = rebuild_scan_codes()
+        self.stdout.write(self.style.SUCCESS(f"Scan codes rebuilt: {count} code(s)."))
@@ -0,0 +1,23 @@
+"""
+Recompute the stored tree paths (tree_path, depth, ancestor_ids, name_path)
+for Locations and Categories from their parent links.
+
+Saving a node through the app keeps these in sync; run this after bulk
+imports, fixture loads or direct SQL edits.
+
+Usage:
+  python manage.py rebuild_tree_paths
+"""
+from django.core.management.base import BaseCommand
+
+from inventory.models import Category, Location
+
+
+class Command(BaseCommand):
+    help = "Rebuild materialized tree paths for Locations and Categories."
+
+    def handle(self, *args, **opts):
+        for model in (Location, Category):
+            changed = model.rebuild_tree_paths()
+            self.stdout.write(f"{model._meta.verbose_name_plural.title()}: {changed} row(s) updated.")
+        self.stdout.write(self.style.SUCCESS("Tree paths rebuilt."))
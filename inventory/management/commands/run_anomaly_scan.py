@@ -1,4 +1,13 @@
+"""
+Run the demand anomaly scan (see inventory.anomaly_shards for the sharding).
+
+Usage:
+  python manage.py run_anomaly_scan
+  python manage.py run_anomaly_scan --pool thread --workers 4
+  python manage.py run_anomaly_scan --celery   # fan out over workers; local pool if no broker
+"""
 from django.core.management.base import BaseCommand
+from inventory import anomaly_shards, job_runs
 from inventory.alerts_jobs import run_anomaly_scan_and_notify
 
 class Command(BaseCommand):
@@ -35,9 +44,21 @@ class Command(BaseCommand):
             dest="sparse_abs_min_qty",
             help="When history is very sparse (MAD=0), only flag if quantity is at least this much.",
         )
+        parser.add_argument(
+            "--pool",
+            choices=["process", "thread", "inline"],
+            default=None,
+            help="Local pool for the shards (default ANOMALY_SCAN_LOCAL_POOL).",
+        )
+        parser.add_argument("--workers", type=int, default=None, help="Local pool size (default one per CPU).")
+        parser.add_argument(
+            "--celery",
+            action="store_true",
+            help="Queue the scan as a Celery chord of shards; runs locally when the broker is unreachable.",
+        )
 
     def handle(self, *args, **opts):
-        summary = run_anomaly_scan_and_notify(
+        scan_kwargs = dict(
             days_back=opts["days_back"],
             last_n_days_only=opts["recent_days"],
             min_points=opts["min_points"],
@@ -47,6 +68,16 @@ class Command(BaseCommand):
             max_recent_days_per_item=opts["max_recent_days_per_item"],
             sparse_abs_min_qty=opts["sparse_abs_min_qty"],
         )
+        if opts["celery"]:
+            if anomaly_shards.broker_available():
+                from inventory.tasks import run_anomaly_scan_task
+
+                run_anomaly_scan_task.delay(**scan_kwargs)
+                self.stdout.write(self.style.SUCCESS("Anomaly scan queued on Celery."))
+                return
+            self.stdout.write(self.style.WARNING("Celery broker unreachable; scanning locally."))
+        with job_runs.track("anomaly_scan", trace_memory=True):
+            summary = run_anomaly_scan_and_notify(**scan_kwargs, pool=opts["pool"], workers=opts["workers"])
         self.stdout.write(self.style.SUCCESS(
             f"Detected {summary['detected']} anomalies. "
             f"New records: {summary['created']}. "
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from inventory.stock_ledger import prune_checkpoints, take_checkpoint
+
+
+class Command(BaseCommand):
+    help = "Snapshot every item's quantity as a StockCheckpoint (base for stock-as-of queries)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--prune-days",
+            type=int,
+            default=None,
+            help="Also delete checkpoint runs older than N days (the newest run is always kept).",
+        )
+
+    def handle(self, *args, **opts):
+        written = take_checkpoint()
+        msg = f"Checkpointed {written} items."
+        if opts["prune_days"] is not None:
+            pruned = prune_checkpoints(opts["prune_days"])
+            msg += f" Pruned {pruned} old checkpoint rows."
+        self.stdout.write(self.style.SUCCESS(msg))
@@ -0,0 +1,74 @@
+"""
+Mark many orders delivered, shipped or cancelled in one transaction.
+
+Same rules as the bulk actions on the Orders page (see
+inventory.order_transitions): deliveries apply their stock as one batch, and
+orders that cannot move (wrong status, not enough stock) are reported and
+skipped while the rest go through.
+
+Usage:
+  python manage.py transition_orders delivered 101 102 103
+  python manage.py transition_orders shipped --reference-prefix PO-2024-
+  python manage.py transition_orders cancelled 7 8 --user alice --json
+"""
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.models import Order
+from inventory.order_transitions import MAX_ORDERS, TRANSITIONS, transition_orders
+
+TARGETS = {
+    "delivered": Order.STATUS_DELIVERED,
+    "shipped": Order.STATUS_SHIPPED,
+    "cancelled": Order.STATUS_CANCELLED,
+}
+
+
+class Command(BaseCommand):
+    help = "Bulk-transition orders (delivered/shipped/cancelled) with a per-order report."
+
+    def add_arguments(self, parser):
+        parser.add_argument("status", choices=sorted(TARGETS), help="Status to move the orders to")
+        parser.add_argument("order_ids", nargs="*", type=int, help="Order ids")
+        parser.add_argument(
+            "--reference-prefix",
+            help="Also select every order whose reference starts with this prefix and that can make the move",
+        )
+        parser.add_argument("--user", help="Username recorded on the stock movements and activity")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    def handle(self, *args, **opts):
+        target = TARGETS[opts["status"]]
+        ids = list(opts["order_ids"])
+        if opts["reference_prefix"]:
+            ids += list(
+                Order.objects.filter(
+                    reference__startswith=opts["reference_prefix"], status__in=TRANSITIONS[target]
+                ).order_by("pk").values_list("pk", flat=True)
+            )
+        if not ids:
+            raise CommandError("No orders given.")
+
+        user = None
+        if opts["user"]:
+            user = get_user_model().objects.filter(username=opts["user"]).first()
+            if user is None:
+                raise CommandError(f"No user named {opts['user']!r}")
+
+        ids = list(dict.fromkeys(ids))
+        outcomes = []
+        for i in range(0, len(ids), MAX_ORDERS):
+            outcomes += transition_orders(ids[i : i + MAX_ORDERS], target, actor=user).outcomes
+
+        if opts["json"]:
+            self.stdout.write(json.dumps([o.as_json() for o in outcomes], indent=2))
+            return
+        failed = [o for o in outcomes if not o.ok]
+        for outcome in failed:
+            self.stdout.write(f"  order #{outcome.order_id}: {outcome.error}")
+        style = self.style.SUCCESS if not failed else self.style.WARNING
+        self.stdout.write(
+            style(f"{len(outcomes) - len(failed)} order(s) marked {opts['status']}, {len(failed)} failed.")
+        )
@@ -0,0 +1,163 @@
+"""
+Manual ("Run scan") demand anomaly scans, always off the request thread.
+
+``start_scan(user)`` queues a scan and returns at once:
+
+- The scan's ``JobRun`` is the progress record. It is created ``queued``
+  and holds ``lock="anomaly_scan"``, a unique column. A second click fails
+  that insert and attaches to the scan already in progress instead of
+  starting another one. A run whose row has not moved for
+  ``ANOMALY_SCAN_STALE_MINUTES`` is treated as dead and its lock released:
+  the worker was killed, or the broker lost the message.
+- Once the row is committed, the scan goes to Celery
+  (``run_anomaly_scan_task`` with ``run_id``) when the broker answers.
+  Otherwise it runs on a daemon thread in this process. That thread uses the
+  thread pool for the shards, because forking a web worker that has other
+  threads is not safe. Both paths update the same row as the stages and
+  shards finish (see ``inventory.job_runs``). The thread path records no
+  peak memory: tracemalloc would trace the whole web worker.
+
+The session remembers the run a user started or attached to. While it is
+active, the bottom banner shows its stage and shard progress and polls
+``anomaly_scan_status`` every few seconds. Polling is used rather than SSE,
+because an open event stream would pin a gunicorn worker for the whole
+scan, which is what this module exists to avoid. When the run ends,
+``watched_run`` forgets it. Users who only attached get the result banner
+built from the run's row counters. The user who started it gets the banner
+from the scan itself, the same way scheduled and queued scans record theirs.
+"""
+from __future__ import annotations
+
+import datetime
+import logging
+import threading
+
+from django.conf import settings
+from django.contrib import messages
+from django.db import IntegrityError, connections, transaction
+from django.utils import timezone
+
+from . import anomaly_shards, job_runs
+from .anomaly_scan_notifications import record_anomaly_scan, record_anomaly_scan_completion_for_user
+from .models import JobRun
+
+logger = logging.getLogger(__name__)
+
+LOCK = "anomaly_scan"
+SESSION_KEY = "anomaly_scan_run"
+
+
+def _stale_cutoff(now):
+    return now - datetime.timedelta(minutes=settings.ANOMALY_SCAN_STALE_MINUTES)
+
+
+def release_stale(now=None):
+    """Fail manual scans that stopped reporting progress, freeing the lock for a new one."""
+    now = now or timezone.now()
+    return JobRun.objects.filter(lock=LOCK, updated_at__lt=_stale_cutoff(now)).update(
+        status=JobRun.STATUS_FAILED,
+        error=f"Abandoned: no progress for {settings.ANOMALY_SCAN_STALE_MINUTES} minutes",
+        finished_at=now,
+        updated_at=now,
+        stage="",
+        lock=None,
+    )
+
+
+def start_scan(user):
+    """Queue a manual scan, or attach to the one in progress; returns ``(run, started)``."""
+    release_stale()
+    for _ in range(3):
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                run = JobRun.objects.create(
+                    name=LOCK,
+                    user=user,
+                    status=JobRun.STATUS_QUEUED,
+                    stage="queued",
+                    lock=LOCK,
+                    started_at=now,
+                    updated_at=now,
+                )
+        except IntegrityError:
+            running = JobRun.objects.filter(lock=LOCK).first()
+            if running:
+                return running, False
+            continue  # it finished between our insert and the lookup
+        transaction.on_commit(lambda: _dispatch(run.pk, user.pk))
+        return run, True
+    raise RuntimeError("Could not queue an anomaly scan")
+
+
+def _dispatch(run_id, user_id):
+    from .tasks import run_anomaly_scan_task
+
+    if anomaly_shards.broker_available():
+        try:
+            run_anomaly_scan_task.delay(user_id=user_id, run_id=run_id)
+            return
+        except Exception:
+            logger.warning("Queueing anomaly scan %s on Celery failed; running it in-process", run_id, exc_info=True)
+    threading.Thread(
+        target=_run_in_thread, args=(run_id, user_id), name=f"warewolf-anomaly-scan-{run_id}", daemon=True
+    ).start()
+
+
+def run_scan(run_id, user_id):
+    """The in-process scan for run ``run_id``; failures are recorded on the run, not raised."""
+    from .alerts_jobs import run_anomaly_scan_and_notify
+
+    try:
+        with job_runs.track(LOCK, user_id=user_id, run_id=run_id, trace_memory=False):
+            result = run_anomaly_scan_and_notify(pool="thread")
+            record_anomaly_scan(result, user_id)
+    except Exception:
+        logger.exception("Manual anomaly scan %s failed", run_id)
+
+
+def _run_in_thread(run_id, user_id):
+    try:
+        run_scan(run_id, user_id)
+    finally:
+        connections.close_all()
+
+
+def watched_run(request):
+    """
+    The scan this session follows, while it is queued or running.
+
+    Once it has ended the session forgets it: attached users get their result
+    banner, and a failure is reported as a message.
+    """
+    run_id = request.session.get(SESSION_KEY)
+    if not run_id:
+        return None
+    run = JobRun.objects.filter(pk=run_id).first()
+    if run and run.is_active and run.updated_at < _stale_cutoff(timezone.now()):
+        release_stale()
+        run.refresh_from_db()
+    if run and run.is_active:
+        return run
+    del request.session[SESSION_KEY]
+    if run and run.status == JobRun.STATUS_OK and run.user_id != request.user.pk:
+        record_anomaly_scan_completion_for_user(request.user, run.rows)
+    elif run and run.status == JobRun.STATUS_FAILED:
+        messages.error(request, f"Anomaly scan failed: {run.error}")
+    return None
+
+
+def progress(run):
+    """JSON payload for the banner poll."""
+    if run is None:
+        return {"active": False}
+    return {
+        "active": True,
+        "id": run.pk,
+        "status": run.status,
+        "stage": run.stage,
+        "done": run.progress_done,
+        "total": run.progress_total,
+        "percent": min(round(100 * run.progress_done / run.progress_total), 100) if run.progress_total else None,
+        "elapsed_seconds": max(int((timezone.now() - run.started_at).total_seconds()), 0),
+    }
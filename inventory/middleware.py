@@ -1,5 +1,7 @@
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
 from django.conf import settings
 from django.core.cache import cache
 from django.utils import timezone as django_timezone
@@ -39,28 +41,104 @@ def _cached_pref(user):
 class UserPreferenceActivationMiddleware:
     """Apply timezone and UI language from UserPreference for authenticated users."""
 
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        if request.user.is_authenticated:
-            pref = _cached_pref(request.user)
-            tzname = (pref.timezone_name or "UTC").strip() or "UTC"
-            try:
-                django_timezone.activate(ZoneInfo(tzname))
-            except (ZoneInfoNotFoundError, ValueError, TypeError):
-                django_timezone.activate(ZoneInfo("UTC"))
-            allowed = _allowed_languages()
-            lang = _normalize_lang(getattr(pref, "language_code", None) or settings.LANGUAGE_CODE, allowed)
-            translation.activate(lang)
-            request.LANGUAGE_CODE = lang
-        else:
-            django_timezone.deactivate()
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        pref = _cached_pref(request.user) if request.user.is_authenticated else None
+        _activate(request, pref)
 
         response = self.get_response(request)
 
-        if request.user.is_authenticated:
+        if pref is not None:
             translation.deactivate()
             django_timezone.deactivate()
 
         return response
+
+    async def __acall__(self, request):
+        user = await request.auser()
+        pref = await sync_to_async(_cached_pref)(user) if user.is_authenticated else None
+        _activate(request, pref)
+
+        response = await self.get_response(request)
+
+        if pref is not None:
+            translation.deactivate()
+            django_timezone.deactivate()
+
+        return response
+
+
+def _activate(request, pref):
+    if pref is None:
+        django_timezone.deactivate()
+        return
+    tzname = (pref.timezone_name or "UTC").strip() or "UTC"
+    try:
+        django_timezone.activate(ZoneInfo(tzname))
+    except (ZoneInfoNotFoundError, ValueError, TypeError):
+        django_timezone.activate(ZoneInfo("UTC"))
+    allowed = _allowed_languages()
+    lang = _normalize_lang(getattr(pref, "language_code", None) or settings.LANGUAGE_CODE, allowed)
+    translation.activate(lang)
+    request.LANGUAGE_CODE = lang
+
+
+class RequestMetricsMiddleware:
+    """
+    Record SQL count/time, template time and latency per view.
+
+    See ``inventory.request_metrics`` for where the numbers go (``/metrics``,
+    optional JSONL file) and how query budgets are configured.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not getattr(settings, "REQUEST_METRICS_ENABLED", True):
+            return self.get_response(request)
+
+        from . import request_metrics
+
+        with request_metrics.collect() as stats:
+            response = self.get_response(request)
+
+        self._finish(request, response, stats)
+        return response
+
+    async def __acall__(self, request):
+        if not getattr(settings, "REQUEST_METRICS_ENABLED", True):
+            return await self.get_response(request)
+
+        from . import request_metrics
+
+        # Queries run on other threads are counted by async_fanout.
+        with request_metrics.collect() as stats:
+            response = await self.get_response(request)
+
+        self._finish(request, response, stats)
+        return response
+
+    @staticmethod
+    def _finish(request, response, stats):
+        from . import request_metrics
+
+        match = getattr(request, "resolver_match", None)
+        view = (match.view_name if match else "") or "unresolved"
+        request_metrics.finish_request(view, request.method, response.status_code, stats)
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0045_supplier_client_latitude_longitude'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='activity',
+            name='kind',
+            field=models.CharField(choices=[('item_create', 'New item'), ('item_update', 'Item updated'), ('item_adjust', 'Quantity'), ('item_archive', 'Archived'), ('item_unarchive', 'Unarchived'), ('item_delete', 'Deleted'), ('item_hard_delete', 'Permanent delete'), ('item_auto_archive', 'Auto-archived'), ('order_stock', 'Order & stock'), ('anomaly_scan', 'Anomaly scan'), ('other', 'Other')], db_index=True, default='other', max_length=32),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['user', '-timestamp'], name='inventory_a_user_id_528b28_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['-timestamp'], name='inventory_a_timesta_4a0c4b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='demandanomaly',
+            index=models.Index(fields=['dismissed', '-date', '-score'], name='inventory_d_dismiss_68566a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['is_active', 'quantity'], name='inventory_i_is_acti_9f1598_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['barcode'], name='inventory_i_barcode_209767_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'dismissed', 'is_read', '-created_at'], name='inventory_n_user_id_ffb842_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['order_type', 'status', 'order_date'], name='inventory_o_order_t_799a3f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['order_date', 'order_type'], name='inventory_o_order_d_647ff6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderline',
+            index=models.Index(fields=['item', 'order'], name='inventory_o_item_id_736110_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockhistory',
+            index=models.Index(fields=['item', 'date'], name='inventory_s_item_id_601257_idx'),
+        ),
+    ]
@@ -0,0 +1,133 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:13
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+# Backfill the ledger from what we already know so the trend chart keeps its
+# history: delivered orders (dated at noon UTC on the order date) and the
+# legacy "Adjusted quantity for <name>: change of N" activity messages whose
+# item name is unambiguous. Then take a first checkpoint of current stock.
+
+import datetime
+import re
+
+ADJUST_RE = re.compile(r"^Adjusted quantity for (.*): change of ([+-]?\d+)$")
+BATCH = 2000
+
+
+def backfill_ledger(apps, schema_editor):
+    Item = apps.get_model("inventory", "Item")
+    OrderLine = apps.get_model("inventory", "OrderLine")
+    Activity = apps.get_model("inventory", "Activity")
+    StockMovement = apps.get_model("inventory", "StockMovement")
+    StockCheckpoint = apps.get_model("inventory", "StockCheckpoint")
+
+    location_by_item = dict(Item.objects.values_list("id", "location_id"))
+
+    batch = []
+
+    def flush():
+        if batch:
+            StockMovement.objects.bulk_create(batch, batch_size=BATCH)
+            batch.clear()
+
+    lines = (
+        OrderLine.objects.filter(order__status="DELIVERED", order__stock_applied=True)
+        .values_list("id", "item_id", "quantity", "order__order_type", "order__order_date")
+        .order_by("id")
+    )
+    for line_id, item_id, qty, order_type, order_date in lines.iterator(chunk_size=BATCH):
+        purchase = order_type == "PURCHASE"
+        batch.append(
+            StockMovement(
+                item_id=item_id,
+                location_id=location_by_item.get(item_id),
+                delta=qty if purchase else -qty,
+                reason="purchase" if purchase else "sale",
+                order_line_id=line_id,
+                timestamp=datetime.datetime.combine(order_date, datetime.time(12), tzinfo=datetime.timezone.utc),
+            )
+        )
+        if len(batch) >= BATCH:
+            flush()
+
+    ids_by_name = {}
+    for item_id, name in Item.objects.values_list("id", "name"):
+        ids_by_name.setdefault(name, []).append(item_id)
+    adjustments = Activity.objects.filter(kind="item_adjust").values_list("message", "user_id", "timestamp")
+    for message, user_id, ts in adjustments.iterator(chunk_size=BATCH):
+        m = ADJUST_RE.match(message or "")
+        ids = ids_by_name.get(m.group(1)) if m else None
+        if not ids or len(ids) != 1:
+            continue
+        batch.append(
+            StockMovement(
+                item_id=ids[0],
+                location_id=location_by_item.get(ids[0]),
+                delta=int(m.group(2)),
+                reason="adjustment",
+                user_id=user_id,
+                timestamp=ts,
+            )
+        )
+        if len(batch) >= BATCH:
+            flush()
+    flush()
+
+    now = django.utils.timezone.now()
+    checkpoints = []
+    for item_id, location_id, qty in Item.objects.values_list("id", "location_id", "quantity").iterator(chunk_size=BATCH):
+        checkpoints.append(StockCheckpoint(item_id=item_id, location_id=location_id, quantity=qty, taken_at=now))
+        if len(checkpoints) >= BATCH:
+            StockCheckpoint.objects.bulk_create(checkpoints)
+            checkpoints.clear()
+    if checkpoints:
+        StockCheckpoint.objects.bulk_create(checkpoints)
+
+
+def noop_reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0046_hot_path_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('taken_at', models.DateTimeField()),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='inventory.item')),
+                ('location', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_checkpoints', to='inventory.location')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['taken_at', 'item'], name='inventory_s_taken_a_05f565_idx'), models.Index(fields=['item', 'taken_at'], name='inventory_s_item_id_b509e7_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.IntegerField()),
+                ('reason', models.CharField(choices=[('purchase', 'Purchase received'), ('sale', 'Sale shipped'), ('adjustment', 'Manual adjustment'), ('edit', 'Item edited'), ('initial', 'Initial stock'), ('archive', 'Archived'), ('unarchive', 'Unarchived')], max_length=20)),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='inventory.item')),
+                ('location', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='inventory.location')),
+                ('order_line', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='inventory.orderline')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['timestamp', 'id'],
+                'indexes': [models.Index(fields=['item', 'timestamp'], name='inventory_s_item_id_0a6e47_idx'), models.Index(fields=['location', 'timestamp'], name='inventory_s_locatio_15098c_idx'), models.Index(fields=['timestamp'], name='inventory_s_timesta_5aa126_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_ledger, noop_reverse),
+    ]
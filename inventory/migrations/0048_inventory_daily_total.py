@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:16
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0047_stock_movement_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryDailyTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('total_units', models.BigIntegerField(default=0)),
+                ('total_value', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=16)),
+                ('active_items', models.PositiveIntegerField(default=0)),
+                ('finalized', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['date'],
+            },
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:22
+
+from django.db import migrations, models
+
+TREE_FIELDS = ["tree_path", "depth", "ancestor_ids", "name_path"]
+
+
+def _fill(model, separator):
+    nodes = {n.pk: n for n in model.objects.only("id", "parent_id", "name")}
+    children = {}
+    for node in nodes.values():
+        children.setdefault(node.parent_id if node.parent_id in nodes else None, []).append(node)
+    queue = []
+    for node in children.get(None, []):
+        node.tree_path, node.depth, node.ancestor_ids, node.name_path = f"{node.pk}/", 0, [], node.name
+        queue.append(node)
+    while queue:
+        parent = queue.pop()
+        for child in children.get(parent.pk, []):
+            child.tree_path = f"{parent.tree_path}{child.pk}/"
+            child.depth = parent.depth + 1
+            child.ancestor_ids = list(parent.ancestor_ids) + [parent.pk]
+            child.name_path = f"{parent.name_path}{separator}{child.name}"
+            queue.append(child)
+    model.objects.bulk_update([n for n in nodes.values() if n.tree_path], TREE_FIELDS, batch_size=500)
+
+
+def backfill_paths(apps, schema_editor):
+    _fill(apps.get_model("inventory", "Location"), " → ")
+    _fill(apps.get_model("inventory", "Category"), " > ")
+
+
+def noop_reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0048_inventory_daily_total'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='ancestor_ids',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='name_path',
+            field=models.CharField(blank=True, default='', editable=False, max_length=1024),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='tree_path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='ancestor_ids',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='name_path',
+            field=models.CharField(blank=True, default='', editable=False, max_length=1024),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='tree_path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(backfill_paths, noop_reverse),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:56
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+SERIAL_SPLIT = re.compile(r"[\r\n,;]+")
+
+
+def backfill_scan_codes(apps, schema_editor):
+    Item = apps.get_model("inventory", "Item")
+    ScanCode = apps.get_model("inventory", "ScanCode")
+    rows = {"sku": [], "barcode": [], "serial": []}
+    for pk, sku, barcode, serials in Item.objects.values_list("pk", "sku", "barcode", "serial_numbers").iterator(
+        chunk_size=2000
+    ):
+        codes = {s.strip(): "serial" for s in SERIAL_SPLIT.split(serials or "") if s.strip()}
+        if (barcode or "").strip():
+            codes[barcode.strip()] = "barcode"
+        if (sku or "").strip():
+            codes[sku.strip()] = "sku"
+        for code, kind in codes.items():
+            if len(code) <= 191:
+                rows[kind].append(ScanCode(code=code, item_id=pk, kind=kind))
+    for kind in ("sku", "barcode", "serial"):
+        ScanCode.objects.bulk_create(rows[kind], ignore_conflicts=True, batch_size=2000)
+
+
+def noop_reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0049_tree_materialized_paths'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanCode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=191, unique=True)),
+                ('kind', models.CharField(choices=[('sku', 'SKU'), ('barcode', 'Barcode'), ('serial', 'Serial number')], max_length=10)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scan_codes', to='inventory.item')),
+            ],
+        ),
+        migrations.RunPython(backfill_scan_codes, noop_reverse),
+    ]
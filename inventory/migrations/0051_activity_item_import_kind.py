@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0050_scan_code'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='activity',
+            name='kind',
+            field=models.CharField(choices=[('item_create', 'New item'), ('item_update', 'Item updated'), ('item_adjust', 'Quantity'), ('item_archive', 'Archived'), ('item_unarchive', 'Unarchived'), ('item_delete', 'Deleted'), ('item_hard_delete', 'Permanent delete'), ('item_auto_archive', 'Auto-archived'), ('item_import', 'Item import'), ('order_stock', 'Order & stock'), ('anomaly_scan', 'Anomaly scan'), ('other', 'Other')], db_index=True, default='other', max_length=32),
+        ),
+    ]
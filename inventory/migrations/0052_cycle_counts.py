@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:22
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0051_activity_item_import_kind'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='activity',
+            name='kind',
+            field=models.CharField(choices=[('item_create', 'New item'), ('item_update', 'Item updated'), ('item_adjust', 'Quantity'), ('item_archive', 'Archived'), ('item_unarchive', 'Unarchived'), ('item_delete', 'Deleted'), ('item_hard_delete', 'Permanent delete'), ('item_auto_archive', 'Auto-archived'), ('item_import', 'Item import'), ('cycle_count', 'Cycle count'), ('order_stock', 'Order & stock'), ('anomaly_scan', 'Anomaly scan'), ('other', 'Other')], db_index=True, default='other', max_length=32),
+        ),
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='reason',
+            field=models.CharField(choices=[('purchase', 'Purchase received'), ('sale', 'Sale shipped'), ('adjustment', 'Manual adjustment'), ('edit', 'Item edited'), ('initial', 'Initial stock'), ('archive', 'Archived'), ('unarchive', 'Unarchived'), ('cycle_count', 'Cycle count')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='CycleCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=120)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('approved', 'Approved'), ('cancelled', 'Cancelled')], default='open', max_length=10)),
+                ('notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('approved_at', models.DateTimeField(blank=True, null=True)),
+                ('adjusted_items', models.PositiveIntegerField(default=0)),
+                ('net_change', models.IntegerField(default=0)),
+                ('approved_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cycle_counts_approved', to=settings.AUTH_USER_MODEL)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cycle_counts_created', to=settings.AUTH_USER_MODEL)),
+                ('location', models.ForeignKey(blank=True, help_text='Area being counted (optional; used for the uncounted-items list)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cycle_counts', to='inventory.location')),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'permissions': [('approve_cyclecount', 'Can approve cycle counts and apply their adjustments')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CycleCountLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('counted_quantity', models.PositiveIntegerField(default=0)),
+                ('expected_quantity', models.IntegerField(blank=True, null=True)),
+                ('counted_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('counted_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cycle_count_lines', to='inventory.item')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='inventory.cyclecount')),
+            ],
+            options={
+                'ordering': ['id'],
+                'constraints': [models.UniqueConstraint(fields=('session', 'item'), name='cycle_count_line_unique_item')],
+            },
+        ),
+    ]
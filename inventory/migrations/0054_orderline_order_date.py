@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:52
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+# Lines get a copy of their order's date: date-range reads can filter the
+# lines table directly, and on PostgreSQL it becomes the partition key.
+
+
+def copy_order_dates(apps, schema_editor):
+    Order = apps.get_model("inventory", "Order")
+    OrderLine = apps.get_model("inventory", "OrderLine")
+    OrderLine.objects.update(
+        order_date=Subquery(Order.objects.filter(pk=OuterRef("order_id")).values("order_date")[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0053_change_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderline',
+            name='order_date',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.RunPython(copy_order_dates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='orderline',
+            name='order_date',
+            field=models.DateField(editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='orderline',
+            index=models.Index(fields=['order_date', 'item'], name='inventory_o_order_d_8ef8b0_idx'),
+        ),
+    ]
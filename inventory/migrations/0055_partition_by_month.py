@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:10
+
+from django.conf import settings
+from django.db import migrations
+
+# Converts orders, order lines and activity to monthly range partitions on
+# PostgreSQL when DB_PARTITIONING is on (see inventory.partitioning). Nothing
+# changes in Django's model state, so on SQLite or with the setting off this
+# is a no-op. Reversing turns partitioned tables back into plain ones.
+
+
+def partition_tables(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql" and settings.DB_PARTITIONING:
+        from inventory.partitioning import convert_all
+
+        convert_all(schema_editor.connection)
+
+
+def unpartition_tables(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        from inventory.partitioning import revert_all
+
+        revert_all(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0054_orderline_order_date'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_tables, unpartition_tables),
+    ]
@@ -20,38 +20,51 @@ class AnomalyResult:
     severity: str      # LOW | MEDIUM | HIGH
 
 
-def build_daily_sales_df(days_back: int = 120) -> pd.DataFrame:
-    """
-    Returns daily SALE quantities per item for the last `days_back` days
-    ending at the latest SALE order date in the database (not today's date).
-    """
-    # Find latest date that actually exists in the data
-    latest = (
+def latest_sale_date() -> date | None:
+    return (
         Order.objects.filter(order_type=Order.TYPE_SALE)
         .order_by("-order_date")
         .values_list("order_date", flat=True)
         .first()
     )
-    if not latest:
+
+
+def build_daily_sales_df(
+    days_back: int = 120,
+    *,
+    end: date | None = None,
+    item_range: tuple[int, int] | None = None,
+) -> pd.DataFrame:
+    """
+    Returns daily SALE quantities per item for the last `days_back` days
+    ending at the latest SALE order date in the database (not today's date).
+
+    ``end`` skips the latest-date lookup; ``item_range`` (inclusive item ids)
+    loads one shard of the matrix (see inventory.anomaly_shards).
+    """
+    # Find latest date that actually exists in the data
+    end = end or latest_sale_date()
+    if not end:
         return pd.DataFrame()
 
-    end = latest
     start = end - timedelta(days=days_back)
 
+    lines = OrderLine.objects.filter(
+        order__order_type=Order.TYPE_SALE,
+        order_date__range=(start, end),
+    )
+    if item_range is not None:
+        lines = lines.filter(item_id__gte=item_range[0], item_id__lte=item_range[1])
     qs = (
-        OrderLine.objects.filter(
-            order__order_type=Order.TYPE_SALE,
-            order__order_date__range=(start, end),
-        )
-        .values("item_id", "order__order_date")
+        lines.values("item_id", "order_date")
         .annotate(y=Sum("quantity"))
-        .order_by("item_id", "order__order_date")
+        .order_by("item_id", "order_date")
     )
 
     rows = []
     for r in qs.iterator(chunk_size=8000):
         rows.append(
-            {"item_id": r["item_id"], "ds": r["order__order_date"], "y": int(r["y"] or 0)}
+            {"item_id": r["item_id"], "ds": r["order_date"], "y": int(r["y"] or 0)}
         )
     df = pd.DataFrame(rows)
     if df.empty:
@@ -80,6 +93,55 @@ def detect_sales_anomalies(
     mad_zero_med_multiplier: float = 8.0,
     max_recent_days_per_item: int = 1,
     min_qty_for_flag: int = 4,
+) -> list[AnomalyResult]:
+    """
+    Load the whole demand matrix and score it in this process.
+
+    See ``score_sales_df`` for the rules; inventory.anomaly_shards runs the
+    same scoring over item-id shards in parallel.
+    """
+    df = build_daily_sales_df(days_back=days_back)
+    if df.empty:
+        return []
+    results = score_sales_df(
+        df,
+        end_date=df["ds"].max().date(),
+        days_back=days_back,
+        min_points=min_points,
+        last_n_days_only=last_n_days_only,
+        z_thresh_low=z_thresh_low,
+        z_thresh_med=z_thresh_med,
+        z_thresh_high=z_thresh_high,
+        min_nonzero_days_in_hist=min_nonzero_days_in_hist,
+        sparse_abs_min_qty=sparse_abs_min_qty,
+        mad_zero_med_multiplier=mad_zero_med_multiplier,
+        max_recent_days_per_item=max_recent_days_per_item,
+        min_qty_for_flag=min_qty_for_flag,
+    )
+    return sort_results(results)
+
+
+def sort_results(results: list[AnomalyResult]) -> list[AnomalyResult]:
+    """High severity first, then highest score."""
+    sev_rank = {"HIGH": 0, "MEDIUM": 1, "LOW": 2}
+    return sorted(results, key=lambda r: (sev_rank.get(r.severity, 9), -r.score))
+
+
+def score_sales_df(
+    df: pd.DataFrame,
+    *,
+    end_date: date,
+    days_back: int = 120,
+    min_points: int = 28,
+    last_n_days_only: int = 14,
+    z_thresh_low: float = 3.5,
+    z_thresh_med: float = 5.0,
+    z_thresh_high: float = 6.5,
+    min_nonzero_days_in_hist: int = 5,
+    sparse_abs_min_qty: int = 45,
+    mad_zero_med_multiplier: float = 8.0,
+    max_recent_days_per_item: int = 1,
+    min_qty_for_flag: int = 4,
 ) -> list[AnomalyResult]:
     """
     Robust anomaly detection using rolling median + MAD robust z-score.
@@ -94,13 +156,13 @@ def detect_sales_anomalies(
     or the absolute quantity is very large. Per-SKU we keep at most
     ``max_recent_days_per_item`` day(s) in the window (strongest by score) so
     routine catalogues do not produce hundreds of rows per scan.
-    """
-    df = build_daily_sales_df(days_back=days_back)
-    if df.empty:
-        return []
 
+    ``end_date`` is the last day with sales in the whole matrix, so every
+    shard of it is scored against the same recent window.
+    """
     results: list[AnomalyResult] = []
-    end_date = df["ds"].max().date()
+    if df.empty:
+        return results
     start_recent = end_date - timedelta(days=last_n_days_only)
 
     series_start_ts = pd.Timestamp(end_date - timedelta(days=days_back))
@@ -194,10 +256,6 @@ def detect_sales_anomalies(
             if max_recent_days_per_item > 0:
                 item_candidates = item_candidates[:max_recent_days_per_item]
             results.extend(item_candidates)
-
-    # Sort: High severity first, then highest score
-    sev_rank = {"HIGH": 0, "MEDIUM": 1, "LOW": 2}
-    results.sort(key=lambda r: (sev_rank.get(r.severity, 9), -r.score))
     return results
 
 
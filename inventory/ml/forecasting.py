@@ -28,11 +28,11 @@ def _daily_demand_series(item: Item, days_back: int = 120) -> pd.DataFrame:
         OrderLine.objects.filter(
             item=item,
             order__order_type=Order.TYPE_SALE,
-            order__order_date__range=(start, end),
+            order_date__range=(start, end),
         )
-        .values("order__order_date")
+        .values("order_date")
         .annotate(y=Sum("quantity"))
-        .order_by("order__order_date")
+        .order_by("order_date")
     )
 
     # Build continuous daily series (fill missing days with 0 demand)
@@ -40,7 +40,7 @@ def _daily_demand_series(item: Item, days_back: int = 120) -> pd.DataFrame:
         df = pd.DataFrame({"ds": [], "y": []})
         return df
 
-    df = pd.DataFrame([{"ds": r["order__order_date"], "y": int(r["y"] or 0)} for r in qs])
+    df = pd.DataFrame([{"ds": r["order_date"], "y": int(r["y"] or 0)} for r in qs])
     df["ds"] = pd.to_datetime(df["ds"])
     df = df.set_index("ds").asfreq("D", fill_value=0).reset_index()
     df["y"] = df["y"].astype(float)
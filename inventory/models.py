@@ -1,5 +1,6 @@
 from django.db import models
 from django.db import models
+from django.db import transaction
 from decimal import Decimal
 from datetime import date
 from django.conf import settings
@@ -96,7 +97,117 @@ class Client(models.Model):
         return None
 
 
-class Location(models.Model):
+class TreeNode(models.Model):
+    """
+    Materialized path for models with a self-referencing ``parent``.
+
+    ``tree_path`` holds the ids from the root down to this node ("1/5/12/"),
+    so a subtree is a ``tree_path__startswith`` prefix scan. ``name_path``
+    caches the display breadcrumb. ``depth`` and ``ancestor_ids`` are stored
+    as well, so breadcrumbs and ancestor lookups never walk ``parent``.
+    ``save()`` keeps the node and its whole subtree in sync when it is
+    renamed or moved. Bulk writes (``update()``, fixtures) bypass this, so
+    run ``rebuild_tree_paths`` afterwards.
+    """
+
+    PATH_SEPARATOR = " > "
+    TREE_FIELDS = ("tree_path", "depth", "ancestor_ids", "name_path")
+
+    tree_path = models.CharField(max_length=255, blank=True, default="", db_index=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    ancestor_ids = models.JSONField(default=list, blank=True, editable=False)
+    name_path = models.CharField(max_length=1024, blank=True, default="", editable=False)
+
+    class Meta:
+        abstract = True
+
+    def _set_tree_fields(self, parent_fields):
+        """Fill the stored fields from the parent's ``(tree_path, depth, ancestor_ids, name_path)`` or None."""
+        if parent_fields is None:
+            self.tree_path, self.depth, self.ancestor_ids, self.name_path = f"{self.pk}/", 0, [], self.name
+        else:
+            p_path, p_depth, p_ancestors, p_names = parent_fields
+            self.tree_path = f"{p_path}{self.pk}/"
+            self.depth = p_depth + 1
+            self.ancestor_ids = list(p_ancestors) + [self.parent_id]
+            self.name_path = f"{p_names}{self.PATH_SEPARATOR}{self.name}"
+
+    def _tree_values(self):
+        return tuple(getattr(self, f) for f in self.TREE_FIELDS)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and not {"name", "parent", "parent_id"} & set(update_fields):
+            return super().save(*args, **kwargs)
+
+        model = type(self)
+        old = None
+        if self.pk:
+            old = model.objects.filter(pk=self.pk).values_list(*self.TREE_FIELDS).first()
+        parent_fields = None
+        if self.parent_id:
+            parent_fields = model.objects.filter(pk=self.parent_id).values_list(*self.TREE_FIELDS).first()
+            if old and old[0] and parent_fields and parent_fields[0].startswith(old[0]):
+                raise ValueError(f"{self} cannot be moved under itself or one of its descendants.")
+
+        super().save(*args, **kwargs)
+
+        self._set_tree_fields(parent_fields)
+        if old == self._tree_values():
+            return
+        model.objects.filter(pk=self.pk).update(**dict(zip(self.TREE_FIELDS, self._tree_values())))
+        if old and old[0]:
+            self._rewrite_descendants(old[0])
+
+    def _rewrite_descendants(self, old_path):
+        """Recompute every node under ``old_path`` in memory and write them back in bulk."""
+        model = type(self)
+        descendants = list(
+            model.objects.filter(tree_path__startswith=old_path)
+            .exclude(pk=self.pk)
+            .order_by("depth")
+            .only("id", "parent_id", "name", *self.TREE_FIELDS)
+        )
+        known = {self.pk: self}
+        for node in descendants:
+            parent = known.get(node.parent_id)
+            if parent is None:
+                continue
+            node._set_tree_fields(parent._tree_values())
+            known[node.pk] = node
+        if descendants:
+            model.objects.bulk_update(descendants, list(self.TREE_FIELDS), batch_size=500)
+
+    @classmethod
+    def rebuild_tree_paths(cls):
+        """Recompute stored paths for every row from ``parent``; returns the number of rows changed."""
+        nodes = {n.pk: n for n in cls.objects.only("id", "parent_id", "name", *cls.TREE_FIELDS)}
+        before = {pk: n._tree_values() for pk, n in nodes.items()}
+        children = {}
+        for node in nodes.values():
+            children.setdefault(node.parent_id if node.parent_id in nodes else None, []).append(node)
+        queue = list(children.get(None, []))
+        for node in queue:
+            node._set_tree_fields(None)
+        while queue:
+            parent = queue.pop()
+            for child in children.get(parent.pk, []):
+                child._set_tree_fields(parent._tree_values())
+                queue.append(child)
+        changed = [n for pk, n in nodes.items() if n._tree_values() != before[pk]]
+        if changed:
+            cls.objects.bulk_update(changed, list(cls.TREE_FIELDS), batch_size=500)
+        return len(changed)
+
+    def subtree(self):
+        """This node and all its descendants (prefix scan on ``tree_path``)."""
+        return type(self).objects.filter(tree_path__startswith=self.tree_path)
+
+    def ancestors(self):
+        return type(self).objects.filter(pk__in=self.ancestor_ids).order_by("depth")
+
+
+class Location(TreeNode):
     parent = models.ForeignKey("self", null=True, blank=True, on_delete=models.SET_NULL, related_name="children")
 
     name = models.CharField(max_length=255)
@@ -136,7 +247,11 @@ class Location(models.Model):
 
     location_type = models.CharField(max_length=50, choices=LOCATION_TYPES, default="internal")
 
+    PATH_SEPARATOR = " → "
+
     def get_breadcrumb(self):
+        if self.name_path:
+            return self.name_path
         path = []
         current = self
         while current is not None:
@@ -160,7 +275,7 @@ class Location(models.Model):
         return self.name
 
 
-class Category(models.Model):
+class Category(TreeNode):
     name = models.CharField(max_length=100)
     parent = models.ForeignKey(
         "self",
@@ -179,6 +294,8 @@ class Category(models.Model):
     @property
     def full_path(self):
         """Return the category path, e.g. Electronics > Laptops"""
+        if self.name_path:
+            return self.name_path
         names = [self.name]
         p = self.parent
         while p:
@@ -248,6 +365,14 @@ class Item(models.Model):
 
     is_active = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            # Dashboard / item list stock filters (active + quantity thresholds).
+            models.Index(fields=["is_active", "quantity"]),
+            # Scanner lookups match on barcode.
+            models.Index(fields=["barcode"]),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.sku})"
 
@@ -258,6 +383,19 @@ class Item(models.Model):
             self.save(update_fields=["is_active"])
 
 
+class OrderQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # Queryset and bulk_update() writes skip Order.save(), which keeps the
+        # lines' copy of order_date in step; bring the lines along here.
+        if "order_date" not in kwargs:
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            order_ids = list(self.values_list("pk", flat=True))
+            updated = super().update(**kwargs)
+            sync_line_order_dates(order_ids, using=self.db)
+        return updated
+
+
 class Order(models.Model):
     TYPE_PURCHASE = "PURCHASE"
     TYPE_SALE = "SALE"
@@ -361,8 +499,31 @@ class Order(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = OrderQuerySet.as_manager()
+
     class Meta:
         ordering = ["-order_date", "-id"]
+        indexes = [
+            # Pending purchase/sale counters and per-type status lists.
+            models.Index(fields=["order_type", "status", "order_date"]),
+            # Weekly chart and sales history range scans by date.
+            models.Index(fields=["order_date", "order_type"]),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_order_date = instance.__dict__.get("order_date")
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Lines carry a copy of the date (the partition key on PostgreSQL; see
+        # inventory.partitioning), so moving an order moves its lines with it.
+        stored = getattr(self, "_stored_order_date", None)
+        if stored is not None and stored != self.order_date:
+            self.lines.update(order_date=self.order_date)
+        self._stored_order_date = self.order_date
 
     def __str__(self):
         lines = list(self.lines.all()[:2])
@@ -394,59 +555,64 @@ class Order(models.Model):
         Apply stock movement once when the order is delivered.
         Purchase = increase stock, Sale = decrease stock.
         Also log stock history for analytics.
-        Raises ValueError if a sale order would reduce stock below zero.
+        Raises ValueError if a sale order would reduce stock below zero;
+        in that case nothing is applied.
+
+        All lines are applied as one batch (see ``inventory.stock_updates``):
+        the order is claimed with a conditional UPDATE so concurrent deliveries
+        cannot apply it twice, and the item updates, history and activity rows
+        are written in bulk.
         """
-        from django.db.models import F
-        from inventory.models import StockHistory
-        from datetime import date
+        from django.db import transaction
+        from inventory.stock_updates import apply_stock_changes
 
         if self.status != self.STATUS_DELIVERED or self.stock_applied:
             return
 
-        delivery_date = timezone.now().date()
-        for line in self.lines.select_related("item").all():
-            item = line.item
-
-            # Sale orders: check stock before applying (quantity must not go below zero)
-            if self.order_type == self.TYPE_SALE:
-                current = item.quantity
-                if current < line.quantity:
-                    raise ValueError(
-                        f"Insufficient stock for {item.name}: "
-                        f"current quantity is {current}, but order requires {line.quantity}. "
-                        f"Stock cannot go below zero."
-                    )
-
-            # Update stock based on order type
-            if self.order_type == self.TYPE_PURCHASE:
-                item.quantity = F("quantity") + line.quantity
-                if self.receiving_location_id:
-                    item.location_id = self.receiving_location_id
-            else:  # SALE
-                item.quantity = F("quantity") - line.quantity
-
-            update_fields = ["quantity"]
-            if self.order_type == self.TYPE_PURCHASE and self.receiving_location_id:
-                update_fields.append("location_id")
-            item.save(update_fields=update_fields)
-            item.refresh_from_db(fields=["quantity"])
-            item.maybe_archive_on_deplete()
-
-            StockHistory.objects.update_or_create(
-                item=item,
-                date=delivery_date,
-                defaults={"quantity": item.quantity},
-            )
-
-            Activity.objects.create(
-                message=f"Order #{self.id} delivered — updated stock for {item.name}",
-                user=actor if actor and getattr(actor, "is_authenticated", False) else None,
-                kind=Activity.KIND_ORDER_STOCK,
+        purchase = self.order_type == self.TYPE_PURCHASE
+        sign = 1 if purchase else -1
+        with transaction.atomic():
+            claimed = Order.objects.filter(pk=self.pk, stock_applied=False).update(stock_applied=True)
+            if not claimed:
+                self.stock_applied = True
+                return
+            lines = list(self.lines.values_list("id", "item_id", "quantity").order_by("id"))
+            apply_stock_changes(
+                [(item_id, sign * qty) for _, item_id, qty in lines],
+                actor=actor,
+                location_id=self.receiving_location_id if purchase else None,
+                movement_reason=StockMovement.REASON_PURCHASE if purchase else StockMovement.REASON_SALE,
+                order_line_ids=[line_id for line_id, _, _ in lines],
+                activity_kind=Activity.KIND_ORDER_STOCK,
+                activity_message=lambda item, _delta: f"Order #{self.id} delivered — updated stock for {item.name}",
             )
 
         # Mark order as applied to avoid duplicates
         self.stock_applied = True
-        self.save(update_fields=["stock_applied"])
+
+
+class OrderLineQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        copy_order_dates(objs)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+def copy_order_dates(lines):
+    """Set ``order_date`` on unsaved lines from their orders (one query for orders not already loaded)."""
+    missing = {line.order_id for line in lines if not OrderLine.order.is_cached(line)}
+    dates = dict(Order.objects.filter(pk__in=missing).values_list("pk", "order_date")) if missing else {}
+    for line in lines:
+        line.order_date = line.order.order_date if OrderLine.order.is_cached(line) else dates.get(line.order_id)
+
+
+def sync_line_order_dates(order_ids, using="default", chunk_size=500):
+    """Copy ``order_date`` from the given orders onto any of their lines that differ."""
+    order_ids = list(order_ids)
+    for i in range(0, len(order_ids), chunk_size):
+        OrderLine.objects.using(using).filter(order_id__in=order_ids[i : i + chunk_size]).exclude(
+            order_date=models.F("order__order_date")
+        ).update(order_date=models.Subquery(Order.objects.filter(pk=models.OuterRef("order_id")).values("order_date")[:1]))
 
 
 class OrderLine(models.Model):
@@ -456,6 +622,11 @@ class OrderLine(models.Model):
         on_delete=models.CASCADE,
         related_name="lines",
     )
+    # Copy of order.order_date, kept in step by save()/bulk_create(),
+    # Order.save() and Order queryset/bulk updates. Date-range reads filter
+    # on it directly, and on PostgreSQL it is the partition key (see
+    # inventory.partitioning).
+    order_date = models.DateField(editable=False)
     item = models.ForeignKey(
         "Item",
         on_delete=models.PROTECT,
@@ -464,12 +635,24 @@ class OrderLine(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
 
+    objects = OrderLineQuerySet.as_manager()
+
     class Meta:
         ordering = ["id"]
+        indexes = [
+            models.Index(fields=["item", "order"]),
+            # Sales series, anomaly windows and usage totals by date range.
+            models.Index(fields=["order_date", "item"]),
+        ]
 
     def __str__(self):
         return f"{self.order} – {self.item.name} x {self.quantity}"
 
+    def save(self, *args, **kwargs):
+        if self.order_id is not None:
+            self.order_date = self.order.order_date
+        super().save(*args, **kwargs)
+
     @property
     def total(self):
         return (self.unit_price or Decimal("0")) * self.quantity
@@ -481,10 +664,339 @@ class StockHistory(models.Model):
     date = models.DateField()
     quantity = models.IntegerField()  # current item quantity on this day
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["item", "date"]),
+        ]
+
     def __str__(self):
         return f"{self.item.name} on {self.date} = {self.quantity}"
     
 
+class StockMovement(models.Model):
+    """
+    Append-only stock ledger: one row per change to an item's on-hand quantity.
+
+    Written by order delivery, manual adjustments, item create/edit and the
+    archive paths. Archive rows carry ``delta=0``; they mark the event without
+    changing on-hand stock. Combine with ``StockCheckpoint`` to answer
+    "stock as of" questions (see ``inventory.stock_ledger``).
+    """
+
+    REASON_PURCHASE = "purchase"
+    REASON_SALE = "sale"
+    REASON_ADJUSTMENT = "adjustment"
+    REASON_EDIT = "edit"
+    REASON_INITIAL = "initial"
+    REASON_ARCHIVE = "archive"
+    REASON_UNARCHIVE = "unarchive"
+    REASON_CYCLE_COUNT = "cycle_count"
+
+    REASON_CHOICES = [
+        (REASON_PURCHASE, "Purchase received"),
+        (REASON_SALE, "Sale shipped"),
+        (REASON_ADJUSTMENT, "Manual adjustment"),
+        (REASON_EDIT, "Item edited"),
+        (REASON_INITIAL, "Initial stock"),
+        (REASON_ARCHIVE, "Archived"),
+        (REASON_UNARCHIVE, "Unarchived"),
+        (REASON_CYCLE_COUNT, "Cycle count"),
+    ]
+
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name="movements")
+    location = models.ForeignKey(
+        Location,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="stock_movements",
+    )
+    delta = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    order_line = models.ForeignKey(
+        OrderLine,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="stock_movements",
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+    )
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["timestamp", "id"]
+        indexes = [
+            models.Index(fields=["item", "timestamp"]),
+            models.Index(fields=["location", "timestamp"]),
+            models.Index(fields=["timestamp"]),
+        ]
+
+    def __str__(self):
+        return f"{self.item.name} {self.delta:+d} ({self.reason}) at {self.timestamp}"
+
+
+class StockCheckpoint(models.Model):
+    """Per-item on-hand quantity captured at ``taken_at``; all items share one timestamp per run."""
+
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name="checkpoints")
+    location = models.ForeignKey(
+        Location,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="stock_checkpoints",
+    )
+    quantity = models.IntegerField()
+    taken_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["taken_at", "item"]),
+            models.Index(fields=["item", "taken_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.item.name} = {self.quantity} at {self.taken_at}"
+
+
+class CycleCount(models.Model):
+    """
+    A stock-take session: counters record what is on the shelf, a manager approves.
+
+    Lines hold counted quantities only. Variances are computed against the
+    items' current quantities when shown, and frozen on the lines
+    (``expected_quantity``) when the session is approved (see
+    ``inventory.cycle_counts``).
+    """
+
+    STATUS_OPEN = "open"
+    STATUS_APPROVED = "approved"
+    STATUS_CANCELLED = "cancelled"
+
+    STATUS_CHOICES = [
+        (STATUS_OPEN, "Open"),
+        (STATUS_APPROVED, "Approved"),
+        (STATUS_CANCELLED, "Cancelled"),
+    ]
+
+    name = models.CharField(max_length=120)
+    location = models.ForeignKey(
+        Location,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="cycle_counts",
+        help_text="Area being counted (optional; used for the uncounted-items list)",
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_OPEN)
+    notes = models.TextField(blank=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="cycle_counts_created",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    approved_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="cycle_counts_approved",
+    )
+    approved_at = models.DateTimeField(null=True, blank=True)
+
+    # Filled in on approval.
+    adjusted_items = models.PositiveIntegerField(default=0)
+    net_change = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ["-created_at", "-id"]
+        permissions = [("approve_cyclecount", "Can approve cycle counts and apply their adjustments")]
+
+    def __str__(self):
+        return f"{self.name} ({self.get_status_display()})"
+
+    @property
+    def is_open(self):
+        return self.status == self.STATUS_OPEN
+
+
+class CycleCountLine(models.Model):
+    session = models.ForeignKey(CycleCount, on_delete=models.CASCADE, related_name="lines")
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name="cycle_count_lines")
+    counted_quantity = models.PositiveIntegerField(default=0)
+    # Item quantity when the session was approved; null while the session is open.
+    expected_quantity = models.IntegerField(null=True, blank=True)
+    counted_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+    )
+    counted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["id"]
+        constraints = [
+            models.UniqueConstraint(fields=["session", "item"], name="cycle_count_line_unique_item"),
+        ]
+
+    def __str__(self):
+        return f"{self.item.name}: counted {self.counted_quantity}"
+
+    @property
+    def variance(self):
+        if self.expected_quantity is None:
+            return None
+        return self.counted_quantity - self.expected_quantity
+
+
+class InventoryDailyTotal(models.Model):
+    """
+    One row per day of active-inventory totals, read by the dashboard trend chart.
+
+    Past days are written by the nightly finalize job (``finalized=True``) or
+    by ``rebuild_inventory_daily_totals``. Today's row is kept current
+    incrementally as stock changes (see ``inventory.daily_totals``).
+    """
+
+    date = models.DateField(unique=True)
+    total_units = models.BigIntegerField(default=0)
+    total_value = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal("0"))
+    active_items = models.PositiveIntegerField(default=0)
+    finalized = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["date"]
+
+    def __str__(self):
+        return f"{self.date}: {self.total_units} units"
+
+
+class ScanCode(models.Model):
+    """
+    Scanner lookup index: one row per code that identifies an item.
+
+    Filled from ``Item.sku``, ``Item.barcode`` and each line of
+    ``Item.serial_numbers`` when an item is saved (see ``inventory.scan_codes``).
+    ``code`` is unique, so a scan resolves with one index probe. When two items
+    claim the same code, a SKU always wins; otherwise the first item keeps it
+    (the other picks it up on its next save or ``rebuild_scan_codes``).
+    """
+
+    KIND_SKU = "sku"
+    KIND_BARCODE = "barcode"
+    KIND_SERIAL = "serial"
+
+    KIND_CHOICES = [
+        (KIND_SKU, "SKU"),
+        (KIND_BARCODE, "Barcode"),
+        (KIND_SERIAL, "Serial number"),
+    ]
+
+    code = models.CharField(max_length=191, unique=True)
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name="scan_codes")
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+
+    def __str__(self):
+        return f"{self.code} → item {self.item_id} ({self.kind})"
+
+
+class ChangeVersion(models.Model):
+    """
+    Write counter per database table, used for conditional GETs.
+
+    Bumped after every committed INSERT/UPDATE/DELETE on a tracked table (see
+    ``inventory.change_versions``). It lives in the database rather than the
+    per-process cache, so every worker agrees on it.
+    """
+
+    table = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField(default=0)
+    changed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.table} v{self.version}"
+
+
+class JobRun(models.Model):
+    """
+    One execution of a background job (scan, recommendation refresh, retention...).
+
+    Written by ``inventory.job_runs.track``: the row is created as ``running``
+    and completed with the duration, the seconds spent in each named stage,
+    the rows the job touched, the queries it ran and its peak traced memory.
+    While it runs, ``stage`` and ``progress_done``/``progress_total`` show
+    where it is. Manual anomaly scans create it as ``queued`` holding
+    ``lock``, which keeps a second click from starting a second scan (see
+    ``inventory.manual_scans``).
+    """
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_OK = "ok"
+    STATUS_FAILED = "failed"
+
+    ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_OK, "OK"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    name = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_RUNNING)
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_seconds = models.FloatField(null=True, blank=True)
+    # {stage: seconds} in the order the stages first ran.
+    stages = models.JSONField(default=dict, blank=True)
+    # {counter: rows}, e.g. {"detected": 120, "created": 4}.
+    rows = models.JSONField(default=dict, blank=True)
+    query_count = models.PositiveIntegerField(default=0)
+    sql_seconds = models.FloatField(default=0)
+    peak_memory_mb = models.FloatField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="job_runs",
+    )
+    # Live progress; cleared when the run finishes.
+    stage = models.CharField(max_length=32, blank=True)
+    progress_done = models.PositiveIntegerField(default=0)
+    progress_total = models.PositiveIntegerField(default=0)
+    # Held (set to the job name) while a deduplicated run is queued or running.
+    lock = models.CharField(max_length=64, null=True, blank=True, unique=True)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["-started_at", "-id"]
+        indexes = [
+            models.Index(fields=["name", "-started_at"]),
+            models.Index(fields=["-started_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.name} at {self.started_at} ({self.get_status_display()})"
+
+    @property
+    def is_active(self):
+        return self.status in self.ACTIVE_STATUSES
+
+
 class Activity(models.Model):
     KIND_OTHER = "other"
     KIND_ITEM_CREATE = "item_create"
@@ -495,6 +1007,8 @@ class Activity(models.Model):
     KIND_ITEM_DELETE = "item_delete"
     KIND_ITEM_HARD_DELETE = "item_hard_delete"
     KIND_ITEM_AUTO_ARCHIVE = "item_auto_archive"
+    KIND_ITEM_IMPORT = "item_import"
+    KIND_CYCLE_COUNT = "cycle_count"
     KIND_ORDER_STOCK = "order_stock"
     KIND_ANOMALY_SCAN = "anomaly_scan"
 
@@ -507,6 +1021,8 @@ class Activity(models.Model):
         (KIND_ITEM_DELETE, "Deleted"),
         (KIND_ITEM_HARD_DELETE, "Permanent delete"),
         (KIND_ITEM_AUTO_ARCHIVE, "Auto-archived"),
+        (KIND_ITEM_IMPORT, "Item import"),
+        (KIND_CYCLE_COUNT, "Cycle count"),
         (KIND_ORDER_STOCK, "Order & stock"),
         (KIND_ANOMALY_SCAN, "Anomaly scan"),
         (KIND_OTHER, "Other"),
@@ -521,6 +1037,8 @@ class Activity(models.Model):
         KIND_ITEM_DELETE: "text-bg-danger",
         KIND_ITEM_HARD_DELETE: "text-bg-danger",
         KIND_ITEM_AUTO_ARCHIVE: "text-bg-warning text-dark",
+        KIND_ITEM_IMPORT: "text-bg-success",
+        KIND_CYCLE_COUNT: "text-bg-info",
         KIND_ORDER_STOCK: "text-bg-primary",
         KIND_ANOMALY_SCAN: "text-bg-success",
         KIND_OTHER: "text-bg-light border text-dark",
@@ -544,6 +1062,12 @@ class Activity(models.Model):
 
     class Meta:
         ordering = ["-timestamp"]
+        indexes = [
+            # Per-user activity pages / privacy export.
+            models.Index(fields=["user", "-timestamp"]),
+            # Dashboard feed and forecasting date-range reads.
+            models.Index(fields=["-timestamp"]),
+        ]
 
     def __str__(self):
         who = self.user.username if self.user else "System"
@@ -570,6 +1094,12 @@ class Notification(models.Model):
 
     url = models.CharField(max_length=255, blank=True, default="")
 
+    class Meta:
+        indexes = [
+            # Bell dropdown: a user's unread, undismissed notes, newest first.
+            models.Index(fields=["user", "dismissed", "is_read", "-created_at"]),
+        ]
+
     def __str__(self):
         return f"{self.user} - {self.message}"
     
@@ -598,6 +1128,10 @@ class DemandAnomaly(models.Model):
     class Meta:
         unique_together = ("item", "date")
         ordering = ["-date", "-created_at"]
+        indexes = [
+            # Dashboard "recent anomalies" and the modal's active filter.
+            models.Index(fields=["dismissed", "-date", "-score"]),
+        ]
 
     def __str__(self):
         return f"{self.item.name} anomaly on {self.date} ({self.severity})"
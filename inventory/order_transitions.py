@@ -0,0 +1,218 @@
+"""
+Move many orders to delivered, shipped or cancelled in one transaction.
+
+``transition_orders`` replaces N separate "mark delivered" round trips. Each
+of those ran ``apply_stock_if_needed`` on its own. Here:
+
+1. The selected orders are locked, and every order is checked against the
+   allowed source statuses. Orders that cannot move (unknown id, already
+   delivered, cancelled, ...) are reported and skipped. The rest still go
+   ahead.
+2. For deliveries, the lines of all accepted orders are read in one query.
+   Sale availability is checked with one locked read of the affected items'
+   quantities. Purchases in the same batch count towards availability.
+   Sales are then allocated in order id order. A sale that cannot be covered
+   in full fails on its own, and the stock it would have taken stays
+   available to the next one.
+3. Deltas are netted per item and applied through ``apply_stock_changes``.
+   There is one call per receiving location for purchases and one for all
+   sales, so the number of queries depends on the number of locations, not
+   on the number of orders or lines.
+4. Statuses are written with one ``UPDATE`` and one Activity per order is
+   inserted in a single batch.
+
+The result is a ``TransitionReport`` with one ``OrderOutcome`` per requested
+id.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.db import transaction
+
+from .models import Activity, Item, Order, OrderLine, StockMovement
+from .stock_updates import apply_stock_changes
+
+# Target status -> statuses an order may move from.
+TRANSITIONS = {
+    Order.STATUS_SHIPPED: (Order.STATUS_PENDING, Order.STATUS_PROCESSING),
+    Order.STATUS_DELIVERED: (Order.STATUS_PENDING, Order.STATUS_PROCESSING, Order.STATUS_SHIPPED),
+    Order.STATUS_CANCELLED: (Order.STATUS_PENDING, Order.STATUS_PROCESSING, Order.STATUS_SHIPPED),
+}
+MAX_ORDERS = 1000
+
+
+@dataclass
+class OrderOutcome:
+    order_id: int
+    ok: bool
+    status: str = ""  # status after the call (unchanged on failure)
+    error: str = ""
+
+    def as_json(self):
+        out = {"id": self.order_id, "ok": self.ok, "status": self.status}
+        if not self.ok:
+            out["error"] = self.error
+        return out
+
+
+@dataclass
+class TransitionReport:
+    target: str
+    outcomes: list = field(default_factory=list)
+
+    @property
+    def succeeded(self):
+        return [o for o in self.outcomes if o.ok]
+
+    @property
+    def failed(self):
+        return [o for o in self.outcomes if not o.ok]
+
+    def summary(self):
+        label = dict(Order.STATUS_CHOICES)[self.target].lower()
+        text = f"{len(self.succeeded)} order(s) marked {label}"
+        if self.failed:
+            text += f", {len(self.failed)} failed"
+        return text
+
+    def as_json(self):
+        return {
+            "target": self.target,
+            "succeeded": len(self.succeeded),
+            "failed": len(self.failed),
+            "orders": [o.as_json() for o in self.outcomes],
+        }
+
+
+def transition_orders(order_ids, target, *, actor=None):
+    """Move ``order_ids`` to ``target`` (see the module docstring); returns a ``TransitionReport``."""
+    if target not in TRANSITIONS:
+        raise ValueError(f"Cannot bulk-transition orders to {target!r}")
+    ids = list(dict.fromkeys(int(pk) for pk in order_ids))
+    if len(ids) > MAX_ORDERS:
+        raise ValueError(f"At most {MAX_ORDERS} orders can be changed at once")
+    report = TransitionReport(target=target)
+    if not ids:
+        return report
+
+    user = actor if actor is not None and getattr(actor, "is_authenticated", False) else None
+    allowed = TRANSITIONS[target]
+    labels = dict(Order.STATUS_CHOICES)
+    outcomes = {}
+
+    with transaction.atomic():
+        orders = {
+            o.pk: o
+            for o in Order.objects.select_for_update()
+            .filter(pk__in=ids)
+            .order_by("pk")
+            .only("id", "order_type", "status", "stock_applied", "receiving_location_id")
+        }
+        accepted = []
+        for pk in ids:
+            order = orders.get(pk)
+            if order is None:
+                outcomes[pk] = OrderOutcome(pk, False, error="Order not found.")
+            elif order.status not in allowed:
+                outcomes[pk] = OrderOutcome(
+                    pk, False, status=order.status,
+                    error=f"Order is {labels[order.status].lower()}; cannot mark it {labels[target].lower()}.",
+                )
+            else:
+                accepted.append(order)
+
+        if target == Order.STATUS_DELIVERED:
+            accepted = _apply_deliveries(accepted, outcomes, user)
+
+        accepted_ids = [o.pk for o in accepted]
+        if accepted_ids:
+            fields = {"status": target}
+            if target == Order.STATUS_DELIVERED:
+                fields["stock_applied"] = True
+            Order.objects.filter(pk__in=accepted_ids).update(**fields)
+            Activity.objects.bulk_create(
+                [
+                    Activity(
+                        message=f"Order #{pk} marked {labels[target].lower()} (bulk update)",
+                        user=user,
+                        kind=Activity.KIND_ORDER_STOCK,
+                    )
+                    for pk in accepted_ids
+                ]
+            )
+        for pk in accepted_ids:
+            outcomes[pk] = OrderOutcome(pk, True, status=target)
+
+    report.outcomes = [outcomes[pk] for pk in ids]
+    return report
+
+
+def _apply_deliveries(orders, outcomes, user):
+    """Validate and apply the stock of ``orders``; returns the ones that can be delivered."""
+    pending = [o for o in orders if not o.stock_applied]
+    lines_by_order = defaultdict(list)
+    for line_id, order_id, item_id, qty in (
+        OrderLine.objects.filter(order_id__in=[o.pk for o in pending])
+        .order_by("order_id", "id")
+        .values_list("id", "order_id", "item_id", "quantity")
+    ):
+        lines_by_order[order_id].append((line_id, item_id, qty))
+
+    item_ids = sorted({item_id for lines in lines_by_order.values() for _, item_id, _ in lines})
+    stock = {}
+    names = {}
+    if item_ids:
+        # The single availability read; the row locks hold until the batch commits.
+        for pk, qty, name in (
+            Item.objects.select_for_update().filter(pk__in=item_ids).order_by("pk").values_list("pk", "quantity", "name")
+        ):
+            stock[pk] = qty
+            names[pk] = name
+
+    for order in pending:
+        if order.order_type == Order.TYPE_PURCHASE:
+            for _, item_id, qty in lines_by_order[order.pk]:
+                stock[item_id] = stock.get(item_id, 0) + qty
+
+    delivered = []
+    for order in sorted(orders, key=lambda o: o.pk):
+        if order.stock_applied or order.order_type == Order.TYPE_PURCHASE:
+            delivered.append(order)
+            continue
+        need = defaultdict(int)
+        for _, item_id, qty in lines_by_order[order.pk]:
+            need[item_id] += qty
+        short = next((i for i in sorted(need) if stock.get(i, 0) < need[i]), None)
+        if short is not None:
+            outcomes[order.pk] = OrderOutcome(
+                order.pk, False, status=order.status,
+                error=(
+                    f"Insufficient stock for {names.get(short, f'item {short}')}: "
+                    f"{stock.get(short, 0)} available, order requires {need[short]}."
+                ),
+            )
+            continue
+        for item_id, qty in need.items():
+            stock[item_id] -= qty
+        delivered.append(order)
+
+    # Purchases first (grouped by receiving location), then every sale in one call.
+    groups = defaultdict(list)
+    for order in delivered:
+        if order.stock_applied:
+            continue
+        purchase = order.order_type == Order.TYPE_PURCHASE
+        key = (True, order.receiving_location_id) if purchase else (False, None)
+        sign = 1 if purchase else -1
+        groups[key].extend((line_id, item_id, sign * qty) for line_id, item_id, qty in lines_by_order[order.pk])
+    for (purchase, location_id), lines in sorted(groups.items(), key=lambda kv: (not kv[0][0], kv[0][1] or 0)):
+        apply_stock_changes(
+            [(item_id, delta) for _, item_id, delta in lines],
+            actor=user,
+            location_id=location_id,
+            movement_reason=StockMovement.REASON_PURCHASE if purchase else StockMovement.REASON_SALE,
+            order_line_ids=[line_id for line_id, _, _ in lines],
+        )
+    return delivered
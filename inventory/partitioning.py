@@ -0,0 +1,366 @@
+"""
+Optional monthly range partitioning of the order and activity tables (PostgreSQL only).
+
+When ``DB_PARTITIONING`` is on, migration 0055 converts ``Order``,
+``OrderLine`` and ``Activity`` into declaratively partitioned tables with
+one partition per calendar month, plus a DEFAULT partition for anything
+outside the created range:
+
+- ``inventory_order`` is partitioned on ``order_date``.
+- ``inventory_orderline`` is partitioned on its copy of ``order_date``.
+- ``inventory_activity`` is partitioned on ``timestamp`` (months in UTC).
+
+A 30/90/180-day range query then only reads the partitions it covers,
+instead of the whole history. On SQLite, or with the setting off, every
+entry point here does nothing, and the ORM sees the same tables either way.
+
+PostgreSQL requires the partition key in every primary key and unique
+constraint. That changes the schema as follows:
+
+- The primary keys become ``(id, <key>)``. ``id`` still comes from a
+  sequence, so it stays unique in practice, and Django keeps using it alone.
+- The line-to-order foreign key becomes ``(order_id, order_date)`` with
+  ``ON UPDATE CASCADE``, so an order's lines follow it when its date changes.
+- Foreign keys into the partitioned tables from other tables (stock
+  movements pointing at order lines) are dropped at the database level. The
+  ORM still enforces ``on_delete`` for them.
+
+``ensure_partitions`` (the ``ensure_partitions`` command and the daily
+``ensure_partitions_task``) creates the partitions for the next
+``DB_PARTITION_MONTHS_AHEAD`` months. It also splits out any month that has
+rows in the DEFAULT partition. ``ensure_partitions --convert`` converts the
+tables later if the setting is switched on after 0055 has run.
+"""
+from __future__ import annotations
+
+import datetime
+import logging
+import re
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import Activity, Order, OrderLine
+
+logger = logging.getLogger(__name__)
+
+_MONTH_SUFFIX = re.compile(r"_p(\d{4})(\d{2})$")
+# Older rows than this stay in the DEFAULT partition when a table is converted.
+MAX_BACKFILL_MONTHS = 120
+
+
+@dataclass(frozen=True)
+class PartitionSpec:
+    model: type
+    key: str
+    # Composite foreign key replacing the plain one to a partitioned parent:
+    # (local columns, parent model, parent columns).
+    parent_fk: tuple = ()
+
+    @property
+    def table(self):
+        return self.model._meta.db_table
+
+    @property
+    def default_partition(self):
+        return f"{self.table}_default"
+
+
+# Conversion order: a parent before the tables that reference it.
+SPECS = (
+    PartitionSpec(Order, "order_date"),
+    PartitionSpec(OrderLine, "order_date", parent_fk=(("order_id", "order_date"), Order, ("id", "order_date"))),
+    PartitionSpec(Activity, "timestamp"),
+)
+
+
+@dataclass
+class PartitionReport:
+    enabled: bool = False
+    converted: list = field(default_factory=list)
+    created: list = field(default_factory=list)
+    rows_moved: int = 0
+
+    def summary(self):
+        if not self.enabled:
+            return "Partitioning is off (needs PostgreSQL and DB_PARTITIONING)"
+        parts = []
+        if self.converted:
+            parts.append("converted " + ", ".join(self.converted))
+        parts.append(f"{len(self.created)} partitions created")
+        if self.rows_moved:
+            parts.append(f"{self.rows_moved} rows moved out of DEFAULT partitions")
+        return "; ".join(parts)
+
+    def as_json(self):
+        return {
+            "enabled": self.enabled,
+            "converted": self.converted,
+            "created": self.created,
+            "rows_moved": self.rows_moved,
+        }
+
+
+def enabled(connection=None):
+    connection = connection or connections["default"]
+    return connection.vendor == "postgresql" and getattr(settings, "DB_PARTITIONING", False)
+
+
+# ---- months and names ----
+
+def month_start(day):
+    return datetime.date(day.year, day.month, 1)
+
+
+def add_months(first, n):
+    year, month = divmod(first.year * 12 + first.month - 1 + n, 12)
+    return datetime.date(year, month + 1, 1)
+
+
+def month_range(first, last):
+    """Month starts from ``first``'s month to ``last``'s month, inclusive."""
+    month, last = month_start(first), month_start(last)
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y%m}"
+
+
+def partition_month(name):
+    match = _MONTH_SUFFIX.search(name)
+    return datetime.date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+# ---- SQL ----
+
+def create_partition_sql(connection, spec, month):
+    """Statements adding ``month``'s partition, taking over its rows from the DEFAULT partition."""
+    q = connection.ops.quote_name
+    name = partition_name(spec.table, month)
+    lo, hi = month.isoformat(), add_months(month, 1).isoformat()
+    return [
+        f"CREATE TABLE {q(name)} (LIKE {q(spec.table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)",
+        (
+            f"WITH moved AS (DELETE FROM {q(spec.default_partition)} "
+            f"WHERE {q(spec.key)} >= '{lo}' AND {q(spec.key)} < '{hi}' RETURNING *) "
+            f"INSERT INTO {q(name)} SELECT * FROM moved"
+        ),
+        f"ALTER TABLE {q(spec.table)} ATTACH PARTITION {q(name)} FOR VALUES FROM ('{lo}') TO ('{hi}')",
+    ]
+
+
+def is_partitioned(cursor, table):
+    cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table])
+    return cursor.fetchone() is not None
+
+
+def existing_months(cursor, table):
+    cursor.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(%s)",
+        [table],
+    )
+    return {month for (name,) in cursor.fetchall() if (month := partition_month(name))}
+
+
+def _index_defs(cursor, table):
+    """``CREATE INDEX`` statements for ``table``'s secondary indexes (re-pointed at the same name)."""
+    cursor.execute(
+        "SELECT c.relname, pg_get_indexdef(i.indexrelid), i.indisunique FROM pg_index i "
+        "JOIN pg_class c ON c.oid = i.indexrelid WHERE i.indrelid = to_regclass(%s) AND NOT i.indisprimary",
+        [table],
+    )
+    defs = []
+    for name, definition, unique in cursor.fetchall():
+        if unique:
+            raise RuntimeError(f"{table} has unique index {name}; a partitioned table cannot enforce it")
+        defs.append(definition.replace(" ON ONLY ", " ON ", 1))
+    return defs
+
+
+def _foreign_keys(cursor, table):
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = to_regclass(%s) AND contype = 'f' AND conparentid = 0",
+        [table],
+    )
+    return cursor.fetchall()
+
+
+def _inbound_foreign_keys(cursor, table):
+    cursor.execute(
+        "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+        "WHERE confrelid = to_regclass(%s) AND contype = 'f' AND conparentid = 0 AND conrelid <> confrelid",
+        [table],
+    )
+    return cursor.fetchall()
+
+
+def _own_sequence(connection, cursor, table):
+    # Replaces the identity column, which does not survive the table swap.
+    q = connection.ops.quote_name
+    sequence = f"{table}_id_seq"
+    cursor.execute(f"CREATE SEQUENCE {q(sequence)} OWNED BY {q(table)}.{q('id')}")
+    cursor.execute(f"SELECT setval('{sequence}'::regclass, COALESCE((SELECT MAX(id) FROM {q(table)}), 0) + 1, false)")
+    cursor.execute(f"ALTER TABLE {q(table)} ALTER COLUMN {q('id')} SET DEFAULT nextval('{sequence}'::regclass)")
+
+
+def _swap(connection, cursor, spec, partitioned, months=()):
+    """Rebuild ``spec``'s table as partitioned (or plain), keeping rows, indexes and outbound keys."""
+    q = connection.ops.quote_name
+    table, old = spec.table, f"{spec.table}_swap"
+    cursor.execute(f"LOCK TABLE {q(table)} IN ACCESS EXCLUSIVE MODE")
+    indexes = _index_defs(cursor, table)
+    foreign_keys = _foreign_keys(cursor, table)
+    dropped = _inbound_foreign_keys(cursor, table)
+    cursor.execute(f"ALTER TABLE {q(table)} RENAME TO {q(old)}")
+    like = f"LIKE {q(old)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS"
+    if partitioned:
+        cursor.execute(f"CREATE TABLE {q(table)} ({like}) PARTITION BY RANGE ({q(spec.key)})")
+        cursor.execute(f"CREATE TABLE {q(spec.default_partition)} PARTITION OF {q(table)} DEFAULT")
+        for month in months:
+            cursor.execute(
+                f"CREATE TABLE {q(partition_name(table, month))} PARTITION OF {q(table)} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+            )
+    else:
+        cursor.execute(f"CREATE TABLE {q(table)} ({like})")
+    cursor.execute(f"INSERT INTO {q(table)} SELECT * FROM {q(old)}")
+    # CASCADE also drops the old sequence (and the copied default that used it)
+    # and the foreign keys other tables had into the old table.
+    cursor.execute(f"DROP TABLE {q(old)} CASCADE")
+    _own_sequence(connection, cursor, table)
+    key_columns = ["id", spec.key] if partitioned else ["id"]
+    cursor.execute(
+        f"ALTER TABLE {q(table)} ADD CONSTRAINT {q(table + '_pkey')} "
+        f"PRIMARY KEY ({', '.join(q(c) for c in key_columns)})"
+    )
+    for statement in indexes:
+        cursor.execute(statement)
+    for name, definition in foreign_keys:
+        cursor.execute(f"ALTER TABLE {q(table)} ADD CONSTRAINT {q(name)} {definition}")
+    return dropped
+
+
+def _add_parent_fk(connection, cursor, spec):
+    q = connection.ops.quote_name
+    columns, parent, parent_columns = spec.parent_fk
+    cursor.execute(
+        f"ALTER TABLE {q(spec.table)} ADD CONSTRAINT {q('_'.join((spec.table, *columns, 'fk')))} "
+        f"FOREIGN KEY ({', '.join(q(c) for c in columns)}) "
+        f"REFERENCES {q(parent._meta.db_table)} ({', '.join(q(c) for c in parent_columns)}) "
+        "ON UPDATE CASCADE DEFERRABLE INITIALLY DEFERRED"
+    )
+
+
+def _restore_inbound_fks(connection, cursor, spec):
+    """Put back Django's single-column foreign keys into a table that is plain again."""
+    q = connection.ops.quote_name
+    for relation in spec.model._meta.related_objects:
+        if relation.many_to_many or not relation.field.db_constraint:
+            continue
+        source, column = relation.related_model._meta.db_table, relation.field.column
+        cursor.execute(
+            "SELECT 1 FROM pg_constraint c JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1] "
+            "WHERE c.conrelid = to_regclass(%s) AND c.contype = 'f' AND a.attname = %s",
+            [source, column],
+        )
+        if cursor.fetchone():
+            continue
+        cursor.execute(
+            f"ALTER TABLE {q(source)} ADD CONSTRAINT {q(f'{source}_{column}_fk_{spec.table}_id')} "
+            f"FOREIGN KEY ({q(column)}) REFERENCES {q(spec.table)} ({q('id')}) DEFERRABLE INITIALLY DEFERRED"
+        )
+
+
+# ---- entry points ----
+
+def convert_all(connection=None, *, months_ahead=None, today=None):
+    """Partition every table in ``SPECS`` that is still plain; returns the converted table names."""
+    connection = connection or connections["default"]
+    if connection.vendor != "postgresql":
+        return []
+    months_ahead = settings.DB_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    today = today or timezone.now().date()
+    this_month = month_start(today)
+    q = connection.ops.quote_name
+    converted = []
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        for spec in SPECS:
+            if is_partitioned(cursor, spec.table):
+                continue
+            cursor.execute(f"SELECT MIN({q(spec.key)}) FROM {q(spec.table)}")
+            (oldest,) = cursor.fetchone()
+            first = this_month
+            if oldest is not None:
+                first = max(month_start(oldest), add_months(this_month, -MAX_BACKFILL_MONTHS))
+            months = list(month_range(first, add_months(this_month, months_ahead)))
+            dropped = _swap(connection, cursor, spec, True, months)
+            if spec.parent_fk:
+                _add_parent_fk(connection, cursor, spec)
+            for source, name in dropped:
+                if source not in {s.table for s in SPECS}:
+                    logger.info("Dropped foreign key %s on %s (now enforced by the ORM only)", name, source)
+            cursor.execute(f"ANALYZE {q(spec.table)}")
+            converted.append(spec.table)
+    return converted
+
+
+def revert_all(connection=None):
+    """Turn the partitioned tables back into plain ones (reverse of ``convert_all``)."""
+    connection = connection or connections["default"]
+    if connection.vendor != "postgresql":
+        return []
+    reverted = []
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        for spec in reversed(SPECS):
+            if not is_partitioned(cursor, spec.table):
+                continue
+            _swap(connection, cursor, spec, False)
+            _restore_inbound_fks(connection, cursor, spec)
+            reverted.append(spec.table)
+    return reverted
+
+
+def ensure_partitions(*, months_ahead=None, convert=False, today=None, using="default"):
+    """
+    Create missing monthly partitions; returns a ``PartitionReport``.
+
+    Covers the current month through ``months_ahead`` months ahead, plus any
+    month that has rows in a DEFAULT partition. Each partition is created in
+    its own short transaction. With ``convert=True``, plain tables are
+    converted first.
+    """
+    connection = connections[using]
+    report = PartitionReport(enabled=enabled(connection))
+    if not report.enabled:
+        return report
+    months_ahead = settings.DB_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    today = today or timezone.now().date()
+    if convert:
+        report.converted = convert_all(connection, months_ahead=months_ahead, today=today)
+    wanted = set(month_range(today, add_months(month_start(today), months_ahead)))
+    q = connection.ops.quote_name
+    for spec in SPECS:
+        with connection.cursor() as cursor:
+            if not is_partitioned(cursor, spec.table):
+                continue
+            cursor.execute(
+                f"SELECT DISTINCT date_trunc('month', {q(spec.key)})::date FROM {q(spec.default_partition)}"
+            )
+            stray = {month for (month,) in cursor.fetchall()}
+            missing = sorted((wanted | stray) - existing_months(cursor, spec.table))
+        for month in missing:
+            with transaction.atomic(using=using), connection.cursor() as cursor:
+                statements = create_partition_sql(connection, spec, month)
+                cursor.execute(statements[0])
+                cursor.execute(statements[1])
+                report.rows_moved += max(cursor.rowcount, 0)
+                cursor.execute(statements[2])
+            report.created.append(partition_name(spec.table, month))
+    return report
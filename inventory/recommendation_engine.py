@@ -143,7 +143,7 @@ def recalculate_recommendations_for_item(item: Item) -> None:
     recent_sales_qs = OrderLine.objects.filter(
         item=item,
         order__order_type=Order.TYPE_SALE,
-        order__order_date__gte=recent_from,
+        order_date__gte=recent_from,
     )
     recent_sales_qty = (
         recent_sales_qs.aggregate(q=Sum("quantity"))["q"] or 0
@@ -153,7 +153,7 @@ def recalculate_recommendations_for_item(item: Item) -> None:
     typical_sales_qs = OrderLine.objects.filter(
         item=item,
         order__order_type=Order.TYPE_SALE,
-        order__order_date__gte=typical_from,
+        order_date__gte=typical_from,
     )
     typical_sales_qty = (
         typical_sales_qs.aggregate(q=Sum("quantity"))["q"] or 0
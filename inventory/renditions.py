@@ -0,0 +1,175 @@
+"""
+WebP thumbnails ("renditions") of uploaded images at a few fixed sizes.
+
+List pages and the navbar used to load original uploads (often multi-megabyte
+phone photos) just to show them at 32 px. ``url(file, size)``, used through
+the ``{% thumbnail %}`` tag, returns the URL of a small WebP copy instead:
+
+- Renditions live under ``MEDIA_ROOT/renditions/`` and are named after a
+  hash of the source file's bytes, so a URL never changes meaning and can be
+  cached by browsers for a year (``immutable``).
+- The page never reads or converts images itself. When a source has no
+  renditions yet, the tag returns the original URL and queues the work on a
+  small per-process pool (``RENDITION_WORKERS``; 0 renders inline). Uploads
+  are queued as soon as the model is saved.
+- The source name → content hash map is kept in the cache. After a cache
+  flush the first page view re-queues the source. The job rereads and hashes
+  it but finds the WebP files already on disk.
+
+``python manage.py generate_renditions`` backfills every existing upload.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# Long side in pixels; roughly 2x the largest on-screen size each is used at.
+SIZES = {
+    "xs": 64,  # table thumbnails, navbar avatar
+    "sm": 256,  # form previews, profile photo
+    "md": 640,  # detail page images
+    "lg": 1280,
+}
+QUALITY = 80
+# Part of every hash: bump it when SIZES or QUALITY change so old URLs are not reused.
+SPEC_VERSION = "1"
+PREFIX = "renditions"
+PENDING_SECONDS = 300
+
+# (app label.model, field) for every uploaded image that gets renditions.
+IMAGE_FIELDS = [
+    ("inventory.Item", "image"),
+    ("inventory.Supplier", "image"),
+    ("inventory.Client", "image"),
+    ("inventory.Location", "image"),
+    ("inventory.UserProfile", "avatar"),
+]
+
+
+def _name_key(name):
+    return "rendition:" + hashlib.sha1(name.encode()).hexdigest()
+
+
+def _pending_key(name):
+    return "rendition-pending:" + hashlib.sha1(name.encode()).hexdigest()
+
+
+def rendition_name(digest, size):
+    return f"{PREFIX}/{digest[:2]}/{digest}-{size}.webp"
+
+
+def url(file, size):
+    """URL of the ``size`` rendition of ``file`` (a FieldFile); the original's until it exists."""
+    if size not in SIZES:
+        raise ValueError(f"Unknown rendition size {size!r}; expected one of {', '.join(SIZES)}")
+    if not file:
+        return ""
+    digest = cache.get(_name_key(file.name))
+    if digest is None:
+        schedule(file.name)
+        digest = cache.get(_name_key(file.name))  # set already when rendering inline
+        if digest is None:
+            return file.url
+    return file.storage.url(rendition_name(digest, size))
+
+
+# ---- rendering ----
+
+def _render(img, side):
+    from PIL import Image
+
+    copy = img.copy()
+    copy.thumbnail((side, side), Image.Resampling.LANCZOS)
+    out = BytesIO()
+    copy.save(out, "WEBP", quality=QUALITY, method=4)
+    return out.getvalue()
+
+
+def generate(name, storage=None, force=False):
+    """
+    Write every missing rendition of the stored file ``name``; returns how many were written.
+
+    Raises ``OSError`` (including Pillow's ``UnidentifiedImageError``) for
+    missing or unreadable files.
+    """
+    from PIL import Image, ImageOps
+
+    storage = storage or default_storage
+    with storage.open(name, "rb") as f:
+        data = f.read()
+    digest = hashlib.blake2b(data + SPEC_VERSION.encode(), digest_size=16).hexdigest()
+
+    todo = [size for size in SIZES if force or not storage.exists(rendition_name(digest, size))]
+    if todo:
+        img = Image.open(BytesIO(data))
+        # Shrinking a JPEG is far cheaper from a reduced-scale decode.
+        img.draft("RGB", (SIZES[todo[-1]], SIZES[todo[-1]]))
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "PA") else "RGB")
+        for size in todo:
+            target = rendition_name(digest, size)
+            if force and storage.exists(target):
+                storage.delete(target)
+            saved = storage.save(target, ContentFile(_render(img, SIZES[size])))
+            if saved != target:
+                # Another worker wrote the same file first; keep theirs.
+                storage.delete(saved)
+    cache.set(_name_key(name), digest, None)
+    return len(todo)
+
+
+def _generate_logged(name):
+    try:
+        generate(name)
+    except Exception:
+        # The pending marker stays, so a broken upload is retried at most every PENDING_SECONDS.
+        logger.warning("could not render thumbnails for %s", name, exc_info=True)
+        return
+    cache.delete(_pending_key(name))
+
+
+# ---- background pool ----
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = int(getattr(settings, "RENDITION_WORKERS", 1))
+            _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="warewolf-renditions")
+    return _pool
+
+
+def schedule(name, refresh=False):
+    """
+    Queue rendition generation for ``name`` once the current transaction commits.
+
+    A source is queued at most once per ``PENDING_SECONDS`` unless
+    ``refresh`` is set (after an upload, which may reuse a deleted file's name).
+    """
+    if not name:
+        return
+    if refresh:
+        cache.delete(_name_key(name))
+        cache.set(_pending_key(name), 1, PENDING_SECONDS)
+    elif not cache.add(_pending_key(name), 1, PENDING_SECONDS):
+        return
+    if int(getattr(settings, "RENDITION_WORKERS", 1)) <= 0:
+        _generate_logged(name)
+        return
+    transaction.on_commit(lambda: _get_pool().submit(_generate_logged, name))
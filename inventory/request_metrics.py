@@ -0,0 +1,307 @@
+"""
+Per-request SQL / template / latency instrumentation.
+
+``RequestMetricsMiddleware`` (in ``inventory.middleware``) opens a
+``RequestStats`` for each request and installs ``connection.execute_wrapper``
+so every query is counted and timed. ``TimedDjangoTemplates`` times template
+rendering (which includes our context processors), and ``timed_section`` lets
+hot helpers such as ``_build_alerts`` report their own duration.
+
+Finished requests are folded into an in-process registry of Prometheus-style
+histograms (served by the manager-only ``/metrics`` view) and, when
+``REQUEST_METRICS_JSONL_PATH`` is set, appended to a rotating JSONL file. The
+registry is per worker process; use the JSONL output to aggregate across
+gunicorn workers.
+"""
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import logging.handlers
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+_current = contextvars.ContextVar("warewolf_request_stats", default=None)
+
+
+class RequestStats:
+    """Counters for a single request (or a single ``collect()`` block)."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.sections = {}
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        t0 = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_seconds += time.perf_counter() - t0
+            self.sql_count += 1
+
+    def add_section(self, name, seconds):
+        self.sections[name] = self.sections.get(name, 0.0) + seconds
+
+
+def current_stats():
+    return _current.get()
+
+
+def activate(stats):
+    return _current.set(stats)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+@contextlib.contextmanager
+def collect(using=None):
+    """Count and time queries (and templates / sections) for the enclosed block.
+
+    Wraps every configured database connection unless ``using`` names one.
+    """
+    stats = RequestStats()
+    token = activate(stats)
+    aliases = [using] if using else list(connections)
+    try:
+        with contextlib.ExitStack() as stack:
+            for alias in aliases:
+                stack.enter_context(connections[alias].execute_wrapper(stats.sql_wrapper))
+            yield stats
+    finally:
+        deactivate(token)
+
+
+def timed_section(name):
+    """Decorator: add the wrapped call's duration to the current request under ``name``."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            stats = _current.get()
+            if stats is None:
+                return func(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stats.add_section(name, time.perf_counter() - t0)
+
+        return wrapper
+
+    return decorator
+
+
+class _TimedTemplate:
+    def __init__(self, template):
+        self._template = template
+
+    def __getattr__(self, name):
+        return getattr(self._template, name)
+
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return self._template.render(context, request)
+        t0 = time.perf_counter()
+        try:
+            return self._template.render(context, request)
+        finally:
+            stats.template_seconds += time.perf_counter() - t0
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Django template backend that reports render time to the current request."""
+
+    def from_string(self, template_code):
+        return _TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _TimedTemplate(super().get_template(template_name))
+
+
+# ---------------------------------------------------------------------------
+# Aggregation
+# ---------------------------------------------------------------------------
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "total", "n")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.n = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.n += 1
+
+
+class MetricsRegistry:
+    METRICS = (
+        ("warewolf_request_seconds", "Total request latency in seconds.", SECONDS_BUCKETS),
+        ("warewolf_request_sql_queries", "SQL queries executed per request.", QUERY_COUNT_BUCKETS),
+        ("warewolf_request_sql_seconds", "Time spent in SQL per request.", SECONDS_BUCKETS),
+        ("warewolf_request_template_seconds", "Template render time per request.", SECONDS_BUCKETS),
+        ("warewolf_section_seconds", "Time spent in instrumented helpers per request.", SECONDS_BUCKETS),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+        self.budget_exceeded = {}
+
+    def observe(self, metric, labels, value):
+        buckets = next(b for name, _, b in self.METRICS if name == metric)
+        key = (metric, labels)
+        with self._lock:
+            hist = self._series.get(key)
+            if hist is None:
+                hist = self._series[key] = _Histogram(buckets)
+            hist.observe(value)
+
+    def record_request(self, view, stats, total_seconds):
+        labels = (("view", view),)
+        self.observe("warewolf_request_seconds", labels, total_seconds)
+        self.observe("warewolf_request_sql_queries", labels, stats.sql_count)
+        self.observe("warewolf_request_sql_seconds", labels, stats.sql_seconds)
+        self.observe("warewolf_request_template_seconds", labels, stats.template_seconds)
+        for section, seconds in stats.sections.items():
+            self.observe("warewolf_section_seconds", labels + (("section", section),), seconds)
+
+    def note_budget_exceeded(self, view):
+        with self._lock:
+            self.budget_exceeded[view] = self.budget_exceeded.get(view, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self.budget_exceeded.clear()
+
+    def render_prometheus(self):
+        with self._lock:
+            series = {k: (list(h.counts), h.total, h.n) for k, h in self._series.items()}
+            exceeded = dict(self.budget_exceeded)
+
+        lines = []
+        for metric, help_text, buckets in self.METRICS:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            for (name, labels), (counts, total, n) in sorted(series.items()):
+                if name != metric:
+                    continue
+                base = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                cumulative = 0
+                for bound, count in zip(buckets, counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{{base},le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{{base},le="+Inf"}} {n}')
+                lines.append(f"{metric}_sum{{{base}}} {total:.6f}")
+                lines.append(f"{metric}_count{{{base}}} {n}")
+
+        lines.append("# HELP warewolf_query_budget_exceeded_total Requests that ran more queries than their budget.")
+        lines.append("# TYPE warewolf_query_budget_exceeded_total counter")
+        for view, count in sorted(exceeded.items()):
+            lines.append(f'warewolf_query_budget_exceeded_total{{view="{_escape(view)}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = MetricsRegistry()
+
+
+# ---------------------------------------------------------------------------
+# Budgets and JSONL output
+# ---------------------------------------------------------------------------
+
+
+def query_budget_for(view):
+    budgets = getattr(settings, "REQUEST_METRICS_QUERY_BUDGETS", {}) or {}
+    if view in budgets:
+        return budgets[view]
+    return getattr(settings, "REQUEST_METRICS_QUERY_BUDGET", None)
+
+
+_jsonl_lock = threading.Lock()
+_jsonl_handler = None
+_jsonl_handler_path = None
+
+
+def _jsonl_logger_handler(path):
+    global _jsonl_handler, _jsonl_handler_path
+    with _jsonl_lock:
+        if _jsonl_handler is None or _jsonl_handler_path != path:
+            if _jsonl_handler is not None:
+                _jsonl_handler.close()
+            _jsonl_handler = logging.handlers.RotatingFileHandler(
+                path,
+                maxBytes=getattr(settings, "REQUEST_METRICS_JSONL_MAX_BYTES", 10 * 1024 * 1024),
+                backupCount=getattr(settings, "REQUEST_METRICS_JSONL_BACKUPS", 5),
+                encoding="utf-8",
+            )
+            _jsonl_handler.setFormatter(logging.Formatter("%(message)s"))
+            _jsonl_handler_path = path
+        return _jsonl_handler
+
+
+def write_jsonl(record):
+    path = getattr(settings, "REQUEST_METRICS_JSONL_PATH", "")
+    if not path:
+        return
+    handler = _jsonl_logger_handler(str(path))
+    handler.handle(
+        logging.LogRecord(__name__, logging.INFO, __file__, 0, json.dumps(record, default=str), None, None)
+    )
+
+
+def finish_request(view, method, status, stats):
+    """Record a finished request: histograms, JSONL line and query budget check."""
+    total = time.perf_counter() - stats.started
+    registry.record_request(view, stats, total)
+
+    budget = query_budget_for(view)
+    if budget is not None and stats.sql_count > budget:
+        registry.note_budget_exceeded(view)
+        logger.warning(
+            "Query budget exceeded for %s: %s queries (budget %s, %.1f ms in SQL)",
+            view,
+            stats.sql_count,
+            budget,
+            stats.sql_seconds * 1000,
+        )
+
+    write_jsonl(
+        {
+            "ts": time.time(),
+            "view": view,
+            "method": method,
+            "status": status,
+            "total_ms": round(total * 1000, 2),
+            "sql_count": stats.sql_count,
+            "sql_ms": round(stats.sql_seconds * 1000, 2),
+            "template_ms": round(stats.template_seconds * 1000, 2),
+            "sections_ms": {k: round(v * 1000, 2) for k, v in stats.sections.items()},
+        }
+    )
+    return total
@@ -0,0 +1,455 @@
+"""
+Streaming importer for the UCI Online Retail dataset (``import_online_retail``).
+
+The source (``.xlsx`` through openpyxl's read-only mode, or ``.csv``) is read
+row by row, never loaded whole, in two passes:
+
+1. ``scan`` reads only dates, SKUs and quantities to find the import window
+   (the last ``months`` of the file) and the ``top_items`` best sellers in it.
+2. ``import_online_retail`` streams the rows again and groups them by
+   invoice. Each invoice becomes one delivered SALE order, with one line per
+   SKU. Every ``chunk_rows`` source rows it writes the new items, orders and
+   lines in bulk, in one transaction per chunk. On PostgreSQL, order lines go
+   through ``COPY``.
+
+After each committed chunk a JSON checkpoint records how far the import got.
+A rerun with the same file and options resumes after the last committed
+invoice instead of duplicating it. The checkpoint is removed when the import
+finishes.
+
+Orders are written with ``stock_applied=True``: the rows are history, and on-hand
+stock for imported items is set separately (``set_imported_stock``).
+"""
+from __future__ import annotations
+
+import csv
+import io
+import json
+import os
+import time
+from calendar import monthrange
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from pathlib import Path
+
+from django.db import connection, transaction
+
+from . import change_versions
+from .models import Category, Item, Location, Order, OrderLine, Supplier
+from .scan_codes import sync_codes_for_items
+from .tree_service import bump_tree_version
+
+CHUNK_ROWS = 20_000
+BATCH_SIZE = 5000
+COLUMNS = ("InvoiceNo", "StockCode", "Description", "Quantity", "InvoiceDate", "UnitPrice")
+# CSV exports of the dataset write dates as 12/1/2010 8:26.
+DATE_FORMATS = ("%m/%d/%Y %H:%M", "%m/%d/%Y %H:%M:%S", "%m/%d/%Y", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M")
+TWO_PLACES = Decimal("0.01")
+
+DEFAULT_CATEGORY = "Imported Dataset"
+DEFAULT_SUPPLIER = "Dataset Supplier"
+DEFAULT_LOCATION = "Imported Location"
+
+
+class RetailImportError(Exception):
+    """Unreadable source, missing columns or a checkpoint from a different import."""
+
+
+@dataclass(frozen=True)
+class RetailRow:
+    invoice: str
+    sku: str
+    description: str
+    quantity: int
+    day: date
+    unit_price: Decimal | None
+
+
+@dataclass
+class ImportPlan:
+    start: date
+    end: date
+    skus: frozenset
+    source_rows: int
+
+
+@dataclass
+class ImportResult:
+    rows_done: int = 0
+    items_created: int = 0
+    orders_created: int = 0
+    lines_created: int = 0
+    resumed_from: int = 0
+    seconds: float = 0.0
+
+    def as_dict(self):
+        return asdict(self)
+
+
+@dataclass
+class _Checkpoint:
+    path: Path | None
+    fingerprint: dict = field(default_factory=dict)
+
+    def load(self):
+        if self.path is None or not self.path.exists():
+            return None
+        data = json.loads(self.path.read_text(encoding="utf-8"))
+        if data.get("fingerprint") != self.fingerprint:
+            raise RetailImportError(
+                f"Checkpoint {self.path} belongs to a different file or options; "
+                "delete it (or pass --restart) to import from the start."
+            )
+        return ImportResult(**data["progress"])
+
+    def save(self, result):
+        if self.path is None:
+            return
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps({"fingerprint": self.fingerprint, "progress": result.as_dict()}), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        if self.path is not None and self.path.exists():
+            self.path.unlink()
+
+
+# ---- reading ----
+
+def _rows_xlsx(path):
+    try:
+        from openpyxl import load_workbook
+    except ImportError as exc:
+        raise RetailImportError("Reading .xlsx files needs openpyxl (pip install openpyxl), or pass a CSV export.") from exc
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from wb.worksheets[0].iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def _rows_csv(path, encoding):
+    with open(path, newline="", encoding=encoding) as f:
+        yield from csv.reader(f)
+
+
+def _raw_rows(path, encoding):
+    """Yield ``(row_number, {column: value})`` for data rows, row 1 being the first after the header."""
+    rows = _rows_xlsx(path) if Path(path).suffix.lower() in (".xlsx", ".xlsm") else _rows_csv(path, encoding)
+    header = next(rows, None)
+    if header is None:
+        raise RetailImportError(f"{path} is empty")
+    names = [str(h).strip() if h is not None else "" for h in header]
+    missing = [c for c in COLUMNS if c not in names]
+    if missing:
+        raise RetailImportError(f"{path} is missing column(s): {', '.join(missing)}")
+    index = {c: names.index(c) for c in COLUMNS}
+    width = max(index.values()) + 1
+    for number, row in enumerate(rows, start=1):
+        row = tuple(row) + (None,) * (width - len(row))
+        yield number, {c: row[i] for c, i in index.items()}
+
+
+def _text(value):
+    if type(value) is str:  # every CSV cell; checked first because this runs per cell
+        text = value.strip()
+        return "" if text.lower() == "nan" else text
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    text = str(value).strip()
+    return "" if text.lower() == "nan" else text
+
+
+@lru_cache(maxsize=65536)
+def _day_from_text(text):
+    # Invoice timestamps repeat on every line of the invoice; strptime is the hot spot.
+    try:
+        return datetime.fromisoformat(text).date()
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _day(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = _text(value)
+    return _day_from_text(text) if text else None
+
+
+def _quantity(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _price(value):
+    try:
+        price = Decimal(str(value)).quantize(TWO_PLACES)
+    except (InvalidOperation, ValueError):
+        return None
+    return price if price >= 0 else None
+
+
+def parse_row(raw):
+    """A sale ``RetailRow``, or ``None`` for returns, cancellations and incomplete rows."""
+    sku = _text(raw["StockCode"])[:100]
+    description = _text(raw["Description"])
+    quantity = _quantity(raw["Quantity"])
+    day = _day(raw["InvoiceDate"])
+    if not sku or not description or quantity <= 0 or day is None:
+        return None
+    return RetailRow(
+        invoice=_text(raw["InvoiceNo"]),
+        sku=sku,
+        description=description[:255],
+        quantity=quantity,
+        day=day,
+        unit_price=_price(raw["UnitPrice"]),
+    )
+
+
+def read_rows(path, encoding="utf-8-sig", start_after=0):
+    """Yield ``(row_number, RetailRow | None)`` from row ``start_after + 1`` on."""
+    for number, raw in _raw_rows(path, encoding):
+        if number > start_after:
+            yield number, parse_row(raw)
+
+
+# ---- pass 1: window and best sellers ----
+
+def _months_before(day, months):
+    y, m = divmod(day.year * 12 + day.month - 1 - months, 12)
+    m += 1
+    return date(y, m, min(day.day, monthrange(y, m)[1]))
+
+
+def scan(path, months=12, top_items=100, encoding="utf-8-sig"):
+    """First pass: the last ``months`` of sales in the file and the ``top_items`` SKUs by quantity in it."""
+    per_day = {}  # sku -> {day: quantity}
+    end = None
+    source_rows = 0
+    # Only the columns that decide the window; descriptions and prices wait for pass 2.
+    for source_rows, raw in _raw_rows(path, encoding):
+        quantity = _quantity(raw["Quantity"])
+        if quantity <= 0 or not _text(raw["Description"]):
+            continue
+        sku, day = _text(raw["StockCode"])[:100], _day(raw["InvoiceDate"])
+        if not sku or day is None:
+            continue
+        days = per_day.setdefault(sku, {})
+        days[day] = days.get(day, 0) + quantity
+        if end is None or day > end:
+            end = day
+    if end is None:
+        raise RetailImportError(f"No sale rows found in {path}")
+    start = _months_before(end, months)
+    totals = {
+        sku: total
+        for sku, days in per_day.items()
+        if (total := sum(q for d, q in days.items() if start <= d <= end))
+    }
+    ranked = sorted(totals, key=lambda sku: (-totals[sku], sku))
+    return ImportPlan(
+        start=start,
+        end=end,
+        skus=frozenset(ranked[:top_items] if top_items > 0 else ranked),
+        source_rows=source_rows,
+    )
+
+
+# ---- pass 2: writing ----
+
+_LINE_COLUMNS = ("order_id", "order_date", "item_id", "quantity", "unit_price")
+
+
+def _copy_lines(rows):
+    """Write ``(order_id, order_date, item_id, quantity, unit_price)`` rows with PostgreSQL ``COPY``."""
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    buf.seek(0)
+    columns = ", ".join(f'"{c}"' for c in _LINE_COLUMNS)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(f'COPY "{OrderLine._meta.db_table}" ({columns}) FROM STDIN WITH (FORMAT csv)', buf)
+    # COPY bypasses the execute wrapper that bumps change versions.
+    change_versions.note_change(OrderLine._meta.db_table)
+
+
+def _insert_lines(rows):
+    """Plain multi-row INSERT for other databases; skips building a model instance per line."""
+    quote = connection.ops.quote_name
+    columns = ", ".join(quote(c) for c in _LINE_COLUMNS)
+    placeholders = ", ".join(["%s"] * len(_LINE_COLUMNS))
+    sql = f"INSERT INTO {quote(OrderLine._meta.db_table)} ({columns}) VALUES ({placeholders})"
+    with connection.cursor() as cursor:
+        for i in range(0, len(rows), BATCH_SIZE):
+            cursor.executemany(sql, rows[i : i + BATCH_SIZE])
+
+
+class _Writer:
+    def __init__(self, plan, result, use_copy):
+        self.plan = plan
+        self.result = result
+        self.use_copy = use_copy
+        self.category, _ = Category.objects.get_or_create(name=DEFAULT_CATEGORY)
+        self.supplier, _ = Supplier.objects.get_or_create(name=DEFAULT_SUPPLIER)
+        self.location, _ = Location.objects.get_or_create(name=DEFAULT_LOCATION)
+        self.item_ids = {}
+        skus = sorted(plan.skus)
+        for i in range(0, len(skus), BATCH_SIZE):
+            self.item_ids.update(Item.objects.filter(sku__in=skus[i : i + BATCH_SIZE]).values_list("sku", "id"))
+
+    def _create_items(self, names):
+        new = {sku: name for sku, name in names.items() if sku not in self.item_ids}
+        if not new:
+            return
+        Item.objects.bulk_create(
+            [
+                Item(
+                    sku=sku,
+                    name=name,
+                    category=self.category,
+                    supplier=self.supplier,
+                    location=self.location,
+                    quantity=0,
+                    reorder_level=10,
+                    unit_cost=Decimal("1.00"),
+                    lead_time_days=7,
+                    safety_stock=0,
+                )
+                for sku, name in new.items()
+            ],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        # ignore_conflicts leaves pks unset, so read them back.
+        created = dict(Item.objects.filter(sku__in=list(new)).values_list("sku", "id"))
+        self.item_ids.update(created)
+        # bulk_create skips the Item signal that indexes the new SKUs; done in
+        # this chunk's transaction so a resumed import never misses them.
+        sync_codes_for_items(created.values())
+        self.result.items_created += len(new)
+
+    def flush(self, invoices, names, rows_done):
+        """Write one chunk of invoices (``{invoice: (day, {sku: [qty, price]})}``) in one transaction."""
+        with transaction.atomic():
+            self._create_items(names)
+            orders = Order.objects.bulk_create(
+                [
+                    Order(
+                        order_type=Order.TYPE_SALE,
+                        order_date=day,
+                        status=Order.STATUS_DELIVERED,
+                        stock_applied=True,
+                        reference=f"SO-{invoice}"[:80],
+                        description="Imported from the Online Retail dataset",
+                    )
+                    for invoice, (day, _) in invoices.items()
+                ],
+                batch_size=BATCH_SIZE,
+            )
+            lines = [
+                (order.pk, order.order_date, self.item_ids[sku], qty, price if price is not None else Decimal("1.00"))
+                for order, (_, skus) in zip(orders, invoices.values())
+                for sku, (qty, price) in skus.items()
+            ]
+            (_copy_lines if self.use_copy else _insert_lines)(lines)
+        self.result.orders_created += len(orders)
+        self.result.lines_created += len(lines)
+        self.result.rows_done = rows_done
+
+
+def import_online_retail(
+    path,
+    months=12,
+    top_items=100,
+    chunk_rows=CHUNK_ROWS,
+    checkpoint_path=None,
+    encoding="utf-8-sig",
+    use_copy=None,
+    log=None,
+):
+    """
+    Import ``path`` (see the module docstring); returns an ``ImportResult``.
+
+    ``checkpoint_path=None`` disables checkpoints. ``use_copy`` defaults to
+    True on PostgreSQL.
+    """
+    log = log or (lambda msg: None)
+    t0 = time.perf_counter()
+    stat = os.stat(path)
+    checkpoint = _Checkpoint(
+        Path(checkpoint_path) if checkpoint_path else None,
+        {
+            "source": os.path.abspath(path),
+            "size": stat.st_size,
+            "mtime": int(stat.st_mtime),
+            "months": months,
+            "top_items": top_items,
+        },
+    )
+    result = checkpoint.load() or ImportResult()
+    result.resumed_from = result.rows_done
+    if result.rows_done:
+        log(f"Resuming after source row {result.rows_done:,}.")
+
+    log("Scanning for the import window and best sellers…")
+    plan = scan(path, months=months, top_items=top_items, encoding=encoding)
+    log(f"{plan.source_rows:,} rows; {len(plan.skus)} SKU(s) from {plan.start} to {plan.end}.")
+
+    if use_copy is None:
+        use_copy = connection.vendor == "postgresql"
+    writer = _Writer(plan, result, use_copy)
+    invoices, names = {}, {}
+    buffered = 0
+    last_row = result.rows_done
+    current = None
+
+    def flush(upto):
+        nonlocal invoices, names, buffered
+        if invoices:
+            writer.flush(invoices, names, upto)
+        else:
+            result.rows_done = upto
+        checkpoint.save(result)
+        rate = (result.rows_done - result.resumed_from) / max(time.perf_counter() - t0, 1e-9)
+        log(
+            f"  rows {result.rows_done:,}/{plan.source_rows:,}: {result.orders_created:,} orders, "
+            f"{result.lines_created:,} lines, {result.items_created:,} new items ({rate:,.0f} rows/s)"
+        )
+        invoices, names, buffered = {}, {}, 0
+
+    for number, row in read_rows(path, encoding, start_after=result.rows_done):
+        invoice = row.invoice if row else current
+        # Chunks end on an invoice boundary so a checkpoint never splits an order.
+        if invoice != current and buffered >= chunk_rows:
+            flush(last_row)
+        current = invoice
+        last_row = number
+        buffered += 1
+        if row is None or row.sku not in plan.skus or not plan.start <= row.day <= plan.end:
+            continue
+        names.setdefault(row.sku, row.description)
+        _, skus = invoices.setdefault(row.invoice, (row.day, {}))
+        line = skus.setdefault(row.sku, [0, row.unit_price])
+        line[0] += row.quantity
+    flush(last_row)
+
+    if result.items_created:
+        # bulk_create skips the Item signal that maintains this.
+        bump_tree_version()
+    checkpoint.clear()
+    result.seconds = round(time.perf_counter() - t0, 2)
+    return result
@@ -0,0 +1,250 @@
+"""
+Retention for the tables that only grow: Activity, Notification,
+Recommendation, JobRun and StockHistory.
+
+Each ``Policy`` names a table, the date column that ages its rows, how many
+days to keep, and which rows are eligible at all. ``apply_retention`` walks
+the eligible rows in primary-key batches. For each batch it appends the rows
+to a gzip'd JSON-lines archive (``RETENTION_ARCHIVE_DIR/<table>/<run>.jsonl.gz``)
+and then deletes them in a short transaction of its own. No lock is held
+across batches, so the nightly run (``apply_retention_task`` / the
+``apply_retention`` command) can overlap normal traffic, and a run that dies
+half way simply continues on the next night.
+
+Defaults (``RETENTION_DAYS`` overrides per table; 0 keeps a table forever):
+
+- ``activity``: 365 days.
+- ``notification``: 60 days, read or dismissed notifications only.
+- ``recommendation``: 90 days after the last update, EXPIRED rows only.
+  Dismissed and accepted rows are kept, because the engine uses them to avoid
+  re-suggesting the same thing.
+- ``jobrun``: 90 days of job telemetry.
+
+StockHistory is downsampled, not dropped. Daily points older than
+``RETENTION_STOCK_HISTORY_DAILY_MONTHS`` keep only the last point of each
+ISO week per item, and the other points are archived and deleted. The
+forecasting series carry the latest earlier point forward, so week-end
+values stay exact.
+"""
+from __future__ import annotations
+
+import datetime
+import gzip
+import json
+import os
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import job_runs
+from .models import Activity, JobRun, Notification, Recommendation, StockHistory
+
+BATCH_SIZE = 2000
+ITEM_CHUNK = 200
+STOCK_HISTORY = "stockhistory"
+
+
+@dataclass(frozen=True)
+class Policy:
+    name: str
+    model: type
+    date_field: str
+    days: int
+    condition: Q = field(default_factory=Q)
+
+    def queryset(self, now):
+        cutoff = now - datetime.timedelta(days=self.days)
+        return self.model.objects.filter(self.condition, **{f"{self.date_field}__lt": cutoff})
+
+
+DEFAULT_POLICIES = (
+    Policy("activity", Activity, "timestamp", 365),
+    Policy("notification", Notification, "created_at", 60, Q(is_read=True) | Q(dismissed=True)),
+    Policy("recommendation", Recommendation, "updated_at", 90, Q(status=Recommendation.STATUS_EXPIRED)),
+    Policy("jobrun", JobRun, "started_at", 90),
+)
+
+
+def policies():
+    """``DEFAULT_POLICIES`` with the ``RETENTION_DAYS`` overrides applied; disabled ones are left out."""
+    overrides = getattr(settings, "RETENTION_DAYS", {})
+    out = []
+    for policy in DEFAULT_POLICIES:
+        days = overrides.get(policy.name, policy.days)
+        if days > 0:
+            out.append(Policy(policy.name, policy.model, policy.date_field, days, policy.condition))
+    return out
+
+
+@dataclass
+class PolicyResult:
+    name: str
+    cutoff: str
+    eligible: int = 0  # dry runs: rows that would go
+    archived: int = 0
+    deleted: int = 0
+    kept: int = 0  # StockHistory: weekly points left in place
+    archive_path: str = ""
+    archive_bytes: int = 0
+
+    def as_json(self):
+        return {k: v for k, v in self.__dict__.items() if v not in ("", None)}
+
+
+@dataclass
+class RetentionReport:
+    dry_run: bool = False
+    results: list = field(default_factory=list)
+
+    @property
+    def deleted(self):
+        return sum(r.deleted for r in self.results)
+
+    def summary(self):
+        if self.dry_run:
+            parts = [f"{r.name}: {r.eligible} eligible" for r in self.results]
+            return "Dry run - " + ("; ".join(parts) or "no policies enabled")
+        parts = [
+            f"{r.name}: {r.deleted} removed" + (f" ({r.archive_bytes} bytes archived)" if r.archive_bytes else "")
+            for r in self.results
+        ]
+        return "; ".join(parts) or "No policies enabled"
+
+    def as_json(self):
+        return {"dry_run": self.dry_run, "deleted": self.deleted, "tables": [r.as_json() for r in self.results]}
+
+
+class _Archive:
+    """Append-only ``.jsonl.gz`` for one table and run; each batch is its own gzip member."""
+
+    def __init__(self, directory, name, stamp):
+        self.path = os.path.join(directory, name, f"{stamp}.jsonl.gz") if directory else ""
+
+    def write(self, rows):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with gzip.open(self.path, "at", encoding="utf-8") as fh:
+            for row in rows:
+                fh.write(json.dumps(row, cls=DjangoJSONEncoder, separators=(",", ":")))
+                fh.write("\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    @property
+    def size(self):
+        return os.path.getsize(self.path) if self.path and os.path.exists(self.path) else 0
+
+
+def _archive_then_delete(model, rows, archive):
+    # Written (and synced) before the delete commits: a crash in between
+    # leaves a duplicate in the archive, never a row that exists nowhere.
+    archive.write(rows)
+    with transaction.atomic():
+        return model.objects.filter(pk__in=[row["id"] for row in rows]).delete()[0]
+
+
+def apply_policy(policy, *, now, archive_dir, stamp, dry_run=False, batch_size=BATCH_SIZE, max_rows=None):
+    """Archive and delete the rows ``policy`` expires; returns a ``PolicyResult``."""
+    qs = policy.queryset(now)
+    result = PolicyResult(policy.name, cutoff=(now - datetime.timedelta(days=policy.days)).isoformat())
+    if dry_run:
+        result.eligible = qs.count()
+        return result
+    archive = _Archive(archive_dir, policy.model._meta.db_table, stamp)
+    last_pk = 0
+    while max_rows is None or result.deleted < max_rows:
+        limit = batch_size if max_rows is None else min(batch_size, max_rows - result.deleted)
+        rows = list(qs.filter(pk__gt=last_pk).order_by("pk").values()[:limit])
+        if not rows:
+            break
+        last_pk = rows[-1]["id"]
+        result.deleted += _archive_then_delete(policy.model, rows, archive)
+        result.archived += len(rows) if archive.path else 0
+    result.archive_path = archive.path if result.archived else ""
+    result.archive_bytes = archive.size if result.archived else 0
+    return result
+
+
+def months_ago(day, months):
+    month_index = day.year * 12 + day.month - 1 - months
+    year, month = divmod(month_index, 12)
+    month += 1
+    # Clamp the day for shorter months (31 March minus one month is 28/29 February).
+    last_day = (datetime.date(year + month // 12, month % 12 + 1, 1) - datetime.timedelta(days=1)).day
+    return datetime.date(year, month, min(day.day, last_day))
+
+
+def _weekly_keepers(rows):
+    """Ids of the last point of every (item, ISO week) in ``rows`` (ordered by item, date, id)."""
+    keep = {}
+    for row in rows:
+        year, week, _ = row["date"].isocalendar()
+        keep[(row["item_id"], year, week)] = row["id"]
+    return set(keep.values())
+
+
+def downsample_stock_history(months, *, today, archive_dir, stamp, dry_run=False, batch_size=BATCH_SIZE):
+    """Thin daily StockHistory older than ``months`` to one point per item and ISO week."""
+    cutoff = months_ago(today, months)
+    result = PolicyResult(STOCK_HISTORY, cutoff=cutoff.isoformat())
+    old = StockHistory.objects.filter(date__lt=cutoff)
+    item_ids = list(old.order_by("item_id").values_list("item_id", flat=True).distinct())
+    archive = _Archive(archive_dir, StockHistory._meta.db_table, stamp)
+    for i in range(0, len(item_ids), ITEM_CHUNK):
+        rows = list(
+            old.filter(item_id__in=item_ids[i : i + ITEM_CHUNK])
+            .order_by("item_id", "date", "id")
+            .values("id", "item_id", "date", "quantity")
+        )
+        keepers = _weekly_keepers(rows)
+        dropped = [row for row in rows if row["id"] not in keepers]
+        result.kept += len(keepers)
+        if dry_run:
+            result.eligible += len(dropped)
+            continue
+        for j in range(0, len(dropped), batch_size):
+            batch = dropped[j : j + batch_size]
+            result.deleted += _archive_then_delete(StockHistory, batch, archive)
+            result.archived += len(batch) if archive.path else 0
+    result.archive_path = archive.path if result.archived else ""
+    result.archive_bytes = archive.size if result.archived else 0
+    return result
+
+
+def apply_retention(*, only=None, dry_run=False, archive=True, batch_size=BATCH_SIZE, max_rows=None, now=None):
+    """
+    Run every enabled policy (or just the names in ``only``); returns a ``RetentionReport``.
+
+    ``archive=False`` deletes without writing archive files. ``max_rows`` caps
+    the rows removed per table in this run.
+    """
+    now = now or timezone.now()
+    stamp = now.strftime("%Y%m%d-%H%M%S")
+    archive_dir = getattr(settings, "RETENTION_ARCHIVE_DIR", "") if archive else ""
+    report = RetentionReport(dry_run=dry_run)
+    for policy in policies():
+        if only and policy.name not in only:
+            continue
+        with job_runs.stage(policy.name):
+            report.results.append(
+                apply_policy(
+                    policy, now=now, archive_dir=archive_dir, stamp=stamp,
+                    dry_run=dry_run, batch_size=batch_size, max_rows=max_rows,
+                )
+            )
+    months = getattr(settings, "RETENTION_STOCK_HISTORY_DAILY_MONTHS", 6)
+    if months > 0 and (not only or STOCK_HISTORY in only):
+        with job_runs.stage(STOCK_HISTORY):
+            report.results.append(
+                downsample_stock_history(
+                    months, today=timezone.localdate(now), archive_dir=archive_dir, stamp=stamp,
+                    dry_run=dry_run, batch_size=batch_size,
+                )
+            )
+    job_runs.add_rows(**{r.name: r.eligible if dry_run else r.deleted for r in report.results})
+    return report
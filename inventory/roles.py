@@ -0,0 +1,11 @@
+"""Role checks shared by the views and the dashboard widgets."""
+
+
+def is_manager_or_admin(user):
+    return (
+        user.is_authenticated
+        and (
+            user.is_superuser
+            or user.groups.filter(name__in=["Manager", "Admin"]).exists()
+        )
+    )
@@ -0,0 +1,169 @@
+"""
+Resolve scanned codes (SKU, barcode or serial number) to items.
+
+``ScanCode`` holds one row per code, so resolving a scan is a single unique
+index probe. Rows are kept in step with the item by ``sync_item_codes``,
+called from the Item ``post_save`` signal. Bulk writes skip signals, so they
+call ``sync_codes_for_items`` for the items they touched, or
+``rebuild_scan_codes`` (also the ``rebuild_scan_codes`` command) to refill
+the whole table.
+
+Lookups go to the table every time: resolving a batch is one ``code__in``
+probe on the unique index, which costs the same round trip as any cache
+check that has to stay correct across processes. Item fields such as
+quantity come from one ``pk__in`` query per lookup batch.
+"""
+from __future__ import annotations
+
+import re
+
+from django.db import transaction
+from django.db.models import Q
+from django.urls import reverse
+
+from .models import Item, ScanCode
+
+MAX_CODE_LENGTH = ScanCode._meta.get_field("code").max_length
+BULK_LOOKUP_LIMIT = 500
+
+_SERIAL_SPLIT = re.compile(r"[\r\n,;]+")
+
+
+def normalize(code):
+    return (code or "").strip()
+
+
+def parse_serials(text):
+    """Serial numbers from the free-text field: one per line (commas and semicolons also split)."""
+    return [s for s in (part.strip() for part in _SERIAL_SPLIT.split(text or "")) if s]
+
+
+def codes_for(sku, barcode, serial_numbers):
+    """``{code: kind}`` for one item; a code listed twice keeps its strongest kind."""
+    codes = {}
+    for code in parse_serials(serial_numbers):
+        codes[code] = ScanCode.KIND_SERIAL
+    if normalize(barcode):
+        codes[normalize(barcode)] = ScanCode.KIND_BARCODE
+    if normalize(sku):
+        codes[normalize(sku)] = ScanCode.KIND_SKU
+    return {code: kind for code, kind in codes.items() if len(code) <= MAX_CODE_LENGTH}
+
+
+def sync_item_codes(item):
+    """Bring ``item``'s rows in line with its current SKU, barcode and serials; True if anything changed."""
+    desired = codes_for(item.sku, item.barcode, item.serial_numbers)
+    with transaction.atomic():
+        rows = ScanCode.objects.filter(Q(item_id=item.pk) | Q(code__in=list(desired))).values_list(
+            "code", "item_id", "kind"
+        )
+        own, others = {}, {}
+        for code, item_id, kind in rows:
+            (own if item_id == item.pk else others)[code] = kind
+        stale = [code for code, kind in own.items() if desired.get(code) != kind]
+        # A SKU displaces another item's barcode/serial row; anything else yields to it.
+        displaced = [
+            code for code, kind in desired.items()
+            if kind == ScanCode.KIND_SKU and others.get(code) not in (None, ScanCode.KIND_SKU)
+        ]
+        added = [
+            ScanCode(code=code, item_id=item.pk, kind=kind)
+            for code, kind in desired.items()
+            if own.get(code) != kind and (code not in others or code in displaced)
+        ]
+        if not stale and not added:
+            return False
+        if stale:
+            ScanCode.objects.filter(item_id=item.pk, code__in=stale).delete()
+        if displaced:
+            ScanCode.objects.filter(code__in=displaced).exclude(item_id=item.pk).delete()
+        ScanCode.objects.bulk_create(added, ignore_conflicts=True)
+    return True
+
+
+def sync_codes_for_items(item_ids, chunk_size=2000):
+    """
+    ``sync_item_codes`` for many items at once (after ``bulk_create``/``update``).
+
+    Same precedence as ``rebuild_scan_codes``, limited to the given items: a
+    SKU displaces another item's barcode or serial; other clashes keep the
+    existing row.
+    """
+    item_ids = list(item_ids)
+    with transaction.atomic():
+        for i in range(0, len(item_ids), chunk_size):
+            chunk = item_ids[i : i + chunk_size]
+            rows_by_kind = {ScanCode.KIND_SKU: [], ScanCode.KIND_BARCODE: [], ScanCode.KIND_SERIAL: []}
+            for pk, sku, barcode, serials in Item.objects.filter(pk__in=chunk).values_list(
+                "pk", "sku", "barcode", "serial_numbers"
+            ):
+                for code, kind in codes_for(sku, barcode, serials).items():
+                    rows_by_kind[kind].append(ScanCode(code=code, item_id=pk, kind=kind))
+            skus = [row.code for row in rows_by_kind[ScanCode.KIND_SKU]]
+            ScanCode.objects.filter(item_id__in=chunk).delete()
+            ScanCode.objects.filter(code__in=skus).exclude(kind=ScanCode.KIND_SKU).delete()
+            for kind in (ScanCode.KIND_SKU, ScanCode.KIND_BARCODE, ScanCode.KIND_SERIAL):
+                ScanCode.objects.bulk_create(rows_by_kind[kind], ignore_conflicts=True)
+
+
+def rebuild_scan_codes(chunk_size=2000):
+    """Refill the whole table from the items; returns the number of rows written."""
+    rows_by_kind = {ScanCode.KIND_SKU: [], ScanCode.KIND_BARCODE: [], ScanCode.KIND_SERIAL: []}
+    items = Item.objects.order_by("pk").values_list("pk", "sku", "barcode", "serial_numbers")
+    for pk, sku, barcode, serials in items.iterator(chunk_size=chunk_size):
+        for code, kind in codes_for(sku, barcode, serials).items():
+            rows_by_kind[kind].append(ScanCode(code=code, item_id=pk, kind=kind))
+    with transaction.atomic():
+        ScanCode.objects.all().delete()
+        # Strongest kind first, so on a clash the SKU (then the barcode) keeps the code.
+        for kind in (ScanCode.KIND_SKU, ScanCode.KIND_BARCODE, ScanCode.KIND_SERIAL):
+            ScanCode.objects.bulk_create(rows_by_kind[kind], ignore_conflicts=True, batch_size=chunk_size)
+    return ScanCode.objects.count()
+
+
+def resolve_codes(codes):
+    """``{code: (item_id, kind) | None}`` from one query on the unique code index."""
+    codes = list(codes)
+    found = {
+        code: (item_id, kind)
+        for code, item_id, kind in ScanCode.objects.filter(code__in=codes).values_list("code", "item_id", "kind")
+    }
+    return {code: found.get(code) for code in codes}
+
+
+def _item_payload(item):
+    return {
+        "id": item.pk,
+        "name": item.name,
+        "sku": item.sku,
+        "barcode": item.barcode,
+        "quantity": item.quantity,
+        "is_active": item.is_active,
+        "location": item.location.name if item.location_id else None,
+        "url": reverse("item_detail", args=[item.pk]),
+    }
+
+
+def lookup(codes):
+    """
+    ``{code: {"code", "kind", "item"} | None}`` for the given scans (order kept).
+
+    Costs at most two queries however many codes are passed: the index
+    probe and one fetch of the matched items.
+    """
+    codes = list(dict.fromkeys(normalize(c) for c in codes if normalize(c)))
+    resolved = resolve_codes(codes)
+    item_ids = {hit[0] for hit in resolved.values() if hit}
+    items = (
+        Item.objects.select_related("location")
+        .only("id", "name", "sku", "barcode", "quantity", "is_active", "location__name")
+        .in_bulk(item_ids)
+        if item_ids
+        else {}
+    )
+    results = {}
+    for code in codes:
+        hit = resolved.get(code)
+        item = items.get(hit[0]) if hit else None
+        results[code] = {"code": code, "kind": hit[1], "item": _item_payload(item)} if item else None
+    return results
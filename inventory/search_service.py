@@ -0,0 +1,123 @@
+"""
+Result sources for the navbar search (``global_search``).
+
+Each source runs one query and returns its rows, so the async view can fan
+the six sources out with ``async_fanout.fan_out`` while the sync view simply
+runs them in order. Results keep the order of ``SOURCES``.
+"""
+from __future__ import annotations
+
+from functools import partial
+
+from django.db.models import Q
+from django.urls import reverse
+
+from .models import Category, Client, Item, Location, Order, OrderLine, Supplier
+
+SEARCH_LIMIT = 5
+
+
+def _items(q):
+    # Stock Items -> detail/profile page
+    return [
+        {
+            "type": "Stock Item",
+            "name": i.name,
+            "sub": f"SKU: {i.sku}",
+            "url": reverse("item_detail", args=[i.id]),
+        }
+        for i in Item.objects.filter(
+            Q(name__icontains=q) | Q(sku__icontains=q) | Q(description__icontains=q)
+        )[:SEARCH_LIMIT]
+    ]
+
+
+def _categories(q):
+    # Categories -> item list filtered by category (shows items in that category)
+    return [
+        {
+            "type": "Category",
+            "name": c.name,
+            "sub": c.full_path,
+            "url": reverse("item_list") + f"?category={c.id}",
+        }
+        for c in Category.objects.filter(name__icontains=q)[:SEARCH_LIMIT]
+    ]
+
+
+def _suppliers(q):
+    # Suppliers -> edit page (no separate profile view; edit shows details)
+    return [
+        {
+            "type": "Supplier",
+            "name": s.name,
+            "sub": s.email or "",
+            "url": reverse("supplier_view", args=[s.id]),
+        }
+        for s in Supplier.objects.filter(name__icontains=q)[:SEARCH_LIMIT]
+    ]
+
+
+def _customers(q):
+    # Customers -> edit page (no separate profile view; edit shows details)
+    return [
+        {
+            "type": "Customer",
+            "name": c.name,
+            "sub": c.email,
+            "url": reverse("client_view", args=[c.id]),
+        }
+        for c in Client.objects.filter(Q(name__icontains=q) | Q(email__icontains=q))[:SEARCH_LIMIT]
+    ]
+
+
+def _locations(q):
+    # Locations -> profile/view page
+    return [
+        {
+            "type": "Location",
+            "name": l.name,
+            "sub": l.get_breadcrumb(),
+            "url": reverse("location_view", args=[l.id]),
+        }
+        for l in Location.objects.filter(name__icontains=q)[:SEARCH_LIMIT]
+    ]
+
+
+def _orders(q):
+    # Orders -> order detail; the prefetch covers the line summary.
+    rows = []
+    orders = (
+        Order.objects.prefetch_related("lines__item")
+        .filter(Q(notes__icontains=q) | Q(reference__icontains=q) | Q(lines__item__name__icontains=q))
+        .distinct()[:SEARCH_LIMIT]
+    )
+    for o in orders:
+        lines = list(o.lines.all())
+        sub = ", ".join(ln.item.name for ln in lines[:2]) if lines else "—"
+        if len(lines) > 2:
+            sub += f" (+{len(lines) - 2} more)"
+        rows.append({
+            "type": "Order",
+            "name": f"Order #{o.id}",
+            "sub": f"{o.order_type.title()} – {sub}",
+            "url": reverse("order_detail", args=[o.id]),
+        })
+    return rows
+
+
+SOURCES = (_items, _categories, _suppliers, _customers, _locations, _orders)
+# Tables the results are read from (the conditional-GET dependencies of ``global_search``).
+SOURCE_MODELS = (Item, Category, Supplier, Client, Location, Order, OrderLine)
+
+
+def source_calls(q):
+    """One zero-argument callable per source, for ``fan_out``."""
+    return [partial(source, q) for source in SOURCES]
+
+
+def search(q):
+    results = []
+    for call in source_calls(q):
+        results.extend(call())
+    return results
@@ -3,13 +3,17 @@ Keep auth groups consistent with manager approval and avoid "active but no permi
 
 Dashboard is @login_required only; list views use @permission_required(..., raise_exception=True).
 """
+from django.apps import apps
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
 from django.core.management import call_command
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
-from inventory.models import ManagerRequest
+from inventory.models import Category, Item, Location, ManagerRequest
+from inventory.renditions import IMAGE_FIELDS, schedule as schedule_renditions
+from inventory.scan_codes import sync_item_codes
+from inventory.tree_service import bump_tree_version
 
 User = get_user_model()
 
@@ -52,3 +56,62 @@ def sync_inventory_groups_after_user_save(
     _ensure_role_permissions()
     staff_group, _ = Group.objects.get_or_create(name="Staff")
     instance.groups.add(staff_group)
+
+
+@receiver(post_delete, sender=Location)
+def reroot_sublocations_after_delete(sender, instance, **kwargs):
+    # Sub-locations were SET_NULL by the delete, but their stored tree paths
+    # still run through the deleted row; re-saving each one rewrites its subtree.
+    if not instance.tree_path:
+        return
+    for child in Location.objects.filter(tree_path__startswith=instance.tree_path, parent__isnull=True):
+        if child.depth == instance.depth + 1:
+            child.save(update_fields=["parent"])
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def invalidate_cached_trees(sender, raw=False, **kwargs):
+    # Item rows feed the per-node counts and quantities of both trees.
+    if raw:
+        return
+    if sender is Location:
+        bump_tree_version("location")
+    elif sender is Category:
+        bump_tree_version("category")
+    else:
+        bump_tree_version()
+
+
+SCAN_CODE_FIELDS = {"sku", "barcode", "serial_numbers"}
+
+
+@receiver(post_save, sender=Item)
+def sync_scan_codes(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Stock-only saves (update_fields without any code field) leave the index alone.
+    if raw or (update_fields is not None and not SCAN_CODE_FIELDS & set(update_fields)):
+        return
+    sync_item_codes(instance)
+
+
+def note_new_image_upload(sender, instance, raw=False, **kwargs):
+    # A freshly assigned upload is not committed to storage until the field's pre_save.
+    field = _IMAGE_FIELD_BY_MODEL[sender]
+    file = getattr(instance, field)
+    instance._rendition_upload = not raw and bool(file) and not getattr(file, "_committed", True)
+
+
+def queue_renditions_for_upload(sender, instance, raw=False, **kwargs):
+    if getattr(instance, "_rendition_upload", False):
+        instance._rendition_upload = False
+        schedule_renditions(getattr(instance, _IMAGE_FIELD_BY_MODEL[sender]).name, refresh=True)
+
+
+_IMAGE_FIELD_BY_MODEL = {apps.get_model(label): field for label, field in IMAGE_FIELDS}
+for _model in _IMAGE_FIELD_BY_MODEL:
+    pre_save.connect(note_new_image_upload, sender=_model, dispatch_uid=f"renditions-pre-{_model._meta.label}")
+    post_save.connect(queue_renditions_for_upload, sender=_model, dispatch_uid=f"renditions-post-{_model._meta.label}")
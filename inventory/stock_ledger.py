@@ -0,0 +1,134 @@
+"""
+Stock ledger queries: checkpoints and "stock as of" reads.
+
+``StockMovement`` rows are append-only deltas. ``StockCheckpoint`` rows are
+taken for every item at a single instant by ``take_checkpoint`` (nightly beat
+task / ``stock_checkpoint`` command). The quantity at moment T comes from the
+nearest checkpoint plus the movements between the checkpoint and T, which is
+one indexed range read on ``(item, timestamp)``:
+
+- checkpoint at or before T: ``checkpoint + sum(delta in (taken_at, T])``
+- only later checkpoints:    ``checkpoint - sum(delta in (T, taken_at])``
+- no checkpoint at all:      ``Item.quantity - sum(delta after T)``
+
+A checkpoint records the true ``Item.quantity``, so writes that bypass the
+ledger (bulk imports, admin edits) stop skewing results after the next
+checkpoint.
+"""
+from __future__ import annotations
+
+import datetime
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Item, StockCheckpoint, StockMovement
+
+BATCH_SIZE = 2000
+
+
+def record_movement(item, delta, reason, *, user=None, order_line=None, location_id=None):
+    """Append a single ledger row (use ``StockMovement.objects.bulk_create`` for batches)."""
+    return StockMovement.objects.create(
+        item=item,
+        location_id=location_id if location_id is not None else item.location_id,
+        delta=int(delta),
+        reason=reason,
+        order_line=order_line,
+        user=user if user is not None and getattr(user, "is_authenticated", False) else None,
+    )
+
+
+def take_checkpoint(now=None):
+    """Snapshot every item's quantity at one shared ``taken_at``; returns rows written."""
+    now = now or timezone.now()
+    written = 0
+    with transaction.atomic():
+        batch = []
+        rows = Item.objects.values_list("id", "location_id", "quantity").order_by("id")
+        for item_id, location_id, qty in rows.iterator(chunk_size=BATCH_SIZE):
+            batch.append(StockCheckpoint(item_id=item_id, location_id=location_id, quantity=qty, taken_at=now))
+            if len(batch) >= BATCH_SIZE:
+                StockCheckpoint.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            StockCheckpoint.objects.bulk_create(batch)
+            written += len(batch)
+    return written
+
+
+def prune_checkpoints(older_than_days):
+    """Drop checkpoint runs older than N days, always keeping the newest run."""
+    cutoff = timezone.now() - datetime.timedelta(days=max(int(older_than_days), 0))
+    newest = StockCheckpoint.objects.aggregate(m=Max("taken_at"))["m"]
+    qs = StockCheckpoint.objects.filter(taken_at__lt=cutoff)
+    if newest is not None:
+        qs = qs.exclude(taken_at=newest)
+    return qs.delete()[0]
+
+
+def _end_of_day(day):
+    return timezone.make_aware(datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min))
+
+
+def stock_as_of(at, item_ids=None, location_id=None):
+    """
+    Return ``{item_id: quantity}`` at ``at``, which is a datetime or a date
+    (meaning the end of that day).
+
+    ``location_id`` limits the answer to checkpoint and movement rows recorded
+    at that location. Each row carries the item's location at the time it was
+    written.
+    """
+    if not isinstance(at, datetime.datetime):
+        at = _end_of_day(at)
+
+    checkpoints = StockCheckpoint.objects.all()
+    movements = StockMovement.objects.all()
+    if item_ids is not None:
+        item_ids = list(item_ids)
+        checkpoints = checkpoints.filter(item_id__in=item_ids)
+        movements = movements.filter(item_id__in=item_ids)
+    if location_id is not None:
+        checkpoints = checkpoints.filter(location_id=location_id)
+        movements = movements.filter(location_id=location_id)
+
+    before = checkpoints.filter(taken_at__lte=at).aggregate(m=Max("taken_at"))["m"]
+    if before is not None:
+        base = dict(checkpoints.filter(taken_at=before).values_list("item_id", "quantity"))
+        window, sign = movements.filter(timestamp__gt=before, timestamp__lte=at), 1
+    else:
+        after = checkpoints.filter(taken_at__gt=at).aggregate(m=Min("taken_at"))["m"]
+        if after is not None:
+            base = dict(checkpoints.filter(taken_at=after).values_list("item_id", "quantity"))
+            window, sign = movements.filter(timestamp__gt=at, timestamp__lte=after), -1
+        else:
+            items = Item.objects.all()
+            if item_ids is not None:
+                items = items.filter(pk__in=item_ids)
+            if location_id is not None:
+                items = items.filter(location_id=location_id)
+            base = dict(items.values_list("id", "quantity"))
+            window, sign = movements.filter(timestamp__gt=at), -1
+
+    result = defaultdict(int, base)
+    for item_id, total in window.values("item_id").annotate(t=Sum("delta")).values_list("item_id", "t"):
+        result[item_id] += sign * int(total or 0)
+    return dict(result)
+
+
+def daily_movement_totals(start_date, end_date):
+    """``{date: net delta}`` across all items for each day with ledger activity."""
+    rows = (
+        StockMovement.objects.filter(timestamp__gte=_end_of_day(start_date - datetime.timedelta(days=1)),
+                                     timestamp__lt=_end_of_day(end_date))
+        .annotate(day=TruncDate("timestamp"))
+        .values("day")
+        .annotate(total=Sum("delta"))
+        .order_by("day")
+    )
+    return {row["day"]: int(row["total"] or 0) for row in rows}
@@ -0,0 +1,232 @@
+"""
+Batched, lock-safe stock changes.
+
+``apply_stock_changes`` is the one place stock quantities move for order
+delivery and manual adjustments. It works on a whole set of items in a single
+transaction. Everything after the item lock is done in bulk, so the number of
+queries stays the same whether an order has 3 lines or 300:
+
+1. ``SELECT ... FOR UPDATE`` on every affected item, in id order. Two deliveries
+   touching the same items then queue rather than deadlock.
+2. A single conditional ``UPDATE`` (``CASE`` per item). When decreases are not
+   allowed to go below zero, each item is guarded by ``quantity >= -delta``. If
+   fewer rows are updated than requested, the transaction is rolled back.
+3. Bulk auto-archive for ``delete_on_deplete`` items that reached zero.
+4. Bulk StockHistory upsert for the day, bulk StockMovement ledger rows,
+   one F() update of today's InventoryDailyTotal and one bulk Activity insert.
+5. A cache version bump so the category/location trees pick up new quantities.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Callable, Iterable
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from .daily_totals import contribution_of, note_item_change, sum_contributions
+from .models import Activity, Item, StockHistory, StockMovement
+from .tree_service import bump_tree_version
+
+
+class InsufficientStock(ValueError):
+    """A decrease would take an item below zero. Subclasses ValueError for existing callers."""
+
+    def __init__(self, item, current, change):
+        self.item = item
+        self.current = current
+        self.change = change
+        super().__init__(
+            f"Insufficient stock for {item.name}: "
+            f"current quantity is {current}, but order requires {-change}. "
+            f"Stock cannot go below zero."
+        )
+
+
+@dataclass
+class StockChangeResult:
+    items: dict = field(default_factory=dict)  # item_id -> Item (quantity / is_active refreshed)
+    deltas: dict = field(default_factory=dict)  # item_id -> net change applied
+    archived_ids: set = field(default_factory=set)
+
+
+def apply_stock_changes(
+    changes: Iterable[tuple[int, int]],
+    *,
+    actor=None,
+    allow_negative: bool = False,
+    location_id: int | None = None,
+    history_date: date | None = None,
+    activity_kind: str = Activity.KIND_OTHER,
+    activity_message: Callable[[Item, int], str] | None = None,
+    log_auto_archive: bool = False,
+    movement_reason: str = StockMovement.REASON_ADJUSTMENT,
+    order_line_ids: list[int] | None = None,
+) -> StockChangeResult:
+    """
+    Apply ``(item_id, delta)`` pairs atomically and return the refreshed items.
+
+    Several pairs for the same item are netted before the stock check, so an
+    order listing the same SKU twice is checked against its total. If
+    ``activity_message`` is given, it is called once per input pair, which
+    keeps one Activity row per order line. ``location_id`` moves every touched
+    item to that location (used when a purchase is received).
+    ``order_line_ids`` is aligned with ``changes``. When given, each ledger row
+    links back to the order line it came from.
+
+    Raises ``InsufficientStock`` (nothing is written) if a decrease would go
+    below zero and ``allow_negative`` is False.
+    """
+    pairs = [(int(item_id), int(delta)) for item_id, delta in changes]
+    result = StockChangeResult()
+    if not pairs:
+        return result
+
+    if order_line_ids is not None and len(order_line_ids) != len(pairs):
+        raise ValueError("order_line_ids must align with changes")
+
+    net = defaultdict(int)
+    for item_id, delta in pairs:
+        net[item_id] += delta
+    item_ids = sorted(net)
+    user = actor if actor is not None and getattr(actor, "is_authenticated", False) else None
+    now = timezone.now()
+    day = history_date or now.date()
+
+    with transaction.atomic():
+        locked = {
+            item.pk: item
+            for item in Item.objects.select_for_update()
+            .filter(pk__in=item_ids)
+            .order_by("pk")
+            .only("id", "name", "quantity", "unit_cost", "is_active", "delete_on_deplete", "location_id")
+        }
+        missing = set(item_ids) - set(locked)
+        if missing:
+            raise Item.DoesNotExist(f"Items not found: {sorted(missing)}")
+
+        if not allow_negative:
+            for item_id in item_ids:
+                item = locked[item_id]
+                if net[item_id] < 0 and item.quantity + net[item_id] < 0:
+                    raise InsufficientStock(item, item.quantity, net[item_id])
+
+        before = {i: contribution_of(locked[i]) for i in item_ids}
+
+        # One WHEN per distinct delta, not per item: large counts and orders
+        # mostly repeat a handful of deltas, and each WHEN costs compile time.
+        by_delta = defaultdict(list)
+        for item_id in item_ids:
+            by_delta[net[item_id]].append(item_id)
+        update_kwargs = {
+            "quantity": Case(
+                *[When(pk__in=ids, then=F("quantity") + Value(delta)) for delta, ids in sorted(by_delta.items())],
+                default=F("quantity"),
+                output_field=IntegerField(),
+            )
+        }
+        if location_id:
+            update_kwargs["location_id"] = location_id
+        guard = Q(pk__in=item_ids)
+        if not allow_negative:
+            if any(delta < 0 for delta in by_delta):
+                guard &= Q(pk__in=[i for i in item_ids if net[i] >= 0]) | _any_of(
+                    Q(pk__in=ids, quantity__gte=-delta) for delta, ids in by_delta.items() if delta < 0
+                )
+        updated = Item.objects.filter(guard).update(**update_kwargs)
+        if updated != len(item_ids):
+            # Only reachable if the row lock was not honoured (e.g. SQLite with a
+            # concurrent writer); re-read and report the first offender.
+            current = dict(Item.objects.filter(pk__in=item_ids).values_list("id", "quantity"))
+            for item_id in item_ids:
+                if current.get(item_id, 0) + net[item_id] < 0:
+                    raise InsufficientStock(locked[item_id], current.get(item_id, 0), net[item_id])
+            raise InsufficientStock(locked[item_ids[0]], current.get(item_ids[0], 0), net[item_ids[0]])
+
+        for item_id, qty in Item.objects.filter(pk__in=item_ids).values_list("id", "quantity"):
+            locked[item_id].quantity = qty
+            if location_id:
+                locked[item_id].location_id = location_id
+
+        to_archive = [
+            i for i in item_ids
+            if locked[i].delete_on_deplete and locked[i].is_active and locked[i].quantity <= 0
+        ]
+        if to_archive:
+            Item.objects.filter(pk__in=to_archive).update(is_active=False)
+            for item_id in to_archive:
+                locked[item_id].is_active = False
+            result.archived_ids = set(to_archive)
+
+        _upsert_history(locked, day)
+        note_item_change(
+            sum_contributions(before.values()),
+            sum_contributions(contribution_of(locked[i]) for i in item_ids),
+        )
+
+        movements = [
+            StockMovement(
+                item_id=item_id,
+                location_id=locked[item_id].location_id,
+                delta=delta,
+                reason=movement_reason,
+                order_line_id=order_line_ids[i] if order_line_ids is not None else None,
+                user=user,
+                timestamp=now,
+            )
+            for i, (item_id, delta) in enumerate(pairs)
+        ]
+        movements.extend(
+            StockMovement(
+                item_id=item_id,
+                location_id=locked[item_id].location_id,
+                delta=0,
+                reason=StockMovement.REASON_ARCHIVE,
+                user=user,
+                timestamp=now,
+            )
+            for item_id in to_archive
+        )
+        StockMovement.objects.bulk_create(movements)
+
+        activities = []
+        if activity_message is not None:
+            activities.extend(
+                Activity(message=activity_message(locked[item_id], delta)[:255], user=user, kind=activity_kind)
+                for item_id, delta in pairs
+            )
+        if log_auto_archive:
+            activities.extend(
+                Activity(
+                    message=f"Archived item (auto, stock depleted): {locked[item_id].name}"[:255],
+                    user=user,
+                    kind=Activity.KIND_ITEM_AUTO_ARCHIVE,
+                )
+                for item_id in to_archive
+            )
+        if activities:
+            Activity.objects.bulk_create(activities)
+
+    bump_tree_version()
+    result.items = locked
+    result.deltas = dict(net)
+    return result
+
+
+def _any_of(qs):
+    combined = Q(pk__in=[])
+    for q in qs:
+        combined |= q
+    return combined
+
+
+def _upsert_history(items, day):
+    """One StockHistory row per item for ``day`` holding the new quantity."""
+    # Replace rather than bulk_update: two statements however many items moved.
+    StockHistory.objects.filter(item_id__in=list(items), date=day).delete()
+    StockHistory.objects.bulk_create(
+        [StockHistory(item_id=item_id, date=day, quantity=item.quantity) for item_id, item in items.items()]
+    )
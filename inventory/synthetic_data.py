@@ -0,0 +1,319 @@
+"""
+Synthetic dataset generator for scale benchmarks.
+
+Everything is written with ``bulk_create`` in fixed-size batches, so a
+production-sized set (10k items, 2M order lines, 1M notifications) takes
+seconds to minutes rather than hours. Every generated row is tagged with
+``SYNTHETIC_PREFIX`` in its name, SKU or reference, so ``purge_synthetic_data``
+can remove exactly what was generated and leave real data alone.
+
+Used by the ``benchmark_scale`` and ``benchmark_jobs`` management commands.
+"""
+from __future__ import annotations
+
+import random
+from dataclasses import asdict, dataclass, field
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    Category,
+    Client,
+    Item,
+    Location,
+    Notification,
+    Order,
+    OrderLine,
+    StockHistory,
+    Supplier,
+)
+
+SYNTHETIC_PREFIX = "SYN"
+BATCH_SIZE = 5000
+
+
+@dataclass
+class SyntheticSpec:
+    items: int = 10_000
+    order_lines: int = 2_000_000
+    lines_per_order: int = 4
+    customers: int = 5_000
+    suppliers: int = 200
+    locations: int = 500
+    categories: int = 60
+    notifications: int = 1_000_000
+    users: int = 10
+    history_days: int = 30
+    days_back: int = 365
+    seed: int = 42
+
+
+@dataclass
+class SyntheticResult:
+    counts: dict = field(default_factory=dict)
+    user_ids: list = field(default_factory=list)
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def _batched(iterable, size):
+    batch = []
+    for obj in iterable:
+        batch.append(obj)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _bulk(model, rows, batch_size=BATCH_SIZE):
+    """bulk_create a (possibly lazy) iterable in batches; return the created objects."""
+    created = []
+    for batch in _batched(rows, batch_size):
+        created.extend(model.objects.bulk_create(batch, batch_size=batch_size))
+    return created
+
+
+def _bulk_count(model, rows, batch_size=BATCH_SIZE):
+    """Like ``_bulk`` but keeps nothing in memory; returns the row count."""
+    n = 0
+    for batch in _batched(rows, batch_size):
+        model.objects.bulk_create(batch, batch_size=batch_size)
+        n += len(batch)
+    return n
+
+
+def generate_synthetic_data(spec: SyntheticSpec, log=None) -> SyntheticResult:
+    """Create a synthetic dataset described by ``spec``. Returns row counts and user ids."""
+    rng = random.Random(spec.seed)
+    log = log or (lambda msg: None)
+    result = SyntheticResult()
+    today = timezone.localdate()
+    p = SYNTHETIC_PREFIX
+
+    User = get_user_model()
+    with transaction.atomic():
+        existing = set(
+            User.objects.filter(username__startswith=f"{p.lower()}_user_").values_list("username", flat=True)
+        )
+        User.objects.bulk_create(
+            [
+                User(username=name, is_staff=False)
+                for name in (f"{p.lower()}_user_{i}" for i in range(spec.users))
+                if name not in existing
+            ]
+        )
+        users = list(User.objects.filter(username__startswith=f"{p.lower()}_user_").order_by("id"))
+        result.user_ids = [u.pk for u in users]
+
+        log(f"Suppliers / customers / locations / categories…")
+        suppliers = _bulk(
+            Supplier,
+            (Supplier(name=f"{p} Supplier {i}", email=f"sup{i}@synthetic.invalid") for i in range(spec.suppliers)),
+        )
+        customers = _bulk(
+            Client,
+            (Client(name=f"{p} Customer {i}", email=f"cust{i}@synthetic.invalid") for i in range(spec.customers)),
+        )
+
+        # Three-level location tree: warehouses > aisles > bins.
+        n_wh = max(1, spec.locations // 50)
+        n_aisle = max(1, spec.locations // 10)
+        warehouses = _bulk(
+            Location,
+            (Location(name=f"{p} Warehouse {i}", location_type="warehouse", structural=True) for i in range(n_wh)),
+        )
+        aisles = _bulk(
+            Location,
+            (
+                Location(name=f"{p} Aisle {i}", parent=warehouses[i % n_wh], structural=True)
+                for i in range(min(n_aisle, max(0, spec.locations - n_wh)))
+            ),
+        )
+        bins = _bulk(
+            Location,
+            (
+                Location(name=f"{p} Bin {i}", code=f"B-{i:05d}", parent=aisles[i % len(aisles)] if aisles else None)
+                for i in range(max(0, spec.locations - n_wh - len(aisles)))
+            ),
+        )
+        stock_locations = bins or aisles or warehouses
+
+        roots = _bulk(Category, (Category(name=f"{p} Category {i}") for i in range(max(1, spec.categories // 6))))
+        categories = roots + _bulk(
+            Category,
+            (
+                Category(name=f"{p} Category {len(roots) + i}", parent=roots[i % len(roots)])
+                for i in range(max(0, spec.categories - len(roots)))
+            ),
+        )
+        # bulk_create skips save(), so fill the materialized tree paths in one pass.
+        Location.rebuild_tree_paths()
+        Category.rebuild_tree_paths()
+
+        result.counts.update(
+            suppliers=len(suppliers),
+            customers=len(customers),
+            locations=len(warehouses) + len(aisles) + len(bins),
+            categories=len(categories),
+            users=len(users),
+        )
+
+    log(f"Items ({spec.items})…")
+    with transaction.atomic():
+        items = _bulk(
+            Item,
+            (
+                Item(
+                    name=f"{p} Item {i}",
+                    sku=f"{p}-{i:07d}",
+                    barcode=f"2{i:011d}",
+                    quantity=rng.choice((0, rng.randint(1, 20), rng.randint(20, 500))),
+                    reorder_level=rng.randint(5, 40),
+                    unit_cost=Decimal(rng.randint(50, 50_000)) / 100,
+                    supplier=suppliers[i % len(suppliers)],
+                    location=stock_locations[i % len(stock_locations)],
+                    category=categories[i % len(categories)],
+                    serial_numbers=f"{p}SN{i:07d}",
+                )
+                for i in range(spec.items)
+            ),
+        )
+    result.counts["items"] = len(items)
+
+    # Orders and lines are generated order-chunk by order-chunk so memory stays flat.
+    n_orders = max(1, spec.order_lines // max(1, spec.lines_per_order)) if spec.order_lines else 0
+    log(f"Orders ({n_orders}) and lines ({spec.order_lines})…")
+    statuses = [Order.STATUS_DELIVERED] * 7 + [
+        Order.STATUS_PENDING,
+        Order.STATUS_PROCESSING,
+        Order.STATUS_SHIPPED,
+        Order.STATUS_CANCELLED,
+    ]
+    lines_left = spec.order_lines
+    n_lines = 0
+    order_no = 0
+    while order_no < n_orders:
+        chunk = min(BATCH_SIZE, n_orders - order_no)
+        with transaction.atomic():
+            orders = []
+            for _ in range(chunk):
+                is_sale = rng.random() < 0.6
+                status = rng.choice(statuses)
+                orders.append(
+                    Order(
+                        order_type=Order.TYPE_SALE if is_sale else Order.TYPE_PURCHASE,
+                        client=customers[rng.randrange(len(customers))] if is_sale and customers else None,
+                        supplier=None if is_sale else suppliers[rng.randrange(len(suppliers))],
+                        order_date=today - timedelta(days=rng.randint(0, spec.days_back)),
+                        status=status,
+                        stock_applied=status == Order.STATUS_DELIVERED,
+                        reference=f"{p}-{order_no:08d}",
+                    )
+                )
+                order_no += 1
+            orders = Order.objects.bulk_create(orders, batch_size=BATCH_SIZE)
+
+            def lines():
+                nonlocal lines_left
+                for o in orders:
+                    for _ in range(min(spec.lines_per_order, lines_left)):
+                        lines_left -= 1
+                        yield OrderLine(
+                            order=o,
+                            item=items[rng.randrange(len(items))],
+                            quantity=rng.randint(1, 25),
+                            unit_price=Decimal(rng.randint(100, 90_000)) / 100,
+                        )
+
+            n_lines += _bulk_count(OrderLine, lines())
+    result.counts.update(orders=n_orders, order_lines=n_lines)
+
+    log(f"Stock history ({spec.history_days} days per item)…")
+    with transaction.atomic():
+        result.counts["stock_history"] = _bulk_count(
+            StockHistory,
+            (
+                StockHistory(item=item, date=today - timedelta(days=d), quantity=max(0, item.quantity + rng.randint(-5, 5)))
+                for item in items
+                for d in range(spec.history_days)
+            ),
+        )
+
+    log(f"Notifications ({spec.notifications})…")
+    with transaction.atomic():
+        result.counts["notifications"] = _bulk_count(
+            Notification,
+            (
+                Notification(
+                    user=users[i % len(users)],
+                    message=f"{p} notification {i}",
+                    is_read=rng.random() < 0.7,
+                    dismissed=rng.random() < 0.4,
+                )
+                for i in range(spec.notifications if users else 0)
+            ),
+        )
+
+    return result
+
+
+def synthetic_data_exists():
+    """Whether a previous ``generate_synthetic_data`` run left rows behind (its SKUs are unique)."""
+    p = SYNTHETIC_PREFIX
+    return (
+        Item.objects.filter(sku__startswith=f"{p}-").exists()
+        or Order.objects.filter(reference__startswith=f"{p}-").exists()
+    )
+
+
+def _delete_in_chunks(queryset, chunk_size=BATCH_SIZE):
+    """
+    Delete ``queryset`` one pk range at a time; returns the rows deleted (cascades included).
+
+    A single ``delete()`` makes Django collect every cascaded row in memory
+    and hold one transaction over all of them. Each chunk is its own
+    transaction instead, so an interrupted purge can simply be rerun.
+    """
+    model = queryset.model
+    deleted, last_pk = 0, None
+    while True:
+        page = queryset.order_by("pk")
+        if last_pk is not None:
+            page = page.filter(pk__gt=last_pk)
+        pks = list(page.values_list("pk", flat=True)[:chunk_size])
+        if not pks:
+            return deleted
+        with transaction.atomic():
+            deleted += model.objects.filter(pk__in=pks).delete()[0]
+        last_pk = pks[-1]
+
+
+def purge_synthetic_data(log=None):
+    """Delete every row created by ``generate_synthetic_data``, children before their parents."""
+    log = log or (lambda msg: None)
+    p = SYNTHETIC_PREFIX
+    steps = (
+        ("notifications", Notification.objects.filter(message__startswith=f"{p} notification")),
+        ("order_lines", OrderLine.objects.filter(order__reference__startswith=f"{p}-")),
+        ("orders", Order.objects.filter(reference__startswith=f"{p}-")),
+        ("stock_history", StockHistory.objects.filter(item__sku__startswith=f"{p}-")),
+        ("items", Item.objects.filter(sku__startswith=f"{p}-")),
+        ("categories", Category.objects.filter(name__startswith=f"{p} Category")),
+        ("locations", Location.objects.filter(name__startswith=f"{p} ")),
+        ("customers", Client.objects.filter(name__startswith=f"{p} Customer")),
+        ("suppliers", Supplier.objects.filter(name__startswith=f"{p} Supplier")),
+        ("users", get_user_model().objects.filter(username__startswith=f"{p.lower()}_user_")),
+    )
+    deleted = {}
+    for name, queryset in steps:
+        log(f"Purging {name}…")
+        deleted[name] = _delete_in_chunks(queryset)
+    log(f"Purged synthetic data: {deleted}")
+    return deleted
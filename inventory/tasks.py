@@ -1,47 +1,139 @@
-from celery import shared_task
-from django.contrib.auth import get_user_model
+from celery import chord, shared_task
+from celery.signals import worker_process_init
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
 
+from . import anomaly_shards, job_runs
 from .alerts_jobs import (
+    apply_anomaly_results,
     run_anomaly_scan_and_notify,
     sync_recommendation_notifications,
 )
-from .anomaly_scan_notifications import record_anomaly_scan_completion_for_user
-from .models import Activity
+from .anomaly_scan_notifications import record_anomaly_scan
+from .daily_totals import finalize_daily_totals
+from .models import JobRun
+from .partitioning import ensure_partitions
 from .recommendation_engine import recalculate_all_recommendations
+from .retention import apply_retention
+from .stock_ledger import prune_checkpoints, take_checkpoint
+
+
+@worker_process_init.connect
+def _dedicated_worker_process(**kwargs):
+    # Prefork children run one task at a time, so a run may trace the whole process.
+    job_runs.dedicated_process()
+
+
+@shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=True, retry_kwargs={"max_retries": 3})
+def run_anomaly_scan_task(self, user_id=None, run_id=None, **scan_kwargs):
+    """
+    Fan the scan out as a chord of item-id shards (see inventory.anomaly_shards).
+
+    A scan that fits in one shard runs right here. Otherwise this returns
+    once the chord is queued, and ``finish_anomaly_scan_task`` writes and
+    records the results. ``run_id`` is the queued JobRun of a manual scan
+    (see inventory.manual_scans); its progress is updated as the shards finish.
+    """
+    days_back = scan_kwargs.pop("days_back", None) or settings.ANOMALY_SCAN_DAYS_BACK
+    scan_kwargs.setdefault("last_n_days_only", anomaly_shards.DEFAULT_LAST_N_DAYS)
+    job_runs.mark(run_id, status=JobRun.STATUS_RUNNING, started_at=timezone.now(), stage="plan")
+    window = anomaly_shards.scan_window(days_back)
+    ranges = anomaly_shards.plan_shards(window, last_n_days_only=scan_kwargs["last_n_days_only"])
+    if len(ranges) < 2:
+        with job_runs.track("anomaly_scan", user_id=user_id, run_id=run_id):
+            result = run_anomaly_scan_and_notify(days_back=days_back, **scan_kwargs)
+            record_anomaly_scan(result, user_id)
+        return result
+    job_runs.mark(run_id, stage="detect", progress_total=len(ranges), progress_done=0)
+    header = [
+        scan_anomaly_shard_task.s(window.as_json(), item_range, days_back, scan_kwargs, run_id=run_id)
+        for item_range in ranges
+    ]
+    callback = finish_anomaly_scan_task.s(user_id=user_id, run_id=run_id)
+    chord(header)(callback.on_error(anomaly_scan_failed_task.s(run_id=run_id)))
+    return {"status": "dispatched", "shards": len(ranges)}
 
 
 @shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=True, retry_kwargs={"max_retries": 3})
-def run_anomaly_scan_task(self, user_id=None):
-    result = run_anomaly_scan_and_notify()
-    if user_id:
-        User = get_user_model()
-        user = User.objects.filter(pk=user_id).first()
-        if user:
-            record_anomaly_scan_completion_for_user(user, result)
-            Activity.objects.create(
-                user=user,
-                kind=Activity.KIND_ANOMALY_SCAN,
-                message=(
-                    f"Anomaly scan completed: {result['detected']} match rules "
-                    f"({result['created']} new, {result['pruned']} obsolete rows removed)"
-                ),
-            )
-    else:
-        Activity.objects.create(
-            user=None,
-            kind=Activity.KIND_ANOMALY_SCAN,
-            message=(
-                f"Scheduled anomaly scan completed: {result['detected']} match rules "
-                f"({result['created']} new)."
-            ),
-        )
+def scan_anomaly_shard_task(self, window, item_range, days_back, rules, run_id=None):
+    results, stages = anomaly_shards.timed_scan_shard(
+        anomaly_shards.ScanWindow.from_json(window), item_range, days_back, rules
+    )
+    job_runs.mark(run_id, progress_done=F("progress_done") + 1)
+    return anomaly_shards.shard_to_json(results, stages)
+
+
+@shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=True, retry_kwargs={"max_retries": 3})
+def finish_anomaly_scan_task(self, shard_results, user_id=None, run_id=None):
+    """
+    Chord callback: one upsert/prune/notify pass over every shard's results.
+
+    The scan's job run is recorded here (continuing ``run_id`` when given),
+    with the shards' load/detect seconds summed in.
+    """
+    with job_runs.track("anomaly_scan", user_id=user_id, run_id=run_id) as run:
+        run.add_rows(shards=len(shard_results))
+        result = apply_anomaly_results(anomaly_shards.results_from_json(shard_results))
+        record_anomaly_scan(result, user_id)
     return result
 
 
+@shared_task
+def anomaly_scan_failed_task(request, exc, traceback, run_id=None):
+    """Chord error callback: a shard gave up, so close the manual scan's run as failed."""
+    now = timezone.now()
+    JobRun.objects.filter(pk=run_id, status__in=JobRun.ACTIVE_STATUSES).update(
+        status=JobRun.STATUS_FAILED,
+        error=f"{type(exc).__name__}: {exc}",
+        finished_at=now,
+        updated_at=now,
+        stage="",
+        lock=None,
+    )
+
+
 @shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=True, retry_kwargs={"max_retries": 3})
 def refresh_recommendations_task(self):
-    recalculate_all_recommendations()
-    summary = sync_recommendation_notifications()
+    with job_runs.track("refresh_recommendations") as run:
+        with run.stage("recalculate"):
+            recalculate_all_recommendations()
+        with run.stage("notify"):
+            summary = sync_recommendation_notifications()
+        run.add_summary(summary)
     return {"status": "ok", **summary}
 
 
+@shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=True, retry_kwargs={"max_retries": 3})
+def stock_checkpoint_task(self, prune_days=None):
+    with job_runs.track("stock_checkpoint") as run:
+        with run.stage("checkpoint"):
+            written = take_checkpoint()
+        with run.stage("prune"):
+            pruned = prune_checkpoints(prune_days) if prune_days is not None else 0
+        run.add_rows(checkpointed=written, pruned=pruned)
+    return {"checkpointed": written, "pruned": pruned}
+
+
+@shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=True, retry_kwargs={"max_retries": 3})
+def finalize_inventory_daily_totals_task(self):
+    with job_runs.track("finalize_daily_totals"):
+        final, current = finalize_daily_totals()
+    return {
+        "finalized": final.date.isoformat() if final else None,
+        "today_units": current.total_units,
+    }
+
+
+@shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=True, retry_kwargs={"max_retries": 3})
+def apply_retention_task(self):
+    with job_runs.track("apply_retention"):
+        return apply_retention().as_json()
+
+
+@shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=True, retry_kwargs={"max_retries": 3})
+def ensure_partitions_task(self):
+    with job_runs.track("ensure_partitions") as run:
+        report = ensure_partitions()
+        run.add_rows(created=len(report.created), rows_moved=report.rows_moved)
+    return report.as_json()
@@ -0,0 +1,11 @@
+from django import template
+
+from inventory import renditions
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumbnail(file, size):
+    """URL of a WebP rendition of an image field: ``{% thumbnail item.image "xs" %}``."""
+    return renditions.url(file, size)
@@ -5,12 +5,13 @@ from decimal import Decimal
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
 from django.test import Client as HttpClient
-from django.test import TestCase
+from django.test import LiveServerTestCase, TestCase, override_settings
 from django.urls import reverse
 
 from inventory.models import (
     Activity,
     Client,
+    DemandAnomaly,
     Item,
     Location,
     Order,
@@ -155,3 +156,881 @@ class IntegrationOrderStockFlowTest(TestCase):
         self.assertTrue(
             Activity.objects.filter(kind=Activity.KIND_ORDER_STOCK).exists()
         )
+
+
+class IntegrationItemAdjustQuantityTest(TestCase):
+    """Manual adjustments go through the batched stock path and refuse to go negative."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.manager_pw = "MgrAdjustPw9"
+        cls.manager = User.objects.create_user(username="adjust_manager", password=cls.manager_pw)
+        cls.manager.groups.set([Group.objects.get(name="Manager")])
+        cls.item = Item.objects.create(
+            name="AdjustMe",
+            sku="ADJ-INT-1",
+            quantity=5,
+            unit_cost=Decimal("1.00"),
+            supplier=Supplier.objects.create(name="Adj Sup"),
+            delete_on_deplete=True,
+        )
+
+    def setUp(self):
+        self.assertTrue(self.client.login(username="adjust_manager", password=self.manager_pw))
+
+    def test_adjust_logs_history_and_auto_archive(self):
+        response = self.client.post(reverse("item_adjust", args=[self.item.pk]), {"adjustment": "-5"})
+        self.assertEqual(response.status_code, 302)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 0)
+        self.assertFalse(self.item.is_active)
+        self.assertEqual(StockHistory.objects.get(item=self.item).quantity, 0)
+        self.assertTrue(
+            Activity.objects.filter(
+                kind=Activity.KIND_ITEM_ADJUST, message="Adjusted quantity for AdjustMe: change of -5"
+            ).exists()
+        )
+        self.assertTrue(Activity.objects.filter(kind=Activity.KIND_ITEM_AUTO_ARCHIVE).exists())
+
+    def test_adjust_below_zero_is_rejected(self):
+        self.client.post(reverse("item_adjust", args=[self.item.pk]), {"adjustment": "-9"})
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 5)
+        self.assertFalse(Activity.objects.exists())
+
+
+class IntegrationTreeViewsTest(TestCase):
+    """Category/location trees render from one cached query; lazy expansion returns rollups."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.manager_pw = "MgrTreePw9"
+        cls.manager = User.objects.create_user(username="tree_manager", password=cls.manager_pw)
+        cls.manager.groups.set([Group.objects.get(name="Manager")])
+        supplier = Supplier.objects.create(name="Tree Sup")
+        cls.wh = Location.objects.create(name="Tree WH")
+        cls.aisle = Location.objects.create(name="Tree Aisle", parent=cls.wh)
+        cls.bin = Location.objects.create(name="Tree Bin", parent=cls.aisle, capacity=40)
+        Item.objects.create(
+            name="Tree Item", sku="TREE-1", quantity=10, unit_cost=Decimal("1.00"), supplier=supplier, location=cls.bin
+        )
+
+    def setUp(self):
+        self.assertTrue(self.client.login(username="tree_manager", password=self.manager_pw))
+
+    def test_lazy_nodes_endpoint_returns_subtree_rollups(self):
+        response = self.client.get(reverse("location_tree_nodes"), {"parent": self.wh.pk})
+        self.assertEqual(response.status_code, 200)
+        (aisle,) = response.json()["nodes"]
+        self.assertEqual(aisle["id"], self.aisle.pk)
+        self.assertEqual(
+            (aisle["child_count"], aisle["item_count"], aisle["subtree_item_count"], aisle["subtree_quantity"]),
+            (1, 0, 1, 10),
+        )
+        self.assertEqual(aisle["utilisation_pct"], 25.0)
+        self.assertEqual(self.client.get(reverse("location_tree_nodes"), {"parent": 999999}).status_code, 404)
+
+    def test_location_tree_page_renders_nested_nodes(self):
+        response = self.client.get(reverse("location_list"), {"view": "tree"})
+        self.assertContains(response, "Tree Bin")
+        self.assertContains(response, "25.0% full")
+        self.assertNotContains(response, 'data-lazy="1"')
+
+    def test_category_tree_query_count_does_not_grow_with_nodes(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from inventory.models import Category
+
+        def render_count():
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.client.get(reverse("category_list")).status_code, 200)
+            return len(ctx.captured_queries)
+
+        render_count()  # warm per-user caches (preferences, role sync)
+        root = Category.objects.create(name="Tree Root")
+        Category.objects.create(name="Tree Child", parent=root)
+        small = render_count()
+        for i in range(20):
+            Category.objects.create(name=f"Tree Leaf {i}", parent=root)
+        self.assertEqual(render_count(), small)
+
+
+class IntegrationDashboardWidgetsTest(TestCase):
+    """The dashboard is a light shell; each widget is its own JSON endpoint with an ETag."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.manager_pw = "MgrWidgetPw9"
+        cls.manager = User.objects.create_user(username="widget_manager", password=cls.manager_pw)
+        cls.manager.groups.set([Group.objects.get(name="Manager")])
+        supplier = Supplier.objects.create(name="Widget Sup")
+        cls.item = Item.objects.create(
+            name="Widget Item", sku="WID-1", quantity=12, unit_cost=Decimal("2.00"), supplier=supplier
+        )
+        DemandAnomaly.objects.create(item=cls.item, date=date(2025, 1, 6), quantity=90, score=-0.4, severity="HIGH")
+        DemandAnomaly.objects.create(
+            item=cls.item, date=date(2025, 1, 7), quantity=80, score=-0.2, severity="LOW", dismissed=True
+        )
+
+    def setUp(self):
+        self.assertTrue(self.client.login(username="widget_manager", password=self.manager_pw))
+
+    def widget_urls(self):
+        response = self.client.get(reverse("dashboard"))
+        self.assertEqual(response.status_code, 200)
+        return response.context["dashboard_widget_urls"]
+
+    def test_shell_lists_every_eager_widget(self):
+        from inventory.dashboard_widgets import WIDGETS
+
+        urls = self.widget_urls()
+        self.assertEqual(set(urls), {name for name, w in WIDGETS.items() if not w.lazy})
+        self.assertNotIn("anomalies", urls)
+
+    def test_shell_does_not_compute_widgets(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self.widget_urls()  # warm per-user caches
+        with CaptureQueriesContext(connection) as ctx:
+            self.widget_urls()
+        sql = " ".join(q["sql"] for q in ctx.captured_queries)
+        self.assertNotIn("inventory_stockhistory", sql)
+        self.assertNotIn("inventory_demandanomaly", sql)
+        self.assertNotIn("inventory_orderline", sql)
+
+    def test_widgets_return_fragments_with_etag_and_304(self):
+        for name, url in self.widget_urls().items():
+            with self.subTest(widget=name):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                payload = response.json()
+                self.assertEqual(payload["widget"], name)
+                self.assertIn("<template data-slot=", payload["html"])
+                self.assertTrue(response["Cache-Control"].startswith("private"))
+                again = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+                self.assertEqual(again.status_code, 304)
+                self.assertEqual(again.content, b"")
+
+    def test_stock_change_moves_versioned_widget_urls(self):
+        before = self.widget_urls()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.quantity = 30
+            self.item.save()
+        after = self.widget_urls()
+        self.assertNotEqual(before["categories"], after["categories"])
+        self.assertNotEqual(before["trend"], after["trend"])
+        self.assertEqual(before["activity"], after["activity"])
+
+        # Bulk writes (other workers, Celery, imports) move them too.
+        with self.captureOnCommitCallbacks(execute=True):
+            Item.objects.filter(pk=self.item.pk).update(quantity=31)
+        self.assertNotEqual(after["locations"], self.widget_urls()["locations"])
+
+    def test_anomalies_widget_filters_and_exports(self):
+        url = reverse("dashboard_widget", args=["anomalies"])
+        active = self.client.get(url).json()
+        self.assertEqual([r["severity"] for r in active["data"]["export_rows"]], ["HIGH"])
+        everything = self.client.get(url, {"anom_show": "all"}).json()
+        self.assertEqual(len(everything["data"]["export_rows"]), 2)
+        self.assertIn("open_anomalies=1", everything["html"])
+        self.assertEqual(self.client.get(reverse("dashboard_widget", args=["nope"])).status_code, 404)
+
+
+class IntegrationAsyncViewsTest(TestCase):
+    """The ASGI versions of the fan-out endpoints answer exactly like the sync views."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.manager = User.objects.create_user(username="async_manager", password="AsyncMgrPw9")
+        cls.manager.groups.set([Group.objects.get(name="Manager")])
+        supplier = Supplier.objects.create(name="Fanout Supplies")
+        Item.objects.create(
+            name="Fanout Widget", sku="FAN-1", quantity=1, reorder_level=5, unit_cost=Decimal("1.00"), supplier=supplier
+        )
+        Location.objects.create(name="Fanout Bay")
+        Client.objects.create(name="Fanout Customer", email="fanout@example.com")
+
+    def setUp(self):
+        self.client.force_login(self.manager)
+
+    def _async_request(self, path, params=None):
+        from django.contrib.sessions.backends.db import SessionStore
+        from django.test import AsyncRequestFactory
+
+        request = AsyncRequestFactory().get(path, params or {})
+        request.session = SessionStore()
+        request.user = self.manager
+
+        async def auser():
+            return self.manager
+
+        request.auser = auser
+        return request
+
+    async def test_search_matches_sync_view(self):
+        from asgiref.sync import sync_to_async
+
+        from inventory import async_views
+
+        url = reverse("global_search")
+        expected = (await sync_to_async(self.client.get)(url, {"q": "Fanout"})).json()
+        response = await async_views.global_search(self._async_request(url, {"q": "Fanout"}))
+        self.assertEqual(json.loads(response.content), expected)
+        self.assertEqual(
+            {row["type"] for row in expected["results"]}, {"Stock Item", "Supplier", "Customer", "Location"}
+        )
+
+    async def test_alerts_and_dashboard_render(self):
+        from asgiref.sync import sync_to_async
+
+        from inventory import async_views
+
+        sync_alerts = await sync_to_async(self.client.get)(reverse("alerts_list"))
+        response = await async_views.alerts_list(self._async_request(reverse("alerts_list")))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Low stock: Fanout Widget")
+        self.assertContains(sync_alerts, "Low stock: Fanout Widget")
+
+        response = await async_views.dashboard(self._async_request(reverse("dashboard")))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], "no-cache, no-store, must-revalidate")
+
+        url = reverse("dashboard_widget", args=["top_items"])
+        response = await async_views.dashboard_widget(self._async_request(url), "top_items")
+        self.assertEqual(json.loads(response.content)["widget"], "top_items")
+        self.assertTrue(response["ETag"])
+
+
+class IntegrationBarcodeDecodeTest(TestCase):
+    """Uploaded photos are decoded on the bounded pool; the batch endpoint streams NDJSON."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.manager = User.objects.create_user(username="scan_manager", password="ScanMgrPw9")
+        cls.manager.groups.set([Group.objects.get(name="Manager")])
+        cls.staff = User.objects.create_user(username="scan_staff", password="ScanStaffPw9")
+        cls.staff.groups.set([Group.objects.get(name="Staff")])
+
+    def _upload(self, name, text=None):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        from inventory.tests.test_unit import _barcode_photo
+
+        data = _barcode_photo(text, size=(1600, 1200), bar=(600, 180)) if text else b"junk"
+        return SimpleUploadedFile(name, data, content_type="image/jpeg")
+
+    def test_single_upload(self):
+        self.client.force_login(self.manager)
+        response = self.client.post(reverse("decode_barcode_upload"), {"image": self._upload("a.jpg", "REC-1")})
+        self.assertEqual(response.json(), {"ok": True, "text": "REC-1", "format": "Code 128"})
+        response = self.client.post(reverse("decode_barcode_upload"), {"image": self._upload("b.jpg")})
+        self.assertEqual((response.status_code, response.json()["error"]), (400, "invalid_image"))
+
+    def test_batch_streams_one_line_per_image(self):
+        self.client.force_login(self.manager)
+        uploads = [self._upload(f"p{i}.jpg", f"PAL-{i}") for i in range(3)] + [self._upload("bad.jpg")]
+        response = self.client.post(reverse("decode_barcode_batch"), {"images": uploads})
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual(lines[-1], {"done": True, "decoded": 3, "failed": 1})
+        by_index = {line["index"]: line for line in lines[:-1]}
+        self.assertEqual([by_index[i]["text"] for i in range(3)], ["PAL-0", "PAL-1", "PAL-2"])
+        self.assertEqual((by_index[3]["name"], by_index[3]["error"]), ("bad.jpg", "invalid_image"))
+
+    def test_batch_requires_item_edit_permission(self):
+        self.client.force_login(self.staff)
+        response = self.client.post(reverse("decode_barcode_batch"), {"images": [self._upload("a.jpg", "X")]})
+        self.assertEqual(response.status_code, 403)
+
+
+class IntegrationItemImportTest(TestCase):
+    """Managers upload a catalogue file; bad rows come back as a downloadable report."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.manager = User.objects.create_user(username="import_manager", password="ImportMgrPw9")
+        cls.manager.groups.set([Group.objects.get(name="Manager")])
+        cls.staff = User.objects.create_user(username="import_staff", password="ImportStaffPw9")
+        cls.staff.groups.set([Group.objects.get(name="Staff")])
+        Supplier.objects.create(name="Catalogue Supplier")
+
+    def _upload(self, text, **extra):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        upload = SimpleUploadedFile("catalogue.csv", text.encode(), content_type="text/csv")
+        return self.client.post(reverse("item_import"), {"file": upload, **extra})
+
+    def test_upload_imports_and_offers_error_report(self):
+        self.client.force_login(self.manager)
+        response = self._upload(
+            "SKU,Name,Unit Cost,Supplier,Quantity\n"
+            "CAT-1,Shelf bracket,3.20,Catalogue Supplier,12\n"
+            "CAT-2,Hinge,,Catalogue Supplier,5\n"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Item.objects.get(sku="CAT-1").quantity, 12)
+        report = response.context["report"]
+        self.assertEqual((report.created, report.error_rows), (1, 1))
+        self.assertContains(response, "Unit cost is required for new items.")
+
+        errors = self.client.get(reverse("item_import_errors", args=[response.context["report_token"]]))
+        self.assertEqual(errors["Content-Type"], "text/csv")
+        self.assertIn("3,CAT-2,unit_cost,", errors.content.decode())
+        self.assertEqual(Activity.objects.filter(kind=Activity.KIND_ITEM_IMPORT, user=self.manager).count(), 1)
+
+    def test_validate_only_and_permissions(self):
+        self.client.force_login(self.manager)
+        response = self._upload("sku,name,unit_cost,supplier\nCAT-9,Lamp,9,Catalogue Supplier\n", dry_run="1")
+        self.assertContains(response, "To create")
+        self.assertFalse(Item.objects.filter(sku="CAT-9").exists())
+        self.assertContains(self._upload("name\nNo SKU column\n"), "The file needs a SKU column.")
+
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(reverse("item_import")).status_code, 403)
+
+
+class IntegrationScanLookupTest(TestCase):
+    """Scanned SKUs, barcodes and serials resolve to items, one at a time or in bulk."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.staff = User.objects.create_user(username="scan_lookup_staff", password="ScanLookupPw9")
+        cls.staff.groups.set([Group.objects.get(name="Staff")])
+        supplier = Supplier.objects.create(name="Lookup Supplier")
+        cls.item = Item.objects.create(
+            name="Pallet Jack",
+            sku="PJ-1",
+            barcode="0001112223334",
+            serial_numbers="PJ-SN-1\nPJ-SN-2",
+            quantity=4,
+            unit_cost=Decimal("99.00"),
+            supplier=supplier,
+        )
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def test_single_lookup(self):
+        response = self.client.get(reverse("scan_lookup"), {"code": " 0001112223334 "})
+        body = response.json()
+        self.assertEqual((body["found"], body["kind"], body["item"]["sku"]), (True, "barcode", "PJ-1"))
+        self.assertEqual(body["item"]["quantity"], 4)
+        self.assertEqual(self.client.get(reverse("scan_lookup"), {"code": "??"}).status_code, 404)
+
+    def test_bulk_lookup(self):
+        codes = ["PJ-SN-2", "PJ-1", "UNKNOWN"] + [f"X-{i}" for i in range(300)]
+        response = self.client.post(
+            reverse("scan_lookup"), data=json.dumps({"codes": codes}), content_type="application/json"
+        )
+        body = response.json()
+        self.assertEqual(body["results"]["PJ-SN-2"]["kind"], "serial")
+        self.assertEqual(body["results"]["PJ-1"]["item"]["id"], self.item.pk)
+        self.assertEqual(len(body["missing"]), 301)
+
+        too_many = json.dumps({"codes": [f"X-{i}" for i in range(501)]})
+        response = self.client.post(reverse("scan_lookup"), data=too_many, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+
+class IntegrationCycleCountTest(TestCase):
+    """Start a count, scan and paste counts, approve; Staff cannot reach it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.manager = User.objects.create_user(username="count_manager", password="CountMgrPw9")
+        cls.manager.groups.set([Group.objects.get(name="Manager")])
+        cls.staff = User.objects.create_user(username="count_staff", password="CountStaffPw9")
+        cls.staff.groups.set([Group.objects.get(name="Staff")])
+        supplier = Supplier.objects.create(name="Count Co")
+        cls.bay = Location.objects.create(name="Count Bay")
+        cls.bolt = Item.objects.create(
+            name="Bolt", sku="CNT-1", quantity=20, unit_cost=Decimal("1.00"), supplier=supplier, location=cls.bay
+        )
+        cls.nut = Item.objects.create(
+            name="Nut", sku="CNT-2", quantity=5, unit_cost=Decimal("1.00"), supplier=supplier, location=cls.bay
+        )
+
+    def test_count_and_approve(self):
+        self.client.force_login(self.manager)
+        response = self.client.post(reverse("cycle_count_list"), {"name": "Bay check", "location": self.bay.pk})
+        session_url = response["Location"]
+        self.client.post(session_url, {"code": "CNT-1", "quantity": "18"})
+        self.client.post(session_url, {"counts": "CNT-1\nMISSING,3\n", "mode": "add"})
+
+        page = self.client.get(session_url)
+        self.assertContains(page, "Not counted yet in Count Bay")
+        self.assertEqual(page.context["summary"]["net_units"], -1)
+        self.assertEqual([line.diff for line in page.context["lines"]], [-1])
+
+        self.client.post(session_url.rstrip("/") + "/approve/")
+        self.bolt.refresh_from_db()
+        self.nut.refresh_from_db()
+        self.assertEqual((self.bolt.quantity, self.nut.quantity), (19, 5))
+        self.assertContains(self.client.get(session_url), "Approved")
+
+    def test_staff_forbidden(self):
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(reverse("cycle_count_list")).status_code, 403)
+
+
+class IntegrationOrderBulkStatusTest(TestCase):
+    """Bulk delivered/shipped/cancelled from the Orders page, with a per-order report."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.manager = User.objects.create_user(username="bulk_manager", password="BulkMgrPw9")
+        cls.manager.groups.set([Group.objects.get(name="Manager")])
+        cls.staff = User.objects.create_user(username="bulk_staff", password="BulkStaffPw9")
+        cls.staff.groups.set([Group.objects.get(name="Staff")])
+        supplier = Supplier.objects.create(name="Bulk Co")
+        customer = Client.objects.create(name="Bulk Buyer")
+        cls.item = Item.objects.create(name="Pallet", sku="PAL-1", quantity=4, unit_cost=Decimal("1.00"), supplier=supplier)
+        cls.orders = []
+        for qty in (3, 3):
+            order = Order.objects.create(order_type=Order.TYPE_SALE, client=customer)
+            OrderLine.objects.create(order=order, item=cls.item, quantity=qty, unit_price=Decimal("2.00"))
+            cls.orders.append(order)
+
+    def test_json_report(self):
+        self.client.force_login(self.manager)
+        response = self.client.post(
+            reverse("order_bulk_status"),
+            {"status": "delivered", "selected_orders": [o.pk for o in self.orders]},
+            HTTP_ACCEPT="application/json",
+        )
+        data = response.json()
+        self.assertEqual((data["succeeded"], data["failed"]), (1, 1))
+        self.assertFalse(data["orders"][1]["ok"])
+        self.assertIn("Insufficient stock", data["orders"][1]["error"])
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 1)
+
+    def test_form_post_reports_with_messages(self):
+        self.client.force_login(self.manager)
+        response = self.client.post(
+            reverse("order_bulk_status"),
+            {"status": "cancelled", "selected_orders": [o.pk for o in self.orders], "next": "/orders/?type=sale"},
+            follow=True,
+        )
+        self.assertContains(response, "2 order(s) marked cancelled")
+        self.assertEqual(Order.objects.filter(status=Order.STATUS_CANCELLED).count(), 2)
+
+    def test_staff_forbidden(self):
+        self.client.force_login(self.staff)
+        response = self.client.post(reverse("order_bulk_status"), {"status": "delivered", "selected_orders": [self.orders[0].pk]})
+        self.assertEqual(response.status_code, 403)
+
+
+class IntegrationApiTest(TestCase):
+    """The /api/v1/ JSON API: Basic auth, includes and permission checks."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.manager = User.objects.create_user(username="api_manager", password="ApiMgrPw9")
+        cls.manager.groups.set([Group.objects.get(name="Manager")])
+        cls.staff = User.objects.create_user(username="api_staff", password="ApiStaffPw9")
+        cls.staff.groups.set([Group.objects.get(name="Staff")])
+        supplier = Supplier.objects.create(name="Api Co")
+        cls.customer = Client.objects.create(name="Api Buyer")
+        cls.item = Item.objects.create(name="Crate", sku="CRT-1", quantity=10, unit_cost=Decimal("1.00"), supplier=supplier)
+
+    def _basic(self, username, password):
+        import base64
+
+        return {"HTTP_AUTHORIZATION": "Basic " + base64.b64encode(f"{username}:{password}".encode()).decode()}
+
+    def test_basic_auth_batch_order_applies_stock(self):
+        record = {
+            "order_type": Order.TYPE_SALE,
+            "client": self.customer.pk,
+            "order_date": "2026-03-01",
+            "status": Order.STATUS_DELIVERED,
+            "priority": "MEDIUM",
+            "lines": [{"item": self.item.pk, "quantity": 4, "unit_price": "2.50"}],
+        }
+        response = self.client.post(
+            reverse("api_batch", args=["orders"]),
+            json.dumps({"records": [record]}),
+            content_type="application/json",
+            **self._basic("api_manager", "ApiMgrPw9"),
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        order_id = response.json()["results"][0]["id"]
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 6)
+
+        data = self.client.get(
+            reverse("api_detail", args=["orders", order_id]), {"include": "lines", "fields": "status"},
+            **self._basic("api_manager", "ApiMgrPw9"),
+        ).json()
+        self.assertEqual(data["status"], Order.STATUS_DELIVERED)
+        self.assertEqual(data["lines"][0]["quantity"], 4)
+
+    def test_staff_reads_but_cannot_write(self):
+        self.client.force_login(self.staff)
+        listing = self.client.get(reverse("api_list", args=["stock"]))
+        self.assertEqual(listing.json()["results"][0]["sku"], "CRT-1")
+        response = self.client.post(
+            reverse("api_batch", args=["items"]),
+            json.dumps({"records": [{"id": self.item.pk, "quantity": 1}]}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 403)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 10)
+
+    def test_errors_are_json(self):
+        self.assertEqual(self.client.get(reverse("api_list", args=["items"])).status_code, 401)
+        bad = self.client.get(reverse("api_list", args=["items"]), **self._basic("api_manager", "wrong"))
+        self.assertEqual(bad.json()["error"], "unauthorized")
+        self.client.force_login(self.manager)
+        self.assertEqual(self.client.get(reverse("api_list", args=["items"]), {"fields": "nope"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("api_list", args=["widgets"])).status_code, 404)
+
+    def test_malformed_foreign_key_filters_are_rejected(self):
+        self.client.force_login(self.manager)
+        for resource, params in (("items", {"location": "abc"}), ("orders", {"client": "x"})):
+            response = self.client.get(reverse("api_list", args=[resource]), params)
+            self.assertEqual(response.status_code, 400, resource)
+            self.assertEqual(response.json()["error"], "invalid_filter")
+        ok = self.client.get(reverse("api_list", args=["orders"]), {"client": str(self.customer.pk)})
+        self.assertEqual(ok.status_code, 200)
+
+
+class IntegrationConditionalGetTest(TestCase):
+    """Unchanged list pages, exports and API collections answer 304 without running the view."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.manager = User.objects.create_user(username="etag_manager", password="EtagMgrPw9")
+        cls.manager.groups.set([Group.objects.get(name="Manager")])
+        cls.supplier = Supplier.objects.create(name="Etag Co")
+        cls.item = Item.objects.create(name="Lid", sku="ETAG-1", quantity=3, unit_cost=Decimal("1.00"), supplier=cls.supplier)
+
+    def setUp(self):
+        from django.conf import settings
+
+        self.client.force_login(self.manager)
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = "e" * 32
+
+    def test_item_list_revalidates_until_an_item_changes(self):
+        url = reverse("item_list")
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first["Cache-Control"], "private, no-cache")
+        with self.assertNumQueries(5):  # session, user, two permission reads, versions
+            again = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(again.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Item.objects.filter(pk=self.item.pk).update(quantity=9)
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], first["ETag"])
+
+    def test_exports_and_api_are_conditional(self):
+        for url in (reverse("item_export_csv"), reverse("api_list", args=["stock"])):
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200, url)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304, url)
+        # A different query string is a different resource.
+        other = self.client.get(reverse("api_list", args=["stock"]), {"fields": "sku"}, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(other.status_code, 200)
+
+    def test_session_dismissals_change_the_etag(self):
+        url = reverse("item_list")
+        first = self.client.get(url)
+        self.client.post(reverse("dismiss_alert"), {"key": "low_stock:0"})
+        session_page = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(session_page.status_code, 200)  # dismissals are part of the ETag
+
+
+class IntegrationManualAnomalyScanTest(TestCase):
+    """The scan button queues a background scan, dedups clicks, and the banner polls its progress."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.first = User.objects.create_user(username="scan_first", password="ScanFirstPw9")
+        cls.second = User.objects.create_user(username="scan_second", password="ScanSecondPw9")
+        for user in (cls.first, cls.second):
+            user.groups.set([Group.objects.get(name="Manager")])
+
+    def _client(self, user):
+        http = HttpClient()
+        http.force_login(user)
+        return http
+
+    def test_clicks_share_one_scan_and_banner_follows_it(self):
+        from unittest import mock
+
+        from inventory import manual_scans
+        from inventory.models import JobRun, Notification
+
+        first, second = self._client(self.first), self._client(self.second)
+        with mock.patch("inventory.manual_scans._dispatch") as dispatch, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.assertRedirects(first.get(reverse("run_anomaly_scan")), reverse("dashboard"), fetch_redirect_response=False)
+            second.get(reverse("run_anomaly_scan"))
+        # Only the first click queued work; the scan never ran inside the request.
+        run = JobRun.objects.get()
+        dispatch.assert_called_once_with(run.pk, self.first.pk)
+        self.assertEqual((run.status, run.lock, run.user), (JobRun.STATUS_QUEUED, "anomaly_scan", self.first))
+
+        status = second.get(reverse("anomaly_scan_status")).json()
+        self.assertEqual((status["active"], status["id"], status["status"]), (True, run.pk, "queued"))
+        self.assertContains(second.get(reverse("dashboard")), 'id="wwAnomalyScanProgress"')
+
+        manual_scans.run_scan(run.pk, self.first.pk)
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.lock), (JobRun.STATUS_OK, None))
+        self.assertEqual(first.get(reverse("anomaly_scan_status")).json(), {"active": False})
+        self.assertEqual(second.get(reverse("anomaly_scan_status")).json(), {"active": False})
+        for user in (self.first, self.second):
+            self.assertTrue(
+                Notification.objects.filter(user=user, message__startswith="[ANOMALY_SCAN_RESULT] ").exists()
+            )
+
+    def test_stale_scan_does_not_block_a_new_one(self):
+        import datetime
+
+        from django.utils import timezone
+
+        from inventory import manual_scans
+        from inventory.models import JobRun
+
+        long_ago = timezone.now() - datetime.timedelta(hours=2)
+        stuck = JobRun.objects.create(
+            name="anomaly_scan", status=JobRun.STATUS_RUNNING, lock="anomaly_scan", updated_at=long_ago
+        )
+        run, started = manual_scans.start_scan(self.first)
+        self.assertTrue(started)
+        self.assertNotEqual(run.pk, stuck.pk)
+        stuck.refresh_from_db()
+        self.assertEqual((stuck.status, stuck.lock), (JobRun.STATUS_FAILED, None))
+
+
+class IntegrationJobRunsTest(TestCase):
+    """The job telemetry page and feed are manager-only."""
+
+    @classmethod
+    def setUpTestData(cls):
+        from inventory.models import JobRun
+
+        User = get_user_model()
+        cls.staff = User.objects.create_user(username="jobs_staff", password="StaffJobsPw9")
+        cls.staff.groups.set([Group.objects.get(name="Staff")])
+        cls.manager = User.objects.create_user(username="jobs_manager", password="MgrJobsPw9")
+        cls.manager.groups.set([Group.objects.get(name="Manager")])
+        JobRun.objects.create(
+            name="anomaly_scan", status=JobRun.STATUS_OK, duration_seconds=4.0,
+            stages={"load": 1.0, "detect": 1.0, "save": 0.5, "prune": 1.2, "notify": 0.3},
+            rows={"detected": 12}, query_count=40,
+        )
+        JobRun.objects.create(name="refresh_recommendations", status=JobRun.STATUS_FAILED, error="boom")
+
+    def test_manager_sees_runs_and_feed(self):
+        http = HttpClient()
+        http.force_login(self.manager)
+        response = http.get(reverse("job_run_list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "refresh_recommendations")
+        self.assertContains(response, "prune 1.20s")
+
+        feed = http.get(reverse("job_run_feed"), {"name": "anomaly_scan"}).json()
+        self.assertEqual([run["name"] for run in feed["runs"]], ["anomaly_scan"])
+        self.assertEqual(feed["runs"][0]["stages"]["prune"], 1.2)
+        self.assertEqual(feed["summary"]["anomaly_scan"]["median_duration_seconds"], 4.0)
+
+    def test_staff_cannot_read_job_runs(self):
+        http = HttpClient()
+        http.force_login(self.staff)
+        self.assertEqual(http.get(reverse("job_run_list")).status_code, 302)
+        self.assertEqual(http.get(reverse("job_run_feed")).status_code, 302)
+
+
+class IntegrationRequestMetricsTest(TestCase):
+    """Request instrumentation feeds ``/metrics`` (managers only) and warns on query budgets."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.staff_pw = "StaffMetricsPw9"
+        cls.manager_pw = "MgrMetricsPw9"
+        cls.staff = User.objects.create_user(username="metrics_staff", password=cls.staff_pw)
+        cls.staff.groups.set([Group.objects.get(name="Staff")])
+        cls.manager = User.objects.create_user(username="metrics_manager", password=cls.manager_pw)
+        cls.manager.groups.set([Group.objects.get(name="Manager")])
+
+    def setUp(self):
+        from inventory.request_metrics import registry
+
+        registry.reset()
+
+    def test_manager_sees_dashboard_histograms(self):
+        http = HttpClient()
+        self.assertTrue(http.login(username="metrics_manager", password=self.manager_pw))
+        self.assertEqual(http.get(reverse("dashboard")).status_code, 200)
+
+        response = http.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('warewolf_request_sql_queries_count{view="dashboard"} 1', body)
+        self.assertIn('warewolf_request_template_seconds_count{view="dashboard"} 1', body)
+        self.assertIn('section="build_alerts"', body)
+
+    def test_staff_cannot_read_metrics(self):
+        http = HttpClient()
+        self.assertTrue(http.login(username="metrics_staff", password=self.staff_pw))
+        response = http.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(REQUEST_METRICS_QUERY_BUDGETS={"item_list": 1})
+    def test_query_budget_warning(self):
+        http = HttpClient()
+        self.assertTrue(http.login(username="metrics_staff", password=self.staff_pw))
+        with self.assertLogs("inventory.request_metrics", level="WARNING") as logs:
+            http.get(reverse("item_list"))
+        self.assertIn("Query budget exceeded for item_list", logs.output[0])
+
+    def test_jsonl_output(self):
+        import tempfile
+        from pathlib import Path
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "requests.jsonl"
+            with override_settings(REQUEST_METRICS_JSONL_PATH=str(path)):
+                http = HttpClient()
+                self.assertTrue(http.login(username="metrics_staff", password=self.staff_pw))
+                http.get(reverse("item_list"))
+                from inventory import request_metrics
+
+                request_metrics._jsonl_handler.flush()
+                rows = [json.loads(line) for line in path.read_text().splitlines()]
+                request_metrics._jsonl_handler.close()
+                request_metrics._jsonl_handler = None
+        self.assertEqual(rows[-1]["view"], "item_list")
+        self.assertGreater(rows[-1]["sql_count"], 0)
+
+
+class IntegrationBenchmarkScaleCommandTest(TestCase):
+    """``benchmark_scale`` generates tagged synthetic rows and reports timings for every key view."""
+
+    def test_small_run_writes_report(self):
+        import tempfile
+        from io import StringIO
+        from pathlib import Path
+
+        from django.core.management import CommandError, call_command
+
+        with tempfile.TemporaryDirectory() as tmp:
+            out = Path(tmp) / "report.json"
+            call_command(
+                "benchmark_scale",
+                items=30,
+                order_lines=120,
+                customers=5,
+                suppliers=3,
+                locations=12,
+                categories=6,
+                notifications=50,
+                users=2,
+                history_days=3,
+                repeat=1,
+                output=str(out),
+                stdout=StringIO(),
+            )
+            report = json.loads(out.read_text())
+
+        self.assertEqual(report["generation"]["created"]["items"], 30)
+        self.assertEqual(report["generation"]["created"]["order_lines"], 120)
+        for label in ("dashboard", "item_list", "order_list", "contacts_list", "alerts_list", "global_search"):
+            self.assertEqual(report["views"][label]["status"], 200, label)
+            self.assertGreater(report["views"][label]["queries"], 0)
+
+        with self.assertRaisesMessage(CommandError, "--purge"):
+            call_command("benchmark_scale", items=1, order_lines=0, notifications=0, stdout=StringIO())
+
+        call_command("benchmark_scale", purge=True, stdout=StringIO())
+        self.assertFalse(Item.objects.filter(sku__startswith="SYN-").exists())
+        self.assertFalse(Order.objects.filter(reference__startswith="SYN-").exists())
+
+
+class IntegrationBenchmarkConcurrencyCommandTest(LiveServerTestCase):
+    """``benchmark_concurrency`` loads every fan-out endpoint on each target and reports percentiles."""
+
+    # The live server's threads share one SQLite connection, so per-request query
+    # counts would bleed into each other and trip the budget warnings.
+    @override_settings(REQUEST_METRICS_ENABLED=False)
+    def test_small_run_against_live_server(self):
+        import tempfile
+        from io import StringIO
+        from pathlib import Path
+
+        from django.core.management import call_command
+
+        with tempfile.TemporaryDirectory() as tmp:
+            out = Path(tmp) / "concurrency.json"
+            stdout = StringIO()
+            call_command(
+                "benchmark_concurrency",
+                target=[f"a={self.live_server_url}", f"b={self.live_server_url}"],
+                concurrency=4,
+                requests=6,
+                output=str(out),
+                stdout=stdout,
+            )
+            report = json.loads(out.read_text())
+
+        self.assertEqual(set(report["targets"]), {"a", "b"})
+        for endpoint in ("dashboard", "dashboard_widget", "alerts_list", "global_search"):
+            stats = report["targets"]["a"][endpoint]
+            self.assertEqual((stats["requests"], stats["errors"]), (6, 0), endpoint)
+            self.assertLessEqual(stats["p50_ms"], stats["p95_ms"])
+        self.assertIn("p95 vs a:", stdout.getvalue())
+
+
+class IntegrationBenchmarkJobsCommandTest(TestCase):
+    """``benchmark_jobs`` measures every job, leaves no data behind and fails on regressions."""
+
+    def test_small_run_and_baseline_regression(self):
+        import tempfile
+        from io import StringIO
+        from pathlib import Path
+
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+
+        with tempfile.TemporaryDirectory() as tmp:
+            out = Path(tmp) / "jobs.json"
+            call_command("benchmark_jobs", skus="40", lines_per_sku=5, output=str(out), stdout=StringIO())
+            report = json.loads(out.read_text())
+
+            jobs = report["results"]["40"]
+            self.assertIn("detect_sales_anomalies", jobs)
+            self.assertIn("sync_recommendation_notifications", jobs)
+            self.assertGreater(jobs["recalculate_all_recommendations"]["queries"], 0)
+            self.assertFalse(Item.objects.filter(sku__startswith="SYN-").exists())
+
+            # A baseline claiming everything used to be free must trip the threshold.
+            for m in jobs.values():
+                m["queries"] = 0
+            out.write_text(json.dumps(report))
+            with self.assertRaises(CommandError):
+                call_command(
+                    "benchmark_jobs", skus="40", lines_per_sku=5, baseline=str(out), stdout=StringIO()
+                )
+
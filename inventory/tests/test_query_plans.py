@@ -0,0 +1,200 @@
+"""
+Query plan regression tests.
+
+Seeds the hot tables with enough rows that a planner would rather use an index
+than read the whole table, then runs EXPLAIN on the selective filters used by
+the dashboard, item list, bell dropdown and background jobs. A sequential scan
+on any of those tables means an index from 0046_hot_path_indexes was dropped or
+a query was rewritten so it can no longer use one.
+"""
+import re
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+
+from inventory.models import (
+    Activity,
+    DemandAnomaly,
+    Item,
+    Notification,
+    Order,
+    OrderLine,
+    StockHistory,
+    Supplier,
+)
+
+N_ITEMS = 400
+N_ORDERS = 4000
+N_USERS = 20
+N_NOTES_PER_USER = 150
+N_HISTORY_DAYS = 15
+
+
+def _seq_scans(plan, tables):
+    """Return the tables from ``tables`` that the plan reads with a full scan."""
+    hits = []
+    for table in tables:
+        if connection.vendor == "postgresql":
+            pattern = rf"Seq Scan on {re.escape(table)}\b"
+        else:
+            # SQLite: "SCAN <table>" (or "SCAN TABLE <table>") without an index.
+            pattern = rf"\bSCAN (?:TABLE )?{re.escape(table)}\b(?! USING (?:COVERING )?INDEX)"
+        if re.search(pattern, plan):
+            hits.append(table)
+    return hits
+
+
+class HotQueryPlanTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.users = User.objects.bulk_create(
+            [User(username=f"plan_user_{i}") for i in range(N_USERS)]
+        )
+        supplier = Supplier.objects.create(name="Plan Supplier")
+        cls.items = Item.objects.bulk_create(
+            [
+                Item(
+                    name=f"Plan Item {i}",
+                    sku=f"PLAN-{i:05d}",
+                    barcode=f"50000{i:08d}",
+                    quantity=0 if i % 97 == 0 else 10 + i % 50,
+                    reorder_level=5,
+                    unit_cost=Decimal("1.00"),
+                    supplier=supplier,
+                    is_active=i % 53 != 0,
+                )
+                for i in range(N_ITEMS)
+            ]
+        )
+
+        today = date.today()
+        orders = Order.objects.bulk_create(
+            [
+                Order(
+                    order_type=Order.TYPE_SALE if i % 2 else Order.TYPE_PURCHASE,
+                    status=Order.STATUS_PENDING if i % 40 == 0 else Order.STATUS_DELIVERED,
+                    order_date=today - timedelta(days=i % 1400),
+                    stock_applied=i % 40 != 0,
+                )
+                for i in range(N_ORDERS)
+            ]
+        )
+        OrderLine.objects.bulk_create(
+            [
+                OrderLine(
+                    order=o,
+                    item=cls.items[i % N_ITEMS],
+                    quantity=1 + i % 5,
+                    unit_price=Decimal("2.00"),
+                )
+                for i, o in enumerate(orders)
+            ],
+            batch_size=1000,
+        )
+        StockHistory.objects.bulk_create(
+            [
+                StockHistory(item=item, date=today - timedelta(days=d), quantity=d)
+                for item in cls.items
+                for d in range(N_HISTORY_DAYS)
+            ],
+            batch_size=1000,
+        )
+        Notification.objects.bulk_create(
+            [
+                Notification(
+                    user=u,
+                    message=f"Note {j}",
+                    is_read=j % 10 != 0,
+                    dismissed=j % 3 == 0,
+                )
+                for u in cls.users
+                for j in range(N_NOTES_PER_USER)
+            ],
+            batch_size=1000,
+        )
+        Activity.objects.bulk_create(
+            [
+                Activity(message=f"Activity {j}", user=cls.users[j % N_USERS])
+                for j in range(N_USERS * N_NOTES_PER_USER)
+            ],
+            batch_size=1000,
+        )
+        DemandAnomaly.objects.bulk_create(
+            [
+                DemandAnomaly(
+                    item=item,
+                    date=today - timedelta(days=d),
+                    quantity=10,
+                    score=float(d),
+                    dismissed=(d + idx) % 25 != 0,
+                )
+                for idx, item in enumerate(cls.items)
+                for d in range(N_HISTORY_DAYS)
+            ],
+            batch_size=1000,
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def assertNoSeqScan(self, qs, *tables):
+        plan = qs.explain()
+        hits = _seq_scans(plan, tables)
+        self.assertEqual(hits, [], f"Sequential scan on {hits}:\n{plan}")
+
+    def test_dashboard_pending_order_counts(self):
+        qs = Order.objects.filter(
+            status=Order.STATUS_PENDING,
+            order_type=Order.TYPE_PURCHASE,
+        ).order_by()
+        self.assertNoSeqScan(qs, "inventory_order")
+
+    def test_dashboard_weekly_orders_range(self):
+        start = date.today() - timedelta(weeks=6)
+        qs = Order.objects.filter(order_date__gte=start, order_date__lte=date.today()).values_list(
+            "order_date", "order_type"
+        )
+        self.assertNoSeqScan(qs, "inventory_order")
+
+    def test_item_list_out_of_stock_filter(self):
+        qs = Item.objects.filter(is_active=True, quantity__lte=0)
+        self.assertNoSeqScan(qs, "inventory_item")
+
+    def test_barcode_lookup(self):
+        qs = Item.objects.filter(barcode=self.items[123].barcode)
+        self.assertNoSeqScan(qs, "inventory_item")
+
+    def test_item_order_lines(self):
+        qs = OrderLine.objects.filter(item=self.items[7]).select_related("order")
+        self.assertNoSeqScan(qs, "inventory_orderline")
+
+    def test_sales_lines_by_date_range(self):
+        start = date.today() - timedelta(days=30)
+        qs = OrderLine.objects.filter(order_date__range=(start, date.today())).values("item_id", "order_date")
+        self.assertNoSeqScan(qs, "inventory_orderline")
+
+    def test_stock_history_for_item_and_date(self):
+        qs = StockHistory.objects.filter(item=self.items[3], date=date.today())
+        self.assertNoSeqScan(qs, "inventory_stockhistory")
+
+    def test_bell_dropdown_notifications(self):
+        qs = Notification.objects.filter(
+            user=self.users[4], is_read=False, dismissed=False
+        ).order_by("-created_at")[:10]
+        self.assertNoSeqScan(qs, "inventory_notification")
+
+    def test_user_activity_page(self):
+        qs = Activity.objects.filter(user=self.users[2]).order_by("-timestamp")[:500]
+        self.assertNoSeqScan(qs, "inventory_activity")
+
+    def test_recent_active_anomalies(self):
+        qs = (
+            DemandAnomaly.objects.filter(dismissed=False)
+            .select_related("item")
+            .order_by("-date", "-score")[:8]
+        )
+        self.assertNoSeqScan(qs, "inventory_demandanomaly")
@@ -2,20 +2,28 @@ from datetime import date
 from decimal import Decimal
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase, override_settings
 
 from inventory import alerts_jobs
 from inventory.ml import anomaly as anomaly_ml
 from inventory.ml.anomaly import AnomalyResult, anomaly_keep_set, build_daily_sales_df, detect_sales_anomalies
 
 from inventory.models import (
+    Activity,
     Category,
     Client,
+    CycleCount,
+    InventoryDailyTotal,
     Item,
+    JobRun,
     Location,
+    Notification,
     Order,
     OrderLine,
     Recommendation,
+    ScanCode,
+    StockHistory,
+    StockMovement,
     Supplier,
     UserPreference,
 )
@@ -91,6 +99,43 @@ class LocationModelTest(TestCase):
         shelf = Location.objects.create(name="Shelf B", parent=aisle)
         self.assertEqual(shelf.get_breadcrumb(), "Warehouse A → Aisle 2 → Shelf B")
 
+    def test_stored_paths_follow_moves_and_renames(self):
+        wh = Location.objects.create(name="WH")
+        aisle = Location.objects.create(name="Aisle", parent=wh)
+        shelf = Location.objects.create(name="Shelf", parent=aisle)
+        other = Location.objects.create(name="WH2")
+        self.assertEqual((shelf.tree_path, shelf.depth, shelf.ancestor_ids),
+                         (f"{wh.pk}/{aisle.pk}/{shelf.pk}/", 2, [wh.pk, aisle.pk]))
+
+        aisle.parent = other
+        aisle.name = "Aisle 9"
+        aisle.save()
+        shelf.refresh_from_db()
+        self.assertEqual(shelf.name_path, "WH2 → Aisle 9 → Shelf")
+        self.assertEqual(shelf.ancestor_ids, [other.pk, aisle.pk])
+        self.assertEqual(set(other.subtree().values_list("name", flat=True)), {"WH2", "Aisle 9", "Shelf"})
+
+        with self.assertNumQueries(1):
+            self.assertEqual(Location.objects.get(pk=shelf.pk).get_breadcrumb(), "WH2 → Aisle 9 → Shelf")
+
+        with self.assertRaises(ValueError):
+            other.parent = shelf
+            other.save()
+
+    def test_delete_reroots_sublocations(self):
+        wh = Location.objects.create(name="WH")
+        aisle = Location.objects.create(name="Aisle", parent=wh)
+        shelf = Location.objects.create(name="Shelf", parent=aisle)
+        wh.delete()
+        shelf.refresh_from_db()
+        self.assertEqual((shelf.name_path, shelf.depth), ("Aisle → Shelf", 1))
+
+    def test_rebuild_tree_paths_after_bulk_create(self):
+        root = Category.objects.create(name="Root")
+        Category.objects.bulk_create([Category(name="Leaf", parent=root)])
+        self.assertEqual(Category.rebuild_tree_paths(), 1)
+        self.assertEqual(Category.objects.get(name="Leaf").full_path, "Root > Leaf")
+
     def test_stock_count(self):
         supplier = Supplier.objects.create(name="S")
         loc = Location.objects.create(name="Bin-1")
@@ -182,6 +227,1161 @@ class OrderModelTest(TestCase):
         self.assertIn("Bolt", s)
 
 
+class OrderApplyStockBatchTest(TestCase):
+    """``apply_stock_if_needed`` applies all lines as one atomic, constant-query batch."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.supplier = Supplier.objects.create(name="Batch Sup")
+        cls.client_obj = Client.objects.create(name="Batch Cust")
+        # Today's InventoryDailyTotal row normally exists (created by the first
+        # change of the day or the nightly job); deliveries then F()-update it.
+        from inventory.daily_totals import refresh_day
+
+        refresh_day()
+
+    def _items(self, n, qty=10, **extra):
+        return [
+            Item.objects.create(
+                name=f"Batch {i}",
+                sku=f"BATCH-{len(extra)}-{qty}-{i}",
+                quantity=qty,
+                unit_cost=Decimal("1.00"),
+                supplier=self.supplier,
+                **extra,
+            )
+            for i in range(n)
+        ]
+
+    def _order(self, order_type, items, qty):
+        order = Order.objects.create(
+            order_type=order_type,
+            supplier=self.supplier if order_type == Order.TYPE_PURCHASE else None,
+            client=self.client_obj if order_type == Order.TYPE_SALE else None,
+            status=Order.STATUS_DELIVERED,
+        )
+        OrderLine.objects.bulk_create(
+            [OrderLine(order=order, item=it, quantity=qty, unit_price=Decimal("1.00")) for it in items]
+        )
+        return order
+
+    def _count_queries(self, order):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            order.apply_stock_if_needed()
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_lines(self):
+        small = self._count_queries(self._order(Order.TYPE_PURCHASE, self._items(3), 2))
+        large = self._count_queries(self._order(Order.TYPE_PURCHASE, self._items(60, qty=5), 2))
+        self.assertEqual(small, large)
+        self.assertLess(large, 20)
+        self.assertEqual(StockHistory.objects.count(), 63)
+        self.assertEqual(Activity.objects.filter(kind=Activity.KIND_ORDER_STOCK).count(), 63)
+
+    def test_insufficient_sale_stock_applies_nothing(self):
+        ok, short = self._items(2, qty=4)
+        order = Order.objects.create(
+            order_type=Order.TYPE_SALE, client=self.client_obj, status=Order.STATUS_DELIVERED
+        )
+        OrderLine.objects.create(order=order, item=ok, quantity=3, unit_price=Decimal("1.00"))
+        OrderLine.objects.create(order=order, item=short, quantity=2, unit_price=Decimal("1.00"))
+        OrderLine.objects.create(order=order, item=short, quantity=3, unit_price=Decimal("1.00"))
+
+        with self.assertRaisesMessage(ValueError, "Insufficient stock for Batch 1"):
+            order.apply_stock_if_needed()
+
+        ok.refresh_from_db()
+        short.refresh_from_db()
+        order.refresh_from_db()
+        self.assertEqual((ok.quantity, short.quantity), (4, 4))
+        self.assertFalse(order.stock_applied)
+        self.assertFalse(StockHistory.objects.exists())
+        self.assertFalse(Activity.objects.exists())
+
+    def test_sale_depletes_and_archives_once(self):
+        (item,) = self._items(1, qty=5, delete_on_deplete=True)
+        order = self._order(Order.TYPE_SALE, [item], 5)
+        order.apply_stock_if_needed()
+        # A stale in-memory copy (loaded before delivery) must not apply stock twice.
+        stale = Order.objects.get(pk=order.pk)
+        stale.stock_applied = False
+        stale.apply_stock_if_needed()
+
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 0)
+        self.assertFalse(item.is_active)
+        self.assertEqual(Activity.objects.filter(kind=Activity.KIND_ORDER_STOCK).count(), 1)
+
+
+class StockLedgerTest(TestCase):
+    """Delivery and adjustments write ``StockMovement`` rows; checkpoints answer stock-as-of reads."""
+
+    def setUp(self):
+        supplier = Supplier.objects.create(name="Ledger Sup")
+        self.loc = Location.objects.create(name="Ledger Loc")
+        self.item = Item.objects.create(
+            name="Ledger Item",
+            sku="LEDGER-1",
+            quantity=10,
+            unit_cost=Decimal("1.00"),
+            supplier=supplier,
+            location=self.loc,
+        )
+        self.order = Order.objects.create(
+            order_type=Order.TYPE_PURCHASE, supplier=supplier, status=Order.STATUS_DELIVERED
+        )
+        self.line = OrderLine.objects.create(
+            order=self.order, item=self.item, quantity=5, unit_price=Decimal("1.00")
+        )
+
+    def test_delivery_writes_typed_movement(self):
+        self.order.apply_stock_if_needed()
+        mv = StockMovement.objects.get(item=self.item)
+        self.assertEqual((mv.delta, mv.reason, mv.order_line_id, mv.location_id),
+                         (5, StockMovement.REASON_PURCHASE, self.line.pk, self.loc.pk))
+
+    def test_stock_as_of_from_checkpoints_in_both_directions(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from inventory.stock_ledger import stock_as_of, take_checkpoint
+
+        t0 = timezone.now()
+        StockMovement.objects.create(item=self.item, location=self.loc, delta=4,
+                                     reason=StockMovement.REASON_ADJUSTMENT, timestamp=t0 - timedelta(hours=2))
+        take_checkpoint(now=t0 - timedelta(hours=1))  # records the current 10
+        StockMovement.objects.create(item=self.item, location=self.loc, delta=-3,
+                                     reason=StockMovement.REASON_SALE, timestamp=t0 - timedelta(minutes=30))
+
+        self.assertEqual(stock_as_of(t0, [self.item.pk]), {self.item.pk: 7})
+        self.assertEqual(stock_as_of(t0 - timedelta(hours=3), [self.item.pk]), {self.item.pk: 6})
+        self.assertEqual(stock_as_of(t0, location_id=self.loc.pk), {self.item.pk: 7})
+
+    def test_trend_reconstruction_uses_ledger_not_activity_text(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from inventory.inventory_forecasting import _reconstruct_from_movements
+
+        today = timezone.localdate()
+        Activity.objects.create(message="Adjusted quantity for Ledger Item: change of 999")
+        StockMovement.objects.create(item=self.item, delta=4, reason=StockMovement.REASON_ADJUSTMENT)
+
+        df = _reconstruct_from_movements(today - timedelta(days=1), today)
+        self.assertEqual(df["total_units"].tolist(), [6, 10])
+
+
+
+class InventoryDailyTotalTest(TestCase):
+    """Trend chart totals are maintained incrementally and read as one range."""
+
+    def setUp(self):
+        supplier = Supplier.objects.create(name="Totals Sup")
+        self.item = Item.objects.create(
+            name="Totals Item", sku="TOT-1", quantity=10, unit_cost=Decimal("2.00"), supplier=supplier
+        )
+        self.order = Order.objects.create(
+            order_type=Order.TYPE_PURCHASE, supplier=supplier, status=Order.STATUS_DELIVERED
+        )
+        OrderLine.objects.create(order=self.order, item=self.item, quantity=5, unit_price=Decimal("2.00"))
+
+    def test_delivery_updates_today_in_place(self):
+        from django.utils import timezone
+
+        from inventory.daily_totals import refresh_day
+
+        refresh_day()
+        self.order.apply_stock_if_needed()
+        row = InventoryDailyTotal.objects.get(date=timezone.localdate())
+        self.assertEqual((row.total_units, row.total_value, row.active_items), (15, Decimal("30.00"), 1))
+
+    def test_rebuild_and_series_read_from_table(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from inventory.daily_totals import rebuild_daily_totals
+        from inventory.inventory_forecasting import get_daily_inventory_series
+
+        today = timezone.localdate()
+        StockMovement.objects.create(
+            item=self.item, delta=4, reason=StockMovement.REASON_ADJUSTMENT,
+            timestamp=timezone.now() - timedelta(days=1),
+        )
+        self.assertEqual(rebuild_daily_totals(days=3), 3)
+        StockHistory.objects.create(item=self.item, date=today, quantity=999)  # must not be read
+
+        df = get_daily_inventory_series(days_back=3)
+        self.assertEqual(df["total_units"].tolist(), [6, 10, 10])
+
+    def test_finalize_subtracts_todays_movements_from_yesterday(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from inventory.daily_totals import finalize_daily_totals
+
+        StockMovement.objects.create(item=self.item, delta=3, reason=StockMovement.REASON_ADJUSTMENT)
+        final, current = finalize_daily_totals()
+        self.assertEqual(final.date, timezone.localdate() - timedelta(days=1))
+        self.assertTrue(final.finalized)
+        self.assertEqual(final.total_units, 7)
+        self.assertEqual(current.total_units, 10)
+
+
+class TreeServiceTest(TestCase):
+    """One grouped query builds the tree; rollups sum bottom-up; writes invalidate the cache."""
+
+    def test_rollups_and_cache_invalidation(self):
+        from inventory.tree_service import KIND_LOCATION, get_tree
+
+        with self.captureOnCommitCallbacks(execute=True):
+            supplier = Supplier.objects.create(name="Tree Sup")
+            wh = Location.objects.create(name="WH", capacity=100)
+            bin_a = Location.objects.create(name="Bin A", parent=wh, capacity=20)
+            Location.objects.create(name="Bin B", parent=wh)
+            item = Item.objects.create(
+                name="Tree Item", sku="TREE-U1", quantity=5, unit_cost=Decimal("1.00"), supplier=supplier,
+                location=bin_a,
+            )
+
+        with self.assertNumQueries(2):  # versions + the grouped load
+            tree = get_tree(KIND_LOCATION)
+        node = tree.nodes[wh.pk]
+        self.assertEqual([c.name for c in node.children], ["Bin A", "Bin B"])
+        self.assertEqual((node.subtree_item_count, node.subtree_quantity, node.subtree_capacity), (1, 5, 120))
+        self.assertEqual(tree.nodes[bin_a.pk].depth, 1)
+
+        with self.assertNumQueries(1):
+            get_tree(KIND_LOCATION)
+
+        # Uncommitted: this transaction sees its own write, the cache is untouched.
+        with self.captureOnCommitCallbacks(execute=True):
+            item.quantity = 15
+            item.save()
+            self.assertEqual(get_tree(KIND_LOCATION).nodes[wh.pk].subtree_quantity, 15)
+        # Committed: the bumped versions miss the old entry in every process.
+        self.assertEqual(get_tree(KIND_LOCATION).nodes[wh.pk].subtree_quantity, 15)
+
+        # Bulk writes the signals never see invalidate it the same way.
+        with self.captureOnCommitCallbacks(execute=True):
+            Item.objects.filter(pk=item.pk).update(quantity=7)
+        self.assertEqual(get_tree(KIND_LOCATION).nodes[wh.pk].subtree_quantity, 7)
+
+
+class AsyncFanOutTest(SimpleTestCase):
+    """``fan_out`` overlaps its branches on the pool and keeps results in call order."""
+
+    @override_settings(ASYNC_FANOUT_WORKERS=4)
+    def test_branches_run_concurrently_in_order(self):
+        import threading
+
+        from asgiref.sync import async_to_sync
+        from django.utils import timezone
+
+        from inventory.async_fanout import fan_out
+
+        # Every branch waits for the other two, so this only finishes if they overlap.
+        barrier = threading.Barrier(3, timeout=5)
+
+        def branch(n):
+            barrier.wait()
+            return n, threading.current_thread().name, timezone.get_current_timezone_name()
+
+        async def run():
+            timezone.activate("Europe/Dublin")
+            try:
+                return await fan_out(*(lambda n=n: branch(n) for n in range(3)))
+            finally:
+                timezone.deactivate()
+
+        results = async_to_sync(run)()
+        self.assertEqual([n for n, _, _ in results], [0, 1, 2])
+        self.assertTrue(all(name.startswith("warewolf-fanout") for _, name, _ in results))
+        self.assertEqual({tz for _, _, tz in results}, {"Europe/Dublin"})
+
+    @override_settings(ASYNC_FANOUT_WORKERS=0)
+    def test_zero_workers_runs_in_sequence(self):
+        import threading
+
+        from asgiref.sync import async_to_sync
+
+        from inventory.async_fanout import fan_out
+
+        names = async_to_sync(fan_out)(
+            lambda: threading.current_thread().name, lambda: threading.current_thread().name
+        )
+        self.assertFalse(any(name.startswith("warewolf-fanout") for name in names))
+
+
+def _barcode_photo(text, size=(4000, 3000), bar=(900, 250), fmt="JPEG"):
+    """Encoded photo of a Code 128 label pasted onto a plain background."""
+    import io
+
+    import numpy as np
+    import zxingcpp
+    from PIL import Image
+
+    label = Image.fromarray(np.array(zxingcpp.write_barcode(zxingcpp.BarcodeFormat.Code128, text, width=bar[0], height=bar[1])))
+    img = Image.new("RGB", size, (200, 190, 180))
+    img.paste(label.convert("RGB"), (size[0] // 3, size[1] // 3))
+    out = io.BytesIO()
+    img.save(out, fmt)
+    return out.getvalue()
+
+
+class BarcodeDecodeTest(SimpleTestCase):
+    def test_large_photo_decodes_downscaled(self):
+        from inventory.barcode_decode import decode_image_bytes
+
+        result = decode_image_bytes(_barcode_photo("SKU-123"))
+        self.assertEqual((result.ok, result.text), (True, "SKU-123"))
+
+    def test_small_label_in_large_photo_needs_full_resolution_retry(self):
+        from inventory.barcode_decode import decode_image_bytes
+
+        result = decode_image_bytes(_barcode_photo("TINY-9", bar=(300, 80)))
+        self.assertEqual(result.text, "TINY-9")
+
+    def test_unreadable_data_and_blank_images(self):
+        import io
+
+        from PIL import Image
+
+        from inventory.barcode_decode import decode_image_bytes
+
+        self.assertEqual(decode_image_bytes(b"not an image").error, "invalid_image")
+        out = io.BytesIO()
+        Image.new("RGB", (200, 200), "white").save(out, "PNG")
+        blank = out.getvalue()
+        self.assertEqual(decode_image_bytes(blank).as_json(), {"ok": False, "error": "not_found"})
+
+    def test_decode_many_reports_every_image(self):
+        from inventory.barcode_decode import decode_many
+
+        blobs = [_barcode_photo(f"P-{i}", size=(1200, 900), bar=(500, 150)) for i in range(3)] + [b"junk"]
+        results = dict(decode_many(blobs))
+        self.assertEqual([results[i].text for i in range(3)], ["P-0", "P-1", "P-2"])
+        self.assertEqual(results[3].error, "invalid_image")
+
+    def test_decode_many_times_out_instead_of_waiting(self):
+        from inventory.barcode_decode import decode_many
+
+        results = dict(decode_many([_barcode_photo("SLOW")], timeout=0))
+        self.assertEqual(results[0].error, "timeout")
+
+
+class ScanCodeIndexTest(TestCase):
+    def setUp(self):
+        self.supplier = Supplier.objects.create(name="Scan Supplier")
+
+    def _item(self, sku, **kwargs):
+        return Item.objects.create(name=sku, sku=sku, unit_cost=Decimal("1.00"), supplier=self.supplier, **kwargs)
+
+    def _codes(self, item):
+        return dict(ScanCode.objects.filter(item=item).values_list("code", "kind"))
+
+    def test_item_save_indexes_sku_barcode_and_serials(self):
+        item = self._item("SC-1", barcode=" 5012345678900 ", serial_numbers="SN-1\nSN-2, SN-3\n\n")
+        self.assertEqual(
+            self._codes(item),
+            {"SC-1": "sku", "5012345678900": "barcode", "SN-1": "serial", "SN-2": "serial", "SN-3": "serial"},
+        )
+        item.barcode = ""
+        item.serial_numbers = "SN-2"
+        item.save()
+        self.assertEqual(self._codes(item), {"SC-1": "sku", "SN-2": "serial"})
+
+    def test_stock_only_save_skips_the_index(self):
+        item = self._item("SC-2")
+        with self.assertNumQueries(1):
+            item.quantity = 5
+            item.save(update_fields=["quantity"])
+
+    def test_sku_takes_code_from_another_items_barcode(self):
+        holder = self._item("SC-3", barcode="SHARED")
+        other = self._item("SC-4", serial_numbers="SC-3")  # already the SKU of SC-3
+        self.assertNotIn("SC-3", self._codes(other))
+        newcomer = self._item("SHARED")
+        self.assertEqual(self._codes(newcomer), {"SHARED": "sku"})
+        self.assertEqual(self._codes(holder), {"SC-3": "sku"})
+
+    def test_lookup_resolves_a_batch_in_two_queries(self):
+        from inventory import scan_codes
+
+        item = self._item("SC-5", barcode="BC-5")
+        with self.assertNumQueries(2):  # index probe + item fetch
+            result = scan_codes.lookup(["BC-5", "NOPE"])
+        self.assertEqual((result["BC-5"]["kind"], result["BC-5"]["item"]["id"]), ("barcode", item.pk))
+        self.assertIsNone(result["NOPE"])
+
+        self._item("NOPE")
+        self.assertEqual(scan_codes.lookup(["NOPE"])["NOPE"]["kind"], "sku")
+
+    def test_rebuild_refills_from_items(self):
+        from inventory.scan_codes import rebuild_scan_codes
+
+        self._item("SC-6", barcode="BC-6", serial_numbers="S6")
+        ScanCode.objects.all().delete()
+        self.assertEqual(rebuild_scan_codes(), 3)
+        self.assertEqual(set(ScanCode.objects.values_list("code", flat=True)), {"SC-6", "BC-6", "S6"})
+
+
+def _png(size=(1200, 900), color=(30, 120, 200)):
+    import io
+
+    from PIL import Image
+
+    out = io.BytesIO()
+    Image.new("RGB", size, color).save(out, "PNG")
+    return out.getvalue()
+
+
+class RenditionTest(TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        from django.core.cache import cache
+
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=media, RENDITION_WORKERS=0)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        cache.clear()
+
+    def _item_with_image(self, sku, data):
+        from django.core.files.base import ContentFile
+
+        supplier, _ = Supplier.objects.get_or_create(name="Rendition Supplier")
+        # Assigned like a form upload: written to storage during save().
+        item = Item(name=sku, sku=sku, unit_cost=Decimal("1.00"), supplier=supplier, image=ContentFile(data, f"{sku}.png"))
+        item.save()
+        return item
+
+    def test_upload_renders_webp_sizes_named_by_content(self):
+        from PIL import Image
+
+        from inventory import renditions
+
+        item = self._item_with_image("RN-1", _png())
+        url = renditions.url(item.image, "xs")
+        self.assertRegex(url, r"/renditions/[0-9a-f]{2}/[0-9a-f]{32}-xs\.webp$")
+        name = url.split("/media/", 1)[1]
+        with item.image.storage.open(name) as f:
+            img = Image.open(f)
+            self.assertEqual((img.format, max(img.size)), ("WEBP", renditions.SIZES["xs"]))
+
+        twin = self._item_with_image("RN-2", _png())
+        self.assertEqual(renditions.url(twin.image, "xs"), url)
+        self.assertEqual(renditions.generate(twin.image.name), 0)
+
+    def test_small_sources_are_not_upscaled_and_bad_sizes_rejected(self):
+        from PIL import Image
+
+        from inventory import renditions
+
+        item = self._item_with_image("RN-3", _png(size=(40, 20)))
+        name = renditions.url(item.image, "lg").split("/media/", 1)[1]
+        with item.image.storage.open(name) as f:
+            self.assertEqual(Image.open(f).size, (40, 20))
+        with self.assertRaises(ValueError):
+            renditions.url(item.image, "huge")
+        self.assertEqual(renditions.url(Item().image, "xs"), "")
+
+    def test_unreadable_upload_falls_back_to_original(self):
+        from inventory import renditions
+
+        with self.assertLogs("inventory.renditions", "WARNING"):
+            item = self._item_with_image("RN-4", b"not an image")
+        # Not retried on every page view while the failure is recent.
+        self.assertEqual(renditions.url(item.image, "sm"), item.image.url)
+
+    def test_backfill_command(self):
+        import io
+
+        from django.core.cache import cache
+        from django.core.management import call_command
+
+        self._item_with_image("RN-6", _png(color=(1, 2, 3)))
+        Supplier.objects.create(name="No logo", image="")
+        cache.clear()
+        out = io.StringIO()
+        call_command("generate_renditions", "--force", stdout=out)
+        self.assertIn("4 file(s) written for 1 image(s); 0 failed", out.getvalue())
+
+
+class RetailImportTest(TestCase):
+    ROWS = [
+        # InvoiceNo, StockCode, Description, Quantity, InvoiceDate, UnitPrice
+        ("536365", "A1", "LANTERN", "6", "12/1/2010 8:26", "2.55"),
+        ("536365", "B2", "MUG", "8", "12/1/2010 8:26", "3.39"),
+        ("536365", "A1", "LANTERN", "4", "12/1/2010 8:26", "2.55"),
+        ("C536366", "B2", "MUG", "-2", "12/1/2010 9:00", "3.39"),  # cancellation
+        ("536367", "C3", "CANDLE", "1", "12/2/2010 10:00", "1.25"),
+        ("536368", "B2", "MUG", "3", "12/3/2010 11:00", "3.39"),
+        ("536369", "OLD", "OLD STOCK", "99", "1/5/2010 11:00", "0.50"),  # outside --months 1
+    ]
+
+    def setUp(self):
+        import csv
+        import shutil
+        import tempfile
+
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        self.path = f"{tmp}/retail.csv"
+        with open(self.path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["InvoiceNo", "StockCode", "Description", "Quantity", "InvoiceDate", "UnitPrice", "Country"])
+            writer.writerows(row + ("United Kingdom",) for row in self.ROWS)
+
+    def _run(self, **kwargs):
+        from inventory.retail_import import import_online_retail
+
+        kwargs.setdefault("months", 1)
+        kwargs.setdefault("top_items", 2)
+        return import_online_retail(self.path, checkpoint_path=self.path + ".ckpt", **kwargs)
+
+    def test_invoices_become_orders_for_top_skus_in_window(self):
+        bystander = Item.objects.create(
+            name="Bystander", sku="BY-1", quantity=1, unit_cost=Decimal("1.00"), supplier=Supplier.objects.create(name="By")
+        )
+        ScanCode.objects.filter(item=bystander).delete()
+        result = self._run()
+        self.assertEqual((result.items_created, result.orders_created, result.lines_created), (2, 2, 3))
+        order = Order.objects.get(reference="SO-536365")
+        self.assertEqual((order.status, order.stock_applied, str(order.order_date)), ("DELIVERED", True, "2010-12-01"))
+        self.assertEqual(
+            sorted(order.lines.values_list("item__sku", "quantity", "unit_price")),
+            [("A1", 10, Decimal("2.55")), ("B2", 8, Decimal("3.39"))],
+        )
+        self.assertFalse(Item.objects.filter(sku__in=["C3", "OLD"]).exists())
+        # bulk-created items still resolve by scan; only they are indexed, not the whole catalogue.
+        self.assertTrue(ScanCode.objects.filter(code="B2").exists())
+        self.assertFalse(ScanCode.objects.filter(item=bystander).exists())
+
+    def test_interrupted_import_resumes_from_checkpoint(self):
+        import os
+        from unittest import mock
+
+        from inventory import retail_import
+
+        real_flush = retail_import._Writer.flush
+        calls = []
+
+        def flaky_flush(writer, *args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError("connection lost")
+            return real_flush(writer, *args)
+
+        with mock.patch.object(retail_import._Writer, "flush", flaky_flush), self.assertRaises(RuntimeError):
+            self._run(chunk_rows=1)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertTrue(os.path.exists(self.path + ".ckpt"))
+        with self.assertRaises(retail_import.RetailImportError):
+            self._run(chunk_rows=1, months=2)  # a different import must not reuse the checkpoint
+
+        result = self._run(chunk_rows=1)
+        self.assertEqual((result.resumed_from, result.orders_created, result.lines_created), (5, 2, 3))
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertFalse(os.path.exists(self.path + ".ckpt"))
+
+    def test_copied_lines_bump_the_order_line_version(self):
+        from unittest import mock
+
+        from django.db import transaction
+
+        from inventory import change_versions, retail_import
+
+        table = OrderLine._meta.db_table
+        with mock.patch.object(retail_import.connection, "cursor", mock.MagicMock()), transaction.atomic():
+            retail_import._copy_lines([])  # COPY never passes through the execute wrapper
+            self.assertTrue(change_versions.has_uncommitted_writes(table))
+
+
+class ItemImportTest(TestCase):
+    def setUp(self):
+        self.supplier = Supplier.objects.create(name="Acme Parts")
+        self.location = Location.objects.create(name="Bay 1")
+
+    def _import(self, text, **kwargs):
+        import io
+
+        from inventory.item_import import import_items
+
+        return import_items(io.BytesIO(text.encode()), "items.csv", **kwargs)
+
+    def test_creates_updates_and_reports_bad_rows(self):
+        Item.objects.create(name="Old", sku="IMP-2", quantity=4, unit_cost=Decimal("1.00"), supplier=self.supplier)
+        report = self._import(
+            "SKU,Name,Unit Cost,Supplier,Location,Quantity,Colour\n"
+            "IMP-1,Bolt,0.25,acme parts,BAY 1,10,red\n"
+            "IMP-2,,,,,7,\n"
+            "IMP-3,Nut,abc,Acme Parts,,1,\n"
+            "IMP-4,Washer,0.10,Nobody,,1,\n"
+            "IMP-1,Bolt again,0.30,Acme Parts,,1,\n"
+        )
+        self.assertEqual((report.created, report.updated, report.error_rows), (1, 1, 3))
+        self.assertEqual(report.ignored_columns, ["Colour"])
+        self.assertEqual(
+            [(row, column) for row, _, column, _ in report.errors],
+            [(4, "unit_cost"), (5, "supplier"), (6, "sku")],
+        )
+        bolt = Item.objects.get(sku="IMP-1")
+        self.assertEqual((bolt.location, bolt.quantity, bolt.unit_cost), (self.location, 10, Decimal("0.25")))
+        updated = Item.objects.get(sku="IMP-2")
+        self.assertEqual((updated.name, updated.quantity), ("Old", 7))  # blank cells keep values
+        self.assertEqual(
+            sorted(StockMovement.objects.values_list("item__sku", "delta", "reason")),
+            [("IMP-1", 10, "initial"), ("IMP-2", 3, "edit")],
+        )
+        self.assertTrue(ScanCode.objects.filter(code="IMP-1", item=bolt).exists())
+        activity = Activity.objects.get(kind=Activity.KIND_ITEM_IMPORT)
+        self.assertIn("1 created, 1 updated", activity.message)
+
+    def test_blank_cells_keep_changes_committed_after_validation(self):
+        from unittest import mock
+
+        from inventory import item_import
+
+        item = Item.objects.create(name="Old", sku="IMP-5", quantity=4, unit_cost=Decimal("1.00"), supplier=self.supplier)
+        real_write = item_import._Importer._write
+
+        def write_after_a_sale(importer, pending):
+            Item.objects.filter(pk=item.pk).update(quantity=1)  # committed between read and write
+            return real_write(importer, pending)
+
+        with mock.patch.object(item_import._Importer, "_write", write_after_a_sale):
+            report = self._import("SKU,Name,Quantity\nIMP-5,Renamed,\n")
+        self.assertEqual(report.updated, 1)
+        item.refresh_from_db()
+        self.assertEqual((item.name, item.quantity), ("Renamed", 1))
+        self.assertFalse(StockMovement.objects.filter(item=item).exists())
+
+    def test_dry_run_writes_nothing(self):
+        report = self._import("sku,name,unit_cost,supplier\nDRY-1,Thing,1,Acme Parts\n", dry_run=True)
+        self.assertEqual(report.created, 1)
+        self.assertFalse(Item.objects.filter(sku="DRY-1").exists())
+        self.assertFalse(Activity.objects.filter(kind=Activity.KIND_ITEM_IMPORT).exists())
+
+    def test_queries_per_batch_do_not_grow_with_rows(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        def run(prefix, n):
+            rows = "".join(f"{prefix}-{i},Item {i},1.50,Acme Parts,{i}\n" for i in range(n))
+            with CaptureQueriesContext(connection) as ctx:
+                self._import("sku,name,unit_cost,supplier,quantity\n" + rows)
+            return len(ctx.captured_queries)
+
+        run("WARM", 1)  # creates today's daily-totals row
+        # 30 rows still fit one SQLite INSERT (999 parameters).
+        self.assertEqual(run("FEW", 3), run("MANY", 30))
+        self.assertEqual(Item.objects.filter(sku__startswith="MANY-").count(), 30)
+
+
+class CycleCountTest(TestCase):
+    def setUp(self):
+        supplier = Supplier.objects.create(name="Count Supplier")
+        self.items = [
+            Item.objects.create(
+                name=f"Counted {i}", sku=f"CC-{i}", barcode=f"BAR-{i}", quantity=10,
+                unit_cost=Decimal("2.00"), supplier=supplier,
+            )
+            for i in range(3)
+        ]
+        self.session = CycleCount.objects.create(name="Shelf A")
+
+    def test_parse_counts(self):
+        from inventory.cycle_counts import parse_counts
+
+        entries, invalid = parse_counts("CC-0\nCC-1, 4\n\nCC-2;x\nBAR-0\t2\n")
+        self.assertEqual(entries, [("CC-0", 1), ("CC-1", 4), ("BAR-0", 2)])
+        self.assertEqual(invalid, [(4, "CC-2;x")])
+
+    def test_record_adds_or_replaces_and_reports_unknown_codes(self):
+        from inventory import cycle_counts
+
+        result = cycle_counts.record_counts(self.session, [("CC-0", 3), ("BAR-0", 2), ("nope", 1)])
+        self.assertEqual((result.recorded, result.unknown), (1, ["nope"]))
+        cycle_counts.record_counts(self.session, [("CC-0", 1)])
+        self.assertEqual(self.session.lines.get().counted_quantity, 6)
+        cycle_counts.record_counts(self.session, [("CC-0", 9)], mode=cycle_counts.MODE_SET)
+        self.assertEqual(self.session.lines.get().counted_quantity, 9)
+
+        summary = cycle_counts.variance_summary(self.session)
+        self.assertEqual((summary["lines"], summary["mismatched"], summary["net_units"]), (1, 1, -1))
+        self.assertEqual(summary["net_value"], Decimal("-2.00"))
+
+    def test_approve_applies_variances_in_one_batch(self):
+        from inventory import cycle_counts
+
+        cycle_counts.record_counts(self.session, [("CC-0", 7), ("CC-1", 10), ("CC-2", 15)])
+        # Stock moving after the count does not change what approval applies against.
+        Item.objects.filter(pk=self.items[2].pk).update(quantity=12)
+
+        result = cycle_counts.approve(self.session)
+        self.assertEqual((result.lines, result.adjusted, result.net_change), (3, 2, 0))
+        self.assertEqual(
+            list(Item.objects.filter(pk__in=[i.pk for i in self.items]).order_by("sku").values_list("quantity", flat=True)),
+            [7, 10, 15],
+        )
+        self.assertEqual(
+            sorted(StockMovement.objects.filter(reason=StockMovement.REASON_CYCLE_COUNT).values_list("item__sku", "delta")),
+            [("CC-0", -3), ("CC-2", 3)],
+        )
+        self.assertEqual(StockHistory.objects.get(item=self.items[2], date=date.today()).quantity, 15)
+        self.assertEqual(Activity.objects.filter(kind=Activity.KIND_CYCLE_COUNT).count(), 1)
+
+        self.session.refresh_from_db()
+        self.assertEqual((self.session.status, self.session.adjusted_items), (CycleCount.STATUS_APPROVED, 2))
+        self.assertEqual(
+            sorted(line.variance for line in self.session.lines.all()), [-3, 0, 3]
+        )
+        with self.assertRaises(cycle_counts.CycleCountError):
+            cycle_counts.approve(self.session)
+        with self.assertRaises(cycle_counts.CycleCountError):
+            cycle_counts.record_counts(self.session, [("CC-0", 1)])
+
+
+class OrderTransitionTest(TestCase):
+    def setUp(self):
+        self.supplier = Supplier.objects.create(name="Bulk Supplier")
+        self.client_obj = Client.objects.create(name="Bulk Client")
+        self.dock = Location.objects.create(name="Dock")
+        self.item = Item.objects.create(name="Crate", sku="BULK-1", quantity=5, unit_cost=Decimal("3.00"), supplier=self.supplier)
+
+    def _order(self, order_type, qty, status=Order.STATUS_PENDING):
+        order = Order.objects.create(
+            order_type=order_type,
+            supplier=self.supplier if order_type == Order.TYPE_PURCHASE else None,
+            client=self.client_obj if order_type == Order.TYPE_SALE else None,
+            receiving_location=self.dock if order_type == Order.TYPE_PURCHASE else None,
+            status=status,
+        )
+        OrderLine.objects.create(order=order, item=self.item, quantity=qty, unit_price=Decimal("3.00"))
+        return order
+
+    def test_deliver_batch_validates_combined_stock_per_order(self):
+        from inventory.order_transitions import transition_orders
+
+        purchase = self._order(Order.TYPE_PURCHASE, 10)
+        first_sale = self._order(Order.TYPE_SALE, 12)
+        too_big = self._order(Order.TYPE_SALE, 4)  # only 3 left after the first sale
+        fits = self._order(Order.TYPE_SALE, 3)
+        cancelled = self._order(Order.TYPE_SALE, 1, status=Order.STATUS_CANCELLED)
+
+        report = transition_orders(
+            [fits.pk, too_big.pk, first_sale.pk, purchase.pk, cancelled.pk, 999999], Order.STATUS_DELIVERED
+        )
+        self.assertEqual(
+            [(o.order_id, o.ok) for o in report.outcomes],
+            [(fits.pk, True), (too_big.pk, False), (first_sale.pk, True), (purchase.pk, True), (cancelled.pk, False), (999999, False)],
+        )
+        self.assertIn("Insufficient stock for Crate", report.failed[0].error)
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.quantity, self.item.location), (0, self.dock))
+        self.assertEqual(
+            dict(Order.objects.filter(pk__in=[too_big.pk, first_sale.pk]).values_list("pk", "status")),
+            {too_big.pk: Order.STATUS_PENDING, first_sale.pk: Order.STATUS_DELIVERED},
+        )
+        self.assertTrue(Order.objects.get(pk=fits.pk).stock_applied)
+        self.assertEqual(
+            sorted(StockMovement.objects.values_list("reason", "delta")),
+            [("purchase", 10), ("sale", -12), ("sale", -3)],
+        )
+
+    def test_ship_and_cancel_do_not_touch_stock(self):
+        from inventory.order_transitions import transition_orders
+
+        sale = self._order(Order.TYPE_SALE, 2)
+        self.assertTrue(transition_orders([sale.pk], Order.STATUS_SHIPPED).outcomes[0].ok)
+        report = transition_orders([sale.pk], Order.STATUS_SHIPPED)
+        self.assertIn("is shipped", report.outcomes[0].error)
+        self.assertTrue(transition_orders([sale.pk], Order.STATUS_CANCELLED).outcomes[0].ok)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 5)
+        self.assertFalse(StockMovement.objects.exists())
+
+    def test_query_count_does_not_grow_with_orders(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from inventory.order_transitions import transition_orders
+
+        def run(n):
+            self.item.quantity = 1000
+            self.item.save()
+            ids = [self._order(Order.TYPE_SALE, 1).pk for _ in range(n)]
+            with CaptureQueriesContext(connection) as ctx:
+                transition_orders(ids, Order.STATUS_DELIVERED)
+            return len(ctx.captured_queries)
+
+        run(1)  # creates today's daily-totals row
+        self.assertEqual(run(2), run(20))
+
+
+class ApiTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_superuser("api_admin", "api@example.com", "ApiAdminPw9")
+        self.supplier = Supplier.objects.create(name="Api Supplies")
+
+    def test_cursor_pages_and_sparse_fields(self):
+        from inventory.api import RESOURCES, list_records
+
+        for n in range(3):
+            Item.objects.create(name=f"Part {n}", sku=f"API-{n}", quantity=n, unit_cost=Decimal("1.00"), supplier=self.supplier)
+        first = list_records(RESOURCES["items"], {"limit": "2", "fields": "sku,quantity"})
+        self.assertEqual([row["sku"] for row in first["results"]], ["API-0", "API-1"])
+        self.assertEqual(set(first["results"][0]), {"id", "sku", "quantity"})
+        rest = list_records(RESOURCES["items"], {"limit": "2", "cursor": first["next_cursor"]})
+        self.assertEqual([row["sku"] for row in rest["results"]], ["API-2"])
+        self.assertIsNone(rest["next_cursor"])
+
+    def test_batch_creates_and_updates_with_ledger_rows(self):
+        from inventory.api import RESOURCES, save_batch
+
+        old = Item.objects.create(name="Old", sku="API-OLD", quantity=4, unit_cost=Decimal("1.00"), supplier=self.supplier)
+        results = save_batch(
+            RESOURCES["items"],
+            [
+                {"name": "New", "sku": "API-NEW", "quantity": 5, "unit_cost": "2.00", "supplier": self.supplier.pk},
+                {"id": old.pk, "quantity": 7},
+            ],
+            self.user,
+        )
+        self.assertEqual([r["created"] for r in results], [True, False])
+        old.refresh_from_db()
+        self.assertEqual((old.name, old.quantity), ("Old", 7))  # unspecified fields keep their values
+        self.assertEqual(
+            sorted(StockMovement.objects.values_list("item__sku", "delta", "reason")),
+            [("API-NEW", 5, "initial"), ("API-OLD", 3, "edit")],
+        )
+        self.assertTrue(ScanCode.objects.filter(code="API-NEW").exists())
+
+    def test_batch_update_writes_only_the_fields_it_names(self):
+        from django.db import transaction
+
+        from inventory.api import RESOURCES, _save_items, validate_batch
+
+        item = Item.objects.create(name="Bolt", sku="API-BOLT", quantity=4, unit_cost=Decimal("1.00"), supplier=self.supplier)
+        entries = validate_batch(RESOURCES["items"], [{"id": item.pk, "name": "Hex bolt"}])
+        Item.objects.filter(pk=item.pk).update(quantity=40)  # stock moved after validation
+        with transaction.atomic():
+            _save_items(RESOURCES["items"], entries, self.user)
+        item.refresh_from_db()
+        self.assertEqual((item.name, item.quantity), ("Hex bolt", 40))
+        self.assertFalse(StockMovement.objects.filter(item=item).exists())
+
+    def test_invalid_record_saves_nothing(self):
+        from inventory.api import RESOURCES, ApiError, save_batch
+
+        records = [
+            {"name": "Good", "sku": "API-G", "quantity": 1, "unit_cost": "1.00", "supplier": self.supplier.pk},
+            {"name": "Bad", "sku": "API-B", "quantity": 1, "unit_cost": "1.00", "supplier": 999999},
+            {"name": "Twin", "sku": "API-G", "quantity": 1, "unit_cost": "1.00", "supplier": self.supplier.pk},
+        ]
+        with self.assertRaises(ApiError) as ctx:
+            save_batch(RESOURCES["items"], records, self.user)
+        self.assertEqual([(e["index"], list(e["errors"])) for e in ctx.exception.extra["errors"]], [(1, ["supplier"]), (2, ["sku"])])
+        self.assertFalse(Item.objects.exists())
+
+
+class ChangeVersionTest(TestCase):
+    def setUp(self):
+        self.supplier = Supplier.objects.create(name="Versioned Supplies")
+        self.item = Item.objects.create(name="Tag", sku="CV-1", quantity=1, unit_cost=Decimal("1.00"), supplier=self.supplier)
+
+    def _item_version(self):
+        from inventory.change_versions import current_versions
+
+        return current_versions(["inventory_item"])[0].get("inventory_item", 0)
+
+    def test_bulk_writes_bump_once_per_transaction_on_commit(self):
+        from django.db import transaction
+
+        before = self._item_version()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                Item.objects.filter(pk=self.item.pk).update(quantity=5)
+                Item.objects.bulk_create([Item(name="Clip", sku="CV-2", unit_cost=Decimal("1.00"), supplier=self.supplier)])
+            self.assertEqual(self._item_version(), before)  # nothing visible before commit
+        self.assertEqual(len([c for c in callbacks if getattr(c, "table", None) == "inventory_item"]), 1)
+        self.assertEqual(self._item_version(), before + 1)
+
+    def test_rolled_back_writes_do_not_bump(self):
+        from django.db import transaction
+
+        before = self._item_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Item.objects.filter(pk=self.item.pk).delete()
+                    raise RuntimeError("abort")
+            except RuntimeError:
+                pass
+        self.assertEqual(self._item_version(), before)
+
+
+class RetentionTest(TestCase):
+    def setUp(self):
+        import tempfile
+
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(__import__("shutil").rmtree, self.archive_dir, True)
+        self.user = get_user_model().objects.create_user("retention_user", password="RetainPw9")
+
+    def _run(self, **kwargs):
+        from inventory.retention import apply_retention
+
+        with override_settings(RETENTION_ARCHIVE_DIR=self.archive_dir, RETENTION_DAYS={}, RETENTION_STOCK_HISTORY_DAILY_MONTHS=6):
+            return apply_retention(**kwargs)
+
+    def test_old_rows_are_archived_then_deleted(self):
+        import gzip
+        import json
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        old = timezone.now() - timedelta(days=400)
+        Activity.objects.create(message="Ancient")
+        Activity.objects.create(message="Recent")
+        Activity.objects.filter(message="Ancient").update(timestamp=old)
+        read = Notification.objects.create(user=self.user, message="Old and read", is_read=True)
+        unread = Notification.objects.create(user=self.user, message="Old but unread")
+        Notification.objects.filter(pk__in=[read.pk, unread.pk]).update(created_at=old)
+
+        dry = self._run(dry_run=True)
+        self.assertEqual({r.name: r.eligible for r in dry.results}["activity"], 1)
+        self.assertTrue(Activity.objects.filter(message="Ancient").exists())
+
+        report = self._run()
+        counts = {r.name: r.deleted for r in report.results}
+        self.assertEqual((counts["activity"], counts["notification"]), (1, 1))
+        self.assertEqual(list(Activity.objects.values_list("message", flat=True)), ["Recent"])
+        self.assertEqual(list(Notification.objects.values_list("pk", flat=True)), [unread.pk])
+        path = next(r.archive_path for r in report.results if r.name == "activity")
+        with gzip.open(path, "rt") as fh:
+            self.assertEqual([json.loads(line)["message"] for line in fh], ["Ancient"])
+
+    def test_stock_history_keeps_one_point_per_week(self):
+        from datetime import date, timedelta
+
+        from django.utils import timezone
+
+        supplier = Supplier.objects.create(name="Retention Supplies")
+        item = Item.objects.create(name="Bin", sku="RET-1", quantity=1, unit_cost=Decimal("1.00"), supplier=supplier)
+        monday = date(2020, 1, 6)
+        StockHistory.objects.bulk_create(
+            [StockHistory(item=item, date=monday + timedelta(days=n), quantity=n) for n in range(14)]
+        )
+        recent = timezone.localdate() - timedelta(days=1)
+        StockHistory.objects.create(item=item, date=recent, quantity=99)
+
+        report = self._run(only=["stockhistory"])
+        result = report.results[0]
+        self.assertEqual((result.deleted, result.kept), (12, 2))
+        self.assertEqual(
+            list(StockHistory.objects.order_by("date").values_list("date", "quantity")),
+            [(date(2020, 1, 12), 6), (date(2020, 1, 19), 13), (recent, 99)],
+        )
+        self.assertEqual(self._run(only=["stockhistory"]).results[0].deleted, 0)  # idempotent
+
+
+class OrderLineDateTest(TestCase):
+    def setUp(self):
+        supplier = Supplier.objects.create(name="Partition Supplies")
+        self.item = Item.objects.create(name="Crate", sku="PART-1", quantity=5, unit_cost=Decimal("1.00"), supplier=supplier)
+        self.order = Order.objects.create(order_type=Order.TYPE_SALE, order_date=date(2026, 1, 10))
+
+    def test_lines_copy_and_follow_the_order_date(self):
+        saved = OrderLine.objects.create(order=self.order, item=self.item, quantity=1, unit_price=Decimal("1.00"))
+        # A line whose order is not loaded: bulk_create reads the date in one query.
+        (bulk,) = OrderLine.objects.bulk_create(
+            [OrderLine(order_id=self.order.pk, item=self.item, quantity=2, unit_price=Decimal("1.00"))]
+        )
+        self.assertEqual((saved.order_date, bulk.order_date), (date(2026, 1, 10), date(2026, 1, 10)))
+
+        order = Order.objects.get(pk=self.order.pk)
+        order.order_date = date(2026, 3, 2)
+        order.save()
+        self.assertEqual(set(OrderLine.objects.values_list("order_date", flat=True)), {date(2026, 3, 2)})
+
+    def test_bulk_and_queryset_updates_move_the_lines(self):
+        OrderLine.objects.create(order=self.order, item=self.item, quantity=1, unit_price=Decimal("1.00"))
+        other = Order.objects.create(order_type=Order.TYPE_SALE, order_date=date(2026, 1, 10))
+        OrderLine.objects.create(order=other, item=self.item, quantity=1, unit_price=Decimal("1.00"))
+
+        self.order.order_date = date(2026, 4, 1)
+        Order.objects.bulk_update([self.order], ["order_date"])
+        # Filtered on the old date, which the update itself changes.
+        Order.objects.filter(pk=other.pk, order_date=date(2026, 1, 10)).update(order_date=date(2026, 5, 1))
+        self.assertEqual(
+            dict(OrderLine.objects.values_list("order_id", "order_date")),
+            {self.order.pk: date(2026, 4, 1), other.pk: date(2026, 5, 1)},
+        )
+
+    def test_partitioning_is_a_no_op_off_postgres(self):
+        from inventory import partitioning
+
+        report = partitioning.ensure_partitions(convert=True)
+        self.assertFalse(report.enabled)
+        self.assertEqual(report.created, [])
+        self.assertEqual(partitioning.convert_all(), [])
+
+    def test_partition_months_and_sql(self):
+        from django.db import connection
+
+        from inventory import partitioning
+
+        months = list(partitioning.month_range(date(2025, 11, 20), date(2026, 2, 3)))
+        self.assertEqual(months, [date(2025, 11, 1), date(2025, 12, 1), date(2026, 1, 1), date(2026, 2, 1)])
+        name = partitioning.partition_name("inventory_order", date(2025, 12, 1))
+        self.assertEqual((name, partitioning.partition_month(name)), ("inventory_order_p202512", date(2025, 12, 1)))
+        self.assertIsNone(partitioning.partition_month("inventory_order_default"))
+
+        spec = partitioning.SPECS[0]
+        create, move, attach = partitioning.create_partition_sql(connection, spec, date(2025, 12, 1))
+        self.assertIn("inventory_order_default", move)
+        self.assertIn("\"order_date\" >= '2025-12-01' AND \"order_date\" < '2026-01-01'", move)
+        self.assertTrue(attach.endswith("FOR VALUES FROM ('2025-12-01') TO ('2026-01-01')"))
+
+
+class AnomalyShardTest(TestCase):
+    def setUp(self):
+        from datetime import timedelta
+
+        supplier = Supplier.objects.create(name="Shard Supplies")
+        self.items = [
+            Item.objects.create(name=f"Shard {i}", sku=f"SHARD-{i}", quantity=100, unit_cost=Decimal("1.00"), supplier=supplier)
+            for i in range(6)
+        ]
+        end = date(2026, 3, 31)
+        orders = Order.objects.bulk_create(
+            [Order(order_type=Order.TYPE_SALE, order_date=end - timedelta(days=d)) for d in range(45)]
+        )
+        lines = []
+        for d, order in enumerate(orders):
+            for i, item in enumerate(self.items):
+                spike = d == 0 and i % 2 == 0
+                lines.append(OrderLine(order=order, item=item, quantity=60 if spike else 2 + (d + i) % 3, unit_price=Decimal("1.00")))
+        OrderLine.objects.bulk_create(lines)
+
+    def test_shards_find_what_a_single_scan_finds(self):
+        from inventory import anomaly_shards
+
+        window = anomaly_shards.scan_window(60)
+        ranges = anomaly_shards.plan_shards(window, shards=3, min_items=1)
+        self.assertEqual(len(ranges), 3)
+        self.assertEqual((ranges[0][0], ranges[-1][1]), (self.items[0].pk, self.items[-1].pk))
+
+        with override_settings(ANOMALY_SCAN_SHARDS=3, ANOMALY_SCAN_SHARD_MIN_ITEMS=1):
+            sharded = anomaly_shards.scan(60)
+        self.assertEqual(sharded, detect_sales_anomalies(days_back=60))
+        self.assertEqual({r.item_id for r in sharded}, {self.items[0].pk, self.items[2].pk, self.items[4].pk})
+
+    def test_chord_callback_writes_and_records_once(self):
+        from inventory import anomaly_shards
+        from inventory.models import DemandAnomaly
+        from inventory.tasks import finish_anomaly_scan_task, scan_anomaly_shard_task
+
+        queued = JobRun.objects.create(name="anomaly_scan", status=JobRun.STATUS_RUNNING, lock="anomaly_scan")
+        window = anomaly_shards.scan_window(60)
+        ranges = anomaly_shards.plan_shards(window, shards=2, min_items=1)
+        JobRun.objects.filter(pk=queued.pk).update(progress_total=len(ranges))
+        parts = [
+            scan_anomaly_shard_task.apply(
+                args=[window.as_json(), item_range, 60, {"last_n_days_only": 14}], kwargs={"run_id": queued.pk}
+            ).get()
+            for item_range in ranges
+        ]
+        summary = finish_anomaly_scan_task.apply(args=[parts], kwargs={"run_id": queued.pk}).get()
+        self.assertEqual((summary["detected"], summary["created"]), (3, 3))
+        self.assertEqual(DemandAnomaly.objects.count(), 3)
+        self.assertEqual(Activity.objects.filter(kind=Activity.KIND_ANOMALY_SCAN).count(), 1)
+
+        run = JobRun.objects.get(name="anomaly_scan")
+        self.assertEqual(run.pk, queued.pk)
+        self.assertEqual(list(run.stages), ["load", "detect", "save", "prune", "notify"])
+        self.assertEqual((run.rows["shards"], run.rows["detected"], run.rows["created"]), (2, 3, 3))
+        self.assertEqual((run.status, run.lock, run.progress_done, run.progress_total), ("ok", None, 2, 2))
+
+
+class JobRunTest(TestCase):
+    def test_track_records_stages_rows_and_queries(self):
+        from inventory import job_runs
+
+        with override_settings(JOB_RUNS_TRACE_MEMORY=True):
+            with job_runs.track("unit_job", trace_memory=True) as run:
+                with job_runs.stage("load"):
+                    Supplier.objects.create(name="Job Supplier")
+                    payload = [0] * 200_000
+                with job_runs.track("nested_job"):
+                    job_runs.add_summary({"created": 2, "ok": True, "label": "x"})
+                with run.stage("load"):
+                    list(Supplier.objects.all())
+                run.add_rows(created=1)
+
+        self.assertEqual(JobRun.objects.count(), 1)
+        recorded = JobRun.objects.get()
+        self.assertEqual((recorded.name, recorded.status), ("unit_job", JobRun.STATUS_OK))
+        self.assertEqual(list(recorded.stages), ["load"])
+        self.assertEqual(recorded.rows, {"created": 3})
+        self.assertGreaterEqual(recorded.query_count, 2)
+        self.assertGreater(recorded.peak_memory_mb, len(payload) * 8 / 1024 / 1024 * 0.9)
+        self.assertIsNotNone(recorded.finished_at)
+
+    @override_settings(JOB_RUNS_TRACE_MEMORY=True)
+    def test_memory_tracing_is_left_to_dedicated_processes(self):
+        import contextvars
+        import tracemalloc
+
+        from inventory import job_runs
+
+        def other_run():  # e.g. a manual scan thread next to a command's run
+            with job_runs.track("overlapping_job", trace_memory=True):
+                pass
+
+        with job_runs.track("web_job"):  # not a dedicated process: no tracing
+            self.assertFalse(tracemalloc.is_tracing())
+        with job_runs.track("command_job", trace_memory=True):
+            contextvars.Context().run(other_run)
+            self.assertTrue(tracemalloc.is_tracing())  # the overlapping run did not stop it
+        self.assertFalse(tracemalloc.is_tracing())
+
+        peaks = dict(JobRun.objects.values_list("name", "peak_memory_mb"))
+        self.assertIsNone(peaks["web_job"])
+        self.assertIsNone(peaks["overlapping_job"])  # another run's peak would be wrong
+        self.assertIsNotNone(peaks["command_job"])
+
+    def test_failure_is_recorded_and_reraised(self):
+        from inventory import job_runs
+
+        with override_settings(JOB_RUNS_TRACE_MEMORY=False), self.assertRaises(ValueError):
+            with job_runs.track("broken_job"):
+                with job_runs.stage("detect"):
+                    raise ValueError("bad window")
+
+        run = JobRun.objects.get(name="broken_job")
+        self.assertEqual(run.status, JobRun.STATUS_FAILED)
+        self.assertEqual(run.error, "ValueError: bad window")
+        self.assertIn("detect", run.stages)
+        self.assertIsNone(run.peak_memory_mb)
+        # Outside a run the helpers are no-ops.
+        with job_runs.stage("load"):
+            job_runs.add_rows(created=1)
+        self.assertEqual(JobRun.objects.count(), 1)
+
+
 class OrderLineModelTest(TestCase):
     def test_line_total_property(self):
         supplier = Supplier.objects.create(name="S")
@@ -0,0 +1,188 @@
+"""
+Whole-hierarchy reads for the category and location trees.
+
+``get_tree(kind)`` loads every node together with its direct item count and
+quantity in one grouped query, links parents and children in memory, and rolls
+item counts, quantity and capacity up each subtree (bottom-up). The built tree
+is cached per kind under a version, so the templates never issue per-node
+queries.
+
+The version is made of the database ``ChangeVersion`` rows of the tables the
+tree is built from (items plus categories or locations; see
+``inventory.change_versions``). Every committed write bumps them, from any
+web worker, Celery task or management command. The per-process cache
+therefore never serves a tree older than the last commit, at the cost of
+one small query per read. A transaction that has written those tables
+builds its own tree, uncached, until it commits. ``bump_tree_version``
+forces the same invalidation for changes the write hook cannot see.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+from django.core.cache import cache
+from django.db.models import Count, Sum
+
+from . import change_versions
+from .models import Category, Item, Location
+
+KIND_CATEGORY = "category"
+KIND_LOCATION = "location"
+KINDS = (KIND_CATEGORY, KIND_LOCATION)
+
+TREE_CACHE_SECONDS = 10 * 60
+
+# Above this many nodes the location tree renders roots only and loads
+# children through ``location_tree_nodes`` when a node is expanded.
+LAZY_TREE_THRESHOLD = 1500
+UNLIMITED_DEPTH = 10_000
+
+
+@dataclass
+class TreeNodeData:
+    id: int
+    name: str
+    parent_id: int | None
+    depth: int = 0
+    item_count: int = 0
+    quantity: int = 0
+    capacity: int | None = None
+    location_type: str = ""
+    location_type_label: str = ""
+    children: list = field(default_factory=list)
+    subtree_item_count: int = 0
+    subtree_quantity: int = 0
+    subtree_capacity: int = 0
+    subtree_capacity_used: int = 0  # quantity held in nodes that have a capacity
+
+    @property
+    def utilisation_pct(self):
+        if not self.subtree_capacity:
+            return None
+        return min(100, round(100 * self.subtree_capacity_used / self.subtree_capacity, 1))
+
+    def as_json(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "parent_id": self.parent_id,
+            "depth": self.depth,
+            "child_count": len(self.children),
+            "item_count": self.item_count,
+            "quantity": self.quantity,
+            "subtree_item_count": self.subtree_item_count,
+            "subtree_quantity": self.subtree_quantity,
+            "capacity": self.capacity,
+            "subtree_capacity": self.subtree_capacity,
+            "subtree_capacity_used": self.subtree_capacity_used,
+            "utilisation_pct": self.utilisation_pct,
+            "location_type": self.location_type,
+            "location_type_label": self.location_type_label,
+        }
+
+
+@dataclass
+class Tree:
+    roots: list
+    nodes: dict  # id -> TreeNodeData
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @property
+    def render_depth(self):
+        """Deepest level the template renders up front (``tree_max_depth``)."""
+        return 0 if len(self.nodes) > LAZY_TREE_THRESHOLD else UNLIMITED_DEPTH
+
+
+def _tables(kind):
+    nodes = Category if kind == KIND_CATEGORY else Location
+    return (Item._meta.db_table, nodes._meta.db_table)
+
+
+def tree_version(kind):
+    """The committed change versions the ``kind`` tree depends on, shared by every process."""
+    tables = _tables(kind)
+    versions, _ = change_versions.current_versions(tables)
+    return "-".join(str(versions.get(table, 0)) for table in tables)
+
+
+def bump_tree_version(*kinds):
+    """Invalidate the cached tree(s) in every process once the current transaction commits."""
+    change_versions.note_change(*{table for kind in kinds or KINDS for table in _tables(kind)})
+
+
+def _load_rows(kind):
+    if kind == KIND_CATEGORY:
+        return (
+            Category.objects.order_by("name", "id")
+            .annotate(n_items=Count("items"), qty=Sum("items__quantity"))
+            .values("id", "name", "parent_id", "n_items", "qty")
+        )
+    type_labels = dict(Location.LOCATION_TYPES)
+    rows = (
+        Location.objects.order_by("id")
+        .annotate(n_items=Count("inventory_items"), qty=Sum("inventory_items__quantity"))
+        .values("id", "name", "parent_id", "n_items", "qty", "capacity", "location_type")
+    )
+    for row in rows:
+        row["location_type_label"] = type_labels.get(row["location_type"], row["location_type"])
+        yield row
+
+
+def build_tree(kind):
+    """Load and roll up the whole hierarchy with a single query (no cache)."""
+    nodes = {}
+    for row in _load_rows(kind):
+        nodes[row["id"]] = TreeNodeData(
+            id=row["id"],
+            name=row["name"],
+            parent_id=row["parent_id"],
+            item_count=int(row["n_items"] or 0),
+            quantity=int(row["qty"] or 0),
+            capacity=row.get("capacity"),
+            location_type=row.get("location_type", ""),
+            location_type_label=row.get("location_type_label", ""),
+        )
+
+    roots = []
+    for node in nodes.values():
+        parent = nodes.get(node.parent_id)
+        (parent.children if parent is not None else roots).append(node)
+
+    # Breadth-first order gives depths top-down; walking it backwards rolls
+    # each subtree up into its parent after all of its children are done.
+    order = list(roots)
+    for node in order:
+        for child in node.children:
+            child.depth = node.depth + 1
+            order.append(child)
+    for node in reversed(order):
+        node.subtree_item_count += node.item_count
+        node.subtree_quantity += node.quantity
+        if node.capacity:
+            node.subtree_capacity += node.capacity
+            node.subtree_capacity_used += node.quantity
+        parent = nodes.get(node.parent_id)
+        if parent is not None:
+            parent.subtree_item_count += node.subtree_item_count
+            parent.subtree_quantity += node.subtree_quantity
+            parent.subtree_capacity += node.subtree_capacity
+            parent.subtree_capacity_used += node.subtree_capacity_used
+    return Tree(roots=roots, nodes=nodes)
+
+
+def get_tree(kind):
+    """Cached ``build_tree`` for the current version of ``kind``."""
+    if kind not in KINDS:
+        raise ValueError(f"Unknown tree kind: {kind}")
+    if change_versions.has_uncommitted_writes(*_tables(kind)):
+        # The versions still describe the committed rows: neither serve them
+        # nor cache what this transaction sees under them.
+        return build_tree(kind)
+    key = f"tree:{kind}:{tree_version(kind)}"
+    tree = cache.get(key)
+    if tree is None:
+        tree = build_tree(kind)
+        cache.set(key, tree, TREE_CACHE_SECONDS)
+    return tree
@@ -1,13 +1,22 @@
+from django.conf import settings
 from django.urls import path, reverse
 from django.shortcuts import redirect
-from . import views
+from . import api, views
+
+# Under ASGI the fan-out endpoints are served by their async versions.
+if settings.ASYNC_VIEWS:
+    from . import async_views as fanout_views
+else:
+    fanout_views = views
 
 urlpatterns = [
     path("signup/", views.signup, name="signup"),
     path("logout/", views.logout_view, name="logout"),
-    path("", views.dashboard, name="dashboard"),
+    path("", fanout_views.dashboard, name="dashboard"),
+    path("dashboard/widgets/<slug:name>/", fanout_views.dashboard_widget, name="dashboard_widget"),
     path("items/<int:pk>/forecast/", views.item_forecast, name="item_forecast"),
     path("anomalies/run/", views.run_anomaly_scan_view, name="run_anomaly_scan"),
+    path("anomalies/run/status/", views.anomaly_scan_status, name="anomaly_scan_status"),
     path(
         "anomalies/banner/dismiss/",
         views.dismiss_anomaly_scan_banner,
@@ -20,7 +29,7 @@ urlpatterns = [
     path("anomalies/bulk/review/", views.anomaly_bulk_review, name="anomaly_bulk_review"),
     path("anomalies/bulk/dismiss/", views.anomaly_bulk_dismiss, name="anomaly_bulk_dismiss"),
     path("anomalies/bulk/undismiss/", views.anomaly_bulk_undismiss, name="anomaly_bulk_undismiss"),
-    path("search/", views.global_search, name="global_search"),
+    path("search/", fanout_views.global_search, name="global_search"),
 
     path("manager-requests/<int:request_id>/approve/", views.approve_manager_request, name="approve_manager_request"),
     path("manager-requests/<int:request_id>/decline/", views.decline_manager_request, name="decline_manager_request"),
@@ -28,20 +37,30 @@ urlpatterns = [
     path("notifications/<int:notification_id>/dismiss/", views.dismiss_notification, name="dismiss_notification"),
     path("alerts/dismiss/", views.dismiss_alert, name="dismiss_alert"),
     path("alerts/dismiss-bulk/", views.dismiss_alerts_bulk, name="dismiss_alerts_bulk"),
-    path("alerts/", views.alerts_list, name="alerts_list"),
+    path("alerts/", fanout_views.alerts_list, name="alerts_list"),
     
 
     # Stock CRUD
     path("items/", views.item_list, name="item_list"),
     path("items/decode-barcode/", views.decode_barcode_upload, name="decode_barcode_upload"),
+    path("items/decode-barcodes/", views.decode_barcode_batch, name="decode_barcode_batch"),
+    path("items/scan-lookup/", views.scan_lookup, name="scan_lookup"),
     path("items/create/", views.item_create, name="item_create"),
     path("items/<int:pk>/", views.item_detail, name="item_detail"),
     path("items/<int:pk>/edit/", views.item_edit, name="item_edit"),
     path("items/<int:pk>/delete/", views.item_delete, name="item_delete"),
     path("items/<int:pk>/adjust/", views.item_adjust_quantity, name="item_adjust"),
     path("items/export/csv/", views.item_export_csv, name="item_export_csv"),
+    path("items/import/", views.item_import, name="item_import"),
+    path("items/import/errors/<str:token>/", views.item_import_errors, name="item_import_errors"),
     path("items/<int:pk>/archive/", views.item_toggle_archive, name="item_toggle_archive"),
     path("items/<int:pk>/hard-delete/", views.item_hard_delete, name="item_hard_delete"),
+    # Cycle counts
+    path("cycle-counts/", views.cycle_count_list, name="cycle_count_list"),
+    path("cycle-counts/<int:pk>/", views.cycle_count_detail, name="cycle_count_detail"),
+    path("cycle-counts/<int:pk>/lines/<int:line_id>/delete/", views.cycle_count_line_delete, name="cycle_count_line_delete"),
+    path("cycle-counts/<int:pk>/approve/", views.cycle_count_approve, name="cycle_count_approve"),
+    path("cycle-counts/<int:pk>/cancel/", views.cycle_count_cancel, name="cycle_count_cancel"),
     # Categories CRUD
     path("categories/", views.category_list, name="category_list"),
     path("categories/add/", views.category_create, name="category_create"),
@@ -55,6 +74,7 @@ urlpatterns = [
     path("locations/<int:pk>/edit/", views.location_edit, name="location_edit"),
     path("locations/<int:pk>/delete/", views.location_delete, name="location_delete"),
     path("locations/tree/", lambda r: redirect(reverse("location_list") + "?view=tree"), name="location_tree"),
+    path("locations/tree/nodes/", views.location_tree_nodes, name="location_tree_nodes"),
     path("locations/export/csv/", views.location_export_csv, name="location_export_csv"),
     path("locations/<int:pk>/view/", views.location_view, name="location_view"),
     # Orders CRUD
@@ -65,6 +85,7 @@ urlpatterns = [
     path("orders/<int:pk>/duplicate/", views.order_duplicate, name="order_duplicate"),
     path("orders/<int:pk>/delete/", views.order_delete, name="order_delete"),
     path("orders/export/csv/", views.order_export_csv, name="order_export_csv"),
+    path("orders/bulk/status/", views.order_bulk_status, name="order_bulk_status"),
     path(
         "orders/<int:pk>/mark-delivered/",
         views.order_mark_delivered,
@@ -90,5 +111,14 @@ urlpatterns = [
     path("settings/", views.settings_view, name="settings"),
     path("profile/activity/export/", views.export_activity_log, name="export_activity_log"),
     path("settings/privacy/export-account/", views.export_account_data, name="export_account_data"),
+    path("metrics", views.metrics_view, name="metrics"),
+    path("jobs/", views.job_run_list, name="job_run_list"),
+    path("jobs/feed.json", views.job_run_feed, name="job_run_feed"),
+
+    # JSON API (see inventory/api.py)
+    path("api/v1/", api.api_index, name="api_index"),
+    path("api/v1/<str:resource>/", api.api_list, name="api_list"),
+    path("api/v1/<str:resource>/batch/", api.api_batch, name="api_batch"),
+    path("api/v1/<str:resource>/<int:pk>/", api.api_detail, name="api_detail"),
 
 ]
\ No newline at end of file
@@ -1,20 +1,23 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.db.models import Count, Sum
-from .models import Item, Supplier, Client, Location, Order, OrderLine, StockHistory, Category, UserPreference, UserProfile
-from .forms import ItemForm, OrderForm, OrderLineFormSet, SupplierForm, ClientForm, CategoryForm, LocationForm
+from .models import Item, Supplier, Client, Location, Order, OrderLine, StockHistory, StockMovement, Category, UserPreference, UserProfile, CycleCount, JobRun
+from .forms import ItemForm, OrderForm, OrderLineFormSet, SupplierForm, ClientForm, CategoryForm, LocationForm, CycleCountForm
 from django.db.models import F, Q
 from django.core.paginator import Paginator
 from django.http import HttpResponse
 import csv
-import datetime
 import json
+import itertools
+import uuid
 from datetime import date, timedelta
 from django.db import models
 from decimal import Decimal
 from django.utils import timezone
 from django.db.models.functions import Coalesce
-from django.http import JsonResponse
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_vary_headers
 from .login_redirect import get_post_login_redirect_url
 from inventory.models import Activity
 from .permissions_display import summarize_permissions, build_role_capability_sections
@@ -30,7 +33,7 @@ from .forms import SignUpForm
 from .models import ManagerRequest, Notification
 from django.contrib.auth.password_validation import password_validators_help_texts
 from django.contrib import messages
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_http_methods, require_POST
 from django.contrib.auth import get_user_model
 User = get_user_model()
 from django.core.mail import send_mail
@@ -46,6 +49,15 @@ from .recommendation_engine import (
     get_recommendations_for_context,
 )
 from .context_processors import get_alerts_for_user
+from .daily_totals import contribution_of, note_item_change
+from .stock_ledger import record_movement
+from .tree_service import KIND_CATEGORY, KIND_LOCATION, UNLIMITED_DEPTH, get_tree
+from . import barcode_decode, dashboard_widgets, scan_codes, search_service
+from . import change_versions, cycle_counts, job_runs, manual_scans
+from . import item_import as item_import_service
+from . import order_transitions
+from .roles import is_manager_or_admin
+from .stock_updates import InsufficientStock, apply_stock_changes
 
 logger = logging.getLogger(__name__)
 
@@ -182,93 +194,15 @@ def logout_view(request):
 
 
 @login_required
+@change_versions.conditional_view(*search_service.SOURCE_MODELS, page=False)
 def global_search(request):
     q = request.GET.get("q", "").strip()
 
     if not q:
         return JsonResponse({"results": []})
 
-    results = []
-
-    # Stock Items -> detail/profile page
-    for i in Item.objects.filter(
-        Q(name__icontains=q) |
-        Q(sku__icontains=q) |
-        Q(description__icontains=q)
-    )[:5]:
-        results.append({
-            "type": "Stock Item",
-            "name": i.name,
-            "sub": f"SKU: {i.sku}",
-            "url": reverse("item_detail", args=[i.id]),
-        })
+    return JsonResponse({"results": search_service.search(q)})
 
-    # Categories -> item list filtered by category (shows items in that category)
-    for c in Category.objects.filter(Q(name__icontains=q))[:5]:
-        results.append({
-            "type": "Category",
-            "name": c.name,
-            "sub": c.full_path,
-            "url": reverse("item_list") + f"?category={c.id}",
-        })
-
-    # Suppliers -> edit page (no separate profile view; edit shows details)
-    for s in Supplier.objects.filter(Q(name__icontains=q))[:5]:
-        results.append({
-            "type": "Supplier",
-            "name": s.name,
-            "sub": s.email or "",
-            "url": reverse("supplier_view", args=[s.id]),
-        })
-
-    # Customers -> edit page (no separate profile view; edit shows details)
-    for c in Client.objects.filter(
-        Q(name__icontains=q) | Q(email__icontains=q)
-    )[:5]:
-        results.append({
-            "type": "Customer",
-            "name": c.name,
-            "sub": c.email,
-            "url": reverse("client_view", args=[c.id]),
-        })
-
-    # Locations -> profile/view page (already correct)
-    for l in Location.objects.filter(Q(name__icontains=q))[:5]:
-        results.append({
-            "type": "Location",
-            "name": l.name,
-            "sub": l.get_breadcrumb(),
-            "url": reverse("location_view", args=[l.id]),
-        })
-
-    # Orders -> order detail
-    for o in Order.objects.prefetch_related("lines__item").filter(
-        Q(notes__icontains=q) |
-        Q(reference__icontains=q) |
-        Q(lines__item__name__icontains=q)
-    ).distinct()[:5]:
-        lines = list(o.lines.select_related("item").all()[:2])
-        sub = ", ".join(ln.item.name for ln in lines) if lines else "—"
-        if o.lines.count() > 2:
-            sub += f" (+{o.lines.count() - 2} more)"
-        results.append({
-            "type": "Order",
-            "name": f"Order #{o.id}",
-            "sub": f"{o.order_type.title()} – {sub}",
-            "url": reverse("order_detail", args=[o.id]),
-        })
-
-    return JsonResponse({"results": results})
-
-
-def is_manager_or_admin(user):
-    return (
-        user.is_authenticated
-        and (
-            user.is_superuser
-            or user.groups.filter(name__in=["Manager", "Admin"]).exists()
-        )
-    )
 
 @login_required
 def approve_manager_request(request, request_id):
@@ -378,341 +312,59 @@ def dismiss_alert(request):
 # Dashboard
 # -------------------------------
 @login_required
+@change_versions.conditional_view(Item, Supplier, Client, Order, extra=dashboard_widgets.shell_version)
 def dashboard(request):
-    from django.db.models import Sum, Count
-    import datetime
-    from inventory.models import DemandAnomaly
-
-    # ---- basic counts ----
-    total_items = Item.objects.filter(is_active=True).count()
-    low_stock_items = Item.objects.filter(is_active=True, quantity__lte=F("reorder_level")).count()
-    active_supplier_count = Supplier.objects.filter(is_active=True).count()
-    active_customer_count = Client.objects.filter(is_active=True).count()
-    pending_purchase_orders_count = Order.objects.filter(
-        status=Order.STATUS_PENDING,
-        order_type=Order.TYPE_PURCHASE,
-    ).count()
-    pending_sales_orders_count = Order.objects.filter(
-        status=Order.STATUS_PENDING,
-        order_type=Order.TYPE_SALE,
-    ).count()
-    low_stock_percent = round((low_stock_items / total_items) * 100, 1) if total_items else 0
-
-    # ---- inventory trend + forecasting ----
-    today = timezone.localdate()
-    trend_days = int(request.GET.get("trend_days", 30))
-    trend_days = max(7, min(30, trend_days))
-    debug_trend = request.GET.get("debug_trend") == "1"
-
-    from .inventory_forecasting import (
-        evaluate_model,
-        generate_forecast,
-        get_daily_inventory_series,
-    )
-
-    full_series_df = get_daily_inventory_series(days_back=180)
-    trend_df = full_series_df.tail(trend_days).copy()
-
-    stock_dates = [d.strftime("%d %b") for d in trend_df["date"]]
-    stock_values = [int(v) for v in trend_df["total_units"]]
-    current_stock_value = int(stock_values[-1]) if stock_values else 0
-
-    inventory_change_pct = None
-    if len(stock_values) >= 2 and stock_values[0] > 0:
-        inventory_change_pct = round(((stock_values[-1] - stock_values[0]) / stock_values[0]) * 100, 1)
-
-    forecast_days = int(request.GET.get("forecast_days", 7))
-    if forecast_days not in (7, 14, 30):
-        forecast_days = 7
-    chart_history_days = 60 if forecast_days == 30 else 45
-
-    forecast_result = generate_forecast(
-        series_df=full_series_df,
-        horizon_days=forecast_days,
-        chart_history_days=chart_history_days,
-    )
-    model_eval = evaluate_model(series_df=full_series_df, horizon_days=forecast_days)
-
-    forecast_metric_value = (
-        forecast_result["next_day_forecast"] if forecast_result["next_day_forecast"] else forecast_result["latest_forecast"]
-    )
-    forecast_badge = forecast_result["trend_badge"]
-    forecast_change_pct = float(forecast_result.get("forecast_change_pct", 0.0))
-    forecast_has_significant_change = bool(forecast_result.get("has_significant_change", False))
-
-    if forecast_badge == "rising":
-        forecast_insight = (
-            f"Projected inventory increases by {abs(forecast_change_pct):.1f}% over the next {forecast_days} days, "
-            "indicating a net stock build-up."
-        )
-    elif forecast_badge == "falling":
-        forecast_insight = (
-            f"Projected inventory decreases by {abs(forecast_change_pct):.1f}% over the next {forecast_days} days, "
-            "indicating a net stock drawdown."
-        )
-    else:
-        forecast_insight = f"No significant change in stock levels expected over the next {forecast_days} days."
-
-    if debug_trend:
-        live_total = int(Item.objects.filter(is_active=True).aggregate(total=Sum("quantity"))["total"] or 0)
-        logger.info(
-            "Forecast debug | points=%s trend_points=%s live_total=%s series_last=%s model=%s fallback=%s",
-            len(full_series_df),
-            len(stock_values),
-            live_total,
-            current_stock_value,
-            forecast_result.get("model_used"),
-            forecast_result.get("used_fallback"),
-        )
-        if model_eval.get("can_evaluate"):
-            logger.info(
-                "Forecast backtest | baseline=%s advanced=%s train=%s valid=%s",
-                model_eval.get("baseline"),
-                model_eval.get("advanced"),
-                model_eval.get("train_points"),
-                model_eval.get("validation_points"),
-            )
-
-    # ---- weekly orders activity (6 calendar weeks Mon–Sun, always including current week) ----
-    def _monday_of_week(d):
-        return d - datetime.timedelta(days=d.weekday())
-
-    current_week_start = _monday_of_week(today)
-    week_starts = [current_week_start - datetime.timedelta(weeks=k) for k in range(5, -1, -1)]
-    week_end_max = week_starts[-1] + datetime.timedelta(days=6)
-    idx_for_week_start = {ws: i for i, ws in enumerate(week_starts)}
-    purchase_by_week = [0] * 6
-    sale_by_week = [0] * 6
-    for order_date, otype in (
-        Order.objects.filter(
-            order_date__gte=week_starts[0],
-            order_date__lte=week_end_max,
-        )
-        .values_list("order_date", "order_type")
-        .iterator(chunk_size=4000)
-    ):
-        ws = _monday_of_week(order_date)
-        i = idx_for_week_start.get(ws)
-        if i is None:
-            continue
-        if otype == Order.TYPE_PURCHASE:
-            purchase_by_week[i] += 1
-        elif otype == Order.TYPE_SALE:
-            sale_by_week[i] += 1
-
-    weekly_labels = [ws.strftime("%d %b") for ws in week_starts]
-    weekly_purchase_counts = purchase_by_week
-    weekly_sale_counts = sale_by_week
-    weekly_counts = [p + s for p, s in zip(purchase_by_week, sale_by_week)]
-
-    this_week_orders = weekly_counts[-1] if weekly_counts else 0
-    last_week_orders = weekly_counts[-2] if len(weekly_counts) >= 2 else None
-
-    # ---- top items by number of orders (for chart + highlight) ----
-    top_items_qs = (
-        Item.objects
-        .annotate(total_orders=Count("order_lines"))
-        .filter(total_orders__gt=0)
-        .order_by("-total_orders")[:5]
-    )
-    top_item = top_items_qs.first()
-    top_items_labels = [item.name[:25] + ("…" if len(item.name) > 25 else "") for item in top_items_qs]
-    top_items_counts = [item.total_orders for item in top_items_qs]
-
-    # ---- recent activity feed ----
-    from inventory.models import Activity
-    # Compact card shows a short list (newest -> oldest). Expanded modal shows more history.
-    recent_activity = Activity.objects.all().order_by("-timestamp")[:5]
-    recent_activity_detail_list = Activity.objects.all().order_by("-timestamp")[:50]
-    recent_activity_export_list = [
-        {
-            "message": a.message,
-            "user": (a.user.username if a.user else "System"),
-            "timestamp": a.timestamp.isoformat(),
-        }
-        for a in recent_activity_detail_list
-    ]
-
-    # ---- recent demand anomalies ----
-    recent_anomalies = (
-        DemandAnomaly.objects
-        .filter(dismissed=False)
-        .select_related("item")
-        .order_by("-date", "-score")[:8]
-    )
-
-    # Demand anomalies expanded (modal) filters mimic the anomaly_list page,
-    # but render inside the dashboard instead of a separate page.
-    anom_severity = request.GET.get("anom_severity", "")
-    anom_show = request.GET.get("anom_show", "active")  # active | dismissed | all
-    anom_q = request.GET.get("q", "").strip()
-
-    anomalies_qs = DemandAnomaly.objects.select_related("item").order_by("-date", "-score")
-    if anom_severity:
-        anomalies_qs = anomalies_qs.filter(severity=anom_severity)
-    if anom_show == "active":
-        anomalies_qs = anomalies_qs.filter(dismissed=False)
-    elif anom_show == "dismissed":
-        anomalies_qs = anomalies_qs.filter(dismissed=True)
-    # "all" -> no filter
-    if anom_q:
-        anomalies_qs = anomalies_qs.filter(item__name__icontains=anom_q)
-
-    anomalies_heading_label = (
-        "Active anomalies" if anom_show == "active" else
-        "Dismissed anomalies" if anom_show == "dismissed" else
-        "All anomalies"
-    )
-
-    # Paginator for the detailed modal (so it behaves like the other list pages)
-    anomalies_per_page = get_per_page(request)
-    anomalies_paginator = Paginator(anomalies_qs, anomalies_per_page)
-    anomalies_page_obj = anomalies_paginator.get_page(request.GET.get("page"))
-    anomalies_detail_list = list(anomalies_page_obj.object_list)
-    anomalies_total_count = anomalies_paginator.count
-    def _export_score(val):
-        try:
-            v = float(val)
-            return 0.0 if v != v else v  # NaN -> 0
-        except (TypeError, ValueError):
-            return 0.0
-
-    # Plain list for {% json_script %} — avoids breaking the dashboard Chart.js block via </script> in names
-    anomalies_export_list = [
-        {
-            "item": a.item.name,
-            "date": a.date.isoformat(),
-            "quantity": int(a.quantity) if a.quantity is not None else 0,
-            "score": _export_score(a.score),
-            "severity": a.severity,
-        }
-        for a in anomalies_qs[:200]
-    ]
-    # String form kept for any callers/templates that still expect it; dashboard uses json_script + list
-    anomalies_export_json = json.dumps(anomalies_export_list)
-
-    # ---- inventory-by-category pie data ----
-    # Sum quantities grouped by category name
-    category_qs = (
-        Item.objects
-        .values("category__name")
-        .annotate(total_qty=Sum("quantity"))
-        .order_by("category__name")
-    )
-
-    pie_labels = [row["category__name"] or "Uncategorised" for row in category_qs]
-    pie_values = [int(row["total_qty"]) for row in category_qs]
-    pie_total_units = int(sum(pie_values)) if pie_values else 0
-    pie_table_rows = [
-        {
-            "label": lbl,
-            "qty": int(qty),
-            "pct": round(100.0 * int(qty) / pie_total_units, 2) if pie_total_units else 0.0,
-        }
-        for lbl, qty in zip(pie_labels, pie_values)
-    ]
+    """
+    Page shell: header, KPI counts and empty card bodies.
 
-    # ---- inventory-by-location (for chart next to category pie) ----
-    location_qs = (
-        Item.objects
-        .values("location__name")
-        .annotate(total_qty=Sum("quantity"))
-        .order_by("-total_qty")[:8]
-    )
-    location_labels = [row["location__name"] or "No location" for row in location_qs]
-    location_values = [int(row["total_qty"]) for row in location_qs]
-    location_total_units = int(sum(location_values)) if location_values else 0
-    location_table_rows = [
-        {"label": lbl, "qty": int(qty)} for lbl, qty in zip(location_labels, location_values)
-    ]
+    Every chart, feed and modal is a separate widget (``dashboard_widgets``)
+    that the page fetches in parallel from ``dashboard_widget``.
+    """
+    return dashboard_shell_response(request, dashboard_widgets.kpi_counts())
 
-    is_manager_or_admin = request.user.groups.filter(name__in=["Manager", "Admin"]).exists()
 
+def dashboard_shell_response(request, kpis):
+    """Render the dashboard shell around already computed KPI counts."""
+    trend_days, forecast_days = dashboard_widgets.dashboard_params(request)
     context = {
-        "total_items": total_items,
-        "low_stock_items": low_stock_items,
-        "active_supplier_count": active_supplier_count,
-        "active_customer_count": active_customer_count,
-        "pending_purchase_orders_count": pending_purchase_orders_count,
-        "pending_sales_orders_count": pending_sales_orders_count,
-        "low_stock_percent": low_stock_percent,
-
+        **kpis,
         "trend_days": trend_days,
-        "stock_dates": stock_dates,
-        "stock_values": stock_values,
-        "current_stock_value": current_stock_value,
-        "inventory_change_pct": inventory_change_pct,
-        "forecast_metric_value": forecast_metric_value,
         "forecast_days": forecast_days,
-        "forecast_badge": forecast_badge,
-        "forecast_chart_labels": json.dumps(forecast_result["chart_labels"]),
-        "forecast_hist_values": json.dumps(forecast_result["chart_hist_values"]),
-        "forecast_values": json.dumps(forecast_result["chart_forecast_values"]),
-        "forecast_lower_values": json.dumps(forecast_result["chart_lower_values"]),
-        "forecast_upper_values": json.dumps(forecast_result["chart_upper_values"]),
-        "forecast_points_json": json.dumps(forecast_result.get("forecast_points", [])),
-        "forecast_model_name": forecast_result.get("model_used", "baseline"),
-        "forecast_model_used_fallback": forecast_result.get("used_fallback", False),
-        "forecast_model_fallback_reason": forecast_result.get("fallback_reason", ""),
-        "forecast_eval": model_eval,
-        "forecast_change_pct": round(forecast_change_pct, 2),
-        "forecast_has_significant_change": forecast_has_significant_change,
-        "forecast_expected_range_lower": forecast_result.get("expected_range_lower", 0),
-        "forecast_expected_range_upper": forecast_result.get("expected_range_upper", 0),
-        "forecast_history_days_used": forecast_result.get("history_days_used", 0),
-        "forecast_confidence_label": forecast_result.get("confidence_label", "Medium"),
-        "forecast_today_index": forecast_result.get("chart_today_index", 0),
-        "forecast_insight_text": forecast_insight,
-
-        "weekly_order_labels": weekly_labels,
-        "weekly_order_counts": weekly_counts,
-        "weekly_purchase_counts": weekly_purchase_counts,
-        "weekly_sale_counts": weekly_sale_counts,
-        "this_week_orders": this_week_orders,
-        "last_week_orders": last_week_orders,
-
-        "top_item": top_item,
-        "top_items_labels": top_items_labels,
-        "top_items_counts": top_items_counts,
-        "recent_activity": recent_activity,
-        "recent_anomalies": recent_anomalies,
-        "recent_activity_detail_list": recent_activity_detail_list,
-        "recent_activity_export_list": recent_activity_export_list,
-        "anomalies_detail_list": anomalies_detail_list,
-        "anomalies_page_obj": anomalies_page_obj,
-        "anomalies_total_count": anomalies_total_count,
-        "anomalies_export_list": anomalies_export_list,
-        "anomalies_export_json": anomalies_export_json,
-        "anom_severity": anom_severity,
-        "anom_show": anom_show,
-        "anom_q": anom_q,
-        "anomalies_per_page": anomalies_per_page,
-        "per_page_choices": PER_PAGE_CHOICES,
-        "anomalies_heading_label": anomalies_heading_label,
-        "is_manager_or_admin": is_manager_or_admin,
-
-        "pie_labels": pie_labels,
-        "pie_values": pie_values,
-        "pie_total_units": pie_total_units,
-        "pie_table_rows": pie_table_rows,
-        "location_labels": location_labels,
-        "location_values": location_values,
-        "location_total_units": location_total_units,
-        "location_table_rows": location_table_rows,
-        "debug_trend": debug_trend,
-        "trend_today_index": (len(stock_dates) - 1) if stock_dates else 0,
-        "trend_debug_start_units": stock_values[0] if stock_values else 0,
-        "trend_debug_end_units": stock_values[-1] if stock_values else 0,
-        "trend_debug_forecast_points": len(forecast_result.get("forecast_points", [])),
+        "is_manager_or_admin": is_manager_or_admin(request.user),
+        "dashboard_widget_urls": {
+            name: dashboard_widgets.widget_url(widget, request)
+            for name, widget in dashboard_widgets.WIDGETS.items()
+            if not widget.lazy
+        },
+        "anomalies_widget_url": dashboard_widgets.widget_url(dashboard_widgets.WIDGETS["anomalies"], request),
     }
 
     response = render(request, "inventory/dashboard.html", context)
+    # Replaced by "private, no-cache" plus an ETag when the view answers conditionally.
     response["Cache-Control"] = "no-cache, no-store, must-revalidate"
     response["Pragma"] = "no-cache"
     response["Expires"] = "0"
     return response
 
 
+@login_required
+def dashboard_widget(request, name):
+    """JSON payload for one dashboard widget, with an ETag and the widget's cache policy."""
+    widget = dashboard_widgets.WIDGETS.get(name)
+    if widget is None:
+        raise Http404("Unknown dashboard widget")
+    return dashboard_widget_response(request, widget, dashboard_widgets.get_payload(widget, request))
+
+
+def dashboard_widget_response(request, widget, payload):
+    response = JsonResponse(payload)
+    etag = dashboard_widgets.payload_etag(response.content)
+    response["ETag"] = etag
+    response["Cache-Control"] = widget.cache_control
+    patch_vary_headers(response, ["Cookie"])
+    return get_conditional_response(request, etag=etag, response=response)
+
+
 @login_required
 @permission_required("inventory.view_item", raise_exception=True)
 @never_cache
@@ -731,62 +383,38 @@ def item_forecast(request, pk):
         "hide_stock_sidebar": True,
     })
 
-from .alerts_jobs import run_anomaly_scan_and_notify
-from .anomaly_scan_notifications import record_anomaly_scan_completion_for_user
-from .tasks import run_anomaly_scan_task
-
 
 @login_required
 @user_passes_test(is_manager_or_admin)
 def run_anomaly_scan_view(request):
-    # Default: run synchronously so the sticky results banner appears on redirect (no Celery wait).
-    # Set ANOMALY_SCAN_BUTTON_SYNC=0 to queue on Celery instead (requires a running worker).
-    if getattr(settings, "ANOMALY_SCAN_BUTTON_SYNC", True):
-        summary = run_anomaly_scan_and_notify()
-        record_anomaly_scan_completion_for_user(request.user, summary)
-        Activity.objects.create(
-            user=request.user,
-            kind=Activity.KIND_ANOMALY_SCAN,
-            message=(
-                f"Anomaly scan completed: {summary['detected']} match rules "
-                f"({summary['created']} new, {summary['pruned']} obsolete rows removed)"
-            ),
-        )
-        messages.success(
-            request,
-            f"Anomaly scan finished — see the banner below. "
-            f"{summary['detected']} anomalies match the rules.",
-        )
-        return redirect("dashboard")
-    try:
-        run_anomaly_scan_task.delay(user_id=request.user.id)
-        Activity.objects.create(
-            user=request.user,
-            kind=Activity.KIND_ANOMALY_SCAN,
-            message="Anomaly scan queued (background job)",
-        )
-        messages.info(
-            request,
-            "Anomaly scan queued in the background. Results will appear in the bottom banner when the worker finishes.",
-        )
-    except Exception:
-        summary = run_anomaly_scan_and_notify()
-        record_anomaly_scan_completion_for_user(request.user, summary)
+    """
+    Queue a manual scan (Celery, or a background thread without a broker) and go back to the dashboard.
+
+    A click while a scan is queued or running attaches to that scan. Either
+    way the bottom banner follows it (see inventory.manual_scans).
+    """
+    run, started = manual_scans.start_scan(request.user)
+    request.session[manual_scans.SESSION_KEY] = run.pk
+    if started:
         Activity.objects.create(
             user=request.user,
             kind=Activity.KIND_ANOMALY_SCAN,
-            message=(
-                f"Anomaly scan completed: {summary['detected']} match rules "
-                f"({summary['created']} new, {summary['pruned']} obsolete rows removed)"
-            ),
-        )
-        messages.warning(
-            request,
-            "Could not reach the task queue — scan ran immediately. Results are in the banner below.",
+            message="Anomaly scan started (background job)",
         )
+        messages.info(request, "Anomaly scan started in the background. Progress is shown in the banner below.")
+    else:
+        messages.info(request, "An anomaly scan is already running. Its progress is shown in the banner below.")
     return redirect("dashboard")
 
 
+@never_cache
+@login_required
+@user_passes_test(is_manager_or_admin)
+def anomaly_scan_status(request):
+    """Polled by the bottom banner: progress of the scan this session follows, ``{"active": false}`` once done."""
+    return JsonResponse(manual_scans.progress(manual_scans.watched_run(request)))
+
+
 @require_POST
 @login_required
 def dismiss_anomaly_scan_banner(request):
@@ -975,6 +603,7 @@ def anomaly_bulk_undismiss(request):
 # ======================================================
 @login_required
 @permission_required("inventory.view_item", raise_exception=True)
+@change_versions.conditional_view(Item, Category, Location, Supplier, OrderLine, StockHistory)
 def item_list(request):
 
     items = Item.objects.select_related("supplier", "location", "category").annotate(
@@ -1025,16 +654,26 @@ def item_list(request):
     # -------------------------
     # CATEGORY FILTER
     # -------------------------
+    # ?subtree=1 also includes child categories / sub-locations (prefix scan on tree_path).
+    include_subtree = request.GET.get("subtree") == "1"
     category_id = request.GET.get("category")
     if category_id:
-        items = items.filter(category_id=category_id)
+        if include_subtree:
+            prefix = Category.objects.filter(pk=category_id).values_list("tree_path", flat=True).first()
+            items = items.filter(category__tree_path__startswith=prefix) if prefix else items.none()
+        else:
+            items = items.filter(category_id=category_id)
 
     # -------------------------
     # LOCATION FILTER
     # -------------------------
     location_id = request.GET.get("location")
     if location_id:
-        items = items.filter(location_id=location_id)
+        if include_subtree:
+            prefix = Location.objects.filter(pk=location_id).values_list("tree_path", flat=True).first()
+            items = items.filter(location__tree_path__startswith=prefix) if prefix else items.none()
+        else:
+            items = items.filter(location_id=location_id)
 
     # -------------------------
     # SUPPLIER FILTER
@@ -1143,7 +782,7 @@ def item_detail(request, pk):
     order_lines = (
         OrderLine.objects.filter(item=item)
         .select_related("order", "order__supplier", "order__client")
-        .order_by("-order__order_date")[:20]
+        .order_by("-order_date")[:20]
     )
     recent_history = item.history.order_by("-date")[:14]
     anomalies = item.demand_anomalies.filter(dismissed=False).order_by("-date")[:5]
@@ -1204,8 +843,16 @@ def item_detail(request, pk):
 @permission_required("inventory.change_item", raise_exception=True)
 def item_toggle_archive(request, pk):
     item = get_object_or_404(Item, pk=pk)
+    before = contribution_of(item)
     item.is_active = not item.is_active
     item.save(update_fields=["is_active"])
+    note_item_change(before, contribution_of(item))
+    record_movement(
+        item,
+        0,
+        StockMovement.REASON_UNARCHIVE if item.is_active else StockMovement.REASON_ARCHIVE,
+        user=request.user,
+    )
 
     if item.is_active:
         messages.success(request, f"Unarchived item: {item.name}")
@@ -1235,34 +882,23 @@ def item_adjust_quantity(request, pk):
 
     if request.method == "POST":
         adjustment = int(request.POST.get("adjustment"))
-        new_qty = item.quantity + adjustment
-        if new_qty < 0:
+        try:
+            apply_stock_changes(
+                [(item.pk, adjustment)],
+                actor=request.user,
+                activity_kind=Activity.KIND_ITEM_ADJUST,
+                activity_message=lambda it, delta: f"Adjusted quantity for {it.name}: change of {delta}",
+                log_auto_archive=True,
+            )
+        except InsufficientStock as e:
             messages.error(
                 request,
-                f"Cannot adjust {item.name}: quantity would become {new_qty}. "
+                f"Cannot adjust {item.name}: quantity would become {e.current + e.change}. "
                 "Stock cannot go below zero."
             )
             return redirect("item_list")
-        was_active = item.is_active
-        item.quantity = new_qty
-        item.save()
-        item.maybe_archive_on_deplete()
-        item.refresh_from_db(fields=["is_active"])
 
         messages.success(request, f"Adjusted {item.name}: quantity updated by {adjustment:+d}")
-
-        Activity.objects.create(
-            message=f"Adjusted quantity for {item.name}: change of {adjustment}",
-            user=request.user,
-            kind=Activity.KIND_ITEM_ADJUST,
-        )
-        if was_active and not item.is_active:
-            Activity.objects.create(
-                message=f"Archived item (auto, stock depleted): {item.name}",
-                user=request.user,
-                kind=Activity.KIND_ITEM_AUTO_ARCHIVE,
-            )
-
         return redirect("item_list")
 
     return render(request, "inventory/item_adjust.html", {"item": item})
@@ -1272,51 +908,107 @@ def item_adjust_quantity(request, pk):
 # ======================================================
 # ITEM CRUD
 # ======================================================
+def _can_decode_barcodes(user):
+    return user.has_perm("inventory.add_item") or user.has_perm("inventory.change_item")
+
+
 @login_required
 @require_POST
 def decode_barcode_upload(request):
     """
     Server-side barcode decode (ZXing-C++) for uploaded images.
     Stronger than in-browser decoders for many 1D symbologies; used from item form upload flow.
+    Runs on the bounded decode pool (``barcode_decode``).
     """
-    if not (
-        request.user.has_perm("inventory.add_item")
-        or request.user.has_perm("inventory.change_item")
-    ):
+    if not _can_decode_barcodes(request.user):
         return JsonResponse({"ok": False, "error": "forbidden"}, status=403)
     f = request.FILES.get("image")
     if not f:
         return JsonResponse({"ok": False, "error": "no_image"}, status=400)
-    if f.size > 5 * 1024 * 1024:
-        return JsonResponse({"ok": False, "error": "too_large"}, status=400)
-    ct = (getattr(f, "content_type", None) or "").lower()
-    if ct and not ct.startswith("image/"):
-        return JsonResponse({"ok": False, "error": "invalid_type"}, status=400)
-    try:
-        import zxingcpp
-        from io import BytesIO
+    error = barcode_decode.check_upload(f)
+    result = barcode_decode.DecodeResult.failed(error) if error else barcode_decode.decode(f.read())
+    return JsonResponse(result.as_json(), status=result.status)
+
+
+@login_required
+@require_POST
+def decode_barcode_batch(request):
+    """
+    Decode many uploaded images (``images``, e.g. every label on a receiving pallet).
+
+    Streams one NDJSON line per image as its decode finishes, in completion
+    order: ``{"index", "name", "ok", "text"|"error", ...}``. A final
+    ``{"done": true, "decoded", "failed"}`` line closes the stream.
+    """
+    if not _can_decode_barcodes(request.user):
+        return JsonResponse({"ok": False, "error": "forbidden"}, status=403)
+    files = request.FILES.getlist("images")
+    if not files:
+        return JsonResponse({"ok": False, "error": "no_image"}, status=400)
+    limit = getattr(settings, "BARCODE_BATCH_MAX_FILES", 50)
+    if len(files) > limit:
+        return JsonResponse({"ok": False, "error": "too_many", "limit": limit}, status=400)
+
+    names = [f.name for f in files]
+    rejected = {i: barcode_decode.check_upload(f) for i, f in enumerate(files)}
+    rejected = {i: error for i, error in rejected.items() if error}
+    accepted = [i for i in range(len(files)) if i not in rejected]
+    # Read the uploads now: the request's temp files are closed once the view returns.
+    blobs = [files[i].read() for i in accepted]
+
+    def lines():
+        decoded = 0
+        results = [(i, barcode_decode.DecodeResult.failed(error)) for i, error in rejected.items()]
+        results = itertools.chain(
+            results, ((accepted[j], result) for j, result in barcode_decode.decode_many(blobs))
+        )
+        for index, result in results:
+            decoded += result.ok
+            yield json.dumps({"index": index, "name": names[index], **result.as_json()}) + "\n"
+        yield json.dumps({"done": True, "decoded": decoded, "failed": len(files) - decoded}) + "\n"
+
+    response = StreamingHttpResponse(lines(), content_type="application/x-ndjson")
+    response["Cache-Control"] = "no-store"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@login_required
+@permission_required("inventory.view_item", raise_exception=True)
+@require_http_methods(["GET", "POST"])
+def scan_lookup(request):
+    """
+    Resolve scanned codes (SKU, barcode or serial number) to items.
+
+    GET ``?code=...`` answers one scan (404 when unknown). POST a JSON body
+    ``{"codes": [...]}`` (up to ``BULK_LOOKUP_LIMIT``) to resolve a whole
+    receiving batch in one call; unknown codes come back as ``null`` and are
+    also listed under ``missing``.
+    """
+    if request.method == "GET":
+        code = scan_codes.normalize(request.GET.get("code"))
+        if not code:
+            return JsonResponse({"found": False, "error": "no_code"}, status=400)
+        match = scan_codes.lookup([code])[code]
+        if match is None:
+            return JsonResponse({"found": False, "code": code}, status=404)
+        return JsonResponse({"found": True, **match})
 
-        from PIL import Image, UnidentifiedImageError
-    except ImportError:
-        return JsonResponse({"ok": False, "error": "library_unavailable"}, status=503)
     try:
-        data = f.read()
-        img = Image.open(BytesIO(data))
-        img.load()
-        if img.mode not in ("RGB", "L"):
-            img = img.convert("RGB")
-        barcodes = zxingcpp.read_barcodes(img)
-        if barcodes:
-            b = barcodes[0]
-            return JsonResponse(
-                {"ok": True, "text": b.text, "format": str(b.format)}
-            )
-        return JsonResponse({"ok": False, "error": "not_found"})
-    except UnidentifiedImageError:
-        return JsonResponse({"ok": False, "error": "invalid_image"}, status=400)
-    except Exception:
-        logger.exception("decode_barcode_upload")
-        return JsonResponse({"ok": False, "error": "decode_failed"}, status=500)
+        codes = json.loads(request.body or b"{}").get("codes")
+    except (ValueError, AttributeError):
+        codes = None
+    if not isinstance(codes, list) or not all(isinstance(c, str) for c in codes):
+        return JsonResponse({"error": "codes must be a list of strings"}, status=400)
+    if len(codes) > scan_codes.BULK_LOOKUP_LIMIT:
+        return JsonResponse(
+            {"error": "too_many", "limit": scan_codes.BULK_LOOKUP_LIMIT}, status=400
+        )
+    results = scan_codes.lookup(codes)
+    return JsonResponse({
+        "results": results,
+        "missing": [code for code, match in results.items() if match is None],
+    })
 
 
 @login_required
@@ -1326,6 +1018,9 @@ def item_create(request):
         form = ItemForm(request.POST, request.FILES)
         if form.is_valid():
             item = form.save()
+            if item.quantity:
+                record_movement(item, item.quantity, StockMovement.REASON_INITIAL, user=request.user)
+            note_item_change(None, contribution_of(item))
 
             Activity.objects.create(
                 message=f"New item created: {item.name}",
@@ -1350,11 +1045,21 @@ def item_create(request):
 @permission_required("inventory.change_item", raise_exception=True)
 def item_edit(request, pk):
     item = get_object_or_404(Item, pk=pk)
+    previous_quantity = item.quantity
+    previous_contribution = contribution_of(item)
 
     if request.method == "POST":
         form = ItemForm(request.POST, request.FILES, instance=item)
         if form.is_valid():
             updated_item = form.save()
+            if updated_item.quantity != previous_quantity:
+                record_movement(
+                    updated_item,
+                    updated_item.quantity - previous_quantity,
+                    StockMovement.REASON_EDIT,
+                    user=request.user,
+                )
+            note_item_change(previous_contribution, contribution_of(updated_item))
 
             Activity.objects.create(
                 message=f"Item updated: {updated_item.name}",
@@ -1382,6 +1087,7 @@ def item_delete(request, pk):
 
     if request.method == "POST":
         name = item.name
+        contribution = contribution_of(item)
         try:
             item.delete()
         except ProtectedError:
@@ -1390,6 +1096,7 @@ def item_delete(request, pk):
                 "Cannot delete this item because it has order history. Archive it instead, or ask a manager for a permanent removal.",
             )
             return redirect("item_list")
+        note_item_change(contribution, None)
         Activity.objects.create(
             message=f"Item deleted: {name}",
             user=request.user,
@@ -1422,7 +1129,9 @@ def item_hard_delete(request, pk):
         StockHistory.objects.filter(item=item).delete()
 
         name = item.name
+        contribution = contribution_of(item)
         item.delete()
+        note_item_change(contribution, None)
 
         _perm_msg = (
             f"Permanently deleted item: {name} "
@@ -1452,6 +1161,7 @@ def item_hard_delete(request, pk):
 
 @login_required
 @permission_required("inventory.view_item", raise_exception=True)
+@change_versions.conditional_view(Item, Category, Location, Supplier, page=False)
 def item_export_csv(request):
     response = HttpResponse(content_type="text/csv")
     response["Content-Disposition"] = 'attachment; filename=\"stock_items.csv\"'
@@ -1480,26 +1190,228 @@ def item_export_csv(request):
     return response
 
 
+ITEM_IMPORT_REPORT_SECONDS = 3600
+ITEM_IMPORT_ERRORS_SHOWN = 200
+
+
+def _item_import_report_key(user, token):
+    return f"item-import-errors:{user.pk}:{token}"
+
+
+@login_required
+@permission_required(["inventory.add_item", "inventory.change_item"], raise_exception=True)
+def item_import(request):
+    """Upload a CSV/XLSX of items to create or update by SKU (see ``inventory.item_import``)."""
+    report = None
+    error = None
+    report_token = None
+    if request.method == "POST":
+        upload = request.FILES.get("file")
+        if not upload:
+            error = "Choose a CSV or Excel file to import."
+        elif upload.size > item_import_service.MAX_UPLOAD_BYTES:
+            error = "That file is too large (50 MB maximum)."
+        else:
+            try:
+                report = item_import_service.import_items(
+                    upload.file,
+                    upload.name,
+                    user=request.user,
+                    dry_run=request.POST.get("dry_run") == "1",
+                )
+            except item_import_service.ItemImportError as exc:
+                error = str(exc)
+        if report is not None and report.errors:
+            report_token = uuid.uuid4().hex
+            cache.set(
+                _item_import_report_key(request.user, report_token),
+                report.errors_csv(),
+                ITEM_IMPORT_REPORT_SECONDS,
+            )
+
+    return render(request, "inventory/item_import.html", {
+        "report": report,
+        "error": error,
+        "report_token": report_token,
+        "shown_errors": report.errors[:ITEM_IMPORT_ERRORS_SHOWN] if report else [],
+        "import_fields": item_import_service.IMPORT_FIELDS,
+        "view": "items",
+    })
+
+
+@login_required
+@permission_required(["inventory.add_item", "inventory.change_item"], raise_exception=True)
+def item_import_errors(request, token):
+    """The full per-row error report of a recent import, as CSV."""
+    body = cache.get(_item_import_report_key(request.user, token))
+    if body is None:
+        raise Http404("Import report expired")
+    response = HttpResponse(body, content_type="text/csv")
+    response["Content-Disposition"] = 'attachment; filename="item_import_errors.csv"'
+    return response
+
+
+# ======================================================
+# CYCLE COUNTS
+# ======================================================
+CYCLE_COUNT_UNCOUNTED_SHOWN = 50
+
+
+@login_required
+@permission_required("inventory.view_cyclecount", raise_exception=True)
+def cycle_count_list(request):
+    """Open and past stock-take sessions; managers start a new one here."""
+    form = CycleCountForm()
+    if request.method == "POST":
+        if not request.user.has_perm("inventory.add_cyclecount"):
+            raise PermissionDenied
+        form = CycleCountForm(request.POST)
+        if form.is_valid():
+            session = form.save(commit=False)
+            session.created_by = request.user
+            session.save()
+            messages.success(request, f"Started cycle count: {session.name}")
+            return redirect("cycle_count_detail", pk=session.pk)
+
+    sessions = (
+        CycleCount.objects.select_related("location", "created_by", "approved_by")
+        .annotate(line_count=Count("lines"))
+    )
+    status = request.GET.get("status", "")
+    if status in dict(CycleCount.STATUS_CHOICES):
+        sessions = sessions.filter(status=status)
+    per_page = get_per_page(request)
+    page_obj = Paginator(sessions, per_page).get_page(request.GET.get("page"))
+    return render(request, "inventory/cycle_count_list.html", {
+        "sessions": page_obj,
+        "form": form,
+        "status": status,
+        "status_choices": CycleCount.STATUS_CHOICES,
+        "per_page": per_page,
+        "per_page_choices": PER_PAGE_CHOICES,
+        "view": "cycle_counts",
+    })
+
+
+@login_required
+@permission_required("inventory.view_cyclecount", raise_exception=True)
+def cycle_count_detail(request, pk):
+    """
+    Enter counts and review variances against current stock.
+
+    POST takes either a single scan (``code`` + ``quantity``) or pasted
+    ``counts`` (one ``code[,quantity]`` per line); ``mode`` picks add or replace.
+    """
+    session = get_object_or_404(CycleCount.objects.select_related("location", "created_by", "approved_by"), pk=pk)
+
+    if request.method == "POST":
+        if not request.user.has_perm("inventory.change_cyclecount"):
+            raise PermissionDenied
+        mode = request.POST.get("mode", cycle_counts.MODE_ADD)
+        if mode not in cycle_counts.MODES:
+            mode = cycle_counts.MODE_ADD
+        if "counts" in request.POST:
+            entries, invalid = cycle_counts.parse_counts(request.POST.get("counts", ""))
+        else:
+            code = request.POST.get("code", "").strip()
+            entries, invalid = cycle_counts.parse_counts(f"{code},{request.POST.get('quantity', '1')}" if code else "")
+        try:
+            result = cycle_counts.record_counts(session, entries, user=request.user, mode=mode)
+        except cycle_counts.CycleCountError as exc:
+            messages.error(request, str(exc))
+            return redirect("cycle_count_detail", pk=session.pk)
+        if result.recorded:
+            messages.success(request, f"Recorded counts for {result.recorded} item{'s' if result.recorded != 1 else ''}.")
+        if result.unknown:
+            shown = ", ".join(result.unknown[:20]) + (" …" if len(result.unknown) > 20 else "")
+            messages.warning(request, f"{len(result.unknown)} code(s) matched no item: {shown}")
+        if invalid:
+            shown = ", ".join(f"line {n}" for n, _ in invalid[:20]) + (" …" if len(invalid) > 20 else "")
+            messages.warning(request, f"Could not read {len(invalid)} line(s): {shown}")
+        return redirect("cycle_count_detail", pk=session.pk)
+
+    lines = cycle_counts.lines_with_variance(session)
+    show = request.GET.get("show", "")
+    if show == "variances":
+        lines = lines.exclude(diff=0)
+    per_page = get_per_page(request)
+    page_obj = Paginator(lines, per_page).get_page(request.GET.get("page"))
+    uncounted = cycle_counts.uncounted_items(session) if session.is_open else Item.objects.none()
+    return render(request, "inventory/cycle_count_detail.html", {
+        "session": session,
+        "lines": page_obj,
+        "summary": cycle_counts.variance_summary(session),
+        "show": show,
+        "uncounted_count": uncounted.count() if session.location_id else 0,
+        "uncounted": list(uncounted[:CYCLE_COUNT_UNCOUNTED_SHOWN]) if session.location_id else [],
+        "per_page": per_page,
+        "per_page_choices": PER_PAGE_CHOICES,
+        "view": "cycle_counts",
+    })
+
+
+@login_required
+@permission_required("inventory.change_cyclecount", raise_exception=True)
+@require_POST
+def cycle_count_line_delete(request, pk, line_id):
+    session = get_object_or_404(CycleCount, pk=pk)
+    if not session.is_open:
+        messages.error(request, f"{session.name} is closed; its counts can no longer change.")
+    else:
+        session.lines.filter(pk=line_id).delete()
+    return redirect("cycle_count_detail", pk=session.pk)
+
+
+@login_required
+@permission_required(["inventory.approve_cyclecount", "inventory.change_item"], raise_exception=True)
+@require_POST
+def cycle_count_approve(request, pk):
+    """Apply every variance of the session to stock in one batch (see ``inventory.cycle_counts``)."""
+    session = get_object_or_404(CycleCount, pk=pk)
+    try:
+        result = cycle_counts.approve(session, user=request.user)
+    except cycle_counts.CycleCountError as exc:
+        messages.error(request, str(exc))
+    else:
+        messages.success(
+            request,
+            f"Approved {session.name}: {result.adjusted} of {result.lines} items adjusted (net {result.net_change:+d}).",
+        )
+    return redirect("cycle_count_detail", pk=session.pk)
+
+
+@login_required
+@permission_required("inventory.approve_cyclecount", raise_exception=True)
+@require_POST
+def cycle_count_cancel(request, pk):
+    session = get_object_or_404(CycleCount, pk=pk)
+    try:
+        cycle_counts.cancel(session)
+    except cycle_counts.CycleCountError as exc:
+        messages.error(request, str(exc))
+    else:
+        messages.success(request, f"Cancelled {session.name}; stock was not changed.")
+    return redirect("cycle_count_detail", pk=session.pk)
+
+
 # ======================================================
 # CATEGORY TREE VIEW + CRUD
 # ======================================================
 @login_required
 @permission_required("inventory.view_category", raise_exception=True)
 def category_list(request):
-    roots = Category.objects.filter(parent__isnull=True)
+    tree = get_tree(KIND_CATEGORY)
+    roots = tree.roots
 
     add_form = CategoryForm()
     all_categories = Category.objects.order_by("name")
 
-    total_categories = Category.objects.count()
-    top_level_count = Category.objects.filter(parent__isnull=True).count()
-    cat_annotated = Category.objects.annotate(
-        _item_count=Count("items", distinct=True),
-        _child_count=Count("children", distinct=True),
-    )
-    categories_with_items_count = cat_annotated.filter(_item_count__gt=0).count()
-    categories_empty_count = cat_annotated.filter(_item_count=0).count()
-    categories_with_children_count = cat_annotated.filter(_child_count__gt=0).count()
+    # Summary cards come from the cached tree rather than five count queries.
+    total_categories = len(tree)
+    top_level_count = len(roots)
+    categories_with_items_count = sum(1 for n in tree.nodes.values() if n.item_count > 0)
+    categories_empty_count = total_categories - categories_with_items_count
+    categories_with_children_count = sum(1 for n in tree.nodes.values() if n.children)
 
     active_filter = request.GET.get("filter", "") or ""
 
@@ -1617,7 +1529,7 @@ def category_delete(request, pk):
 # -------------------------------
 @login_required
 @permission_required("inventory.view_location", raise_exception=True)
-@never_cache
+@change_versions.conditional_view(Location, Item, Order)
 def location_list(request):
     """
     Location listing with:
@@ -1772,7 +1684,10 @@ def location_list(request):
     )
 
     view_mode = request.GET.get("view", "list")
-    roots = Location.objects.filter(parent__isnull=True) if view_mode == "tree" else None
+    roots, tree_max_depth = None, 0
+    if view_mode == "tree":
+        location_tree_data = get_tree(KIND_LOCATION)
+        roots, tree_max_depth = location_tree_data.roots, location_tree_data.render_depth
 
     # Map data: locations with coordinates (for popup map)
     locations_with_coords = list(
@@ -1801,6 +1716,7 @@ def location_list(request):
         "view": "locations",
         "view_mode": view_mode,
         "roots": roots,
+        "tree_max_depth": tree_max_depth,
         "total_locations": total_locations,
         "warehouse_count": warehouse_count,
         "total_stock_qty": total_stock_qty,
@@ -1940,13 +1856,39 @@ def location_export_csv(request):
 @login_required
 @permission_required("inventory.view_location", raise_exception=True)
 def location_tree(request):
-    roots = Location.objects.filter(parent__isnull=True)
+    tree = get_tree(KIND_LOCATION)
     return render(request, "inventory/location_tree.html", {
-        "roots": roots,
+        "roots": tree.roots,
+        "tree_max_depth": UNLIMITED_DEPTH,  # this page has no lazy-loading script
         "view": "locations",
     })
 
 
+@login_required
+@permission_required("inventory.view_location", raise_exception=True)
+def location_tree_nodes(request):
+    """Children of ``?parent=<id>`` (roots when omitted) with subtree rollups, for lazy tree expansion."""
+    tree = get_tree(KIND_LOCATION)
+    parent_id = request.GET.get("parent")
+    if parent_id:
+        try:
+            parent = tree.nodes.get(int(parent_id))
+        except ValueError:
+            parent = None
+        if parent is None:
+            return JsonResponse({"ok": False, "error": "Location not found."}, status=404)
+        children = parent.children
+    else:
+        children = tree.roots
+    nodes = []
+    for node in children:
+        data = node.as_json()
+        data["url"] = reverse("location_view", args=[node.id])
+        data["items_url"] = reverse("item_list") + f"?location={node.id}"
+        nodes.append(data)
+    return JsonResponse({"ok": True, "parent": int(parent_id) if parent_id else None, "nodes": nodes})
+
+
 # -------------------------------
 # LOCATION DETAIL VIEW
 # -------------------------------
@@ -2016,6 +1958,7 @@ def location_view(request, pk):
 # -------------------------------
 @login_required
 @permission_required("inventory.view_order", raise_exception=True)
+@change_versions.conditional_view(Order, OrderLine, Item, Location, Supplier, Client)
 def order_list(request):
     orders = (
         Order.objects.select_related(
@@ -2227,6 +2170,7 @@ def order_detail(request, pk):
 
 @login_required
 @permission_required("inventory.view_order", raise_exception=True)
+@change_versions.conditional_view(Order, OrderLine, Item, Supplier, Client, page=False)
 def order_export_csv(request):
     """Export orders to CSV, respecting current filters. Pass ids=1,2,3 to export only selected orders."""
     orders = Order.objects.prefetch_related("lines", "lines__item").select_related("supplier", "client")
@@ -2425,7 +2369,7 @@ def order_create(request):
                     order__order_type=Order.TYPE_PURCHASE,
                     item=item_for_history,
                 )
-                .order_by("-order__order_date")
+                .order_by("-order_date")
                 .values_list("unit_price", flat=True)
                 .first()
             )
@@ -2464,7 +2408,7 @@ def order_create(request):
                     order__order_type=Order.TYPE_SALE,
                     item=item_for_history,
                 )
-                .order_by("-order__order_date")
+                .order_by("-order_date")
                 .values_list("unit_price", flat=True)
                 .first()
             )
@@ -2628,6 +2572,60 @@ def order_mark_delivered(request, pk):
     return redirect(reverse("order_list") + f"?type={order.order_type.lower()}")
 
 
+BULK_ORDER_TARGETS = {
+    "delivered": Order.STATUS_DELIVERED,
+    "shipped": Order.STATUS_SHIPPED,
+    "cancelled": Order.STATUS_CANCELLED,
+}
+
+
+@require_POST
+@login_required
+@permission_required("inventory.change_order", raise_exception=True)
+def order_bulk_status(request):
+    """
+    Mark the selected orders delivered, shipped or cancelled in one transaction.
+
+    Deliveries apply all their stock as one batch (see ``inventory.order_transitions``).
+    Returns the per-order report as JSON when asked for it (``Accept:
+    application/json``), otherwise as flash messages on the list page.
+    """
+    wants_json = "application/json" in request.headers.get("Accept", "")
+    target = BULK_ORDER_TARGETS.get(request.POST.get("status", ""))
+    selected_ids = [pk for pk in request.POST.getlist("selected_orders") if pk.isdigit()]
+    next_url = request.POST.get("next") or request.GET.get("next")
+    if not next_url or not next_url.startswith("/"):
+        next_url = reverse("order_list")
+
+    if target is None:
+        if wants_json:
+            return JsonResponse({"ok": False, "error": "invalid_status"}, status=400)
+        messages.error(request, "Choose delivered, shipped or cancelled.")
+        return redirect(next_url)
+    if not selected_ids:
+        if wants_json:
+            return JsonResponse({"ok": False, "error": "no_orders"}, status=400)
+        messages.info(request, "No orders selected.")
+        return redirect(next_url)
+    try:
+        report = order_transitions.transition_orders(selected_ids, target, actor=request.user)
+    except ValueError as exc:
+        if wants_json:
+            return JsonResponse({"ok": False, "error": str(exc)}, status=400)
+        messages.error(request, str(exc))
+        return redirect(next_url)
+
+    if wants_json:
+        return JsonResponse({"ok": not report.failed, **report.as_json()})
+    if report.succeeded:
+        messages.success(request, report.summary() + ".")
+    for outcome in report.failed[:20]:
+        messages.error(request, f"Order #{outcome.order_id}: {outcome.error}")
+    if len(report.failed) > 20:
+        messages.error(request, f"… and {len(report.failed) - 20} more orders failed.")
+    return redirect(next_url)
+
+
 def _contact_map_points(qs, detail_view_name: str):
     """Build [{id, name, address, latitude, longitude, map_url, detail_url}, ...] for Leaflet."""
     rows = qs.filter(
@@ -2887,6 +2885,7 @@ def contacts_list(request):
 @login_required
 @permission_required("inventory.view_supplier", raise_exception=True)
 @permission_required("inventory.view_client", raise_exception=True)
+@change_versions.conditional_view(Supplier, Client, Order, OrderLine, page=False)
 def contact_export_csv(request):
     """Export contacts to CSV, respecting current filters."""
     type_filter = request.GET.get("type", "suppliers")
@@ -3063,7 +3062,7 @@ def supplier_view(request, pk):
     from django.db.models.functions import TruncMonth
     order_values_by_month = (
         OrderLine.objects.filter(order__supplier=supplier)
-        .annotate(month=TruncMonth("order__order_date"))
+        .annotate(month=TruncMonth("order_date"))
         .values("month")
         .annotate(total=Sum(F("quantity") * F("unit_price")))
         .order_by("month")[:12]
@@ -3159,7 +3158,7 @@ def client_view(request, pk):
     from django.db.models.functions import TruncMonth
     order_values_by_month = (
         OrderLine.objects.filter(order__client=client)
-        .annotate(month=TruncMonth("order__order_date"))
+        .annotate(month=TruncMonth("order_date"))
         .values("month")
         .annotate(total=Sum(F("quantity") * F("unit_price")))
         .order_by("month")[:12]
@@ -3540,7 +3539,11 @@ def settings_view(request):
 @login_required
 def alerts_list(request):
     alerts, _ = get_alerts_for_user(request, limit=None)
+    return alerts_list_response(request, alerts)
+
 
+def alerts_list_response(request, alerts):
+    """Render the Alerts page: filter, sort and paginate the merged alert rows."""
     total_all = len(alerts)
     total_critical = sum(1 for a in alerts if a.get("severity") == "critical")
     total_warning = sum(1 for a in alerts if a.get("severity") == "warning")
@@ -3688,4 +3691,86 @@ def dismiss_alerts_bulk(request):
         )
     request.session["dismissed_alerts"] = list(dismissed)
     cache.delete(f"ctx_notifications:{request.user.pk}")
-    return redirect(request.META.get("HTTP_REFERER", reverse("alerts_list")))
\ No newline at end of file
+    return redirect(request.META.get("HTTP_REFERER", reverse("alerts_list")))
+
+@never_cache
+@login_required
+@user_passes_test(is_manager_or_admin)
+def metrics_view(request):
+    """Prometheus text exposition of per-view request histograms (this worker only)."""
+    from .request_metrics import registry
+
+    return HttpResponse(
+        registry.render_prometheus(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+# Stage colours on the jobs page; the same stage keeps its colour across jobs.
+_JOB_STAGE_COLOURS = {
+    "plan": "secondary",
+    "load": "info",
+    "detect": "primary",
+    "save": "success",
+    "prune": "warning",
+    "notify": "danger",
+}
+
+
+def _filtered_job_runs(request):
+    runs = JobRun.objects.select_related("user")
+    name = request.GET.get("name", "")
+    if name:
+        runs = runs.filter(name=name)
+    status = request.GET.get("status", "")
+    if status in dict(JobRun.STATUS_CHOICES):
+        runs = runs.filter(status=status)
+    return runs, name, status
+
+
+@never_cache
+@login_required
+@user_passes_test(is_manager_or_admin)
+def job_run_list(request):
+    """Recent background job runs with duration, stage breakdown, rows, queries and peak memory."""
+    runs, name, status = _filtered_job_runs(request)
+    per_page = get_per_page(request)
+    page_obj = Paginator(runs, per_page).get_page(request.GET.get("page"))
+    for run in page_obj:
+        run.stage_bars = [
+            (stage, seconds, share, _JOB_STAGE_COLOURS.get(stage, "dark"))
+            for stage, seconds, share in job_runs.stage_shares(run)
+        ]
+    summary = job_runs.summarize(runs[:200])
+    return render(request, "inventory/job_run_list.html", {
+        "runs": page_obj,
+        "summary": sorted(summary.items()),
+        "job_names": JobRun.objects.order_by("name").values_list("name", flat=True).distinct(),
+        "name": name,
+        "status": status,
+        "status_choices": JobRun.STATUS_CHOICES,
+        "per_page": per_page,
+        "per_page_choices": PER_PAGE_CHOICES,
+        "view": "job_runs",
+    })
+
+
+@never_cache
+@login_required
+@user_passes_test(is_manager_or_admin)
+def job_run_feed(request):
+    """
+    JSON feed of job runs, newest first, plus a per-job summary over them.
+
+    Filters: ``?name=``, ``?status=``; ``?limit=`` (default 50, at most 500).
+    """
+    runs, _, _ = _filtered_job_runs(request)
+    try:
+        limit = min(max(int(request.GET.get("limit", 50)), 1), 500)
+    except ValueError:
+        limit = 50
+    runs = list(runs[:limit])
+    return JsonResponse({
+        "runs": [job_runs.run_as_json(run) for run in runs],
+        "summary": job_runs.summarize(runs),
+    })
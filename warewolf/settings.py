@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 import os
 from pathlib import Path
 
+from celery.schedules import crontab
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 try:
@@ -59,6 +61,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "inventory.middleware.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -74,7 +77,8 @@ ROOT_URLCONF = "warewolf.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # Stock Django templates, plus render timing for request metrics.
+        "BACKEND": "inventory.request_metrics.TimedDjangoTemplates",
         "DIRS": [],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -127,6 +131,13 @@ else:
         }
     }
 
+# Monthly range partitioning of orders, order lines and activity (PostgreSQL only;
+# see inventory.partitioning). Read by migration 0055; to switch it on later, set it
+# and run `manage.py ensure_partitions --convert`. Partitions are pre-created this
+# many months ahead by the daily ensure_partitions_task.
+DB_PARTITIONING = os.getenv("DB_PARTITIONING", "").strip().lower() in ("1", "true", "yes", "on")
+DB_PARTITION_MONTHS_AHEAD = int(os.getenv("DB_PARTITION_MONTHS_AHEAD", "3"))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -230,17 +241,30 @@ CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = TIME_ZONE
-# Manual "Run scan" on dashboard: run in the web process by default so results (and the
-# sticky banner) appear as soon as the request finishes. Set ANOMALY_SCAN_BUTTON_SYNC=0
-# to queue via Celery instead (requires a running worker; otherwise the task sits in Redis).
-ANOMALY_SCAN_BUTTON_SYNC = os.getenv("ANOMALY_SCAN_BUTTON_SYNC", "true").strip().lower() in (
+# Manual "Run scan" on the dashboard always runs in the background (inventory.manual_scans):
+# on Celery when the broker answers, otherwise on a thread in the web process. A scan whose
+# progress record has not moved for ANOMALY_SCAN_STALE_MINUTES is treated as dead, so a new
+# click can start a fresh one.
+ANOMALY_SCAN_STALE_MINUTES = int(os.getenv("ANOMALY_SCAN_STALE_MINUTES", "30"))
+# History window for demand series (smaller = faster scans; must cover min_points + recent window).
+ANOMALY_SCAN_DAYS_BACK = int(os.getenv("ANOMALY_SCAN_DAYS_BACK", "60"))
+# Sharded scan (inventory.anomaly_shards): at most ANOMALY_SCAN_SHARDS item-id shards of at
+# least ANOMALY_SCAN_SHARD_MIN_ITEMS candidate items each. Celery runs them as a chord; without
+# a worker they run on a local "process" or "thread" pool (workers 0 = one per CPU).
+ANOMALY_SCAN_SHARDS = int(os.getenv("ANOMALY_SCAN_SHARDS", "8"))
+ANOMALY_SCAN_SHARD_MIN_ITEMS = int(os.getenv("ANOMALY_SCAN_SHARD_MIN_ITEMS", "250"))
+ANOMALY_SCAN_LOCAL_POOL = os.getenv("ANOMALY_SCAN_LOCAL_POOL", "process").strip().lower()
+ANOMALY_SCAN_LOCAL_WORKERS = int(os.getenv("ANOMALY_SCAN_LOCAL_WORKERS", "0"))
+# Job telemetry (inventory.job_runs): every task run is stored as a JobRun with stage timings,
+# row and query counts. Peak memory comes from tracemalloc (Celery prefork children and
+# management commands only), which slows pandas-heavy jobs down; set
+# JOB_RUNS_TRACE_MEMORY=0 to leave it out.
+JOB_RUNS_TRACE_MEMORY = os.getenv("JOB_RUNS_TRACE_MEMORY", "true").strip().lower() in (
     "1",
     "true",
     "yes",
     "on",
 )
-# History window for demand series (smaller = faster scans; must cover min_points + recent window).
-ANOMALY_SCAN_DAYS_BACK = int(os.getenv("ANOMALY_SCAN_DAYS_BACK", "60"))
 
 CELERY_BEAT_SCHEDULE = {
     "run-anomaly-scan-every-30-minutes": {
@@ -251,9 +275,86 @@ CELERY_BEAT_SCHEDULE = {
         "task": "inventory.tasks.refresh_recommendations_task",
         "schedule": 30 * 60,
     },
+    # Nightly stock ledger checkpoint; keeps ~13 months of daily checkpoints.
+    "stock-checkpoint-daily": {
+        "task": "inventory.tasks.stock_checkpoint_task",
+        "schedule": crontab(hour=0, minute=15),
+        "kwargs": {"prune_days": 400},
+    },
+    # Close yesterday's InventoryDailyTotal row and re-sync today's (trend chart).
+    "inventory-daily-totals-finalize": {
+        "task": "inventory.tasks.finalize_inventory_daily_totals_task",
+        "schedule": crontab(hour=0, minute=5),
+    },
+    # Archive and delete old activity/notifications/recommendations; thin old stock history.
+    "retention-nightly": {
+        "task": "inventory.tasks.apply_retention_task",
+        "schedule": crontab(hour=3, minute=30),
+    },
+    # Keep monthly partitions created ahead of time (no-op unless DB_PARTITIONING on PostgreSQL).
+    "partitions-daily": {
+        "task": "inventory.tasks.ensure_partitions_task",
+        "schedule": 24 * 60 * 60,
+    },
 }
 
+# Retention (inventory.retention): rows past their table's age limit are appended to
+# RETENTION_ARCHIVE_DIR/<table>/<run>.jsonl.gz and deleted in batches. Per-table limits
+# in days override the defaults, e.g. RETENTION_DAYS="activity=730,notification=30";
+# 0 keeps a table forever. Daily StockHistory older than
+# RETENTION_STOCK_HISTORY_DAILY_MONTHS is thinned to one point per item and week (0 = off).
+RETENTION_ARCHIVE_DIR = os.getenv("RETENTION_ARCHIVE_DIR", str(BASE_DIR / "archive"))
+RETENTION_DAYS = {
+    name.strip(): int(days)
+    for name, _, days in (pair.partition("=") for pair in os.getenv("RETENTION_DAYS", "").split(","))
+    if name.strip() and days.strip().isdigit()
+}
+RETENTION_STOCK_HISTORY_DAILY_MONTHS = int(os.getenv("RETENTION_STOCK_HISTORY_DAILY_MONTHS", "6"))
+
 # Smart alerts tuning
 FORECAST_NOTIFICATION_COOLDOWN_HOURS = int(
     os.getenv("FORECAST_NOTIFICATION_COOLDOWN_HOURS", "12")
 )
+
+# ASGI mode (warewolf.asgi sets DJANGO_ASYNC_VIEWS=1): the dashboard, its widgets,
+# alerts and search are served by inventory.async_views. Their independent queries
+# run on a pool of ASYNC_FANOUT_WORKERS threads per process, each holding its own
+# DB connection; 0 runs them one after another on the request thread.
+ASYNC_VIEWS = os.getenv("DJANGO_ASYNC_VIEWS", "").strip().lower() in ("1", "true", "yes", "on")
+ASYNC_FANOUT_WORKERS = int(os.getenv("ASYNC_FANOUT_WORKERS", "8"))
+
+# Server-side barcode decoding (inventory.barcode_decode): a bounded pool per process.
+# Uploads are decoded at BARCODE_DECODE_MAX_SIDE px first; a request gives up after
+# BARCODE_DECODE_TIMEOUT_SECONDS, and gets "busy" when all workers plus the queue are taken.
+BARCODE_DECODE_WORKERS = int(os.getenv("BARCODE_DECODE_WORKERS", "2"))
+BARCODE_DECODE_QUEUE = int(os.getenv("BARCODE_DECODE_QUEUE", "8"))
+BARCODE_DECODE_TIMEOUT_SECONDS = float(os.getenv("BARCODE_DECODE_TIMEOUT_SECONDS", "5"))
+BARCODE_DECODE_MAX_SIDE = int(os.getenv("BARCODE_DECODE_MAX_SIDE", "1600"))
+BARCODE_BATCH_MAX_FILES = int(os.getenv("BARCODE_BATCH_MAX_FILES", "50"))
+
+# WebP thumbnails of uploaded images (inventory.renditions), rendered off the request
+# path on a per-process pool of RENDITION_WORKERS threads (0 renders inline).
+RENDITION_WORKERS = int(os.getenv("RENDITION_WORKERS", "1"))
+
+# Per-request instrumentation (inventory.middleware.RequestMetricsMiddleware).
+# Histograms are served to managers at /metrics; set REQUEST_METRICS_JSONL_PATH to
+# also append one JSON line per request to a rotating file.
+REQUEST_METRICS_ENABLED = os.getenv("REQUEST_METRICS_ENABLED", "true").strip().lower() in (
+    "1",
+    "true",
+    "yes",
+    "on",
+)
+REQUEST_METRICS_JSONL_PATH = os.getenv("REQUEST_METRICS_JSONL_PATH", "")
+REQUEST_METRICS_JSONL_MAX_BYTES = int(os.getenv("REQUEST_METRICS_JSONL_MAX_BYTES", str(10 * 1024 * 1024)))
+REQUEST_METRICS_JSONL_BACKUPS = int(os.getenv("REQUEST_METRICS_JSONL_BACKUPS", "5"))
+# Log a warning when a view runs more SQL queries than this. Per-view overrides use
+# URL names, e.g. REQUEST_METRICS_QUERY_BUDGETS="dashboard=120,item_list=40".
+REQUEST_METRICS_QUERY_BUDGET = int(os.getenv("REQUEST_METRICS_QUERY_BUDGET", "60"))
+REQUEST_METRICS_QUERY_BUDGETS = {
+    name.strip(): int(limit)
+    for name, _, limit in (
+        pair.partition("=") for pair in os.getenv("REQUEST_METRICS_QUERY_BUDGETS", "").split(",")
+    )
+    if name.strip() and limit.strip().isdigit()
+}
@@ -15,9 +15,11 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
+from django.views.decorators.cache import cache_control
+from django.views.static import serve
 
 from inventory.auth_views import WareWolfLoginView
 
@@ -28,5 +30,13 @@ urlpatterns = [
     path("", include("inventory.urls")),  # or your app urls
 ]
 if settings.DEBUG:
+    # Rendition names are content hashes, so they can be cached forever.
+    urlpatterns += [
+        re_path(
+            rf"^{settings.MEDIA_URL.strip('/')}/renditions/(?P<path>.*)$",
+            cache_control(public=True, max_age=31536000, immutable=True)(serve),
+            {"document_root": settings.MEDIA_ROOT / "renditions"},
+        ),
+    ]
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 